@@ -0,0 +1,28 @@
+"""
+Benchmarks for the Derivity backend.
+
+Modules here can be run directly (``python -m benchmarks.<module>``) or
+through management commands; ``setup_django`` configures settings for the
+standalone case.
+"""
+import os
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'derivity_backend.settings')
+    import django
+    django.setup()
+
+
+class scratch_database:
+    """Run a benchmark against a throwaway test database instead of real data"""
+
+    def __enter__(self):
+        from django.db import connection
+        self.connection = connection
+        self.old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        return connection
+
+    def __exit__(self, *exc_info):
+        self.connection.creation.destroy_test_db(self.old_name, verbosity=0)
@@ -0,0 +1,148 @@
+"""
+Concurrency benchmark for the auth-status polling workload under ASGI.
+
+Every open page polls ``/api/auth-status/``. This drives Django's ASGI
+application in-process, the way an ASGI server would, with a growing number
+of concurrent logged-in clients, once with the sync views (each request
+pushed through ``sync_to_async``) and once with the native async views that
+``derivity_backend/asgi.py`` enables. Reports req/s and p50/p99 latency per
+concurrency level.
+
+    python -m benchmarks.bench_asgi --users 200 --requests 2000 --concurrency 1 8 32 128
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import ModuleType
+
+from benchmarks import scratch_database, setup_django
+
+
+def route_table(async_views):
+    from django.urls import path
+    from main import views
+
+    if async_views:
+        auth_status, validate = views.acheck_auth_status, views.avalidate_email_api
+    else:
+        auth_status, validate = views.check_auth_status, views.validate_email_api
+    urlconf = ModuleType(f'bench_urls_{"async" if async_views else "sync"}')
+    urlconf.urlpatterns = [
+        path('api/auth-status/', auth_status, name='check_auth_status'),
+        path('api/validate-email/', validate, name='validate_email'),
+    ]
+    return urlconf
+
+
+async def call(application, path, cookie):
+    """One GET through the ASGI interface; returns (status, seconds)"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+    }
+    status = None
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await disconnected.wait()  # Django listens for a disconnect while the view runs
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    start = time.perf_counter()
+    await application(scope, receive, send)
+    return status, time.perf_counter() - start
+
+
+async def run_level(application, cookies, total, concurrency):
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def client(worker):
+        nonlocal errors
+        cookie = cookies[worker % len(cookies)]
+        for _ in counter:
+            status, elapsed = await call(application, '/api/auth-status/', cookie)
+            latencies.append(elapsed)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'rps': total / wall,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'errors': errors,
+    }
+
+
+def login_cookies(count):
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from main.models import UserProfile
+
+    User.objects.bulk_create([
+        User(username=f'poll{i}', email=f'poll{i}@example.com', password='!', first_name='Poll')
+        for i in range(count)
+    ])
+    users = list(User.objects.filter(username__startswith='poll').order_by('pk'))
+    UserProfile.objects.bulk_create([UserProfile(user=u) for u in users])
+
+    cookies = []
+    for user in users:
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookies.append(f'{settings.SESSION_COOKIE_NAME}={session.session_key}')
+    return cookies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=200, help='Logged-in sessions polling')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.handlers.asgi import ASGIHandler
+    from django.test.utils import override_settings
+    from django.urls import clear_url_caches
+
+    # Polls would otherwise rewrite the session row every time, and concurrent
+    # writers mostly measure SQLite's table lock rather than the views
+    with scratch_database(), override_settings(METRICS_DIR=None, SESSION_SAVE_EVERY_REQUEST=False):
+        cookies = login_cookies(args.users)
+        print(f'{"views":<6} {"clients":>7} {"req/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"errors":>6}')
+        for label, async_views in [('sync', False), ('async', True)]:
+            with override_settings(ROOT_URLCONF=route_table(async_views)):
+                clear_url_caches()
+                application = ASGIHandler()
+                asyncio.run(run_level(application, cookies, min(50, args.requests), 4))  # Warm up
+                for concurrency in args.concurrency:
+                    result = asyncio.run(run_level(application, cookies, args.requests, concurrency))
+                    print(f'{label:<6} {concurrency:>7} {result["rps"]:>9.0f} {result["p50_ms"]:>8.2f} '
+                          f'{result["p99_ms"]:>8.2f} {result["errors"]:>6}')
+            clear_url_caches()
+
+
+if __name__ == '__main__':
+    main()
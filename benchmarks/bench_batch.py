@@ -0,0 +1,84 @@
+"""
+Page-load API latency with and without ``/api/batch/``.
+
+A page load fetches the CSRF token and auth status and, on the signup page,
+checks the typed email. This replays that set of calls for logged-in users
+as separate requests and as one batch, through the full middleware stack,
+and reports server time, queries and round trips per page load. ``--rtt-ms``
+adds a modelled network round trip so the saving from fewer trips shows up
+in the total.
+
+    python -m benchmarks.bench_batch --users 50 --loads 500 --rtt-ms 40
+"""
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks import scratch_database, setup_django
+
+PAGE_LOAD = [
+    {'path': '/api/csrf-token/'},
+    {'path': '/api/auth-status/'},
+    {'method': 'POST', 'path': '/api/validate-email/', 'body': {'email': 'new.visitor@example.com'}},
+]
+
+
+def separate(client):
+    for call in PAGE_LOAD:
+        if call.get('method') == 'POST':
+            client.post(call['path'], json.dumps(call['body']), content_type='application/json')
+        else:
+            client.get(call['path'])
+    return len(PAGE_LOAD)
+
+
+def batched(client):
+    client.post('/api/batch/', json.dumps({'requests': PAGE_LOAD}), content_type='application/json')
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--loads', type=int, default=500, help='Page loads per strategy')
+    parser.add_argument('--rtt-ms', type=float, default=40.0, help='Modelled network round trip')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from main.models import UserProfile
+
+    with scratch_database(), override_settings(METRICS_DIR=None, ALLOWED_HOSTS=['testserver']):
+        User.objects.bulk_create([
+            User(username=f'page{i}', email=f'page{i}@example.com', password='!') for i in range(args.users)
+        ])
+        users = list(User.objects.order_by('pk'))
+        UserProfile.objects.bulk_create([UserProfile(user=u) for u in users])
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        print(f'{"strategy":<10} {"trips":>5} {"server ms":>10} {"p95 ms":>8} {"queries":>8} '
+              f'{"total ms @ rtt":>15}')
+        for label, load in [('separate', separate), ('batch', batched)]:
+            load(clients[0])  # Warm up
+            timings = []
+            with CaptureQueriesContext(connection) as captured:
+                for i in range(args.loads):
+                    start = time.perf_counter()
+                    trips = load(clients[i % len(clients)])
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            server_ms = statistics.mean(timings)
+            print(f'{label:<10} {trips:>5} {server_ms:>10.2f} {timings[int(len(timings) * 0.95)]:>8.2f} '
+                  f'{len(captured.captured_queries) / args.loads:>8.1f} {server_ms + trips * args.rtt_ms:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Storage size and read latency of compressed chat text.
+
+Builds a synthetic corpus of chat turns (short questions, multi-KB
+answers), writes it to two SQLite files, one with plain TEXT columns and
+one with the bytes ``CompressedTextField`` stores, and compares file size,
+full-scan read time and random point reads including decompression.
+
+    python -m benchmarks.bench_compressed_text --rows 20000 --answer-kb 4
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+VOCABULARY = (
+    'option call put strike expiry volatility implied delta gamma vega theta hedge portfolio '
+    'position risk premium underlying futures spread margin exposure return drawdown signal '
+    'the a of to and in is for with that this on as by market price model trade value time'
+).split()
+
+
+def paragraph(rng, words):
+    text = ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def corpus(rows, answer_kb, rng):
+    for i in range(rows):
+        question = paragraph(rng, rng.randint(6, 20))
+        parts = []
+        while sum(len(p) for p in parts) < answer_kb * 1024 * rng.uniform(0.5, 1.5):
+            if rng.random() < 0.2:
+                parts.append(f'| strike | delta | price |\n|---|---|---|\n'
+                             f'| {rng.randint(80, 120)} | {rng.random():.3f} | {rng.uniform(1, 20):.2f} |')
+            else:
+                parts.append(paragraph(rng, rng.randint(30, 90)))
+        yield i, question, '\n\n'.join(parts)
+
+
+def build(path, column_type, rows, encode):
+    db = sqlite3.connect(path)
+    db.execute(f'CREATE TABLE conversation (id INTEGER PRIMARY KEY, message {column_type}, response {column_type})')
+    db.executemany('INSERT INTO conversation VALUES (?, ?, ?)',
+                   ((i, encode(m), encode(r)) for i, m, r in rows))
+    db.commit()
+    db.execute('VACUUM')
+    db.close()
+    return os.path.getsize(path)
+
+
+def read_all(path, decode):
+    db = sqlite3.connect(path)
+    start = time.perf_counter()
+    total = 0
+    for message, response in db.execute('SELECT message, response FROM conversation'):
+        total += len(decode(message)) + len(decode(response))
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed, total
+
+
+def point_reads(path, decode, ids):
+    db = sqlite3.connect(path)
+    start = time.perf_counter()
+    for pk in ids:
+        decode(db.execute('SELECT response FROM conversation WHERE id = ?', (pk,)).fetchone()[0])
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed / len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--answer-kb', type=float, default=4.0, help='Mean answer size')
+    parser.add_argument('--point-reads', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    from main.fields import decode_text, encode_text
+
+    rows = list(corpus(args.rows, args.answer_kb, random.Random(7)))
+    raw_bytes = sum(len(m.encode()) + len(r.encode()) for _, m, r in rows)
+    rng = random.Random(8)
+    ids = [rng.randrange(args.rows) for _ in range(args.point_reads)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        for label, column_type, encode, decode in [
+            ('text', 'TEXT', lambda s: s, lambda s: s),
+            ('compressed', 'BLOB', encode_text, decode_text),
+        ]:
+            path = os.path.join(tmp, f'{label}.sqlite3')
+            size = build(path, column_type, rows, encode)
+            scan_s, _ = read_all(path, decode)
+            point_s = point_reads(path, decode, ids)
+            results.append((label, size, scan_s, point_s))
+
+    print(f'{args.rows} turns, {raw_bytes / 2**20:.1f} MiB of text')
+    print(f'{"storage":<11} {"file MiB":>9} {"scan s":>8} {"scan MiB/s":>11} {"point read us":>14}')
+    for label, size, scan_s, point_s in results:
+        print(f'{label:<11} {size / 2**20:>9.1f} {scan_s:>8.2f} {raw_bytes / 2**20 / scan_s:>11.0f} '
+              f'{point_s * 1e6:>14.1f}')
+    print(f'size ratio: {results[1][1] / results[0][1]:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Dashboard loads composed per request versus served from cached snapshots.
+
+Stores --bars daily bars for --symbols symbols and --fills paper fills for
+each of --users users (spread over --per-user symbols) in a scratch
+database, then times /api/dashboard/ loads for a sample of users:
+
+1. composing the dashboard on every load (positions query, marking, indicators,
+   covariance and VaR, JSON encoding), what the dashboard would cost without
+   snapshots,
+2. cold loads through the view, which compose and cache the snapshot,
+3. cached loads (200) and revalidations with If-None-Match (304),
+
+with the queries each makes (the view is called directly, so session and
+auth queries are left out). Then it times keeping snapshots current:
+patching a 500-fill batch into cached positions, and appending a bar to a
+symbol that cached dashboards hold.
+
+    python -m benchmarks.bench_dashboard --users 1000 --symbols 50 --per-user 8
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+from benchmarks import scratch_database, setup_django
+
+
+def timed(function, count):
+    """Seconds per call"""
+    start = time.perf_counter()
+    for i in range(count):
+        function(i)
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--per-user', type=int, default=8, help='Symbols each user trades')
+    parser.add_argument('--fills', type=int, default=40, help='Fills per user')
+    parser.add_argument('--bars', type=int, default=2520)
+    parser.add_argument('--sample', type=int, default=200, help='Users whose loads are timed')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from django.utils import timezone
+    from main import dashboard, marketdata, trading, views
+    from main.models import PaperFill
+
+    rng = random.Random(5)
+    symbols = [f'S{i:03d}' for i in range(args.symbols)]
+    with tempfile.TemporaryDirectory() as root, scratch_database(), \
+            override_settings(MARKET_DATA_DIR=root, METRICS_DIR=None):
+        store = marketdata.get_store()
+        for seed, symbol in enumerate(symbols):
+            bars = marketdata.synthetic_bars(args.bars, step=86400, seed=seed)
+            store.append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+        User.objects.bulk_create([User(username=f'user{i}', email=f'user{i}@example.com', password='!')
+                                  for i in range(args.users)])
+        users = list(User.objects.order_by('pk'))
+        now = timezone.now()
+        PaperFill.objects.bulk_create([
+            PaperFill(symbol=symbol, price=round(rng.uniform(50, 150), 2), quantity=rng.randint(1, 100),
+                      buy_order_id=1, sell_order_id=2, buyer=user, aggressor='buy', executed_at=now)
+            for user in users for symbol in rng.sample(symbols, args.per_user)
+            for _ in range(args.fills // args.per_user)
+        ], batch_size=5000)
+        print(f'{len(users):,} users, {PaperFill.objects.count():,} fills over {len(symbols)} symbols '
+              f'x {args.bars:,} bars')
+
+        factory = RequestFactory()
+        sample = users[:args.sample]
+
+        def get(user, etag=None):
+            request = factory.get('/api/dashboard/', **({'HTTP_IF_NONE_MATCH': etag} if etag else {}))
+            request.user = user
+            return views.dashboard_snapshot(request)
+
+        def per_load(name, function, expect):
+            with CaptureQueriesContext(connection) as captured:
+                seconds = timed(function, len(sample))
+            print(f'{name:<22} {seconds * 1e3:8.3f} ms/load  {1 / seconds:10,.0f} loads/s  '
+                  f'{len(captured) / len(sample):.0f} queries  ({expect})')
+
+        def compose_every_time(i):
+            state = dashboard.load_positions(sample[i].pk)
+            json.dumps(dashboard.compose(state)[0], separators=(',', ':'))
+
+        per_load('compose every load', compose_every_time, 'no snapshot')
+        cache.clear()
+        per_load('cold snapshot', lambda i: get(sample[i]), 'compose and cache')
+        responses = [get(user) for user in sample]
+        assert all(response.status_code == 200 for response in responses)
+        per_load('cached snapshot', lambda i: get(sample[i]), '200')
+        etags = [response['ETag'] for response in responses]
+        per_load('revalidated snapshot', lambda i: get(sample[i], etags[i]), '304')
+        assert get(sample[0], etags[0]).status_code == 304
+
+        body = sum(len(response.content) for response in responses) / len(responses)
+        stored = sum(len(cache.get(dashboard._snapshot_key(user.pk))[1]) for user in sample) / len(sample)
+        print(f'{"snapshot size":<22} {body:8,.0f} B JSON, {stored:,.0f} B cached')
+
+        batch = PaperFill.objects.bulk_create([
+            PaperFill(symbol=rng.choice(symbols), price=100, quantity=1, buy_order_id=1, sell_order_id=2,
+                      buyer=rng.choice(sample), seller=rng.choice(sample), aggressor='buy', executed_at=now)
+            for _ in range(500)
+        ])
+        start = time.perf_counter()
+        trading.fills_stored.send(sender=PaperFill, fills=batch)
+        print(f'{"500-fill batch":<22} {(time.perf_counter() - start) * 1e3:8.3f} ms to patch positions and '
+              f'drop snapshots')
+        quantities = [{symbol: position[0] for symbol, position in state['positions'].items()}
+                      for state in (dashboard.positions(sample[0].pk), dashboard.load_positions(sample[0].pk))]
+        assert quantities[0] == quantities[1]
+
+        for user in sample:
+            get(user)
+        symbol = next(iter(dashboard.positions(sample[0].pk)['positions']))
+        holders = len(cache.get(dashboard._holders_key(symbol)))
+        last = store.info(symbol)['last_ts']
+        start = time.perf_counter()
+        store.append(symbol, [last + 86400], [100.0], [100.0], [100.0], [100.0], [1.0])
+        print(f'{"bar appended":<22} {(time.perf_counter() - start) * 1e3:8.3f} ms including dropping '
+              f'{holders} holders\' snapshots')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Keystroke-rate benchmark for the email availability check.
+
+Replays signup forms being typed one character at a time, issuing a check
+for every prefix that passes format validation (as the signup page does),
+and compares a plain ``exists()`` query per keystroke against the Bloom
+filter front in ``main.bloom``.
+
+    python -m benchmarks.bench_email_bloom --users 50000 --sessions 2000
+"""
+import argparse
+import random
+import time
+
+from benchmarks import scratch_database, setup_django
+
+
+def keystroke_stream(sessions, registered, rng):
+    from main.views import validate_email
+
+    stream = []
+    for _ in range(sessions):
+        if rng.random() < 0.05:
+            email = rng.choice(registered)  # Occasional returning user
+        else:
+            email = f'{rng.choice(["alex", "sam", "jo", "kim"])}.{rng.randrange(10**6)}@example.com'
+        for end in range(1, len(email) + 1):
+            prefix = email[:end]
+            if validate_email(prefix)[0]:
+                stream.append(prefix)
+    return stream
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--sessions', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from main.bloom import registered_emails
+
+    with scratch_database():
+        User.objects.bulk_create([
+            User(username=f'u{i}', email=f'user{i}@example.com', password='!')
+            for i in range(args.users)
+        ], batch_size=2000)
+        registered = [f'user{i}@example.com' for i in range(args.users)]
+        stream = keystroke_stream(args.sessions, registered, random.Random(42))
+
+        start = time.perf_counter()
+        registered_emails.reset()
+        registered_emails.might_contain('warmup@example.com')
+        build_s = time.perf_counter() - start
+
+        results = {}
+        for label, check in [
+            ('exists() query', lambda e: User.objects.filter(email=e).exists()),
+            ('bloom front', registered_emails.is_registered),
+        ]:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                answers = [check(email) for email in stream]
+                elapsed = time.perf_counter() - start
+            results[label] = answers
+            print(f'{label:<16} {len(stream)} checks  {elapsed / len(stream) * 1e6:8.1f} us/check  '
+                  f'{len(captured.captured_queries)} queries')
+            reset_queries()
+
+        assert results['exists() query'] == results['bloom front'], 'Bloom front changed an answer'
+        print(f'filter build: {build_s * 1000:.1f} ms for {args.users} users, '
+              f'{len(registered_emails._filter.bits)} bytes')
+
+
+if __name__ == '__main__':
+    main()
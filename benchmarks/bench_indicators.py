@@ -0,0 +1,65 @@
+"""
+Full versus incremental indicator computation.
+
+Builds a panel of random-walk closes (symbols x bars), computes every
+indicator over the whole panel, then appends new bars one at a time and
+compares recomputing the full history for each bar with advancing an
+``IndicatorState`` for all symbols at once. Also checks that both modes
+end on the same values.
+
+    python -m benchmarks.bench_indicators --symbols 2000 --bars 2520 --new-bars 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--symbols', type=int, default=2000)
+    parser.add_argument('--bars', type=int, default=2520, help='History per symbol (2520 = 10 years of daily bars)')
+    parser.add_argument('--new-bars', type=int, default=50)
+    parser.add_argument('--full-runs', type=int, default=3, help='New bars timed with full recomputation')
+    args = parser.parse_args()
+
+    setup_django()
+    from main.indicators import DEFAULTS, NAMES, IndicatorState, compute
+
+    rng = np.random.default_rng(4)
+    total = args.bars + args.new_bars
+    panel = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (args.symbols, total)), axis=1))
+    cells = args.symbols * args.bars
+    print(f'{args.symbols} symbols x {args.bars} bars = {cells / 1e6:.1f}M closes')
+
+    start = time.perf_counter()
+    compute(panel[:, :args.bars], **DEFAULTS)
+    full_s = time.perf_counter() - start
+    print(f'full history, vectorized      {full_s * 1000:9.1f} ms  ({cells / full_s / 1e6:.0f}M closes/s)')
+
+    start = time.perf_counter()
+    for t in range(args.bars, args.bars + args.full_runs):
+        compute(panel[:, :t + 1], **DEFAULTS)
+    recompute_s = (time.perf_counter() - start) / args.full_runs
+    print(f'new bar, full recompute       {recompute_s * 1000:9.1f} ms per bar')
+
+    start = time.perf_counter()
+    state = IndicatorState.from_history(panel[:, :args.bars], **DEFAULTS)
+    print(f'state from history            {(time.perf_counter() - start) * 1000:9.1f} ms')
+
+    start = time.perf_counter()
+    for t in range(args.bars, total):
+        values = state.update(panel[:, t])
+    update_s = (time.perf_counter() - start) / args.new_bars
+    print(f'new bar, incremental          {update_s * 1000:9.3f} ms per bar  '
+          f'({update_s / args.symbols * 1e6:.2f} us per symbol, {recompute_s / update_s:.0f}x faster)')
+
+    full = compute(panel, **DEFAULTS)
+    worst = max(float(np.nanmax(np.abs(values[name] - full[name][:, -1]))) for name in NAMES)
+    print(f'max difference incremental vs full: {worst:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Latency and payload size of /api/market/<symbol>/.
+
+Writes ten years of synthetic minute bars (about 5.3 million rows) to a
+scratch MARKET_DATA_DIR, then requests the whole range, one month and one
+day, downsampled to a fixed number of points in every mode, and reports
+median and p95 milliseconds per request and the JSON payload size.
+
+    python -m benchmarks.bench_marketdata --years 10 --points 500 --requests 50
+"""
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+DAY = 86400
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, default=10.0)
+    parser.add_argument('--points', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per range and mode')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client, override_settings
+    from main import marketdata
+
+    root = tempfile.mkdtemp()
+    try:
+        with override_settings(MARKET_DATA_DIR=root, ALLOWED_HOSTS=['testserver'], METRICS_DIR=None):
+            bars = marketdata.synthetic_bars(int(args.years * 365 * DAY / 60))
+            start = time.perf_counter()
+            marketdata.get_store().append('DRV', bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+            print(f'ingested {len(bars["ts"]):,} bars in {time.perf_counter() - start:.2f}s')
+
+            last = int(bars['ts'][-1])
+            ranges = [('all', {}), ('30 days', {'start': last - 30 * DAY}), ('1 day', {'start': last - DAY})]
+            client = Client()
+            print(f'{"range":<8} {"mode":<7} {"rows":>10} {"points":>7} {"p50 ms":>8} {"p95 ms":>8} {"KiB":>7}')
+            for label, params in ranges:
+                for mode in marketdata.DOWNSAMPLE_MODES:
+                    query = {**params, 'points': args.points, 'mode': mode}
+                    timings = []
+                    for _ in range(args.requests):
+                        started = time.perf_counter()
+                        response = client.get('/api/market/DRV/', query)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    body = response.json()
+                    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                    print(f'{label:<8} {mode:<7} {body["rows"]:>10,} {body["points"]:>7} '
+                          f'{statistics.median(timings):>8.1f} {p95:>8.1f} {len(response.content) / 1024:>7.1f}')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
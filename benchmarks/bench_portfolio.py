@@ -0,0 +1,70 @@
+"""
+Portfolio optimization on a large universe, cold and cached.
+
+Writes daily bars for a universe of symbols to a scratch MARKET_DATA_DIR,
+then posts /api/portfolio/optimize/ for each method: the first request reads
+the closes and estimates the shrunk covariance, the repeats reuse the cached
+estimate and only solve the allocation.
+
+    python -m benchmarks.bench_portfolio --assets 1000 --bars 504 --window 252 --requests 5
+"""
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+DAY = 86400
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--assets', type=int, default=1000)
+    parser.add_argument('--bars', type=int, default=504, help='Daily bars stored per symbol')
+    parser.add_argument('--window', type=int, default=252)
+    parser.add_argument('--requests', type=int, default=5, help='Cached requests per method')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client, override_settings
+    from main import marketdata, portfolio
+
+    root = tempfile.mkdtemp()
+    try:
+        with override_settings(MARKET_DATA_DIR=root, ALLOWED_HOSTS=['testserver'], METRICS_DIR=None):
+            store = marketdata.get_store()
+            symbols = [f'S{i:04d}' for i in range(args.assets)]
+            for seed, symbol in enumerate(symbols):
+                bars = marketdata.synthetic_bars(args.bars, step=DAY, seed=seed)
+                store.append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+            print(f'{args.assets} symbols x {args.bars} daily bars, window {args.window}')
+
+            client = Client()
+            requests = [
+                ('min_variance', {'max_weight': 0.01}),
+                ('mean_variance', {'max_weight': 0.05, 'risk_aversion': 5}),
+                ('risk_parity', {}),
+            ]
+            print(f'{"method":<14} {"cold ms":>8} {"cached ms":>10} {"iterations":>10} {"holdings":>9}')
+            for method, extra in requests:
+                data = json.dumps({'symbols': symbols, 'window': args.window, 'method': method, **extra})
+                portfolio._estimates.clear()
+                timings = []
+                for _ in range(args.requests + 1):
+                    started = time.perf_counter()
+                    response = client.post('/api/portfolio/optimize/', data, content_type='application/json')
+                    timings.append((time.perf_counter() - started) * 1000)
+                body = response.json()
+                assert body['status'] == 'success', body
+                holdings = sum(weight > 1e-6 for weight in body['weights'].values())
+                print(f'{method:<14} {timings[0]:>8.1f} {statistics.median(timings[1:]):>10.1f} '
+                      f'{body["iterations"]:>10} {holdings:>9}')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Options pricing throughput.
+
+Prices a batch of random contracts with Black-Scholes plus Greeks, solves
+implied volatility back from those prices, prices American options on
+binomial and trinomial trees, and posts the batch to
+/api/pricing/options/ to include JSON parsing and serialization.
+
+    python -m benchmarks.bench_pricing --contracts 100000 --tree-contracts 2000 --steps 200
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+
+
+def report(label, count, seconds):
+    print(f'{label:<30} {seconds * 1000:9.1f} ms  ({count / seconds:12,.0f} contracts/s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--contracts', type=int, default=100_000)
+    parser.add_argument('--tree-contracts', type=int, default=2000)
+    parser.add_argument('--steps', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client, override_settings
+    from main import pricing
+
+    rng = np.random.default_rng(5)
+    n = args.contracts
+    spot, strike = rng.uniform(50, 150, n), rng.uniform(50, 150, n)
+    expiry, sigma, call = rng.uniform(0.02, 3, n), rng.uniform(0.05, 1.5, n), rng.random(n) < 0.5
+
+    start = time.perf_counter()
+    price, _ = pricing.black_scholes(spot, strike, expiry, 0.03, sigma, call, 0.01, greeks=True)
+    report('black-scholes + greeks', n, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    solved = pricing.implied_volatility(price, spot, strike, expiry, 0.03, call, 0.01)
+    report('implied volatility', n, time.perf_counter() - start)
+    print(f'{"":<30} {np.isnan(solved).mean():.2%} without time value above rounding')
+
+    m = min(args.tree_contracts, n)
+    for method in ('binomial', 'trinomial'):
+        start = time.perf_counter()
+        pricing.tree_price(spot[:m], strike[:m], expiry[:m], 0.03, sigma[:m], call[:m], 0.01,
+                           steps=args.steps, method=method)
+        report(f'american {method}, {args.steps} steps', m, time.perf_counter() - start)
+
+    body = json.dumps({'spot': spot.tolist(), 'strike': strike.tolist(), 'expiry': expiry.tolist(),
+                       'rate': 0.03, 'dividend': 0.01, 'volatility': sigma.tolist(),
+                       'type': np.where(call, 'call', 'put').tolist()})
+    with override_settings(ALLOWED_HOSTS=['testserver'], METRICS_DIR=None, PRICING_MAX_CONTRACTS=n,
+                           DATA_UPLOAD_MAX_MEMORY_SIZE=max(len(body), 2621440)):
+        start = time.perf_counter()
+        response = Client().post('/api/pricing/options/', body, content_type='application/json')
+        seconds = time.perf_counter() - start
+    assert response.status_code == 200, response.content[:200]
+    report('POST /api/pricing/options/', n, seconds)
+    print(f'{"":<30} request {len(body) / 2**20:.1f} MiB, response {len(response.content) / 2**20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
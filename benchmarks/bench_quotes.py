@@ -0,0 +1,171 @@
+"""
+Live quote fan-out to many concurrent subscribers in one process.
+
+Opens --subscribers connections against derivity_backend.asgi.application
+(half server-sent events through Django, half WebSocket). Each connection
+subscribes to --per-client random symbols out of --symbols. A --slow
+fraction of clients take --slow-delay seconds per write, like sockets that
+drain slowly. The synthetic feed then ticks every subscribed symbol each
+--interval seconds for --seconds, and the benchmark reports:
+
+- quotes published and deliveries per second
+- how many quotes slow clients had coalesced away
+- publish-to-client latency percentiles for fast and slow clients
+- CPU used per second of wall time, and peak memory
+
+    python -m benchmarks.bench_quotes --subscribers 10000 --symbols 200 --per-client 5 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import time
+
+from benchmarks import setup_django
+
+
+class Client:
+    def __init__(self, symbols, slow_delay, record):
+        self.query = f'symbols={",".join(symbols)}'.encode()
+        self.slow_delay = slow_delay
+        self.record = record
+        self.received = 0
+        self.latencies = []
+        self.gone = asyncio.Event()
+
+    def arrived(self, count, parse):
+        # Only sampled clients decode, so client-side parsing stays out of the server's CPU figure
+        self.received += count
+        if self.record:
+            now = time.time()
+            self.latencies += [now - quote['ts'] for quote in parse()]
+
+    async def sse(self, application):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': '/api/quotes/stream/', 'raw_path': b'/api/quotes/stream/',
+            'query_string': self.query, 'root_path': '', 'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+        }
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await self.gone.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and message['body'].startswith(b'event:'):
+                if self.slow_delay:
+                    await asyncio.sleep(self.slow_delay)
+                body = message['body']
+                self.arrived(body.count(b'event: quote'), lambda: [
+                    json.loads(line[6:]) for line in body.split(b'\n') if line.startswith(b'data: ')
+                ])
+
+        await application(scope, receive, send)
+
+    async def websocket(self, application):
+        scope = {'type': 'websocket', 'path': '/ws/quotes/', 'query_string': self.query}
+        messages = [{'type': 'websocket.connect'}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await self.gone.wait()
+            return {'type': 'websocket.disconnect', 'code': 1000}
+
+        async def send(message):
+            if message['type'] == 'websocket.send':
+                if self.slow_delay:
+                    await asyncio.sleep(self.slow_delay)
+                text = message['text']
+                self.arrived(text.count('"symbol"'), lambda: json.loads(text))
+
+        await application(scope, receive, send)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+
+
+def client_coalesced(hub):
+    seen = set()
+    for channel in hub.channels.values():
+        for subscriber in channel:
+            if id(subscriber) not in seen:
+                seen.add(id(subscriber))
+                yield subscriber.coalesced
+
+
+async def run(args):
+    from derivity_backend.asgi import application
+    from main import quotes
+
+    rng = random.Random(3)
+    universe = [f'Q{i:04d}' for i in range(args.symbols)]
+    clients = [Client(rng.sample(universe, args.per_client), args.slow_delay if rng.random() < args.slow else 0,
+                      record=i % 100 == 0) for i in range(args.subscribers)]
+
+    start = time.perf_counter()
+    transports = {'sse': [Client.sse], 'websocket': [Client.websocket], 'both': [Client.websocket, Client.sse]}
+    transports = transports[args.transport]
+    tasks = [asyncio.create_task(transports[i % len(transports)](client, application))
+             for i, client in enumerate(clients)]
+    hub = None
+    while hub is None or sum(map(len, hub.channels.values())) < args.subscribers * args.per_client:
+        await asyncio.sleep(0.05)
+        hub = quotes._hub
+    print(f'{args.subscribers:,} subscribers connected in {time.perf_counter() - start:.2f} s '
+          f'({len(hub.channels)} symbols ticking every {args.interval} s)')
+
+    await asyncio.sleep(args.interval * 2)  # Past the initial latest-quote burst
+    for client in clients:
+        client.received, client.latencies = 0, []
+    published, coalesced = hub.published, sum(client_coalesced(hub))
+    wall, cpu = time.perf_counter(), time.process_time()
+    await asyncio.sleep(args.seconds)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    published, coalesced = hub.published - published, sum(client_coalesced(hub)) - coalesced
+
+    delivered = sum(client.received for client in clients)
+    fast = [latency for client in clients if not client.slow_delay for latency in client.latencies]
+    slow = [latency for client in clients if client.slow_delay for latency in client.latencies]
+    print(f'published {published / wall:10,.0f} quotes/s')
+    print(f'delivered {delivered / wall:10,.0f} quotes/s  ({coalesced:,} coalesced for slow clients)')
+    print(f'latency   fast p50 {percentile(fast, 0.5) * 1e3:6.1f} ms  p99 {percentile(fast, 0.99) * 1e3:6.1f} ms  '
+          f'slow p50 {percentile(slow, 0.5) * 1e3:6.1f} ms  p99 {percentile(slow, 0.99) * 1e3:6.1f} ms')
+    print(f'cpu       {cpu / wall:10.0%} of one core  peak RSS '
+          f'{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MB')
+
+    for client in clients:
+        client.gone.set()
+    await asyncio.gather(*tasks)
+    await asyncio.sleep(0)
+    print(f'after disconnect: {len(hub.channels)} channels left')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--subscribers', type=int, default=10_000)
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--per-client', type=int, default=5, help='Symbols each subscriber follows')
+    parser.add_argument('--interval', type=float, default=0.25, help='Seconds between ticks of each symbol')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--transport', choices=['sse', 'websocket', 'both'], default='both')
+    parser.add_argument('--slow', type=float, default=0.1, help='Fraction of slow clients')
+    parser.add_argument('--slow-delay', type=float, default=3.0, help='Seconds each write takes a slow client')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+
+    with override_settings(METRICS_DIR=None, QUOTES_TICK_INTERVAL=args.interval):
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Query latency of the ai_chat retrieval index.
+
+Builds the index from the real page templates, then again from a corpus
+scaled up by repeating those passages with varied vocabulary, and reports
+build time and per-question search time for each.
+
+    python -m benchmarks.bench_retrieval --scale 200 --queries 2000
+"""
+import argparse
+import random
+import time
+
+from benchmarks import setup_django
+
+QUESTIONS = [
+    'How much does the pro plan cost?', 'Is my data secure?', 'Who founded Derivity?',
+    'Do you integrate with Slack or Office?', 'When will enterprise be available?',
+    'What can the AI automate for my team?', 'Can I cancel anytime?',
+]
+
+
+def measure(index, queries):
+    start = time.perf_counter()
+    for question in queries:
+        index.search(question)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', type=int, default=200, help='Copies of the site corpus in the large index')
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from main.retrieval import IndexStore, RetrievalIndex, build_matrix
+
+    rng = random.Random(3)
+    queries = [rng.choice(QUESTIONS) for _ in range(args.queries)]
+
+    store = IndexStore(None)
+    start = time.perf_counter()
+    store.build(force=True)
+    site = store.index
+    print(f'site index   {len(site.passages):>7} passages {len(site.term_ids):>7} terms  '
+          f'build {(time.perf_counter() - start) * 1000:7.1f} ms  search {measure(site, queries) * 1e6:8.1f} us')
+
+    passages = []
+    for copy in range(args.scale):
+        for passage in site.passages:
+            passages.append(dict(passage, text=f"{passage['text']} variant{copy} topic{copy % 97}"))
+    start = time.perf_counter()
+    vocabulary, idf, matrix = build_matrix(passages)
+    large = RetrievalIndex(vocabulary, idf, matrix, passages)
+    print(f'scaled index {len(passages):>7} passages {len(vocabulary):>7} terms  '
+          f'build {(time.perf_counter() - start) * 1000:7.1f} ms  search {measure(large, queries) * 1e6:8.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Monte Carlo VaR throughput, in the calling process and in the process pool.
+
+Builds a random covariance for the portfolio, then simulates the same
+seeded paths with workers=0 (one thread) and with the process pool at each
+requested size, reporting paths per second and checking that every run
+produced identical paths.
+
+    python -m benchmarks.bench_risk --assets 20 --horizon 10 --paths 1000000 --workers 1 2 4
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--assets', type=int, default=20)
+    parser.add_argument('--horizon', type=int, default=10, help='Bars per path')
+    parser.add_argument('--paths', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    setup_django()
+    from main import risk
+    from main.portfolio import ledoit_wolf
+
+    rng = np.random.default_rng(6)
+    returns = np.outer(rng.normal(0, 0.01, 252), rng.normal(1, 0.3, args.assets)) + \
+        rng.normal(0, 0.015, (252, args.assets))
+    covariance, _ = ledoit_wolf(returns)
+    chol = np.linalg.cholesky(covariance)
+    mean = returns.mean(axis=0)
+    positions = rng.uniform(1000, 5000, args.assets)
+    draws = args.paths * args.horizon * args.assets
+    print(f'{args.paths:,} paths x {args.horizon} bars x {args.assets} assets = {draws / 1e6:,.0f}M normals')
+
+    start = time.perf_counter()
+    reference = risk.simulate(mean, chol, positions, args.horizon, args.paths, seed=1)
+    elapsed = time.perf_counter() - start
+    print(f'{"inline":<10} {elapsed:8.2f} s  {args.paths / elapsed:12,.0f} paths/s')
+
+    for workers in args.workers:
+        risk._pool = None
+        risk.get_pool(workers).submit(int).result()  # Start the workers outside the timing
+        start = time.perf_counter()
+        pnl, drawdown = risk.simulate(mean, chol, positions, args.horizon, args.paths, seed=1, workers=workers)
+        elapsed = time.perf_counter() - start
+        same = np.array_equal(pnl, reference[0]) and np.array_equal(drawdown, reference[1])
+        print(f'{f"{workers} workers":<10} {elapsed:8.2f} s  {args.paths / elapsed:12,.0f} paths/s  '
+              f'{"identical" if same else "DIFFERENT"}')
+        risk._pool.shutdown()
+
+    summary = risk.summarize(*reference, [0.95, 0.99])
+    print(f'VaR 99% {summary["var"]["0.99"]:,.0f}  CVaR 99% {summary["cvar"]["0.99"]:,.0f}  '
+          f'median max drawdown {summary["drawdown"]["quantiles"]["0.5"]:,.0f}')
+
+
+if __name__ == '__main__':
+    main()
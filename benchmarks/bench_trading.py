@@ -0,0 +1,116 @@
+"""
+Paper-trading matching throughput and latency, and batched fill storage.
+
+Generates a synthetic order flow (limit orders around a drifting mid, some
+market orders and cancels) over a few symbols, then:
+
+1. matches it on bare ``OrderBook`` objects (orders/s),
+2. sends it through the matching engine the way views do, one blocking call
+   per order (orders/s, p50/p99 latency), and times how long the queued
+   fills take to reach a scratch database,
+3. stores a sample of the same fills one INSERT each for comparison.
+
+    python -m benchmarks.bench_trading --orders 100000 --symbols 4
+"""
+import argparse
+import random
+import time
+
+from benchmarks import scratch_database, setup_django
+
+
+def order_flow(count, symbols, seed=1):
+    """[(symbol, command, args)]; cancels name the sequence number of the order they cancel"""
+    rng = random.Random(seed)
+    mids = {symbol: 10_000 for symbol in symbols}
+    resting = {symbol: [] for symbol in symbols}
+    flow = []
+    for sequence in range(count):
+        symbol = rng.choice(symbols)
+        mids[symbol] += rng.choice((-1, 0, 1))
+        if resting[symbol] and rng.random() < 0.25:
+            victim = resting[symbol].pop(rng.randrange(len(resting[symbol])))
+            flow.append((symbol, 'cancel', victim))
+            continue
+        side = rng.choice(('buy', 'sell'))
+        if rng.random() < 0.05:
+            price = None
+        else:
+            offset = int(rng.expovariate(0.2)) - 2  # Mostly passive, some crossing
+            price = mids[symbol] - offset if side == 'buy' else mids[symbol] + offset
+            resting[symbol].append(sequence)
+        flow.append((symbol, 'place', (1 + sequence % 2, side, price, rng.randint(1, 100), sequence)))
+    return flow
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--symbols', type=int, default=4)
+    parser.add_argument('--single-inserts', type=int, default=2000, help='Fills stored one INSERT each')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from main.models import PaperFill
+    from main.orderbook import Order, OrderBook
+    from main.trading import MatchingEngine
+
+    symbols = [f'SYM{i}' for i in range(args.symbols)]
+    flow = order_flow(args.orders, symbols)
+    places = sum(command == 'place' for _, command, _ in flow)
+    print(f'{len(flow):,} commands: {places:,} orders, {len(flow) - places:,} cancels over {len(symbols)} symbols')
+
+    books = {symbol: OrderBook(symbol) for symbol in symbols}
+    fills = 0
+    start = time.perf_counter()
+    for symbol, command, payload in flow:
+        if command == 'place':
+            user_id, side, price, quantity, sequence = payload
+            fills += len(books[symbol].submit(Order(sequence, user_id, side, price, quantity)))
+        else:
+            books[symbol].cancel(payload)
+    elapsed = time.perf_counter() - start
+    print(f'{"order book":<12} {len(flow) / elapsed:12,.0f} commands/s  {fills:,} fills')
+
+    with scratch_database():
+        users = [User.objects.create_user(f'trader{i}', f'trader{i}@example.com', '!') for i in (1, 2)]
+        engine = MatchingEngine()
+        order_ids, latencies = {}, []
+        start = time.perf_counter()
+        for symbol, command, payload in flow:
+            began = time.perf_counter()
+            if command == 'place':
+                user_id, side, price, quantity, sequence = payload
+                order, _ = engine.place(users[user_id - 1].pk, symbol, side, price, quantity)
+                order_ids[sequence] = order['id']
+            else:
+                user_id = 1 + payload % 2
+                engine.cancel(users[user_id - 1].pk, symbol, order_ids[payload])
+            latencies.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+        engine.flush(timeout=600)
+        stored_in = time.perf_counter() - start
+        latencies.sort()
+        stored = PaperFill.objects.count()
+        print(f'{"engine":<12} {len(flow) / elapsed:12,.0f} commands/s  p50 {percentile(latencies, 0.5) * 1e6:,.0f} us  '
+              f'p99 {percentile(latencies, 0.99) * 1e6:,.0f} us')
+        print(f'{"batched":<12} {stored:,} fills stored {(stored_in - elapsed) * 1e3:,.0f} ms after the last order '
+              f'({"matches" if stored == fills else "DIFFERS from"} the bare books)')
+
+        sample = list(PaperFill.objects.values()[:args.single_inserts])
+        for row in sample:
+            del row['id']
+        start = time.perf_counter()
+        for row in sample:
+            PaperFill.objects.create(**row)
+        elapsed = time.perf_counter() - start
+        print(f'{"one by one":<12} {len(sample) / elapsed:12,.0f} fills/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+Load-test harness for the Derivity API surface.
+
+Drives the JSON APIs and page routes over real HTTP from a pool of client
+threads or processes and reports latency percentiles, throughput and error
+rates. The target is either an in-process threaded WSGI server started on an
+ephemeral port or any server already listening (``--url``). Used by the
+``loadtest`` management command.
+"""
+import http.cookiejar
+import json
+import math
+import multiprocessing
+import socketserver
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+BENCH_EMAIL_DOMAIN = 'bench.derivity.test'
+BENCH_PASSWORD = 'BenchPassw0rd'
+
+PAGES = ['/', '/about/', '/features/', '/pricing/', '/contact/', '/login/', '/signup/']
+
+
+def bench_email(i):
+    return f'bench{i}@{BENCH_EMAIL_DOMAIN}'
+
+
+# Each scenario maps a request index to (method, path, payload). ``user_count``
+# is the number of seeded users so requests spread across accounts.
+
+def _login(i, user_count):
+    return 'POST', '/api/login/', {'username': bench_email(i % user_count), 'password': BENCH_PASSWORD}
+
+
+def _signup(i, user_count):
+    return 'POST', '/api/signup/', {
+        'fullName': 'Bench User',
+        'email': f'signup-{uuid.uuid4().hex[:12]}@{BENCH_EMAIL_DOMAIN}',
+        'password': BENCH_PASSWORD,
+    }
+
+
+def _auth_status(i, user_count):
+    return 'GET', '/api/auth-status/', None
+
+
+def _validate_email(i, user_count):
+    # Alternate between registered and unregistered addresses
+    email = bench_email(i % user_count) if i % 2 else f'free{i}@{BENCH_EMAIL_DOMAIN}'
+    return 'POST', '/api/validate-email/', {'email': email}
+
+
+def _contact(i, user_count):
+    return 'POST', '/api/contact/', {
+        'name': 'Bench Visitor',
+        'email': bench_email(i % user_count),
+        'message': 'Load test message asking about pricing tiers.',
+    }
+
+
+def _csrf_token(i, user_count):
+    return 'GET', '/api/csrf-token/', None
+
+
+def _pages(i, user_count):
+    return 'GET', PAGES[i % len(PAGES)], None
+
+
+SCENARIOS = {
+    'login': _login,
+    'signup': _signup,
+    'auth_status': _auth_status,
+    'validate_email': _validate_email,
+    'contact': _contact,
+    'csrf_token': _csrf_token,
+    'pages': _pages,
+}
+
+# Scenarios whose clients log in once before the measured loop
+AUTHENTICATED_SCENARIOS = {'auth_status'}
+
+
+class BenchClient:
+    """HTTP client with its own cookie jar, so each worker has its own session"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, payload=None):
+        """Return (latency_seconds, ok) for one request"""
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={'Content-Type': 'application/json'}
+        )
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                body = response.read()
+                ok = response.status < 400 and not _is_api_error(response, body)
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return time.perf_counter() - start, ok
+
+
+def _is_api_error(response, body):
+    # The views report failures as 200 responses with {"status": "error"}
+    if 'json' not in response.headers.get('Content-Type', ''):
+        return False
+    try:
+        return json.loads(body).get('status') == 'error'
+    except (ValueError, AttributeError):
+        return True
+
+
+def _worker(base_url, scenario, indices, user_count):
+    client = BenchClient(base_url)
+    if scenario in AUTHENTICATED_SCENARIOS:
+        client.request(*_login(indices[0] if indices else 0, user_count))
+
+    build = SCENARIOS[scenario]
+    samples = []
+    started = time.monotonic()
+    for i in indices:
+        samples.append(client.request(*build(i, user_count)))
+    return samples, started, time.monotonic()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, ok in samples)
+    errors = sum(1 for latency, ok in samples if not ok)
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'rps': round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 2) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run_scenario(base_url, scenario, requests, concurrency, mode='thread', user_count=1):
+    """Drive one scenario with ``concurrency`` clients and return its summary"""
+    shards = [list(range(w, requests, concurrency)) for w in range(concurrency)]
+    shards = [indices for indices in shards if indices]
+    args = [(base_url, scenario, indices, user_count) for indices in shards]
+
+    if mode == 'process':
+        with multiprocessing.Pool(len(args)) as pool:
+            results = pool.starmap(_worker, args)
+    else:
+        with ThreadPoolExecutor(len(args)) as executor:
+            results = list(executor.map(lambda a: _worker(*a), args))
+
+    samples = [sample for worker_samples, _, _ in results for sample in worker_samples]
+    elapsed = max(end for _, _, end in results) - min(start for _, start, _ in results)
+    return summarize(samples, elapsed)
+
+
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host='127.0.0.1', port=0):
+    """Serve the Django WSGI app from a background thread; returns (server, base_url)"""
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server(
+        host, port, get_wsgi_application(),
+        server_class=_ThreadingWSGIServer, handler_class=_QuietHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def seed_users(count):
+    """Create ``count`` benchmark users (idempotent) sharing one precomputed hash; ``cleanup`` removes them"""
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from main.models import UserProfile
+
+    emails = [bench_email(i) for i in range(count)]
+    existing = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+    password = make_password(BENCH_PASSWORD)
+    User.objects.bulk_create([
+        User(username=f'bench_{i}', email=email, password=password, first_name='Bench', last_name='User')
+        for i, email in enumerate(emails) if email not in existing
+    ], batch_size=500)
+
+    user_ids = User.objects.filter(email__in=emails).values_list('pk', flat=True)
+    with_profile = set(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=pk) for pk in user_ids if pk not in with_profile], batch_size=500
+    )
+    # Earlier runs may have left accounts locked
+    UserProfile.objects.filter(user_id__in=user_ids).update(failed_login_attempts=0, account_locked_until=None)
+
+
+def cleanup():
+    """Delete every row created by seeding or by the benchmark scenarios"""
+    from django.contrib.auth.models import User
+    from main.models import ContactMessage, LoginAttempt
+
+    suffix = f'@{BENCH_EMAIL_DOMAIN}'
+    LoginAttempt.objects.filter(email__endswith=suffix).delete()
+    ContactMessage.objects.filter(email__endswith=suffix).delete()
+    User.objects.filter(email__endswith=suffix).delete()
+
+
+def compare(results, baseline, tolerance=0.10):
+    """Compare results with a baseline; returns (report_lines, regressions)"""
+    lines = []
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            lines.append(f'{scenario}: no baseline')
+            continue
+        checks = [
+            ('p95_ms', current['p95_ms'] > previous['p95_ms'] * (1 + tolerance)),
+            ('rps', current['rps'] < previous['rps'] * (1 - tolerance)),
+            ('error_rate', current['error_rate'] > previous['error_rate'] + 0.01),
+        ]
+        for metric, regressed in checks:
+            before, after = previous[metric], current[metric]
+            change = f'{(after - before) / before:+.1%}' if before else 'n/a'
+            marker = 'REGRESSION' if regressed else 'ok'
+            lines.append(f'{scenario:<16} {metric:<10} {before:>10} -> {after:<10} {change:>8}  {marker}')
+            if regressed:
+                regressions.append(f'{scenario}.{metric}')
+    return lines, regressions
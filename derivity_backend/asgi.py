@@ -12,5 +12,19 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'derivity_backend.settings')
+# Serve the polled read-only endpoints with async views (see ASYNC_VIEWS)
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from main import quotes  # noqa: E402  (needs settings configured above)
+
+
+async def application(scope, receive, send):
+    # Live quote streams bypass Django's middleware stack (see main/quotes.py)
+    if scope['type'] == 'websocket':
+        await quotes.websocket_app(scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/api/quotes/stream/':
+        await quotes.sse_app(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
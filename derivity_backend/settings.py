@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.RequestMetricsMiddleware',
+    'main.middleware.IPPolicyMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -50,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'derivity_backend.urls'
@@ -83,6 +87,19 @@ DATABASES = {
 }
 
 
+# Cache
+# Holds lockout state and other cross-request data. Use a shared backend
+# (Redis or Memcached) when running more than one worker process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'derivity',
+        # Django's default of 300 entries is outgrown by dashboard snapshots (two entries per active user)
+        'OPTIONS': {'MAX_ENTRIES': 10_000},
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -143,6 +160,10 @@ CSRF_COOKIE_HTTPONLY = False  # Allow JavaScript access for frontend
 CSRF_COOKIE_SAMESITE = 'Lax'
 CSRF_TRUSTED_ORIGINS = ['http://127.0.0.1:8000', 'http://localhost:8000']
 
+# Password reset / email verification token lifetimes (seconds)
+PASSWORD_RESET_TOKEN_TTL = 60 * 60
+EMAIL_VERIFICATION_TOKEN_TTL = 7 * 24 * 60 * 60
+
 # Login URLs
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
@@ -220,3 +241,97 @@ CORS_ALLOW_NULL_ORIGIN = True
 CORS_PREFLIGHT_MAX_AGE = 86400
 CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
 X_FRAME_OPTIONS = 'DENY'
+
+# Request metrics (served at /metrics in Prometheus text format)
+METRICS_ENABLED = True
+METRICS_DIR = BASE_DIR / 'var' / 'metrics'  # Shared by all worker processes of one host
+METRICS_FLUSH_INTERVAL = 5  # Seconds between per-process flushes
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # Empty list allows any client
+
+# Sampling profiler (see `python manage.py profile_report`)
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.0  # Fraction of requests profiled, e.g. 0.001
+PROFILING_HEADER = 'X-Profile'  # Staff requests carrying this header are always profiled
+PROFILING_DIR = BASE_DIR / 'var' / 'profiles'
+PROFILING_MAX_FILES = 500
+
+# Email availability Bloom filter (main/bloom.py)
+EMAIL_BLOOM_ENABLED = True
+EMAIL_BLOOM_ERROR_RATE = 0.001
+EMAIL_BLOOM_REFRESH_SECONDS = 30  # Picks up users added by other workers or bulk imports
+EMAIL_BLOOM_SHARED_NAME = None  # e.g. 'derivity-email-bloom' to share one filter across workers
+
+# Network blocklist/allowlist for authentication endpoints (one CIDR per line)
+IP_BLOCKLIST_FILE = None  # e.g. BASE_DIR / 'var' / 'ip-blocklist.txt'
+IP_ALLOWLIST_FILE = None  # Allowlisted networks override the blocklist
+IP_POLICY_PATHS = ['/api/login/', '/api/signup/', '/api/profile/', '/api/password-reset/', '/admin/login/']
+IP_POLICY_RELOAD_SECONDS = 5
+# Reverse proxies (CIDRs) whose X-Forwarded-For entries are believed; with none, the client is REMOTE_ADDR
+TRUSTED_PROXIES = []
+
+# Route the read-only API endpoints to their native async views (main/urls.py).
+# derivity_backend/asgi.py enables this; WSGI servers keep the sync views.
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS') == '1'
+
+# /api/batch/ (main/batch.py)
+BATCH_MAX_REQUESTS = 20  # Sub-requests accepted per batch
+
+# Idempotency-Key replay for signup, contact and profile updates (main/idempotency.py)
+IDEMPOTENCY_TTL = 24 * 60 * 60  # Seconds a stored response is replayed
+IDEMPOTENCY_WAIT_SECONDS = 10  # How long a concurrent retry waits for the first request
+IDEMPOTENCY_LOCK_SECONDS = 60  # In-flight marker lifetime if a worker dies mid-request
+
+# ai_chat retrieval index over the marketing pages (main/retrieval.py)
+RETRIEVAL_TEMPLATES = ['index.html', 'features.html', 'pricing.html', 'about.html']
+RETRIEVAL_INDEX_DIR = BASE_DIR / 'var' / 'retrieval'  # None keeps the index in memory only
+RETRIEVAL_CHECK_SECONDS = 5  # How often template mtimes are checked for changes
+RETRIEVAL_MIN_SCORE = 0.15  # Cosine similarity below which the canned reply is used
+
+# OHLCV bar store behind /api/market/<symbol>/ (main/marketdata.py)
+MARKET_DATA_DIR = BASE_DIR / 'var' / 'market'  # One directory of column files per symbol
+MARKET_DATA_MAX_POINTS = 5000  # Upper bound for ?points=
+
+# /api/pricing/options/ (main/pricing.py)
+PRICING_MAX_CONTRACTS = 100_000  # Contracts per request
+PRICING_MAX_TREE_STEPS = 2000  # Time steps for American options
+PRICING_MAX_TREE_NODES = 2_000_000_000  # contracts x steps^2 per request, about a few seconds of CPU
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # Django's 2.5 MB default holds ~40k contracts of columnar JSON
+
+# /api/portfolio/optimize/ (main/portfolio.py)
+PORTFOLIO_MAX_ASSETS = 2000  # Symbols per request
+PORTFOLIO_MAX_WINDOW = 5000  # Returns per covariance estimate
+PORTFOLIO_CACHE_SIZE = 8  # Covariance estimates kept per process; 1,000 assets is 8 MB each
+
+# /api/risk/simulations/ Monte Carlo VaR jobs (main/risk.py)
+RISK_MAX_PATHS = 5_000_000
+RISK_MAX_HORIZON = 252  # Bars simulated per path
+RISK_MAX_DRAWS = 2_000_000_000  # paths x horizon x positions per job
+RISK_WORKERS = min(2, os.cpu_count() or 1)  # Simulation processes per web process; 0 simulates in the job thread
+RISK_MAX_RUNNING_JOBS = 2  # Job threads per web process; further jobs wait queued
+RISK_MAX_QUEUED_JOBS = 20  # Jobs waiting per web process before submissions get a 429
+RISK_MAX_ACTIVE_JOBS_PER_USER = 2  # Queued or running jobs per user
+RISK_STALE_SECONDS = 600  # Active jobs not refreshed for this long were lost with their process; > longest block
+
+# /api/backtest/ (main/backtest.py)
+BACKTEST_MAX_SYMBOLS = 1000
+BACKTEST_MAX_COMBINATIONS = 200  # Parameter combinations per sweep
+BACKTEST_MAX_CELLS = 500_000_000  # symbols x bars x combinations, about ten seconds on one core
+BACKTEST_MAX_PANEL_BYTES = 1024 ** 3  # Estimated closes, returns and indicator arrays of one panel, per sweep worker
+BACKTEST_WORKERS = 0  # Sweep processes; 0 runs the sweep in the request
+
+# /api/trading/ paper-trading matching engine (main/trading.py)
+TRADING_TICK = '0.01'  # Price increment; limit prices must be a multiple
+TRADING_MAX_QUANTITY = 1_000_000  # Shares per order
+TRADING_MAX_DEPTH = 100  # Upper bound for ?depth= on the book
+TRADING_FILL_BATCH = 500  # Fills per bulk insert
+TRADING_FLUSH_INTERVAL = 0.05  # Seconds a matched fill may wait before it is stored
+TRADING_SYMBOLS = None  # Symbols that take orders; None allows any symbol with stored market data
+
+# Live quotes over SSE (/api/quotes/stream/) and WebSocket (/ws/quotes/), ASGI only (main/quotes.py)
+QUOTES_TICK_INTERVAL = 0.25  # Seconds between synthetic ticks of each subscribed symbol
+QUOTES_MAX_SYMBOLS = 50  # Symbols per connection
+QUOTES_HEARTBEAT = 15  # Seconds of quiet before an SSE keepalive comment
+
+# /api/dashboard/ per-user snapshots (main/dashboard.py)
+DASHBOARD_SNAPSHOT_TIMEOUT = 300  # Seconds, for snapshots and cached positions; bounds staleness across processes not sharing the cache
+DASHBOARD_RISK_WINDOW = 252  # Returns behind the snapshot's parametric VaR
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ContactMessage, UserProfile, AIConversation, LoginAttempt
+from .models import ContactMessage, UserProfile, AIConversation, LoginAttempt, NewsletterCampaign, PaperFill, RiskJob
 
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
@@ -22,7 +22,7 @@ class UserProfileAdmin(admin.ModelAdmin):
 class AIConversationAdmin(admin.ModelAdmin):
     list_display = ('session_id', 'user', 'created_at', 'ip_address')
     list_filter = ('created_at',)
-    search_fields = ('session_id', 'message', 'response', 'user__email')
+    search_fields = ('session_id', 'user__email')  # message/response are stored compressed
     readonly_fields = ('created_at',)
 
 @admin.register(LoginAttempt)
@@ -37,3 +37,27 @@ class LoginAttemptAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         return False  # Prevent editing
+
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'sent_count', 'failed_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'body')
+    readonly_fields = ('status', 'last_user_id', 'sent_count', 'failed_count', 'created_at', 'started_at',
+                       'finished_at')
+
+@admin.register(RiskJob)
+class RiskJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('id', 'user', 'status', 'params', 'runner', 'progress', 'result', 'error', 'created_at',
+                       'started_at', 'heartbeat_at', 'finished_at')
+
+@admin.register(PaperFill)
+class PaperFillAdmin(admin.ModelAdmin):
+    list_display = ('symbol', 'price', 'quantity', 'buyer', 'seller', 'aggressor', 'executed_at')
+    list_filter = ('symbol', 'aggressor', 'executed_at')
+    search_fields = ('symbol', 'buyer__email', 'seller__email')
+    
+    def has_add_permission(self, request):
+        return False  # Written by the matching engine
@@ -0,0 +1,288 @@
+"""
+Vectorized backtests of simple strategies over stored bars.
+
+A backtest runs on a panel of closes (symbols x bars) aligned on the
+timestamps every symbol shares. A strategy turns the panel into target
+positions in {-1, 0, 1} per symbol and bar, using only closes up to that
+bar; the portfolio holds position / symbols of each (equal weight, gross
+exposure at most 1) from one close to the next. Per bar:
+
+    gross = sum(weight[t-1] * return[t])
+    cost = sum(|weight[t] - weight[t-1]|) * (commission_bps + slippage_bps) / 1e4
+    net = gross - cost
+
+Weights are rebalanced to target every bar (drift between closes is not
+traded). Signal to position to P&L is a handful of whole-panel array
+operations, with no loop per bar or per symbol.
+
+``sweep`` evaluates every combination of a parameter grid. Indicators are
+memoized per task, so a grid of fast x slow moving averages computes each
+window once. With workers > 0, combinations are split across a spawned
+process pool; the closes are placed in shared memory once instead of being
+pickled for every task.
+"""
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import indicators, marketdata
+
+# strategy: (parameter names, defaults)
+STRATEGIES = {
+    'sma_cross': (('fast', 'slow'), {'fast': 20, 'slow': 100}),
+    'momentum': (('lookback',), {'lookback': 120}),
+    'mean_reversion': (('window', 'entry'), {'window': 20, 'entry': 2.0}),
+}
+
+
+# Whole-panel float64 arrays alive while one combination is evaluated: closes,
+# returns, signal, position, weights and a temporary; memoized indicators come on top
+PANEL_ARRAYS = 6
+
+
+class BacktestError(ValueError):
+    pass
+
+
+class Panel:
+    """Closes of a universe with per-bar returns and memoized indicators"""
+
+    def __init__(self, closes):
+        self.closes = closes
+        self.returns = np.zeros(closes.shape)
+        np.divide(closes[:, 1:], closes[:, :-1], out=self.returns[:, 1:])
+        self.returns[:, 1:] -= 1.0
+        self._memo = {}
+
+    def _cached(self, key, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def sma(self, window):
+        return self._cached(('sma', window), lambda: indicators.sma(self.closes, window))
+
+    def zscore(self, window):
+        return self._cached(('zscore', window), lambda: indicators.zscore(self.closes, window))
+
+    def change(self, lookback):
+        def compute():
+            out = np.full(self.closes.shape, np.nan)
+            out[:, lookback:] = self.closes[:, lookback:] / self.closes[:, :-lookback] - 1
+            return out
+        return self._cached(('change', lookback), compute)
+
+
+def positions(panel, strategy, params, long_only=False):
+    """Target positions in {-1, 0, 1}; 0 while the strategy's indicators warm up"""
+    if strategy == 'sma_cross':
+        signal = panel.sma(params['fast']) - panel.sma(params['slow'])
+    elif strategy == 'momentum':
+        signal = panel.change(params['lookback'])
+    else:
+        z = panel.zscore(params['window'])
+        signal = np.where(np.abs(z) > params['entry'], -z, 0.0)
+    position = np.sign(np.nan_to_num(signal))
+    if long_only:
+        np.maximum(position, 0.0, out=position)
+    return position
+
+
+def evaluate(panel, position, commission_bps=1.0, slippage_bps=2.0, periods_per_year=252, equity=False):
+    """Performance metrics (and the equity curve when asked) of holding `position` through the panel"""
+    weights = position / position.shape[0]
+    gross = np.einsum('ij,ij->j', weights[:, :-1], panel.returns[:, 1:])
+    traded = np.abs(np.diff(weights, axis=1, prepend=0.0)).sum(axis=0)
+    net = gross - traded[1:] * (commission_bps + slippage_bps) / 1e4
+    net[0] -= traded[0] * (commission_bps + slippage_bps) / 1e4  # Opening trades are paid in the first period
+
+    curve = np.cumprod(1.0 + net)
+    drawdown = 1.0 - curve / np.maximum.accumulate(np.maximum(curve, 1.0))
+    std = net.std()
+    metrics = {
+        'total_return': float(curve[-1] - 1),
+        'annual_return': float(curve[-1] ** (periods_per_year / len(net)) - 1) if curve[-1] > 0 else -1.0,
+        'volatility': float(std * np.sqrt(periods_per_year)),
+        'sharpe': float(net.mean() / std * np.sqrt(periods_per_year)) if std > 0 else None,
+        'max_drawdown': float(drawdown.max()),
+        'turnover': float(traded.mean() * periods_per_year),  # Capital traded per year
+        'exposure': float(np.abs(weights).sum(axis=0).mean()),
+    }
+    if equity:
+        return metrics, np.concatenate([[1.0], curve])
+    return metrics
+
+
+def grid(strategy, params):
+    """Parameter dicts for every combination; each value may be a single value or a list"""
+    names, defaults = STRATEGIES[strategy]
+    axes = []
+    for name in names:
+        value = params.get(name, defaults[name])
+        axes.append(value if isinstance(value, list) else [value])
+    combos = [dict(zip(names, values)) for values in itertools.product(*axes)]
+    if strategy == 'sma_cross':
+        combos = [combo for combo in combos if combo['fast'] < combo['slow']]
+    return combos
+
+
+def _evaluate_all(closes, strategy, combos, options):
+    panel = Panel(closes)
+    return [evaluate(panel, positions(panel, strategy, combo, options['long_only']),
+                     options['commission_bps'], options['slippage_bps'], options['periods_per_year'])
+            for combo in combos]
+
+
+def _evaluate_shared(name, shape, strategy, combos, options):
+    """Pool task: evaluate combinations on the parent's shared memory panel"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return _evaluate_all(np.ndarray(shape, dtype=np.float64, buffer=shm.buf), strategy, combos, options)
+    finally:
+        shm.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def sweep(closes, strategy, combos, long_only=False, commission_bps=1.0, slippage_bps=2.0, periods_per_year=252,
+          workers=0):
+    """Metrics for each parameter combination, in order"""
+    options = {'long_only': long_only, 'commission_bps': commission_bps, 'slippage_bps': slippage_bps,
+               'periods_per_year': periods_per_year}
+    if not workers or len(combos) == 1:
+        return _evaluate_all(closes, strategy, combos, options)
+
+    # Contiguous slices keep combinations that share indicator windows in the same task
+    tasks = np.array_split(np.arange(len(combos)), min(len(combos), workers * 2))
+    shm = shared_memory.SharedMemory(create=True, size=closes.nbytes)
+    try:
+        np.ndarray(closes.shape, dtype=np.float64, buffer=shm.buf)[:] = closes
+        pool = get_pool(workers)
+        futures = [pool.submit(_evaluate_shared, shm.name, closes.shape, strategy,
+                               [combos[i] for i in task], options) for task in tasks if len(task)]
+        return [metrics for future in futures for metrics in future.result()]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def load_closes(symbols, start=None, end=None):
+    """(timestamps, closes as symbols x bars) for start <= ts <= end on timestamps all symbols share"""
+    store = marketdata.get_store()
+    data = [store.read(symbol, start, end) for symbol in symbols]
+    common = data[0]['ts']
+    for columns in data[1:]:
+        common = np.intersect1d(common, columns['ts'], assume_unique=True)
+    common = np.asarray(common)
+    if len(common) < 3:
+        raise BacktestError('Fewer than 3 bars shared by all symbols in the range')
+    closes = np.empty((len(symbols), len(common)))
+    for i, columns in enumerate(data):
+        closes[i] = columns['close'][np.searchsorted(columns['ts'], common)]
+    if not (closes > 0).all():
+        raise BacktestError('Closes must be positive')
+    return common, closes
+
+
+def run(symbols, strategy, params, start=None, end=None, long_only=False, commission_bps=1.0, slippage_bps=2.0,
+        periods_per_year=252, points=500, workers=0):
+    """Backtest every combination of params; results are sorted by Sharpe and the best includes its equity curve"""
+    ts, closes = load_closes(symbols, start, end)
+    combos = grid(strategy, params)
+    costs = {'commission_bps': commission_bps, 'slippage_bps': slippage_bps, 'periods_per_year': periods_per_year}
+    results = [{'params': combo, **metrics} for combo, metrics in
+               zip(combos, sweep(closes, strategy, combos, long_only, **costs, workers=workers))]
+    results.sort(key=lambda result: -np.inf if result['sharpe'] is None else result['sharpe'], reverse=True)
+
+    panel = Panel(closes)
+    _, curve = evaluate(panel, positions(panel, strategy, results[0]['params'], long_only), **costs, equity=True)
+    sample = np.unique(np.linspace(0, len(ts) - 1, min(points, len(ts))).astype(np.int64))
+    return {
+        'bars': len(ts),
+        'start': int(ts[0]),
+        'end': int(ts[-1]),
+        'results': results,
+        'best': {'params': results[0]['params'], 'ts': ts[sample].tolist(),
+                 'equity': np.round(curve[sample], 6).tolist()},
+    }
+
+
+def panel_bytes(symbols, bars, strategy, combos):
+    """Approximate peak memory of evaluating combos on one symbols x bars panel"""
+    # Every distinct window is memoized as its own panel-sized array for the whole sweep
+    windows = {combo[name] for combo in combos for name in STRATEGIES[strategy][0] if name != 'entry'}
+    return symbols * bars * 8 * (PANEL_ARRAYS + len(windows))
+
+
+def parse_request(data, max_symbols, max_combinations, max_cells, max_bytes):
+    """Validate a JSON backtest request into run keyword arguments"""
+    if not isinstance(data, dict):
+        raise BacktestError('Expected a JSON object')
+    symbols = data.get('symbols')
+    if not isinstance(symbols, list) or not symbols or not all(isinstance(s, str) for s in symbols):
+        raise BacktestError('Symbols must be a non-empty list of symbols')
+    if len(symbols) > max_symbols:
+        raise BacktestError(f'At most {max_symbols} symbols per backtest')
+    try:
+        symbols = [marketdata.normalize_symbol(symbol) for symbol in symbols]
+        # ISO dates or epoch seconds, as for /api/market/<symbol>/
+        start, end = (marketdata.parse_time(str(data[name]), end=name == 'end') if data.get(name) is not None
+                      else None for name in ('start', 'end'))
+    except marketdata.MarketDataError as e:
+        raise BacktestError(str(e))
+    if len(set(symbols)) != len(symbols):
+        raise BacktestError('Symbols must be unique')
+
+    strategy = data.get('strategy')
+    if strategy not in STRATEGIES:
+        raise BacktestError(f'Strategy must be one of {", ".join(STRATEGIES)}')
+    names, _ = STRATEGIES[strategy]
+    params = data.get('params', {})
+    if not isinstance(params, dict) or set(params) - set(names):
+        raise BacktestError(f'{strategy} takes params {", ".join(names)}')
+    for name, value in params.items():
+        values = value if isinstance(value, list) else [value]
+        integer = name != 'entry'
+        if not values or not all(isinstance(v, int if integer else (int, float)) and not isinstance(v, bool)
+                                 and v > 0 for v in values):
+            raise BacktestError(f'{name} must be a positive {"integer" if integer else "number"} or a list of them')
+    combos = grid(strategy, params)
+    if not combos:
+        raise BacktestError('No parameter combination has fast < slow')
+    if len(combos) > max_combinations:
+        raise BacktestError(f'At most {max_combinations} parameter combinations per backtest')
+
+    options = {}
+    for name, default in [('commission_bps', 1.0), ('slippage_bps', 2.0), ('periods_per_year', 252)]:
+        value = data.get(name, default)
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0 or \
+                (name == 'periods_per_year' and not value > 0):
+            raise BacktestError(f'{name} must be a non-negative number')
+        options[name] = value
+
+    # Stored rows bound the bars of any range, so this caps the work before anything is read
+    store = marketdata.get_store()
+    bars = min(store.series(symbol).rows for symbol in symbols)
+    if len(symbols) * bars * len(combos) > max_cells:
+        raise BacktestError(f'symbols x bars x combinations must be at most {max_cells}; narrow the range')
+    # Cells bound the CPU time, not the memory: one combination over many symbols and bars can need gigabytes
+    needed = panel_bytes(len(symbols), bars, strategy, combos)
+    if needed > max_bytes:
+        raise BacktestError(f'This backtest needs about {needed // 2**20} MB, at most {max_bytes // 2**20} MB is '
+                            f'allowed; use fewer symbols or indicator windows, or narrow the range')
+    return {'symbols': symbols, 'strategy': strategy, 'params': params, 'start': start, 'end': end,
+            'long_only': bool(data.get('long_only', False)), **options}
@@ -0,0 +1,123 @@
+"""
+Internal dispatch for the ``/api/batch/`` endpoint.
+
+A page load needs the CSRF token, auth status and a few other API calls;
+each separate request pays for middleware, the session and user load and
+CORS handling. The batch endpoint runs them as sub-requests through the URL
+resolver inside one request: every sub-request shares the outer request's
+session, user and META, so those are loaded once and any session or CSRF
+cookie changes are written by the outer response.
+
+The batch endpoint itself is CSRF-exempt, so a page can fetch its first
+token through it, and sub-views are called directly rather than through the
+middleware stack; each sub-request is therefore run through
+``CsrfViewMiddleware.process_view`` here, which passes safe methods and
+exempt views and otherwise wants the outer request's X-CSRFToken header.
+The outer Idempotency-Key header is dropped: it belongs to the batch, and
+would make every idempotent sub-view share (and replay) one key.
+"""
+import copy
+import json
+import logging
+from http.cookies import SimpleCookie
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.http import Http404, QueryDict
+from django.middleware.csrf import CsrfViewMiddleware
+from django.urls import resolve
+from django.utils.datastructures import MultiValueDict
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_METHODS = ('GET', 'POST')
+
+_csrf = CsrfViewMiddleware(lambda request: None)
+
+
+class BatchError(ValueError):
+    """A sub-request that cannot be dispatched; the message is returned to the client"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def check_path(path):
+    """Only plain API routes may be batched"""
+    if not path.startswith('/api/'):
+        raise BatchError('Only /api/ routes can be batched')
+    if path.startswith('/api/batch/'):
+        raise BatchError('Batches cannot be nested')
+    # Authentication routes are guarded by IPPolicyMiddleware on their own path
+    if path.startswith(tuple(getattr(settings, 'IP_POLICY_PATHS', ()))):
+        raise BatchError('This endpoint must be called directly', status=403)
+
+
+def build_subrequest(request, method, path, query, body):
+    """Shallow copy of the outer request pointed at another route"""
+    sub = copy.copy(request)
+    sub.method = method
+    sub.path = sub.path_info = path
+    sub.GET = QueryDict(query)
+    sub.content_type = 'application/json'
+    sub._body = json.dumps(body).encode() if body is not None else b''
+    sub._post = QueryDict()
+    sub._files = MultiValueDict()
+    return sub
+
+
+def dispatch(request, item, cookies):
+    """Run one sub-request and return its result entry"""
+    if not isinstance(item, dict):
+        raise BatchError('Each request must be an object')
+    method = str(item.get('method', 'GET')).upper()
+    if method not in ALLOWED_METHODS:
+        raise BatchError(f'Method {method} cannot be batched')
+    path, _, query = str(item.get('path', '')).partition('?')
+    check_path(path)
+
+    try:
+        match = resolve(path, getattr(request, 'urlconf', None))
+    except Http404:
+        raise BatchError(f'No route for {path}', status=404)
+
+    sub = build_subrequest(request, method, path, query, item.get('body'))
+    sub.resolver_match = match
+    if _csrf.process_view(sub, match.func, match.args, match.kwargs) is not None:
+        raise BatchError('CSRF verification failed; send the X-CSRFToken header with the batch', status=403)
+    callback = match.func
+    if iscoroutinefunction(callback):
+        callback = async_to_sync(callback)
+    response = callback(sub, *match.args, **match.kwargs)
+
+    if response.streaming:
+        raise BatchError('Streaming responses cannot be batched')
+    # Views may log in or out, which replaces the user on the request
+    request.user = sub.user
+    for key, morsel in response.cookies.items():
+        cookies[key] = morsel
+
+    content = response.content.decode(response.charset)
+    if response.get('Content-Type', '').startswith('application/json'):
+        content = json.loads(content) if content else None
+    return {'status': response.status_code, 'body': content}
+
+
+def run_batch(request, items):
+    """Dispatch sub-requests in order; returns (results, cookies set by the sub-views)"""
+    results = []
+    cookies = SimpleCookie()
+    request.META.pop('HTTP_IDEMPOTENCY_KEY', None)  # Sub-requests share META
+    request.__dict__.pop('headers', None)  # Cached view of META
+    for item in items:
+        entry = {'id': item.get('id')} if isinstance(item, dict) else {'id': None}
+        try:
+            entry.update(dispatch(request, item, cookies))
+        except BatchError as e:
+            entry.update({'status': e.status, 'body': {'status': 'error', 'message': str(e)}})
+        except Exception as e:
+            logger.error(f"Batch sub-request {item!r} failed: {str(e)}")
+            entry.update({'status': 500, 'body': {'status': 'error', 'message': 'Internal error'}})
+        results.append(entry)
+    return results, cookies
@@ -0,0 +1,310 @@
+"""
+Bloom filter of registered emails for the real-time availability check.
+
+``validate_email_api`` runs on every keystroke of the signup form, and almost
+every address typed there is not registered. The filter answers "definitely
+not registered" from memory; only possible matches are confirmed with the
+indexed ``auth_user.email`` query.
+
+The filter is built on first use by streaming every email from the database,
+kept current by the User ``post_save`` signal, and topped up every
+EMAIL_BLOOM_REFRESH_SECONDS with rows written by other processes or by
+``bulk_create``. Setting EMAIL_BLOOM_SHARED_NAME places the bit array in
+shared memory so every worker on the host uses one filter; a filter that
+outgrows its segment moves to a larger one and unlinks the old.
+
+Bits are set with a read-modify-write of their byte, so writers are
+serialized: by a thread lock, and for a shared filter also by an ``flock`` on
+a lock file next to the segment. The number of keys counts only adds that set
+a new bit, so re-adding a known email (a refresh sees every profile saved
+since the last one) does not bring a rebuild closer; for a shared filter the
+count lives in the segment header and is updated under the lock.
+"""
+import hashlib
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+try:
+    import fcntl
+except ImportError:  # Windows: shared filters are not supported there
+    fcntl = None
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MIN_CAPACITY = 1 << 14
+
+# Shared segment header: ready flag, number of keys added, highest user pk seen
+HEADER = struct.Struct('<B7xQQ')
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over a bytearray or a shared memory buffer"""
+
+    def __init__(self, capacity, error_rate=0.001, buffer=None):
+        self.capacity = capacity
+        self.num_bits = self.optimal_num_bits(capacity, error_rate)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = buffer if buffer is not None else bytearray(self.size_in_bytes(capacity, error_rate))
+
+    @staticmethod
+    def optimal_num_bits(capacity, error_rate):
+        return max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+
+    @classmethod
+    def size_in_bytes(cls, capacity, error_rate):
+        return (cls.optimal_num_bits(capacity, error_rate) + 7) // 8
+
+    def _positions(self, key):
+        # Double hashing: k positions derived from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """Set the key's bits; returns whether any was not set yet (the key is new, false positives aside)"""
+        bits = self.bits
+        added = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                added = True
+        return added
+
+    def __contains__(self, key):
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class RegisteredEmails:
+    """Process-wide front for "is this email registered?" lookups"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Builds and refreshes
+        self._write_lock = threading.Lock()  # Bit writes
+        self._lock_file = None
+        self.reset()
+
+    def reset(self):
+        """Drop the filter so the next lookup rebuilds it (used by tests)"""
+        self._filter = None
+        self._shm = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._count = 0
+        self._max_pk = 0
+        self._refreshed_at = 0.0
+        self._refreshed_wall = None
+
+    def is_registered(self, email):
+        """Exact answer; only possible matches reach the database"""
+        from django.contrib.auth.models import User
+
+        email = normalize_email(email)
+        if not self.might_contain(email):
+            return False
+        return User.objects.filter(email=email).exists()
+
+    async def ais_registered(self, email):
+        """Async variant of is_registered for the ASGI views"""
+        from django.contrib.auth.models import User
+
+        email = normalize_email(email)
+        if self._needs_database():
+            # Builds and refreshes stream from the ORM, so run them off the event loop
+            await sync_to_async(self._get_filter)()
+        if not self.might_contain(email):
+            return False
+        return await User.objects.filter(email=email).aexists()
+
+    def might_contain(self, email):
+        if not getattr(settings, 'EMAIL_BLOOM_ENABLED', True):
+            return True
+        bloom = self._get_filter()
+        if bloom is None:
+            return True  # Shared filter still being built by another worker
+        return normalize_email(email) in bloom
+
+    def add(self, email):
+        """Record a newly registered or changed email, if the filter is built"""
+        bloom = self._filter
+        if bloom is None or not email or not self._is_ready():
+            return  # A build in progress, here or in another worker, is topped up by the next refresh
+        with self._writing():
+            self._record(bloom.add(normalize_email(email)))
+
+    @contextmanager
+    def _writing(self):
+        """Serialize bit writes across threads and, for a shared filter, across processes"""
+        with self._write_lock:
+            if self._lock_file is None:
+                yield
+                return
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _record(self, added, max_pk=0):
+        """Count keys that set new bits; the shared header holds every worker's adds (hold _writing)"""
+        if self._shm is not None:
+            ready, count, shared_max_pk = HEADER.unpack_from(self._shm.buf)
+            self._count = count + added
+            self._max_pk = max(self._max_pk, shared_max_pk, max_pk)
+            HEADER.pack_into(self._shm.buf, 0, ready, self._count, self._max_pk)
+        else:
+            self._count += added
+            self._max_pk = max(self._max_pk, max_pk)
+
+    def _needs_database(self):
+        """Whether the next lookup would build or refresh the filter"""
+        if not getattr(settings, 'EMAIL_BLOOM_ENABLED', True):
+            return False
+        return self._filter is None or self._refresh_due()
+
+    def _refresh_due(self):
+        return time.monotonic() - self._refreshed_at > getattr(settings, 'EMAIL_BLOOM_REFRESH_SECONDS', 30)
+
+    def _get_filter(self):
+        if self._filter is None:
+            with self._lock:
+                if self._filter is None:
+                    self._build()
+        elif self._refresh_due():
+            if self._lock.acquire(blocking=False):
+                try:
+                    if self._is_ready():
+                        self._refresh()
+                    else:
+                        self._finish_shared_build()
+                finally:
+                    self._lock.release()
+        return self._filter if self._is_ready() else None
+
+    def _is_ready(self):
+        if self._shm is None:
+            return self._filter is not None
+        return HEADER.unpack_from(self._shm.buf)[0] == 1
+
+    def _build(self):
+        from django.contrib.auth.models import User
+
+        error_rate = getattr(settings, 'EMAIL_BLOOM_ERROR_RATE', 0.001)
+        count = User.objects.count()
+        # Round capacity up to a power of two with 2x headroom for growth
+        capacity = max(MIN_CAPACITY, 1 << math.ceil(math.log2(max(count, 1) * 2)))
+        shared_name = getattr(settings, 'EMAIL_BLOOM_SHARED_NAME', None)
+
+        self._refreshed_at = time.monotonic()
+        self._refreshed_wall = timezone.now()
+        if not shared_name:
+            self._shm = None
+            bloom = BloomFilter(capacity, error_rate)
+            self._count, self._max_pk = self._populate(bloom, 0)
+            self._filter = bloom  # Published once populated, so add() never writes alongside _populate
+            logger.info(f"Built email Bloom filter: {self._count} emails, {len(self._filter.bits)} bytes")
+            return
+
+        if fcntl is None:
+            raise RuntimeError('EMAIL_BLOOM_SHARED_NAME needs fcntl to lock the shared filter')
+        size = HEADER.size + BloomFilter.size_in_bytes(capacity, error_rate)
+        name = f'{shared_name}-{capacity}'
+        outgrown = self._shm
+        if self._lock_file is not None:
+            self._lock_file.close()  # Lock of the segment this filter outgrew
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f'{name}.lock'), 'a')
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name=name)
+            created = False
+        # The segment outlives individual workers; it is sized by capacity so
+        # growth past it moves every worker to a new, larger segment.
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+        self._shm = shm
+        self._filter = BloomFilter(capacity, error_rate, buffer=shm.buf[HEADER.size:size])
+        if created:
+            # Under the lock: a worker that finds the segment not ready yet waits here instead of populating it too
+            with self._writing():
+                self._count, self._max_pk = self._populate(self._filter, 0)
+                HEADER.pack_into(shm.buf, 0, 1, self._count, self._max_pk)
+            logger.info(f"Built shared email Bloom filter {name}: {self._count} emails")
+        else:
+            _, self._count, self._max_pk = HEADER.unpack_from(shm.buf)
+        if outgrown is not None and outgrown.name != shm.name:
+            self._unlink(outgrown)
+
+    @staticmethod
+    def _unlink(shm):
+        """Remove an outgrown segment's name; workers still attached keep it mapped until they move too"""
+        resource_tracker.register(shm._name, 'shared_memory')  # unlink() unregisters it
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            resource_tracker.unregister(shm._name, 'shared_memory')  # Another worker removed it first
+
+    def _finish_shared_build(self):
+        """Populate a shared segment whose creator never marked it ready"""
+        self._refreshed_at = time.monotonic()
+        self._refreshed_wall = timezone.now()
+        with self._writing():
+            if self._is_ready():
+                return  # Another worker finished it first
+            self._count, self._max_pk = self._populate(self._filter, 0)
+            HEADER.pack_into(self._shm.buf, 0, 1, self._count, self._max_pk)
+
+    def _populate(self, bloom, since_pk):
+        """Add every email after since_pk to a filter nobody else writes yet; (keys added, max pk)"""
+        from django.contrib.auth.models import User
+
+        count = 0
+        max_pk = since_pk
+        rows = (User.objects.filter(pk__gt=since_pk).order_by('pk')
+                .values_list('pk', 'email').iterator(chunk_size=2000))
+        for pk, email in rows:
+            if email:
+                count += bloom.add(normalize_email(email))
+            max_pk = pk
+        return count, max_pk
+
+    def _refresh(self):
+        """Add users created or re-emailed since the last refresh, possibly by other processes"""
+        from django.contrib.auth.models import User
+
+        since = self._refreshed_wall
+        self._refreshed_at = time.monotonic()
+        self._refreshed_wall = timezone.now()
+        rows = list(User.objects.filter(Q(pk__gt=self._max_pk) | Q(profile__updated_at__gte=since))
+                    .values_list('pk', 'email'))
+        with self._writing():
+            added = sum(self._filter.add(normalize_email(email)) for pk, email in rows if email)
+            self._record(added, max((pk for pk, _ in rows), default=0))
+        if self._count > self._filter.capacity:
+            self._filter = None  # Rebuild at the next power-of-two capacity
+
+
+registered_emails = RegisteredEmails()
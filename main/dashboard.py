@@ -0,0 +1,259 @@
+"""
+Per-user dashboard snapshots behind /api/dashboard/.
+
+A snapshot is everything the dashboard shows for one user in one JSON
+document: paper-trading positions marked to the latest stored close, a few
+indicators per held symbol, and a parametric one-bar value at risk of the
+open positions. It is composed once and cached as the finished response
+body (``fields.encode_text``, so zlib-compressed once it is a few hundred
+bytes) next to a hash of it that serves as the ETag. A client that already
+has the current snapshot costs one cache read and a 304; any other hit costs
+that read and a decompress, with no queries, market data reads or JSON
+encoding.
+
+A snapshot is dropped when its inputs change and rebuilt on the next
+request:
+
+- Positions are cached separately per user as additive totals per symbol
+  (net quantity and net cost), so the matching engine's fill writer patches
+  them with each stored batch instead of anyone re-reading the user's fills,
+  and drops the snapshot. A cold entry is rebuilt with one grouped query.
+  Entries record the highest fill id they include and patches skip fills at
+  or below it, so a rebuild racing the writer never counts a fill twice.
+- Every market data append drops the snapshots of the users holding that
+  symbol, listed in a per-symbol holders entry that builds keep current.
+
+Patches, drops and the final store of a build share a lock, and a build is
+not stored if its positions or bars changed while it was composed. That
+holds within a process. The default LocMemCache is per process, so fills
+matched and bars appended in one process do not reach the cached positions
+and snapshots of another; cached positions expire with snapshots, after
+DASHBOARD_SNAPSHOT_TIMEOUT, which bounds how stale a dashboard served by
+another process can be. A shared cache keeps every process current.
+"""
+import hashlib
+import json
+import math
+import threading
+from statistics import NormalDist
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FloatField, Max, Q, Sum
+
+from . import indicators, marketdata, portfolio
+from .fields import encode_text
+
+SNAPSHOT_PREFIX = 'dashboard:snapshot:'
+POSITIONS_PREFIX = 'dashboard:positions:'
+HOLDERS_PREFIX = 'dashboard:holders:'
+HOLDERS_TIMEOUT = 24 * 60 * 60  # Refreshed by every stored snapshot, so it outlives them
+INDICATORS = ('sma', 'rsi', 'volatility', 'zscore')
+CONFIDENCE = (0.95, 0.99)
+DECIMALS = 6
+
+_lock = threading.Lock()
+
+
+def _snapshot_key(user_id):
+    return f'{SNAPSHOT_PREFIX}{user_id}'
+
+
+def _positions_key(user_id):
+    return f'{POSITIONS_PREFIX}{user_id}'
+
+
+def _holders_key(symbol):
+    return f'{HOLDERS_PREFIX}{symbol}'
+
+
+def _snapshot_timeout():
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_TIMEOUT', 300)
+
+
+def _round(value):
+    return None if value is None or not math.isfinite(value) else round(float(value), DECIMALS)
+
+
+def load_positions(user_id):
+    """{'through': highest fill id, 'positions': {symbol: [net quantity, net cost]}} from the fills table"""
+    from .models import PaperFill
+
+    bought, sold = Q(buyer_id=user_id), Q(seller_id=user_id)
+    value = F('price') * F('quantity')
+    rows = (PaperFill.objects.filter(bought | sold).order_by().values('symbol').annotate(
+        bought=Sum('quantity', filter=bought, default=0),
+        sold=Sum('quantity', filter=sold, default=0),
+        paid=Sum(value, filter=bought, default=0.0, output_field=FloatField()),
+        received=Sum(value, filter=sold, default=0.0, output_field=FloatField()),
+        through=Max('id'),
+    ))
+    return {
+        'through': max((row['through'] for row in rows), default=0),
+        'positions': {row['symbol']: [row['bought'] - row['sold'], row['paid'] - row['received']] for row in rows},
+    }
+
+
+def positions(user_id):
+    """A user's cached positions, loaded from the fills table on a miss"""
+    key = _positions_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        with _lock:  # Holds off the fill writer, so fills stored meanwhile are patched in, not lost
+            state = cache.get(key)
+            if state is None:
+                state = load_positions(user_id)
+                cache.set(key, state, _snapshot_timeout())
+    return state
+
+
+def apply_fills(fills):
+    """Patch the cached positions of everyone in newly stored fills and drop their snapshots"""
+    deltas = {}
+    for fill in fills:
+        value = float(fill.price) * fill.quantity
+        for user_id, sign in ((fill.buyer_id, 1), (fill.seller_id, -1)):
+            if user_id is not None:
+                deltas.setdefault(user_id, []).append((fill.pk, fill.symbol, sign * fill.quantity, sign * value))
+    if not deltas:
+        return
+
+    keys = {_positions_key(user_id): user_id for user_id in deltas}
+    with _lock:
+        patched, stale = {}, []
+        for key, state in cache.get_many(keys).items():
+            rows = deltas[keys[key]]
+            if any(pk is None for pk, _, _, _ in rows):
+                stale.append(key)  # The backend did not return ids; reload from the table
+                continue
+            held = state['positions']
+            for pk, symbol, quantity, value in rows:
+                if pk > state['through']:
+                    position = held.setdefault(symbol, [0, 0.0])
+                    position[0] += quantity
+                    position[1] += value
+            state['through'] = max(state['through'], max(pk for pk, _, _, _ in rows))
+            patched[key] = state
+        cache.set_many(patched, _snapshot_timeout())
+        cache.delete_many(stale + [_snapshot_key(user_id) for user_id in deltas])
+
+
+def invalidate_symbol(symbol):
+    """Drop the snapshots of everyone holding a symbol, after bars were appended to it"""
+    with _lock:
+        holders = cache.get(_holders_key(symbol))
+        if holders:
+            cache.delete_many([_snapshot_key(user_id) for user_id in holders])
+
+
+def _stored_rows(store, symbol):
+    try:
+        return store.series(symbol).rows
+    except marketdata.MarketDataError:
+        return 0
+
+
+def parametric_var(values, estimate):
+    """One-bar volatility and VaR (a positive loss) of position values from normal returns"""
+    values = np.asarray(values, dtype=np.float64)
+    mean = float(values @ estimate.mean)
+    sigma = math.sqrt(max(float(values @ estimate.covariance @ values), 0.0))
+    return sigma, {str(level): NormalDist().inv_cdf(level) * sigma - mean for level in CONFIDENCE}
+
+
+def compose(state, risk_window=252):
+    """(snapshot, {held symbol: stored rows it was marked with})"""
+    store = marketdata.get_store()
+    rows = {}
+    items = []
+    for symbol, (quantity, cost) in sorted(state['positions'].items()):
+        item = {
+            'symbol': symbol,
+            'quantity': quantity,
+            'net_cost': _round(cost),
+            'average_price': _round(cost / quantity) if quantity else None,
+            'last': None,
+            'ts': None,
+            'market_value': None,
+            'pnl': _round(-cost),  # Closed positions: what the round trips made
+            'indicators': None,
+        }
+        if quantity:
+            item['pnl'] = None
+            rows[symbol] = _stored_rows(store, symbol)
+            try:
+                ts, close, values = indicators.latest(symbol)
+            except marketdata.MarketDataError:
+                pass
+            else:
+                item.update({
+                    'last': _round(close),
+                    'ts': ts,
+                    'market_value': _round(quantity * close),
+                    'pnl': _round(quantity * close - cost),
+                    'indicators': {name: _round(values[name]) for name in INDICATORS},
+                })
+        items.append(item)
+
+    marked = [item for item in items if item['market_value'] is not None]
+    risk = None
+    if marked:
+        try:
+            estimate, _ = portfolio.covariance([item['symbol'] for item in marked], risk_window)
+        except (portfolio.PortfolioError, marketdata.MarketDataError):
+            pass
+        else:
+            sigma, var = parametric_var([item['market_value'] for item in marked], estimate)
+            risk = {
+                'observations': estimate.observations,
+                'end': int(estimate.ts[-1]),
+                'volatility': _round(sigma),
+                'var': {level: _round(value) for level, value in var.items()},
+            }
+
+    snapshot = {
+        'status': 'success',
+        'positions': items,
+        'totals': {
+            'open_positions': sum(1 for item in items if item['quantity']),
+            'market_value': _round(sum(item['market_value'] for item in marked)),
+            'gross_exposure': _round(sum(abs(item['market_value']) for item in marked)),
+            'pnl': _round(sum(item['pnl'] for item in items if item['pnl'] is not None)),
+            'unmarked': sum(1 for item in items if item['pnl'] is None),
+        },
+        'risk': risk,
+    }
+    return snapshot, rows
+
+
+def build(user_id):
+    """Compose a user's snapshot and cache it unless its inputs changed meanwhile; (ETag, blob)"""
+    state = positions(user_id)
+    through = state['through']
+    snapshot, rows = compose(state, getattr(settings, 'DASHBOARD_RISK_WINDOW', 252))
+    body = json.dumps(snapshot, separators=(',', ':'))
+    etag = '"%s"' % hashlib.blake2b(body.encode(), digest_size=12).hexdigest()
+    blob = encode_text(body)
+
+    store = marketdata.get_store()
+    with _lock:
+        current = cache.get(_positions_key(user_id))
+        if current is None or current['through'] != through:
+            return etag, blob
+        if any(_stored_rows(store, symbol) != count for symbol, count in rows.items()):
+            return etag, blob
+        holders = cache.get_many([_holders_key(symbol) for symbol in rows])
+        # Rewritten even when the user is listed, so no holders entry expires before this snapshot
+        cache.set_many({_holders_key(symbol): holders.get(_holders_key(symbol), set()) | {user_id}
+                        for symbol in rows}, HOLDERS_TIMEOUT)
+        cache.set(_snapshot_key(user_id), (etag, blob), _snapshot_timeout())
+    return etag, blob
+
+
+def get_snapshot(user_id):
+    """(ETag, blob) of a user's dashboard; decode the blob with fields.decode_text"""
+    stored = cache.get(_snapshot_key(user_id))
+    if stored is None:
+        return build(user_id)
+    return stored
@@ -0,0 +1,156 @@
+"""
+Streaming CSV/JSONL exports of users and audit tables.
+
+Rows are read with keyset pagination on (timestamp, id) using
+``values_list``, so each page is a single index range scan and memory use
+does not grow with the table. Output is produced incrementally and can be
+gzip-compressed on the fly; the same generators back the staff export
+endpoint and the ``export_data`` command. Under ASGI the endpoint wraps them
+in ``aiter_chunks``: Django buffers a synchronous iterator whole before
+sending it from an async server.
+
+CSV cells that a spreadsheet would evaluate as a formula (text starting with
+``=``, ``+``, ``-``, ``@``, tab or carriage return) are prefixed with ``'``;
+user-supplied names and messages end up in these files.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import AIConversation, ContactMessage, LoginAttempt
+
+# name: (model, timestamp field, exported columns)
+EXPORTS = {
+    'users': (User, 'date_joined', [
+        'id', 'date_joined', 'username', 'email', 'first_name', 'last_name', 'is_active',
+        'last_login', 'profile__newsletter_subscription', 'profile__email_verified',
+    ]),
+    'login_attempts': (LoginAttempt, 'timestamp', [
+        'id', 'timestamp', 'email', 'user_id', 'ip_address', 'success', 'failure_reason', 'user_agent',
+    ]),
+    'contact_messages': (ContactMessage, 'created_at', [
+        'id', 'created_at', 'name', 'email', 'message', 'responded',
+    ]),
+    'conversations': (AIConversation, 'created_at', [
+        'id', 'created_at', 'session_id', 'user_id', 'ip_address', 'message', 'response',
+    ]),
+}
+
+FLUSH_BYTES = 64 * 1024
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parse_bound(value, end=False):
+    """Parse an ISO date or datetime into an aware datetime; dates cover the whole day"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value!r}')
+        parsed = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def iter_rows(name, start=None, end=None, chunk_size=2000):
+    """Yield value tuples for an export in (timestamp, id) order"""
+    model, ts_field, columns = EXPORTS[name]
+    queryset = model.objects.all()
+    if start:
+        queryset = queryset.filter(**{f'{ts_field}__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{ts_field}__lte': end})
+
+    # The keyset columns go first so each row carries its own cursor
+    fields = [ts_field, 'id'] + columns
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            last_ts, last_id = last
+            page = page.filter(Q(**{f'{ts_field}__gt': last_ts}) | Q(**{ts_field: last_ts, 'id__gt': last_id}))
+        rows = list(page.order_by(ts_field, 'id').values_list(*fields)[:chunk_size])
+        for row in rows:
+            yield row[2:]
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][:2]
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    value = _format_value(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(name, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.replace('profile__', '') for column in EXPORTS[name][2]])
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def iter_jsonl(name, rows):
+    columns = [column.replace('profile__', '') for column in EXPORTS[name][2]]
+    parts = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(parts).encode()
+            parts = []
+            size = 0
+    yield ''.join(parts).encode()
+
+
+def gzip_stream(chunks):
+    """Compress a byte stream incrementally into gzip format"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(name, fmt='csv', start=None, end=None, gzip=False, chunk_size=2000):
+    """Return an iterator of encoded bytes for an export"""
+    rows = iter_rows(name, start, end, chunk_size)
+    chunks = iter_csv(name, rows) if fmt == 'csv' else iter_jsonl(name, rows)
+    return gzip_stream(chunks) if gzip else chunks
+
+
+async def aiter_chunks(chunks):
+    """Async iterator over a byte stream, advancing it (and its queries) off the event loop"""
+    chunks = iter(chunks)
+    done = object()
+    advance = sync_to_async(next)
+    while (chunk := await advance(chunks, done)) is not done:
+        yield chunk
@@ -0,0 +1,103 @@
+"""
+Model fields.
+
+``CompressedTextField`` keeps large text (chat messages and model output)
+compressed in a binary column. Every stored value starts with a one-byte
+codec header, so rows written with different codecs can coexist and new
+codecs can be added without rewriting old data. Values shorter than
+``threshold`` bytes, or that do not shrink, are stored raw. Compressed
+contents cannot be searched with SQL lookups such as ``icontains``.
+"""
+import zlib
+
+from django import forms
+from django.db import models
+
+RAW = 0
+ZLIB = 1
+
+# header byte: (compress, decompress)
+CODECS = {
+    RAW: (lambda data, level: data, lambda data: data),
+    ZLIB: (lambda data, level: zlib.compress(data, level), zlib.decompress),
+}
+
+
+def encode_text(text, threshold=256, codec=ZLIB, level=6):
+    """Encode text as header byte + payload"""
+    data = text.encode()
+    if len(data) >= threshold and codec != RAW:
+        packed = CODECS[codec][0](data, level)
+        if len(packed) < len(data):
+            return bytes([codec]) + packed
+    return bytes([RAW]) + data
+
+
+def decode_text(value):
+    value = bytes(value)
+    if not value:
+        return ''
+    try:
+        decompress = CODECS[value[0]][1]
+    except KeyError:
+        raise ValueError(f'Unknown text codec {value[0]}')
+    return decompress(value[1:]).decode()
+
+
+class CompressedTextField(models.BinaryField):
+    """Text field stored as codec-tagged, optionally compressed bytes"""
+
+    description = 'Compressed text'
+
+    def __init__(self, *args, threshold=256, level=6, **kwargs):
+        self.threshold = threshold
+        self.level = level
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.pop('editable', None)
+        if not self.editable:
+            kwargs['editable'] = False
+        if self.threshold != 256:
+            kwargs['threshold'] = self.threshold
+        if self.level != 6:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        if isinstance(value, str):
+            return value  # Row not yet converted by the recompression migration
+        return decode_text(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decode_text(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)  # Already encoded
+        return encode_text(str(value), self.threshold, ZLIB, self.level)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return connection.Database.Binary(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def get_default(self):
+        # BinaryField turns the empty default into b''; this field holds text
+        return models.Field.get_default(self)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{'form_class': forms.CharField, 'widget': forms.Textarea, **kwargs})
@@ -0,0 +1,116 @@
+"""
+``Idempotency-Key`` support for POST endpoints that mobile clients retry.
+
+The first request carrying a key runs the view and its response is stored in
+the cache for IDEMPOTENCY_TTL seconds; retries with the same key and body get
+that response back without re-running validation, hashing or inserts.
+A retry that arrives while the first request is still running waits for it
+(up to IDEMPOTENCY_WAIT_SECONDS) instead of executing a second time. The
+in-flight marker is taken with ``cache.add``, which is atomic on the shared
+backends (Redis, Memcached, database), so this holds across workers as long
+as CACHES points at one of them.
+
+Keys are scoped to the view and the signed-in user, and a retry whose body
+differs from the original is rejected. Responses with a 5xx status are not
+stored, so the client can retry them; the wrapped views therefore report
+unexpected failures with a 500 rather than a 200 error body. Replays return the original body and status only;
+cookies set by middleware on the first response (e.g. the session after
+signup) are not replayed.
+"""
+import functools
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+KEY_PREFIX = 'idempotency:'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def _cache_key(request, view_name, key):
+    user_id = request.user.pk if request.user.is_authenticated else 'anon'
+    scope = f'{view_name}:{user_id}:{key}'
+    return KEY_PREFIX + hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _fingerprint(request):
+    return hashlib.sha256(request.method.encode() + b' ' + request.path.encode() + b'\n' + request.body).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'This Idempotency-Key was already used with a different request'
+        }, status=422)
+    response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _wait_for_result(result_key, lock_key):
+    """Poll for the in-flight request's response; None if it failed or timed out"""
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        stored = cache.get(result_key)
+        if stored is not None:
+            return stored
+        if cache.get(lock_key) is None:
+            return None  # First request finished without storing (server error)
+    return None
+
+
+def idempotent(view):
+    """Store and replay responses for requests that carry an Idempotency-Key header"""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'
+            }, status=400)
+
+        result_key = _cache_key(request, view.__name__, key)
+        lock_key = result_key + ':lock'
+        fingerprint = _fingerprint(request)
+
+        stored = cache.get(result_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        lock_timeout = getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 60)
+        if not cache.add(lock_key, fingerprint, lock_timeout):
+            stored = _wait_for_result(result_key, lock_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            return JsonResponse({
+                'status': 'error',
+                'message': 'A request with this Idempotency-Key is still being processed'
+            }, status=409)
+
+        try:
+            response = view(request, *args, **kwargs)
+            if response.status_code < 500 and not response.streaming:
+                cache.set(result_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                }, getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60))
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
@@ -0,0 +1,371 @@
+"""
+Technical indicators over close prices, in two modes that agree.
+
+``compute`` evaluates every indicator over whole arrays with NumPy. Inputs
+may be one series ``(bars,)`` or a panel ``(symbols, bars)``; time is the
+last axis. Moving sums use cumulative sums, and exponential averages are
+computed in blocks: each block of EMA_BLOCK bars is one matrix product, and
+the values carried between blocks form a shorter exponential average that is
+solved the same way. No Python loop runs per bar.
+
+``IndicatorState`` is the incremental mode: it keeps O(1) state per symbol
+(the last EMA values, Wilder averages, and running sums over a ring buffer
+of the last ``window`` closes and returns), so ``update`` advances a whole
+panel by one bar without touching history. ``latest`` keeps one state per
+stored symbol and feeds it only the bars appended to the market data store
+since the previous call.
+
+Conventions: EMAs start at the first value (no SMA seed); RSI uses Wilder
+smoothing starting from the first change; Bollinger bands and z-scores use
+the population standard deviation; volatility is the sample standard
+deviation of log returns per bar (annualized when periods_per_year is
+given). Values that are still warming up are NaN.
+"""
+import threading
+
+import numpy as np
+
+from . import marketdata
+
+EMA_BLOCK = 64
+CHUNK_SYMBOLS = 32
+WARMUP_BARS = 2048  # History fed to a new state; older bars change EMAs by less than 1e-30
+RESYNC_UPDATES = 4096  # Running sums are recomputed from the ring buffer this often
+DEFAULTS = {'window': 20, 'ema_span': 20, 'rsi_period': 14, 'macd': (12, 26, 9), 'bands': 2.0}
+NAMES = ('sma', 'ema', 'rsi', 'macd', 'macd_signal', 'macd_hist', 'bb_upper', 'bb_lower', 'volatility', 'zscore')
+
+
+def _ema(x, alpha, initial):
+    """y[t] = alpha * x[t] + (1 - alpha) * y[t-1] along the last axis, with y[-1] = initial (shape (..., 1))"""
+    length = x.shape[-1]
+    if not length:
+        return x.copy()
+    size = min(EMA_BLOCK, length)
+    blocks = -(-length // size)
+    decay = 1.0 - alpha
+    if blocks * size != length:
+        x = np.pad(x, [(0, 0)] * (x.ndim - 1) + [(0, blocks * size - length)])
+    x = x.reshape(x.shape[:-1] + (blocks, size))
+
+    # Within a block starting from zero: local[k] = sum_j alpha * decay**(k-j) * x[j]
+    lag = np.arange(size)[:, None] - np.arange(size)[None, :]
+    weights = np.where(lag >= 0, alpha * decay ** np.maximum(lag, 0), 0.0)
+    local = (x.reshape(-1, size) @ weights.T).reshape(x.shape)  # One 2-D BLAS call for every block
+    ramp = decay ** np.arange(1, size + 1)
+
+    if blocks == 1:
+        carries = initial
+    else:
+        # Block ends follow end[b] = local_end[b] + decay**size * end[b-1]: an EMA over blocks
+        block_decay = decay ** size
+        ends = _ema(local[..., :, -1] / (1.0 - block_decay), 1.0 - block_decay, initial)
+        carries = np.concatenate((initial, ends[..., :-1]), axis=-1)
+    out = local + carries[..., None] * ramp
+    return out.reshape(out.shape[:-2] + (blocks * size,))[..., :length]
+
+
+def ema(x, span):
+    x = np.asarray(x, dtype=np.float64)
+    return _ema(x, 2.0 / (span + 1), x[..., :1])
+
+
+def _rolling_sum(x, window):
+    """Sum of the last `window` values at each position (partial sums before that)"""
+    total = np.cumsum(x, axis=-1)
+    total[..., window:] -= total[..., :-window].copy()
+    return total
+
+
+def _rolling_mean_std(x, window, ddof=0):
+    """Rolling mean and standard deviation; NaN until `window` values are available"""
+    ref = x[..., :1]  # Shift by the first value so the squared sums do not cancel
+    shifted = x - ref
+    sums = _rolling_sum(shifted, window)
+    squares = _rolling_sum(shifted * shifted, window)
+    mean = sums / window
+    var = np.maximum(squares - sums * mean, 0.0) / (window - ddof)
+    mean += ref
+    std = np.sqrt(var)
+    mean[..., :window - 1] = np.nan
+    std[..., :window - 1] = np.nan
+    return mean, std
+
+
+def _zscore(x, mean, std):
+    z = np.divide(x - mean, std, out=np.zeros(np.broadcast(x, std).shape), where=std > 0)
+    z[np.isnan(mean)] = np.nan
+    return z
+
+
+def sma(x, window):
+    return _rolling_mean_std(np.asarray(x, dtype=np.float64), window)[0]
+
+
+def rsi(x, period=14):
+    x = np.asarray(x, dtype=np.float64)
+    change = np.diff(x, axis=-1)
+    out = np.full(x.shape, np.nan)
+    if change.shape[-1] == 0:
+        return out
+    gain, loss = np.maximum(change, 0.0), np.maximum(-change, 0.0)
+    alpha = 1.0 / period
+    avg_gain, avg_loss = _ema(gain, alpha, gain[..., :1]), _ema(loss, alpha, loss[..., :1])
+    out[..., 1:] = _rsi_from_averages(avg_gain, avg_loss)
+    out[..., :period] = np.nan
+    return out
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), value)
+
+
+def macd(x, fast=12, slow=26, signal=9):
+    """(MACD line, signal line, histogram)"""
+    x = np.asarray(x, dtype=np.float64)
+    line = ema(x, fast) - ema(x, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(x, window=20, bands=2.0):
+    """(middle, upper, lower)"""
+    mean, std = _rolling_mean_std(np.asarray(x, dtype=np.float64), window)
+    return mean, mean + bands * std, mean - bands * std
+
+
+def volatility(x, window=20, periods_per_year=None):
+    """Rolling sample standard deviation of log returns"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] > window:
+        out[..., 1:] = _rolling_mean_std(np.diff(np.log(x), axis=-1), window, ddof=1)[1]
+    return out * np.sqrt(periods_per_year) if periods_per_year else out
+
+
+def zscore(x, window=20):
+    x = np.asarray(x, dtype=np.float64)
+    mean, std = _rolling_mean_std(x, window)
+    return _zscore(x, mean, std)
+
+
+def compute(closes, window=20, ema_span=20, rsi_period=14, macd=(12, 26, 9), bands=2.0, periods_per_year=None):
+    """Every indicator in NAMES for a series or panel of closes, as arrays shaped like closes"""
+    closes = np.asarray(closes, dtype=np.float64)
+    params = dict(window=window, ema_span=ema_span, rsi_period=rsi_period, macd=macd, bands=bands,
+                  periods_per_year=periods_per_year)
+    if closes.ndim == 2 and closes.shape[0] > CHUNK_SYMBOLS:
+        # A few symbols at a time keeps the ~70 whole-array passes in cache
+        out = {name: np.empty(closes.shape) for name in NAMES}
+        for lo in range(0, closes.shape[0], CHUNK_SYMBOLS):
+            for name, values in _compute(closes[lo:lo + CHUNK_SYMBOLS], **params).items():
+                out[name][lo:lo + CHUNK_SYMBOLS] = values
+        return out
+    return _compute(closes, **params)
+
+
+def _compute(closes, window, ema_span, rsi_period, macd, bands, periods_per_year):
+    fast, slow, signal = macd
+    mean, std = _rolling_mean_std(closes, window)
+    line = ema(closes, fast) - ema(closes, slow)
+    signal_line = ema(line, signal)
+    return {
+        'sma': mean,
+        'ema': ema(closes, ema_span),
+        'rsi': rsi(closes, rsi_period),
+        'macd': line,
+        'macd_signal': signal_line,
+        'macd_hist': line - signal_line,
+        'bb_upper': mean + bands * std,
+        'bb_lower': mean - bands * std,
+        'volatility': volatility(closes, window, periods_per_year),
+        'zscore': _zscore(closes, mean, std),
+    }
+
+
+class IndicatorState:
+    """Rolling indicator state for a panel of symbols, advanced one bar at a time"""
+
+    def __init__(self, symbols=1, window=20, ema_span=20, rsi_period=14, macd=(12, 26, 9), bands=2.0,
+                 periods_per_year=None):
+        self.window = window
+        self.bands = bands
+        self.periods_per_year = periods_per_year
+        self.alphas = {
+            'ema': 2.0 / (ema_span + 1), 'fast': 2.0 / (macd[0] + 1), 'slow': 2.0 / (macd[1] + 1),
+            'signal': 2.0 / (macd[2] + 1), 'rsi': 1.0 / rsi_period,
+        }
+        self.rsi_period = rsi_period
+        self.count = 0
+        shape = (symbols,)
+        self.last = np.full(shape, np.nan)
+        self.ref = np.zeros(shape)
+        self.ema = {name: np.zeros(shape) for name in ('ema', 'fast', 'slow', 'signal')}
+        self.avg_gain = np.zeros(shape)
+        self.avg_loss = np.zeros(shape)
+        # Ring buffers of the last `window` closes (shifted by ref) and log returns, with their running sums
+        self.closes = np.zeros((symbols, window))
+        self.returns = np.zeros((symbols, window))
+        self.sums = {name: np.zeros(shape) for name in ('close', 'close_sq', 'ret', 'ret_sq')}
+
+    @classmethod
+    def from_history(cls, closes, **params):
+        """State after the given (symbols, bars) or (bars,) closes, computed without a per-bar loop"""
+        closes = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+        state = cls(closes.shape[0], **params)
+        bars = closes.shape[1]
+        if not bars:
+            return state
+        alphas, first = state.alphas, closes[:, :1]
+        state.count = bars
+        state.last = closes[:, -1].copy()
+        state.ref = closes[:, 0].copy()
+        for name in ('ema', 'fast', 'slow'):
+            state.ema[name] = _ema(closes, alphas[name], first)[:, -1]
+        line = _ema(closes, alphas['fast'], first) - _ema(closes, alphas['slow'], first)
+        state.ema['signal'] = _ema(line, alphas['signal'], line[:, :1])[:, -1]
+        if bars > 1:
+            change = np.diff(closes, axis=1)
+            gain, loss = np.maximum(change, 0.0), np.maximum(-change, 0.0)
+            state.avg_gain = _ema(gain, alphas['rsi'], gain[:, :1])[:, -1]
+            state.avg_loss = _ema(loss, alphas['rsi'], loss[:, :1])[:, -1]
+
+        window = state.window
+        positions = np.arange(max(bars - window, 0), bars)
+        state.closes[:, positions % window] = closes[:, positions] - state.ref[:, None]
+        returns = np.diff(np.log(closes[:, -window - 1:]), axis=1)
+        return_positions = np.arange(bars - 1 - returns.shape[1], bars - 1)
+        state.returns[:, return_positions % window] = returns
+        state._resync()
+        return state
+
+    def _resync(self):
+        closes = self.closes[:, :min(self.count, self.window)]
+        returns = self.returns[:, :min(max(self.count - 1, 0), self.window)]
+        self.sums['close'], self.sums['close_sq'] = closes.sum(axis=1), (closes * closes).sum(axis=1)
+        self.sums['ret'], self.sums['ret_sq'] = returns.sum(axis=1), (returns * returns).sum(axis=1)
+
+    def update(self, closes):
+        """Advance every symbol by one bar of closes (shape (symbols,))"""
+        closes = np.array(closes, dtype=np.float64)
+        alphas, emas, sums, window = self.alphas, self.ema, self.sums, self.window
+        if self.count == 0:
+            self.ref = closes.copy()
+            for name in ('ema', 'fast', 'slow'):
+                emas[name] = closes.copy()
+            emas['signal'] = np.zeros_like(closes)
+        else:
+            for name in ('ema', 'fast', 'slow'):
+                emas[name] += alphas[name] * (closes - emas[name])
+            emas['signal'] += alphas['signal'] * (emas['fast'] - emas['slow'] - emas['signal'])
+
+            change = closes - self.last
+            gain, loss = np.maximum(change, 0.0), np.maximum(-change, 0.0)
+            if self.count == 1:
+                self.avg_gain, self.avg_loss = gain, loss
+            else:
+                self.avg_gain += alphas['rsi'] * (gain - self.avg_gain)
+                self.avg_loss += alphas['rsi'] * (loss - self.avg_loss)
+
+            # Return number count-1 replaces the one `window` returns ago
+            value = np.log(closes / self.last)
+            slot = (self.count - 1) % window
+            old = self.returns[:, slot]
+            if self.count - 1 < window:
+                old = np.zeros_like(value)
+            sums['ret'] += value - old
+            sums['ret_sq'] += value * value - old * old
+            self.returns[:, slot] = value
+
+        value = closes - self.ref
+        slot = self.count % window
+        old = self.closes[:, slot] if self.count >= window else np.zeros_like(value)
+        sums['close'] += value - old
+        sums['close_sq'] += value * value - old * old
+        self.closes[:, slot] = value
+
+        self.last = closes
+        self.count += 1
+        if self.count % RESYNC_UPDATES == 0:
+            self._resync()  # Bound floating-point drift in the running sums
+        return self.values()
+
+    def values(self):
+        """Latest value of every indicator in NAMES, each shaped (symbols,)"""
+        window, count = self.window, self.count
+        nan = np.full(self.last.shape, np.nan)
+        if count >= window:
+            mean = self.sums['close'] / window
+            std = np.sqrt(np.maximum(self.sums['close_sq'] / window - mean * mean, 0.0))
+            mean = mean + self.ref
+            zscore = _zscore(self.last, mean, std)
+        else:
+            mean = std = zscore = nan
+        if count > window:
+            ret_mean = self.sums['ret'] / window
+            vol = np.sqrt(np.maximum(self.sums['ret_sq'] - self.sums['ret'] * ret_mean, 0.0) / (window - 1))
+            if self.periods_per_year:
+                vol = vol * np.sqrt(self.periods_per_year)
+        else:
+            vol = nan
+        line = self.ema['fast'] - self.ema['slow'] if count else nan
+        return {
+            'sma': mean,
+            'ema': self.ema['ema'] if count else nan,
+            'rsi': _rsi_from_averages(self.avg_gain, self.avg_loss) if count > self.rsi_period else nan,
+            'macd': line,
+            'macd_signal': self.ema['signal'] if count else nan,
+            'macd_hist': line - self.ema['signal'] if count else nan,
+            'bb_upper': mean + self.bands * std,
+            'bb_lower': mean - self.bands * std,
+            'volatility': vol,
+            'zscore': zscore,
+        }
+
+
+def to_payload(values, decimals=6):
+    """JSON-ready values or lists with NaN (warming up) as None"""
+    if np.ndim(values) == 0:
+        return None if np.isnan(values) else round(float(values), decimals)
+    rounded = np.round(np.asarray(values, dtype=np.float64), decimals)
+    return [None if value != value else value for value in rounded.tolist()]
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+def latest(symbol):
+    """
+    (timestamp, close, indicator values) for the newest stored bar of a symbol.
+
+    The state is kept per process and advanced with only the bars appended
+    since the last call; after a gap larger than WARMUP_BARS it is rebuilt
+    from the most recent WARMUP_BARS bars.
+    """
+    store = marketdata.get_store()
+    series = store.series(symbol)
+    if not series.rows:
+        raise marketdata.MarketDataError(f'No data for {marketdata.normalize_symbol(symbol)}')
+    key = (store.root, marketdata.normalize_symbol(symbol))
+    closes = series.columns['close']
+    with _states_lock:
+        state, rows = _states.get(key, (None, 0))
+        if state is None or rows > series.rows or series.rows - rows > WARMUP_BARS:
+            state = IndicatorState.from_history(closes[max(series.rows - WARMUP_BARS, 0):series.rows], **DEFAULTS)
+        else:
+            for close in closes[rows:series.rows]:
+                state.update(np.array([close]))
+        _states[key] = (state, series.rows)
+        values = {name: float(value[0]) for name, value in state.values().items()}
+    return int(series.ts[series.rows - 1]), float(closes[series.rows - 1]), values
+
+
+def history(symbol, bars):
+    """Indicator series for the last `bars` stored bars, warmed up on the bars before them"""
+    series = marketdata.get_store().series(symbol)
+    first = max(series.rows - bars - WARMUP_BARS, 0)
+    values = compute(series.columns['close'][first:series.rows], **DEFAULTS)
+    start = max(series.rows - bars, 0) - first
+    return np.asarray(series.ts[first + start:series.rows]), {name: v[start:] for name, v in values.items()}
@@ -0,0 +1,61 @@
+"""
+Cache mirror of account lockout state.
+
+``UserProfile`` remains the source of truth for ``failed_login_attempts`` and
+``account_locked_until``; every profile save copies them into the cache under
+the profile's ``user_id``, and bulk ``update()`` calls on those fields drop
+the entries they touch. ``user_login`` remembers which user an email resolved
+to, so repeated attempts against a locked account are rejected from the
+cache without any queries. Entries expire together with the lock.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from .bloom import normalize_email
+
+KEY_PREFIX = 'lockout:'
+STATE_TIMEOUT = 24 * 60 * 60  # Failure counts for unlocked accounts, and email links
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}user:{user_id}'
+
+
+def _email_key(email):
+    return KEY_PREFIX + hashlib.sha256(normalize_email(email).encode()).hexdigest()
+
+
+def link(email, user_id):
+    """Record that logins with this email are for user_id"""
+    if email:
+        cache.set(_email_key(email), user_id, STATE_TIMEOUT)
+
+
+def get_state(email):
+    """Return {'failed_attempts': int, 'locked_until': epoch seconds or None}, or None"""
+    user_id = cache.get(_email_key(email))
+    return None if user_id is None else cache.get(_key(user_id))
+
+
+def is_locked(email):
+    state = get_state(email)
+    return bool(state and state['locked_until'] and state['locked_until'] > time.time())
+
+
+def remember(user_id, failed_attempts, locked_until):
+    """Mirror the lockout fields of a profile into the cache"""
+    if not failed_attempts and not locked_until:
+        cache.delete(_key(user_id))
+        return
+
+    until = locked_until.timestamp() if locked_until else None
+    remaining = until - time.time() if until else 0
+    timeout = remaining if remaining > 0 else STATE_TIMEOUT
+    cache.set(_key(user_id), {'failed_attempts': failed_attempts, 'locked_until': until}, timeout)
+
+
+def forget(user_ids):
+    """Drop the mirrored state of these users; the next login reads the database"""
+    cache.delete_many([_key(user_id) for user_id in user_ids])
@@ -0,0 +1,44 @@
+"""
+Outgoing mail off the request path.
+
+``send_later`` hands a message to a single background thread once the
+current transaction commits, so a request never waits on the mail server and
+its duration does not depend on whether a message was sent. Messages queued
+in a process that exits before sending them are lost.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.mail import send_mail
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(1, thread_name_prefix='mailer')
+        return _executor
+
+
+def _send(subject, message, recipients):
+    try:
+        send_mail(subject, message, None, recipients)
+    except Exception:
+        logger.exception('Could not send %r to %d recipients', subject, len(recipients))
+
+
+def send_later(subject, message, recipients):
+    """Send a message from the mail thread after the current transaction commits"""
+    transaction.on_commit(lambda: get_executor().submit(_send, subject, message, list(recipients)))
+
+
+def wait(timeout=10):
+    """Block until every message queued so far has been handed to the backend"""
+    get_executor().submit(lambda: None).result(timeout)
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.retrieval import get_store
+
+
+class Command(BaseCommand):
+    help = 'Build the ai_chat retrieval index from the marketing page templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-parse every template, not just changed ones')
+
+    def handle(self, *args, **options):
+        store = get_store()
+        if not store.index_dir:
+            raise CommandError('RETRIEVAL_INDEX_DIR is not set; the index is built in memory on first use')
+
+        start = time.perf_counter()
+        parsed = store.build(force=options['force'])
+        index = store.index
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index.passages)} passages, {len(index.term_ids)} terms in '
+            f'{(time.perf_counter() - start) * 1000:.0f} ms; re-parsed {", ".join(parsed) or "nothing"}'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from main.tokens import expire_tokens
+
+
+class Command(BaseCommand):
+    help = 'Clear expired password reset and email verification tokens'
+
+    def handle(self, *args, **options):
+        reset, verification = expire_tokens()
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {reset} password reset and {verification} email verification tokens'
+        ))
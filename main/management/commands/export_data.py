@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream an export of users or audit tables as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=list(exports.EXPORTS))
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--start', help='Only rows at or after this ISO date/datetime')
+        parser.add_argument('--end', help='Only rows at or before this ISO date/datetime')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per query')
+        parser.add_argument('--output', '-o', help='Output file (defaults to stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            start = exports.parse_bound(options['start'])
+            end = exports.parse_bound(options['end'], end=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['gzip'] and not options['output']:
+            raise CommandError('--gzip needs --output')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        chunks = exports.stream_export(
+            options['export'], options['format'], start, end, options['gzip'], options['chunk_size']
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            self.stderr.write(f"Export written to {options['output']}")
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
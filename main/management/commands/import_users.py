@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.bloom import registered_emails
+from main.models import UserProfile
+from main.views import validate_email, validate_name, validate_password
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+SHOWN_REJECTS = 10  # Printed at the end; the rest are only in the --rejects file
+
+
+def _init_worker():
+    # Spawned (non-forked) workers need their own settings
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'derivity_backend.settings')
+    django.setup()
+
+
+def read_rows(path, fmt):
+    """Yield (line number, dict) from a CSV or JSONL file without loading it whole"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for line_number, row in enumerate(csv.DictReader(f), 2):
+                yield line_number, row
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    yield line_number, None
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create users from a CSV or JSONL file (full_name, email, password, newsletter)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (defaults to the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users per transaction')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes used for password hashing')
+        parser.add_argument('--rejects', help='Write rejected rows and reasons to this JSONL file')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and hash but do not insert')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive')
+
+        self.seen_emails = set()
+        self.taken_usernames = set()
+        self.rejected = 0
+        self.shown_rejects = []
+        # Rejects are written as they happen, so a file of mostly bad rows needs no memory for them
+        self.rejects_file = open(options['rejects'], 'w') if options['rejects'] else None
+        created = 0
+        start = time.perf_counter()
+
+        pool = None
+        if options['workers'] > 1:
+            pool = ProcessPoolExecutor(options['workers'], initializer=_init_worker)
+        try:
+            for batch in batched(read_rows(path, fmt), options['batch_size']):
+                accepted = self.validate_batch(batch)
+                if not accepted:
+                    continue
+
+                passwords = [row['password'] for row in accepted]
+                if pool:
+                    chunksize = max(1, len(passwords) // (options['workers'] * 4))
+                    hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+                else:
+                    hashes = [make_password(p) for p in passwords]
+
+                if not options['dry_run']:
+                    self.insert_batch(accepted, hashes)
+                created += len(accepted)
+
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'  {created} imported, {self.rejected} rejected, {created / elapsed:.0f} rows/s')
+        finally:
+            if pool:
+                pool.shutdown()
+            if self.rejects_file:
+                self.rejects_file.close()
+
+        elapsed = time.perf_counter() - start
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {created} users in {elapsed:.1f}s ({created / elapsed if elapsed else 0:.0f} rows/s); '
+            f'{self.rejected} rejected'
+        ))
+        for reject in self.shown_rejects:
+            self.stderr.write(f"  line {reject['line']}: {reject['reason']}")
+
+    def reject(self, line_number, row, reason):
+        email = row.get('email') if isinstance(row, dict) else None
+        reject = {'line': line_number, 'email': email if isinstance(email, str) else None, 'reason': reason}
+        self.rejected += 1
+        if len(self.shown_rejects) < SHOWN_REJECTS:
+            self.shown_rejects.append(reject)
+        if self.rejects_file:
+            self.rejects_file.write(json.dumps(reject) + '\n')
+
+    def validate_batch(self, batch):
+        """Apply the signup validation rules and drop duplicates; returns cleaned rows"""
+        candidates = []
+        for line_number, row in batch:
+            if not isinstance(row, dict):
+                self.reject(line_number, row, 'Unreadable row')
+                continue
+            full_name = str(row.get('full_name') or row.get('fullName') or '').strip()
+            email = str(row.get('email') or '').strip().lower()
+            password = row.get('password') or None
+
+            for valid, message in (validate_name(full_name), validate_email(email)):
+                if not valid:
+                    self.reject(line_number, row, message)
+                    break
+            else:
+                if password is not None:
+                    if not isinstance(password, str):  # JSONL numbers, lists, ...
+                        self.reject(line_number, row, 'Password must be a string')
+                        continue
+                    valid, message = validate_password(password)
+                    if not valid:
+                        self.reject(line_number, row, message)
+                        continue
+                if email in self.seen_emails:
+                    self.reject(line_number, row, 'Duplicate email in file')
+                    continue
+                self.seen_emails.add(email)
+                newsletter = row.get('newsletter', False)
+                if isinstance(newsletter, str):
+                    newsletter = newsletter.strip().lower() in TRUE_VALUES
+                candidates.append({
+                    'line': line_number, 'full_name': full_name, 'email': email,
+                    'password': password, 'newsletter': bool(newsletter),
+                })
+
+        existing = set(User.objects.filter(
+            email__in=[c['email'] for c in candidates]
+        ).values_list('email', flat=True))
+        accepted = []
+        for candidate in candidates:
+            if candidate['email'] in existing:
+                self.reject(candidate['line'], candidate, 'An account with this email already exists')
+            else:
+                accepted.append(candidate)
+        return accepted
+
+    def assign_usernames(self, rows):
+        """One query per batch instead of a probe loop per user"""
+        bases = [row['email'].split('@')[0][:140] for row in rows]
+        taken = set(User.objects.filter(username__in=bases).values_list('username', flat=True))
+        usernames = []
+        for base in bases:
+            username = base
+            if username in taken or username in self.taken_usernames:
+                username = f"{base}_{uuid.uuid4().hex[:8]}"
+            self.taken_usernames.add(username)
+            usernames.append(username)
+        return usernames
+
+    def insert_batch(self, rows, hashes):
+        users = []
+        for row, username, password_hash in zip(rows, self.assign_usernames(rows), hashes):
+            name_parts = row['full_name'].split()
+            users.append(User(
+                username=username,
+                email=row['email'],
+                password=password_hash,
+                first_name=name_parts[0] if name_parts else '',
+                last_name=' '.join(name_parts[1:]),
+                is_active=True,
+            ))
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(users)
+            if users and users[0].pk is None:
+                # Backends that cannot return ids from a bulk insert
+                ids = dict(User.objects.filter(email__in=[u.email for u in users]).values_list('email', 'pk'))
+                for user in users:
+                    user.pk = ids[user.email]
+            UserProfile.objects.bulk_create([
+                UserProfile(user=user, newsletter_subscription=row['newsletter'], email_verified=False)
+                for user, row in zip(users, rows)
+            ])
+
+        # bulk_create skips post_save, so update the email filter directly
+        for user in users:
+            registered_emails.add(user.email)
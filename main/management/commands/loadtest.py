@@ -0,0 +1,89 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import loadtest
+
+
+class Command(BaseCommand):
+    help = 'Load-test the API and page routes and report latency percentiles, req/s and error rates as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(loadtest.SCENARIOS),
+                            help=f'Comma-separated scenarios: {", ".join(loadtest.SCENARIOS)}')
+        parser.add_argument('--users', type=int, default=100, help='Number of benchmark users to seed')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent clients')
+        parser.add_argument('--workers', choices=['thread', 'process'], default='thread',
+                            help='Run clients as threads or as separate processes')
+        parser.add_argument('--url', help='Target an already running server instead of an in-process one')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--baseline', help='JSON report to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.10,
+                            help='Allowed relative slowdown before a metric counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if any metric regressed against the baseline')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the benchmark users and rows instead of deleting them after the run')
+
+    def handle(self, *args, **options):
+        scenarios = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+        unknown = [s for s in scenarios if s not in loadtest.SCENARIOS]
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+        if options['users'] < 1 or options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--users, --requests and --concurrency must be positive')
+
+        server = None
+        base_url = options['url']
+        try:
+            # Seeding writes to the configured database; the finally block removes it again
+            loadtest.seed_users(options['users'])
+            if not base_url:
+                server, base_url = loadtest.start_server()
+                # Per-request INFO logging from the views would dominate the run
+                logging.disable(logging.INFO)
+
+            results = {}
+            for scenario in scenarios:
+                results[scenario] = loadtest.run_scenario(
+                    base_url, scenario, options['requests'], options['concurrency'],
+                    mode=options['workers'], user_count=options['users']
+                )
+        finally:
+            if server:
+                server.shutdown()
+                logging.disable(logging.NOTSET)
+            if not options['keep']:
+                loadtest.cleanup()
+
+        report = {
+            'meta': {
+                'target': options['url'] or 'in-process',
+                'users': options['users'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'workers': options['workers'],
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'Could not read baseline {options["baseline"]}: {e}')
+            lines, regressions = loadtest.compare(results, baseline, options['tolerance'])
+            for line in lines:
+                self.stderr.write(line)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'Regressions against baseline: {", ".join(regressions)}')
@@ -0,0 +1,58 @@
+import io
+import os
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.middleware import get_profiling_dir
+
+
+class Command(BaseCommand):
+    help = 'Merge sampled request profiles and print the top-N hotspots per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Profile directory (defaults to PROFILING_DIR)')
+        parser.add_argument('--view', action='append', help='Only report these view names (repeatable)')
+        parser.add_argument('--top', type=int, default=20, help='Number of functions to show per view')
+        parser.add_argument('--sort', default='cumulative',
+                            choices=['cumulative', 'tottime', 'ncalls', 'pcalls'],
+                            help='Sort key for the hotspot table')
+
+    def handle(self, *args, **options):
+        profile_dir = options['dir'] or get_profiling_dir()
+        if not os.path.isdir(profile_dir):
+            raise CommandError(f'No profiles found: {profile_dir} does not exist')
+
+        views = sorted(
+            name for name in os.listdir(profile_dir)
+            if os.path.isdir(os.path.join(profile_dir, name))
+        )
+        if options['view']:
+            wanted = {v.replace(':', '.') for v in options['view']}
+            views = [v for v in views if v in wanted]
+
+        reported = 0
+        for view in views:
+            view_dir = os.path.join(profile_dir, view)
+            files = [
+                os.path.join(view_dir, name) for name in sorted(os.listdir(view_dir))
+                if name.endswith('.prof')
+            ]
+            if not files:
+                continue
+
+            stream = io.StringIO()
+            stats = pstats.Stats(files[0], stream=stream)
+            for path in files[1:]:
+                try:
+                    stats.add(path)
+                except (OSError, EOFError, TypeError, ValueError):
+                    self.stderr.write(f'Skipping unreadable profile {path}')
+            stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{view} ({len(files)} samples)'))
+            self.stdout.write(stream.getvalue())
+            reported += 1
+
+        if not reported:
+            raise CommandError('No profiles matched')
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import NewsletterCampaign
+from main.newsletter import send_campaign
+
+
+class Command(BaseCommand):
+    help = 'Send a newsletter campaign to subscribed users, resuming from its last watermark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int)
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Recipients per SMTP connection and watermark save')
+        parser.add_argument('--resend', action='store_true',
+                            help='Start over from the first subscriber even if the campaign was sent')
+
+    def handle(self, *args, **options):
+        try:
+            campaign = NewsletterCampaign.objects.get(pk=options['campaign_id'])
+        except NewsletterCampaign.DoesNotExist:
+            raise CommandError(f"Campaign {options['campaign_id']} does not exist")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        if options['resend']:
+            campaign.status = 'draft'
+            campaign.last_user_id = 0
+            campaign.sent_count = 0
+            campaign.failed_count = 0
+            campaign.save()
+        elif campaign.status == 'sent':
+            raise CommandError(f'Campaign {campaign.pk} was already sent; use --resend to send again')
+        elif campaign.last_user_id:
+            self.stdout.write(f'Resuming after user {campaign.last_user_id} ({campaign.sent_count} already sent)')
+
+        def progress(campaign, sent, elapsed):
+            rate = sent / elapsed if elapsed else 0
+            self.stdout.write(f'  {sent} sent, watermark user {campaign.last_user_id}, {rate:.0f} msg/s')
+
+        sent, elapsed = send_campaign(campaign, options['batch_size'], progress)
+        rate = sent / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {sent} messages in {elapsed:.1f}s ({rate:.0f} msg/s); campaign total {campaign.sent_count}'
+        ))
+        if campaign.failed_count:
+            self.stdout.write(self.style.WARNING(
+                f'{campaign.failed_count} recipients were refused by the mail server (see the log)'
+            ))
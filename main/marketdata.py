@@ -0,0 +1,502 @@
+"""
+Columnar, append-only OHLCV store for the dashboard charts.
+
+Each symbol is a directory under MARKET_DATA_DIR holding one raw
+little-endian file per column (``ts.i8`` epoch seconds, ``open.f8`` ...
+``volume.f8``), readable with ``np.fromfile`` or ``np.memmap``. ``meta.json``
+records how many rows are committed: appends write the column files first
+and the row count last, so a crash mid-append leaves extra bytes that
+readers ignore and the next append truncates.
+
+``ts.idx`` is a sparse index holding every INDEX_STRIDE-th timestamp. A
+range query binary-searches it in memory and then only the one stride of
+the memory-mapped timestamp column on each side, so opening ten years of
+minute bars touches a handful of pages.
+
+Range reads return zero-copy memmap slices. Charts ask for a number of
+points instead: OHLC buckets for candlesticks, min/max buckets that keep
+every peak and trough of a line, or LTTB for the smoothest-looking line.
+Each append also maintains rollups over blocks of ROLLUP_ROWS rows (high,
+low, volume, and the position of the lowest and highest close), so a range
+whose buckets span several blocks is aggregated from the rollups plus the
+partial blocks at its edges, and a decade of minute bars costs about as
+much as a few days.
+"""
+import csv
+import json
+import os
+import re
+import threading
+from datetime import datetime, time, timezone
+
+import numpy as np
+from django.conf import settings
+from django.dispatch import Signal
+from django.utils.dateparse import parse_date, parse_datetime
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+INDEX_STRIDE = 4096
+SYMBOL_RE = re.compile(r'^[A-Z0-9][A-Z0-9.\-=^]{0,19}$')
+DOWNSAMPLE_MODES = ('ohlc', 'minmax', 'lttb')
+LTTB_PRESELECT = 4  # Min/max candidates per output point on long LTTB ranges
+ROLLUP_ROWS = 1024
+# Per-block aggregate files: name -> dtype
+ROLLUPS = {
+    'high.max': '<f8', 'low.min': '<f8', 'volume.sum': '<f8',
+    'close.min': '<f8', 'close.max': '<f8', 'close.argmin': '<i8', 'close.argmax': '<i8',
+}
+
+
+# Sent after bars are committed, with `symbol` and the number of `rows` written
+bars_appended = Signal()
+
+
+class MarketDataError(ValueError):
+    pass
+
+
+def normalize_symbol(symbol):
+    symbol = (symbol or '').strip().upper()
+    if not SYMBOL_RE.match(symbol):
+        raise MarketDataError(f'Invalid symbol: {symbol!r}')
+    return symbol
+
+
+class SymbolSeries:
+    """Memory-mapped columns of one symbol at a fixed committed length"""
+
+    def __init__(self, path, rows):
+        self.rows = rows
+        self.ts = self._map(path, 'ts.i8', np.int64, rows)
+        self.columns = {name: self._map(path, f'{name}.f8', np.float64, rows) for name in COLUMNS}
+        blocks = -(-rows // ROLLUP_ROWS)
+        self.rollups = {name: self._map(path, name, dtype, blocks) for name, dtype in ROLLUPS.items()}
+        sparse_rows = -(-rows // INDEX_STRIDE)
+        self.sparse = np.fromfile(os.path.join(path, 'ts.idx'), dtype='<i8', count=sparse_rows) if rows else \
+            np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def _map(path, name, dtype, rows):
+        dtype = np.dtype(dtype).newbyteorder('<')
+        if not rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(path, name), dtype=dtype, mode='r', shape=(rows,))
+
+    def locate(self, ts, side):
+        """Row position of ts in the timestamp column (np.searchsorted semantics)"""
+        block = max(int(np.searchsorted(self.sparse, ts, side=side)) - 1, 0)
+        lo = block * INDEX_STRIDE
+        hi = min(lo + 2 * INDEX_STRIDE, self.rows)
+        return lo + int(np.searchsorted(self.ts[lo:hi], ts, side=side))
+
+    def slice(self, start=None, end=None):
+        """Row range [first, last) covering start <= ts <= end"""
+        first = self.locate(start, 'left') if start is not None else 0
+        last = self.locate(end, 'right') if end is not None else self.rows
+        return first, max(first, last)
+
+    def elements(self, first, last):
+        """
+        Rows [first, last) as raw rows at the edges plus whole rollup blocks
+        in between; 'row' is where each element starts
+        """
+        a, b = -(-first // ROLLUP_ROWS), last // ROLLUP_ROWS
+        head, tail = np.arange(first, a * ROLLUP_ROWS), np.arange(b * ROLLUP_ROWS, last)
+        block_rows = np.arange(a, b) * ROLLUP_ROWS
+        columns, rollups = self.columns, self.rollups
+
+        def join(raw, rolled):
+            return np.concatenate((raw[head], rolled, raw[tail]))
+
+        return {
+            'row': np.concatenate((head, block_rows, tail)),
+            'open': join(columns['open'], columns['open'][block_rows]),
+            'high': join(columns['high'], rollups['high.max'][a:b]),
+            'low': join(columns['low'], rollups['low.min'][a:b]),
+            'close': join(columns['close'], columns['close'][block_rows + ROLLUP_ROWS - 1]),
+            'volume': join(columns['volume'], rollups['volume.sum'][a:b]),
+            'min': join(columns['close'], rollups['close.min'][a:b]),
+            'max': join(columns['close'], rollups['close.max'][a:b]),
+            'min_row': np.concatenate((head, rollups['close.argmin'][a:b], tail)),
+            'max_row': np.concatenate((head, rollups['close.argmax'][a:b], tail)),
+        }
+
+    def downsample(self, first, last, points, mode='ohlc'):
+        """Rows [first, last) reduced to about `points` points, from the rollups when buckets are large"""
+        if mode not in DOWNSAMPLE_MODES:
+            raise MarketDataError(f'Mode must be one of {", ".join(DOWNSAMPLE_MODES)}')
+        n = last - first
+        buckets = {'ohlc': points, 'minmax': points // 2, 'lttb': points * LTTB_PRESELECT // 2}[mode]
+        if n < 2 * ROLLUP_ROWS * max(buckets, 1):
+            data = {'ts': self.ts[first:last]}
+            data.update((name, column[first:last]) for name, column in self.columns.items())
+            return downsample(data, points, mode)
+
+        # Every bucket spans at least two blocks, so each holds at least one element
+        elements = self.elements(first, last)
+        starts = np.searchsorted(elements['row'], first + _buckets(n, buckets))
+        if mode == 'ohlc':
+            return _aggregate_ohlc(self.ts[elements['row'][starts]], elements, starts)
+        rows = np.concatenate((
+            elements['min_row'][_bucket_extremes(elements['min'], starts, np.minimum)],
+            elements['max_row'][_bucket_extremes(elements['max'], starts, np.maximum)],
+        ))
+        if mode == 'lttb':
+            rows = np.append(rows, [first, last - 1])
+        rows = np.unique(rows)
+        ts, close = np.asarray(self.ts[rows]), np.asarray(self.columns['close'][rows])
+        if mode == 'lttb':
+            ts, close = downsample_lttb(ts, close, points)
+        return {'ts': ts, 'close': close}
+
+
+class MarketDataStore:
+    def __init__(self, root):
+        self.root = str(root)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol):
+        return os.path.join(self.root, normalize_symbol(symbol))
+
+    def _meta(self, path):
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'rows': 0}
+
+    def _committed_rows(self, path):
+        return self._meta(path)['rows']
+
+    def has(self, symbol):
+        return os.path.exists(os.path.join(self._path(symbol), 'meta.json'))
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, 'meta.json')))
+
+    def series(self, symbol):
+        """Current SymbolSeries, reopened only when rows were appended since the last call"""
+        path = self._path(symbol)
+        rows = self._committed_rows(path)
+        cached = self._series.get(path)
+        if cached is None or cached.rows != rows:
+            if not rows and not os.path.isdir(path):
+                raise MarketDataError(f'No data for {os.path.basename(path)}')
+            cached = SymbolSeries(path, rows)
+            self._series[path] = cached
+        return cached
+
+    def read(self, symbol, start=None, end=None):
+        """Columns for start <= ts <= end as zero-copy memmap slices"""
+        series = self.series(symbol)
+        first, last = series.slice(start, end)
+        data = {'ts': series.ts[first:last]}
+        for name in COLUMNS:
+            data[name] = series.columns[name][first:last]
+        return data
+
+    def query(self, symbol, start=None, end=None, points=500, mode='ohlc'):
+        """(rows in start <= ts <= end, those rows downsampled to about `points` points)"""
+        series = self.series(symbol)
+        first, last = series.slice(start, end)
+        return last - first, series.downsample(first, last, points, mode)
+
+    def append(self, symbol, ts, open_, high, low, close, volume):
+        """
+        Append bars in time order; returns the number of rows written.
+
+        Bars at or before the last stored timestamp are skipped, so
+        re-importing overlapping history is harmless. One writer per symbol.
+        """
+        path = self._path(symbol)
+        ts = np.asarray(ts, dtype=np.int64)
+        values = [np.asarray(v, dtype=np.float64) for v in (open_, high, low, close, volume)]
+        if any(len(v) != len(ts) for v in values):
+            raise MarketDataError('All columns must have the same length')
+        if len(ts) > 1 and np.any(np.diff(ts) <= 0):
+            order = np.argsort(ts, kind='stable')
+            ts = ts[order]
+            values = [v[order] for v in values]
+            keep = np.concatenate(([True], np.diff(ts) > 0))  # Drop duplicate timestamps
+            ts = ts[keep]
+            values = [v[keep] for v in values]
+
+        written = self._append(path, ts, values)
+        if written:
+            bars_appended.send_robust(sender=MarketDataStore, store=self, symbol=os.path.basename(path), rows=written)
+        return written
+
+    def _append(self, path, ts, values):
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            meta = self._meta(path)
+            rows = meta['rows']
+            if rows:
+                newer = ts > meta['last_ts']
+                ts = ts[newer]
+                values = [v[newer] for v in values]
+            if not len(ts):
+                return 0
+
+            for name, column, dtype in [('ts.i8', ts, '<i8')] + [
+                (f'{name}.f8', v, '<f8') for name, v in zip(COLUMNS, values)
+            ]:
+                with open(os.path.join(path, name), 'ab') as f:
+                    f.truncate(rows * 8)  # Discard bytes from an interrupted append
+                    f.write(column.astype(dtype, copy=False).tobytes())
+
+            # Sparse index entries for every stride boundary the new rows cross
+            total = rows + len(ts)
+            first_entry = -(-rows // INDEX_STRIDE)
+            positions = np.arange(first_entry * INDEX_STRIDE, total, INDEX_STRIDE) - rows
+            with open(os.path.join(path, 'ts.idx'), 'ab') as f:
+                f.truncate(first_entry * 8)
+                f.write(ts[positions].astype('<i8').tobytes())
+            self._write_rollups(path, rows, dict(zip(COLUMNS, values)))
+
+            tmp_path = os.path.join(path, 'meta.json.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'rows': total, 'first_ts': meta.get('first_ts', int(ts[0])), 'last_ts': int(ts[-1])}, f)
+            os.replace(tmp_path, os.path.join(path, 'meta.json'))
+            return len(ts)
+
+    @staticmethod
+    def _write_rollups(path, rows, new):
+        """Recompute rollups from the last (partial) block stored before this append onwards"""
+        first_block = rows // ROLLUP_ROWS
+        base = first_block * ROLLUP_ROWS
+
+        def tail(name):
+            stored = np.fromfile(os.path.join(path, f'{name}.f8'), dtype='<f8', count=rows - base, offset=base * 8)
+            return np.concatenate((stored, new[name]))
+
+        high, low, close, volume = tail('high'), tail('low'), tail('close'), tail('volume')
+        starts = np.arange(0, len(close), ROLLUP_ROWS)
+        lows, highs = _block_argextremes(close, ROLLUP_ROWS, len(starts))
+        rollups = {
+            'high.max': np.maximum.reduceat(high, starts),
+            'low.min': np.minimum.reduceat(low, starts),
+            'volume.sum': np.add.reduceat(volume, starts),
+            'close.min': close[lows], 'close.max': close[highs],
+            'close.argmin': base + lows, 'close.argmax': base + highs,
+        }
+        for name, dtype in ROLLUPS.items():
+            with open(os.path.join(path, name), 'ab') as f:
+                f.truncate(first_block * 8)
+                f.write(rollups[name].astype(dtype).tobytes())
+
+    def info(self, symbol):
+        """Committed row count and first/last timestamps"""
+        return self._meta(self._path(symbol))
+
+
+def _buckets(n, points):
+    """Start offsets of `points` equal-count buckets over n rows"""
+    return np.linspace(0, n, points + 1).astype(np.int64)[:-1]
+
+
+def _aggregate_ohlc(ts, data, starts):
+    """One candle per bucket of rows beginning at `starts`; ts is each bucket's first timestamp"""
+    ends = np.append(starts[1:], len(data['close'])) - 1
+    return {
+        'ts': np.asarray(ts),
+        'open': np.asarray(data['open'][starts]),
+        'high': np.maximum.reduceat(data['high'], starts),
+        'low': np.minimum.reduceat(data['low'], starts),
+        'close': np.asarray(data['close'][ends]),
+        'volume': np.add.reduceat(data['volume'], starts),
+    }
+
+
+def downsample_ohlc(data, points):
+    n = len(data['ts'])
+    if n <= points:
+        return {key: np.asarray(values) for key, values in data.items()}
+    starts = _buckets(n, points)
+    return _aggregate_ohlc(data['ts'][starts], data, starts)
+
+
+def _block_argextremes(values, size, count):
+    """Positions of the min and max of `count` blocks of `size` rows; the last block takes the remainder"""
+    # Whole blocks as a zero-copy 2-D view: one pass, no temporaries
+    body = values[:(count - 1) * size].reshape(count - 1, size)
+    offsets = np.arange(count - 1) * size
+    tail_start = (count - 1) * size
+    tail = values[tail_start:]
+    lows = np.append(offsets + body.argmin(axis=1), tail_start + tail.argmin())
+    highs = np.append(offsets + body.argmax(axis=1), tail_start + tail.argmax())
+    return lows, highs
+
+
+def _bucket_extremes(values, starts, reduce):
+    """Index of the first min (reduce=np.minimum) or max of each bucket of values beginning at `starts`"""
+    counts = np.diff(np.append(starts, len(values)))
+    hits = np.flatnonzero(values == np.repeat(reduce.reduceat(values, starts), counts))
+    return hits[np.searchsorted(hits, starts)]
+
+
+def downsample_minmax(ts, values, points):
+    """Keep the minimum and maximum of each bucket, in time order (up to `points` points)"""
+    n = len(ts)
+    if n <= points:
+        return np.asarray(ts), np.asarray(values)
+    buckets = max(points // 2, 1)
+    positions = np.unique(np.concatenate(_block_argextremes(values, n // buckets, buckets)))
+    return np.asarray(ts[positions]), np.asarray(values[positions])
+
+
+def downsample_lttb(ts, values, points):
+    """Largest-Triangle-Three-Buckets: keeps the points that shape the line"""
+    n = len(ts)
+    if n <= points:
+        return np.asarray(ts), np.asarray(values)
+    if points < 3:  # No bucket between the endpoints to pick from
+        positions = [0, n - 1][:max(points, 0)]
+        return np.asarray(ts)[positions], np.asarray(values)[positions]
+    if n > points * LTTB_PRESELECT:
+        # MinMaxLTTB: LTTB only ever picks a bucket extreme, so run it on
+        # min/max candidates instead of every row of a long range
+        buckets = points * LTTB_PRESELECT // 2
+        positions = np.unique(np.concatenate(([0, n - 1],) + _block_argextremes(values, n // buckets, buckets)))
+        ts, values = ts[positions], values[positions]
+        n = len(positions)
+    x = np.asarray(ts, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    # Average of every bucket is needed as the "next point"; compute them all at once
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    avg_x = np.append(sums_x / sizes, x[-1])
+    avg_y = np.append(sums_y / sizes, y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return x[selected].astype(np.int64), y[selected]
+
+
+def downsample(data, points, mode='ohlc'):
+    """Reduce a range read to about `points` points"""
+    if mode == 'ohlc':
+        return downsample_ohlc(data, points)
+    if mode == 'minmax':
+        ts, close = downsample_minmax(data['ts'], data['close'], points)
+    elif mode == 'lttb':
+        ts, close = downsample_lttb(data['ts'], data['close'], points)
+    else:
+        raise MarketDataError(f'Mode must be one of {", ".join(DOWNSAMPLE_MODES)}')
+    return {'ts': ts, 'close': close}
+
+
+def synthetic_bars(n, start_ts=1_262_304_000, step=60, price=100.0, volatility=0.2, seed=0):
+    """Geometric Brownian motion OHLCV bars, for demos, tests and benchmarks"""
+    rng = np.random.default_rng(seed)
+    dt = step / (365 * 24 * 3600)
+    returns = rng.normal(-0.5 * volatility ** 2 * dt, volatility * np.sqrt(dt), n)
+    close = price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate(([price], close[:-1]))
+    spread = np.abs(rng.normal(0, volatility * np.sqrt(dt), n)) * close
+    return {
+        'ts': start_ts + step * np.arange(n, dtype=np.int64),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.gamma(2.0, 500.0, n).round(),
+    }
+
+
+def parse_time(value, end=False):
+    """Epoch seconds from epoch digits or an ISO date/datetime (UTC unless an offset is given)"""
+    if not value:
+        return None
+    if value.lstrip('-').isdigit():
+        return int(value)
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day, time.max if end else time.min)  # Dates cover the whole day
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise MarketDataError(f'Invalid time: {value!r}')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def to_payload(data, decimals=4):
+    """JSON-ready columns; prices are rounded so the payload stays small"""
+    payload = {}
+    for name, values in data.items():
+        if name == 'ts':
+            payload[name] = np.asarray(values).tolist()
+        elif name == 'volume':
+            payload[name] = np.rint(values).astype(np.int64).tolist()
+        else:
+            payload[name] = np.round(values, decimals).tolist()
+    return payload
+
+
+TIME_HEADERS = ('timestamp', 'time', 'datetime', 'date', 'ts')
+
+
+def _parse_timestamps(values):
+    if all(v.lstrip('-').isdigit() for v in values[:10]):
+        ts = np.array(values, dtype=np.int64)
+        return ts // 1000 if ts.size and abs(ts[0]) > 10**11 else ts  # Milliseconds
+    cleaned = [v.strip().rstrip('Z').replace(' ', 'T') for v in values]
+    return np.array(cleaned, dtype='datetime64[s]').astype(np.int64)
+
+
+def read_csv(f, chunk_rows=100_000):
+    """
+    Yield column dicts from a CSV with a header row, chunk_rows at a time.
+
+    The time column may hold epoch seconds, epoch milliseconds or ISO
+    datetimes (treated as UTC); a missing volume column is read as zero.
+    """
+    reader = csv.reader(f)
+    header = [h.strip().lower() for h in next(reader)]
+    try:
+        time_col = next(header.index(h) for h in TIME_HEADERS if h in header)
+        price_cols = [header.index(name) for name in COLUMNS[:4]]
+    except (StopIteration, ValueError):
+        raise MarketDataError(f'CSV needs a time column and open, high, low, close; got {", ".join(header)}')
+    volume_col = header.index('volume') if 'volume' in header else None
+
+    while True:
+        rows = [row for _, row in zip(range(chunk_rows), reader) if row]
+        if not rows:
+            return
+        chunk = {'ts': _parse_timestamps([row[time_col] for row in rows])}
+        for name, col in zip(COLUMNS[:4], price_cols):
+            chunk[name] = np.array([row[col] for row in rows], dtype=np.float64)
+        if volume_col is None:
+            chunk['volume'] = np.zeros(len(rows))
+        else:
+            chunk['volume'] = np.array([row[volume_col] or 0 for row in rows], dtype=np.float64)
+        yield chunk
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    root = str(getattr(settings, 'MARKET_DATA_DIR', os.path.join(settings.BASE_DIR, 'var', 'market')))
+    with _store_lock:
+        if _store is None or _store.root != root:
+            _store = MarketDataStore(root)
+        return _store
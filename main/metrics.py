@@ -0,0 +1,292 @@
+"""
+Per-process request metrics with Prometheus text-format export.
+
+Each thread writes into its own shard, so recording a request never takes a
+lock. Shards are merged when the process flushes its totals to
+``METRICS_DIR/<pid>.json``; the ``/metrics`` view sums every file in that
+directory so the numbers cover all worker processes.
+
+Nothing is dropped when threads or workers go away, so counters never go
+backwards: a finished thread's shard is folded into the process total, and
+the file of a worker that has exited is folded into ``retired.json`` and
+removed. The directory must therefore belong to the workers of one host.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRICS = {
+    'derivity_http_requests_total': (
+        'counter', 'Total HTTP requests by view, method and status.'),
+    'derivity_http_request_duration_seconds': (
+        'histogram', 'Request latency in seconds by view.'),
+    'derivity_http_response_size_bytes': (
+        'histogram', 'Response body size in bytes by view.'),
+    'derivity_db_queries_total': (
+        'counter', 'Database queries executed while handling requests, by view.'),
+    'derivity_db_query_duration_seconds_total': (
+        'counter', 'Time spent in database queries, by view.'),
+}
+
+RETIRED = 'retired.json'
+
+_shards = []
+_shards_lock = threading.Lock()
+_local = threading.local()
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+
+
+class _Shard:
+    """Counters and histograms written by a single thread"""
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        hist = self.histograms.get(key)
+        if hist is None:
+            # One slot per bucket plus +Inf, then sum and count
+            hist = [0] * (len(buckets) + 3)
+            self.histograms[key] = hist
+        index = len(buckets)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                index = i
+                break
+        hist[index] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _Shard(threading.current_thread())
+        _local.shard = shard
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+_finished = _Shard()  # Totals of threads that have exited
+
+
+def _fold_finished_threads():
+    """Move the shards of exited threads into _finished so they can be freed"""
+    with _shards_lock:
+        done = [shard for shard in _shards if not shard.thread.is_alive()]
+        if not done:
+            return
+        _shards[:] = [shard for shard in _shards if shard.thread.is_alive()]
+        for shard in done:
+            for key, value in shard.counters.items():
+                _finished.counters[key] = _finished.counters.get(key, 0) + value
+            for key, hist in shard.histograms.items():
+                _merge_histogram(_finished.histograms, key, list(hist))
+
+
+def record_request(view, method, status, duration, query_count, query_time, size=None):
+    """Record one handled request into the calling thread's shard"""
+    shard = _shard()
+    shard.inc('derivity_http_requests_total', (('view', view), ('method', method), ('status', str(status))))
+    labels = (('view', view),)
+    shard.observe('derivity_http_request_duration_seconds', labels, duration, LATENCY_BUCKETS)
+    shard.inc('derivity_db_queries_total', labels, query_count)
+    shard.inc('derivity_db_query_duration_seconds_total', labels, query_time)
+    if size is not None:
+        shard.observe('derivity_http_response_size_bytes', labels, size, SIZE_BUCKETS)
+
+
+def snapshot():
+    """Merge every thread shard of this process into one snapshot"""
+    _fold_finished_threads()
+    counters = {}
+    histograms = {}
+    with _shards_lock:  # A fold must not be seen half done
+        for shard in [_finished] + _shards:
+            for key, value in shard.counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, hist in shard.histograms.copy().items():
+                _merge_histogram(histograms, key, list(hist))
+    return counters, histograms
+
+
+def _merge_histogram(histograms, key, hist):
+    existing = histograms.get(key)
+    if existing is None:
+        histograms[key] = hist
+    else:
+        for i, value in enumerate(hist):
+            existing[i] += value
+
+
+def get_metrics_dir():
+    """Return the shared metrics directory, or None for single-process mode"""
+    metrics_dir = getattr(settings, 'METRICS_DIR', None)
+    return str(metrics_dir) if metrics_dir else None
+
+
+def flush(force=False):
+    """Write this process's totals to the shared directory if the interval has passed"""
+    global _last_flush
+    metrics_dir = get_metrics_dir()
+    if not metrics_dir:
+        return
+    now = time.monotonic()
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+    if not force and now - _last_flush < interval:
+        return
+    if not _flush_lock.acquire(blocking=force):
+        return  # Another thread is already flushing
+    try:
+        _last_flush = now
+        os.makedirs(metrics_dir, exist_ok=True)
+        _write(metrics_dir, f'{os.getpid()}.json', *snapshot())
+    finally:
+        _flush_lock.release()
+
+
+def _write(metrics_dir, filename, counters, histograms):
+    payload = {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, hist] for (name, labels), hist in histograms.items()],
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=metrics_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, os.path.join(metrics_dir, filename))
+
+
+def _read(path, counters, histograms):
+    """Add a flushed file's totals to counters and histograms"""
+    with open(path) as f:
+        payload = json.load(f)
+    for name, labels, value in payload.get('counters', []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, hist in payload.get('histograms', []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        _merge_histogram(histograms, key, hist)
+
+
+def _exited(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass  # Alive, under another user
+    return False
+
+
+def _retire_exited_workers(metrics_dir):
+    """Fold the files of workers that have exited into RETIRED and remove them"""
+    exited = [filename for filename in os.listdir(metrics_dir)
+              if filename.endswith('.json') and filename[:-5].isdigit() and _exited(int(filename[:-5]))]
+    if not exited:
+        return
+    counters, histograms = {}, {}
+    retired = os.path.join(metrics_dir, RETIRED)
+    if os.path.exists(retired):
+        _read(retired, counters, histograms)
+    folded = []
+    for filename in exited:
+        path = os.path.join(metrics_dir, filename)
+        try:
+            _read(path, counters, histograms)
+        except (OSError, ValueError):
+            continue
+        folded.append(path)
+    if folded:
+        _write(metrics_dir, RETIRED, counters, histograms)
+        for path in folded:
+            os.remove(path)
+
+
+def collect():
+    """Return counters and histograms aggregated across all worker processes"""
+    metrics_dir = get_metrics_dir()
+    if not metrics_dir:
+        return snapshot()
+
+    flush(force=True)
+    counters = {}
+    histograms = {}
+    with open(os.path.join(metrics_dir, 'collect.lock'), 'a') as lock:
+        # Collectors take turns, so none counts a file both before and after it is retired
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _retire_exited_workers(metrics_dir)
+        for filename in os.listdir(metrics_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                _read(os.path.join(metrics_dir, filename), counters, histograms)
+            except (OSError, ValueError):
+                continue  # File replaced mid-read
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(counters, histograms):
+    """Render aggregated metrics in the Prometheus text exposition format"""
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        if metric_type == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+            continue
+
+        buckets = LATENCY_BUCKETS if name.endswith('_seconds') else SIZE_BUCKETS
+        for (metric, labels), hist in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), hist[:-2]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_number(float(bound))
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(hist[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {hist[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clear this process's in-memory metrics (used by tests)"""
+    for shard in [_finished] + _shards:
+        shard.counters.clear()
+        shard.histograms.clear()
@@ -0,0 +1,228 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+
+from . import ippolicy, metrics
+from .views import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+# Held while a request is profiled. Python 3.12+ allows one active profiler per
+# process, and a profiler enabled around an awaiting coroutine also records
+# whatever else the event loop runs, so requests are profiled one at a time
+# and any that arrive meanwhile run unprofiled.
+_profiling = threading.Lock()
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries and their total time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware that runs natively in both WSGI and ASGI handlers"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class RequestMetricsMiddleware(AsyncCapableMiddleware):
+    """Record latency, status, query count and response size for every request"""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, counter)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        # The async ORM runs queries in the request's sync thread with the
+        # same connection object, so the wrapper still sees them
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, counter)
+        return response
+
+    def record(self, request, response, duration, counter):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        metrics.record_request(
+            view, request.method, response.status_code,
+            duration, counter.count, counter.duration, size
+        )
+        metrics.flush()
+
+
+class IPPolicyMiddleware(AsyncCapableMiddleware):
+    """Reject requests to the authentication endpoints from blocklisted networks"""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.paths = tuple(getattr(settings, 'IP_POLICY_PATHS', ()))
+        configured = getattr(settings, 'IP_BLOCKLIST_FILE', None) or getattr(settings, 'IP_ALLOWLIST_FILE', None)
+        self.loader = ippolicy.get_loader() if configured and self.paths else None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.blocked_response(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.blocked_response(request) or await self.get_response(request)
+
+    def blocked_response(self, request):
+        if self.loader is not None and request.path.startswith(self.paths):
+            client_ip = get_client_ip(request)
+            if self.loader.get().is_blocked(client_ip):
+                logger.warning(f"Blocked {request.method} {request.path} from IP {client_ip}")
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Access from your network has been blocked.'
+                }, status=403)
+        return None
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Opt-in cProfile sampling of view execution.
+
+    A request is profiled when PROFILING_ENABLED is set and either a random
+    draw falls under PROFILING_SAMPLE_RATE or a staff user sends the
+    PROFILING_HEADER header. Stats are written to
+    PROFILING_DIR/<view name>/ and the oldest files are removed once
+    PROFILING_MAX_FILES is exceeded. Must come after AuthenticationMiddleware.
+    Only one request per process is profiled at a time.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'PROFILING_ENABLED', False)
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.header = getattr(settings, 'PROFILING_HEADER', 'X-Profile')
+        self.max_files = getattr(settings, 'PROFILING_MAX_FILES', 500)
+        if self.async_mode:
+            # A sync process_view would cost every ASGI request a thread hop
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        # In async mode this returns the coroutine for the handler to await
+        return self.get_response(request)
+
+    def sampled(self, request):
+        return self.enabled and bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def should_profile(self, request):
+        if not self.enabled:
+            return False
+        if self.sampled(request):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(request.headers.get(self.header) and user is not None and user.is_staff)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.should_profile(request) or not _profiling.acquire(blocking=False):
+            return None
+
+        profiler = cProfile.Profile()
+        try:
+            response = profiler.runcall(view_func, request, *view_args, **view_kwargs)
+        finally:
+            _profiling.release()
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        write_profile(profiler, view, self.max_files)
+        return response
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled:
+            return None
+        if not self.sampled(request):
+            if not request.headers.get(self.header):
+                return None
+            user = await request.auser()
+            if not user.is_staff:
+                return None
+
+        if not _profiling.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            if iscoroutinefunction(view_func):
+                # Unprofiled requests on the event loop are still captured while this one awaits
+                profiler.enable()
+                try:
+                    response = await view_func(request, *view_args, **view_kwargs)
+                finally:
+                    profiler.disable()
+            else:
+                response = await sync_to_async(profiler.runcall)(view_func, request, *view_args, **view_kwargs)
+        finally:
+            _profiling.release()
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        await sync_to_async(write_profile)(profiler, view, self.max_files)
+        return response
+
+
+def get_profiling_dir():
+    return str(getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'var', 'profiles')))
+
+
+def write_profile(profiler, view, max_files):
+    """Dump stats under the view's directory and rotate out the oldest files"""
+    profile_dir = get_profiling_dir()
+    view_dir = os.path.join(profile_dir, view.replace(':', '.').replace(os.sep, '_'))
+    os.makedirs(view_dir, exist_ok=True)
+    filename = f'{time.time():.6f}-{os.getpid()}-{random.getrandbits(32):08x}.prof'
+    profiler.dump_stats(os.path.join(view_dir, filename))
+
+    files = []
+    for dirpath, _, names in os.walk(profile_dir):
+        files.extend(os.path.join(dirpath, name) for name in names if name.endswith('.prof'))
+    if len(files) > max_files:
+        files.sort(key=os.path.basename)  # Names start with the write timestamp
+        for path in files[:len(files) - max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Already rotated by another worker
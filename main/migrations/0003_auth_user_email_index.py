@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index auth_user.email, which login and the email availability check filter on"""
+
+    dependencies = [
+        ('main', '0002_rename_last_login_userprofile_account_locked_until_and_more'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS main_auth_user_email_idx ON auth_user (email);',
+            reverse_sql='DROP INDEX IF EXISTS main_auth_user_email_idx;',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_auth_user_email_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='email_verification_expires',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='email_verification_token',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='password_reset_expires',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='password_reset_token',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_newsletter_campaign'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS main_auth_user_joined_idx ON auth_user (date_joined, id);',
+            reverse_sql='DROP INDEX IF EXISTS main_auth_user_joined_idx;',
+        ),
+        migrations.AddIndex(
+            model_name='aiconversation',
+            index=models.Index(fields=['created_at', 'id'], name='main_conversation_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['created_at', 'id'], name='main_contact_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['timestamp', 'id'], name='main_loginattempt_ts_idx'),
+        ),
+    ]
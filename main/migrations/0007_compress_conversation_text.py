@@ -0,0 +1,88 @@
+from django.db import migrations, models
+
+import main.fields
+
+BATCH_SIZE = 500
+
+
+def copy_batches(apps, source_fields, target_fields):
+    """Copy conversation text between column pairs in primary-key batches"""
+    AIConversation = apps.get_model('main', 'AIConversation')
+    last_pk = 0
+    while True:
+        rows = list(
+            AIConversation.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', *source_fields)[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        AIConversation.objects.bulk_update([
+            AIConversation(pk=row[0], **dict(zip(target_fields, row[1:]))) for row in rows
+        ], target_fields)
+        last_pk = rows[-1][0]
+
+
+def compress(apps, schema_editor):
+    copy_batches(apps, ['message', 'response'], ['message_packed', 'response_packed'])
+
+
+def decompress(apps, schema_editor):
+    copy_batches(apps, ['message_packed', 'response_packed'], ['message', 'response'])
+
+
+class Migration(migrations.Migration):
+    """
+    Move AIConversation.message/response to compressed binary columns.
+
+    New columns are added alongside the text ones, filled in batches, and
+    then renamed into place, so the conversion works on every backend.
+    """
+
+    dependencies = [
+        ('main', '0006_export_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiconversation',
+            name='message_packed',
+            field=main.fields.CompressedTextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='aiconversation',
+            name='response_packed',
+            field=main.fields.CompressedTextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(compress, decompress),
+        # Give the text columns a default so unapplying can add them back to filled tables
+        migrations.AlterField(
+            model_name='aiconversation',
+            name='message',
+            field=models.TextField(default=''),
+        ),
+        migrations.AlterField(
+            model_name='aiconversation',
+            name='response',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='aiconversation',
+            name='message',
+        ),
+        migrations.RemoveField(
+            model_name='aiconversation',
+            name='response',
+        ),
+        migrations.RenameField(
+            model_name='aiconversation',
+            old_name='message_packed',
+            new_name='message',
+        ),
+        migrations.RenameField(
+            model_name='aiconversation',
+            old_name='response_packed',
+            new_name='response',
+        ),
+    ]
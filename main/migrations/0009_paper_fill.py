@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_risk_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaperFill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('price', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('quantity', models.PositiveIntegerField()),
+                ('buy_order_id', models.BigIntegerField()),
+                ('sell_order_id', models.BigIntegerField()),
+                ('aggressor', models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell')], max_length=4)),
+                ('executed_at', models.DateTimeField()),
+                ('buyer', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='paper_buys', to=settings.AUTH_USER_MODEL)),
+                ('seller', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='paper_sells', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-executed_at'],
+                'indexes': [models.Index(fields=['buyer', 'executed_at'], name='main_fill_buyer_idx'), models.Index(fields=['seller', 'executed_at'], name='main_fill_seller_idx'), models.Index(fields=['symbol', 'executed_at'], name='main_fill_symbol_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_risk_job_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newslettercampaign',
+            name='failed_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -4,6 +4,8 @@ from django.core.validators import RegexValidator
 from django.utils import timezone
 import uuid
 
+from .fields import CompressedTextField
+
 class ContactMessage(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -16,6 +18,23 @@ class ContactMessage(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='main_contact_created_idx'),
+        ]
+
+class UserProfileQuerySet(models.QuerySet):
+    LOCKOUT_FIELDS = {'failed_login_attempts', 'account_locked_until'}
+
+    def update(self, **kwargs):
+        """Bulk updates skip post_save, so drop the lockout mirror of every row they change"""
+        if self.LOCKOUT_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        from . import lockout
+        user_ids = list(self.values_list('user_id', flat=True))
+        rows = super().update(**kwargs)
+        lockout.forget(user_ids)
+        return rows
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -27,14 +46,18 @@ class UserProfile(models.Model):
     )
     newsletter_subscription = models.BooleanField(default=False)
     email_verified = models.BooleanField(default=False)
-    email_verification_token = models.CharField(max_length=100, blank=True, null=True)
-    password_reset_token = models.CharField(max_length=100, blank=True, null=True)
-    password_reset_expires = models.DateTimeField(blank=True, null=True)
+    # Token fields hold a SHA-256 hash of the token, never the token itself
+    email_verification_token = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    email_verification_expires = models.DateTimeField(blank=True, null=True, db_index=True)
+    password_reset_token = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    password_reset_expires = models.DateTimeField(blank=True, null=True, db_index=True)
     last_login_ip = models.GenericIPAddressField(blank=True, null=True)
     failed_login_attempts = models.IntegerField(default=0)
     account_locked_until = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserProfileQuerySet.as_manager()
     
     def __str__(self):
         return f"Profile for {self.user.username}"
@@ -57,12 +80,19 @@ class UserProfile(models.Model):
         if self.failed_login_attempts >= 5:  # Lock after 5 failed attempts
             self.account_locked_until = timezone.now() + timezone.timedelta(minutes=30)
         self.save()
+    
+    class Meta:
+        indexes = [
+            # Newsletter sends walk subscribers in user_id order
+            models.Index(fields=['newsletter_subscription', 'user'], name='main_profile_newsletter_idx'),
+        ]
 
 class AIConversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     session_id = models.CharField(max_length=100, unique=True, default=uuid.uuid4)
-    message = models.TextField()
-    response = models.TextField()
+    # Model output runs to several KB per turn; stored zlib-compressed
+    message = CompressedTextField()
+    response = CompressedTextField()
     created_at = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     
@@ -71,6 +101,9 @@ class AIConversation(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='main_conversation_created_idx'),
+        ]
 
 class LoginAttempt(models.Model):
     """Track login attempts for security monitoring"""
@@ -88,3 +121,93 @@ class LoginAttempt(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Date-range exports page through (timestamp, id)
+            models.Index(fields=['timestamp', 'id'], name='main_loginattempt_ts_idx'),
+        ]
+
+class NewsletterCampaign(models.Model):
+    """A newsletter mailing with a resumable send watermark"""
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+    ]
+    
+    subject = models.CharField(max_length=200)
+    # Supports $first_name, $last_name, $full_name and $email placeholders
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    last_user_id = models.BigIntegerField(default=0)  # Highest recipient user id already sent
+    sent_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)  # Recipients the server refused; skipped, not retried
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.subject} ({self.get_status_display()})"
+    
+    class Meta:
+        ordering = ['-created_at']
+
+class RiskJob(models.Model):
+    """A Monte Carlo VaR/CVaR simulation submitted through the API and polled for its result"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Random so job URLs cannot be enumerated
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='risk_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    params = models.JSONField()
+    runner = models.CharField(max_length=32, blank=True)  # The process running the job (risk.RUNNER)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)  # Refreshed by that process while the job is active
+    progress = models.FloatField(default=0.0)  # Fraction of paths simulated
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"Risk job {str(self.id)[:8]} ({self.get_status_display()})"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'heartbeat_at'], name='main_riskjob_active_idx'),
+        ]
+
+class PaperFill(models.Model):
+    """A paper-trading execution, written in batches by the matching engine"""
+    AGGRESSOR_CHOICES = [
+        ('buy', 'Buy'),
+        ('sell', 'Sell'),
+    ]
+    
+    symbol = models.CharField(max_length=20)
+    price = models.DecimalField(max_digits=18, decimal_places=6)
+    quantity = models.PositiveIntegerField()
+    # Orders live in the engine's memory; their ids are kept for reconciliation
+    buy_order_id = models.BigIntegerField()
+    sell_order_id = models.BigIntegerField()
+    buyer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='paper_buys')
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='paper_sells')
+    aggressor = models.CharField(max_length=4, choices=AGGRESSOR_CHOICES)
+    executed_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.quantity} {self.symbol} @ {self.price}"
+    
+    class Meta:
+        ordering = ['-executed_at']
+        indexes = [
+            models.Index(fields=['buyer', 'executed_at'], name='main_fill_buyer_idx'),
+            models.Index(fields=['seller', 'executed_at'], name='main_fill_seller_idx'),
+            models.Index(fields=['symbol', 'executed_at'], name='main_fill_symbol_idx'),
+        ]
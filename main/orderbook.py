@@ -0,0 +1,164 @@
+"""
+Price-time priority limit order book for paper trading.
+
+Prices are integer ticks. Each side keeps a dict of price level -> FIFO
+deque of resting orders, the total quantity resting at each level, and a
+heap of its prices (negated for bids), so the best price is heap[0] and
+adding a level is O(log levels). Cancels are lazy: the order is marked and
+its quantity taken off the level total, and it is dropped when it reaches
+the front of its queue. A level is deleted from the dict as soon as no
+live quantity rests at it, and its stale heap entry is popped the next time
+it surfaces; once stale entries outnumber the levels, the heap is rebuilt
+from the levels, so it stays O(levels) however often orders are placed and
+cancelled away from the best price. Matching an order
+costs O(log levels) per level it clears plus O(1) per resting order it
+trades with.
+
+Market orders take liquidity until filled or the other side is empty, and
+their remainder is cancelled; limit orders rest what they do not fill.
+"""
+import heapq
+from collections import deque
+
+BUY, SELL = 'buy', 'sell'
+COMPACT_SLACK = 64  # Stale heap entries tolerated beyond one per live level
+
+
+class Order:
+    __slots__ = ('id', 'user_id', 'side', 'price', 'quantity', 'remaining', 'status')
+
+    def __init__(self, id, user_id, side, price, quantity):
+        self.id = id
+        self.user_id = user_id
+        self.side = side
+        self.price = price  # Ticks; None for market orders
+        self.quantity = quantity
+        self.remaining = quantity
+        self.status = 'new'
+
+    def as_dict(self):
+        return {'id': self.id, 'side': self.side, 'price': self.price, 'quantity': self.quantity,
+                'remaining': self.remaining, 'status': self.status}
+
+
+class Fill:
+    __slots__ = ('price', 'quantity', 'maker', 'taker')
+
+    def __init__(self, price, quantity, maker, taker):
+        self.price = price
+        self.quantity = quantity
+        self.maker = maker
+        self.taker = taker
+
+
+class BookSide:
+    def __init__(self, side):
+        self.sign = -1 if side == BUY else 1  # Heap keys: best price first
+        self.heap = []
+        self.levels = {}
+        self.volume = {}
+
+    def best(self):
+        """Best price with resting quantity, or None"""
+        heap = self.heap
+        while heap:
+            price = heap[0] * self.sign
+            if price in self.levels:
+                return price
+            heapq.heappop(heap)
+        return None
+
+    def add(self, order):
+        level = self.levels.get(order.price)
+        if level is None:
+            level = self.levels[order.price] = deque()
+            self.volume[order.price] = 0
+            heapq.heappush(self.heap, order.price * self.sign)
+        level.append(order)
+        self.volume[order.price] += order.remaining
+
+    def remove_level(self, price):
+        del self.levels[price]
+        del self.volume[price]
+        if len(self.heap) > 2 * len(self.levels) + COMPACT_SLACK:
+            self.heap = [price * self.sign for price in self.levels]
+            heapq.heapify(self.heap)
+
+    def depth(self, levels):
+        """[(price, quantity)] for the best `levels` prices"""
+        prices = sorted(self.levels, key=lambda price: price * self.sign)[:levels]
+        return [(price, self.volume[price]) for price in prices]
+
+
+class OrderBook:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.sides = {BUY: BookSide(BUY), SELL: BookSide(SELL)}
+        self.orders = {}  # Resting orders by id
+        self.last_price = None
+
+    def best_bid(self):
+        return self.sides[BUY].best()
+
+    def best_ask(self):
+        return self.sides[SELL].best()
+
+    def submit(self, order):
+        """Match an incoming order; returns its fills. The order's status and remaining are updated"""
+        other = self.sides[SELL if order.side == BUY else BUY]
+        fills = []
+        while order.remaining:
+            price = other.best()
+            if price is None or (order.price is not None and
+                                 (price > order.price if order.side == BUY else price < order.price)):
+                break
+            level = other.levels[price]
+            while level and order.remaining:
+                maker = level[0]
+                if maker.status == 'cancelled':
+                    level.popleft()
+                    continue
+                quantity = min(maker.remaining, order.remaining)
+                maker.remaining -= quantity
+                order.remaining -= quantity
+                other.volume[price] -= quantity
+                fills.append(Fill(price, quantity, maker, order))
+                if not maker.remaining:
+                    maker.status = 'filled'
+                    level.popleft()
+                    del self.orders[maker.id]
+                else:
+                    maker.status = 'partial'
+            if not other.volume[price]:
+                other.remove_level(price)  # Cancelled orders may still be queued behind the last fill
+        if fills:
+            self.last_price = fills[-1].price
+
+        if not order.remaining:
+            order.status = 'filled'
+        elif order.price is None:
+            order.status = 'cancelled'  # Market orders never rest
+        else:
+            order.status = 'partial' if fills else 'open'
+            self.sides[order.side].add(order)
+            self.orders[order.id] = order
+        return fills
+
+    def cancel(self, order_id):
+        """Cancel a resting order; returns it, or None if it is not resting"""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        side = self.sides[order.side]
+        order.status = 'cancelled'
+        side.volume[order.price] -= order.remaining
+        if not side.volume[order.price]:
+            side.remove_level(order.price)  # Only cancelled orders were left in it
+        return order
+
+    def snapshot(self, levels=10):
+        return {
+            'bids': self.sides[BUY].depth(levels),
+            'asks': self.sides[SELL].depth(levels),
+            'last': self.last_price,
+        }
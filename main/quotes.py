@@ -0,0 +1,312 @@
+"""
+Live quote fan-out for the ASGI server.
+
+A ``QuoteHub`` keeps a channel (set of subscribers) per symbol and the
+latest quote of each. One feed task consumes a quote source and publishes
+every quote to its symbol's channel. A quote is serialized once when it is
+published, and publishing only stores a reference with each subscriber
+without awaiting anything, so a slow client never holds up the feed or
+other clients.
+
+Backpressure works by coalescing. A subscriber holds at most one pending
+quote per symbol, and a newer quote replaces one that has not been sent.
+A client that reads slower than quotes arrive (its writes wait for the
+socket to drain) skips quotes in between and always gets the latest ones.
+Its memory is bounded by the number of symbols it subscribes to.
+
+The source is a local synthetic-tick generator standing in for a market
+data connection. It random-walks each symbol from its last stored close
+(or 100), and only ticks symbols someone is subscribed to. The feed starts
+with the first subscription and stops once the last client has left.
+
+Clients connect with server-sent events (GET /api/quotes/stream/?symbols=)
+or a WebSocket at /ws/quotes/. WebSocket clients can also send
+{"subscribe": [...]} and {"unsubscribe": [...]}. Both are plain ASGI
+endpoints that derivity_backend/asgi.py routes to ahead of Django. Django's
+handler would cost every connection a thread hop per sync middleware
+method, which dominates opening thousands of connections, and these
+streams use no session, auth or CSRF.
+
+asyncio objects belong to one event loop, so there is one hub per loop. An
+ASGI server process runs a single loop.
+"""
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+from . import marketdata
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteError(ValueError):
+    pass
+
+
+class Quote:
+    __slots__ = ('symbol', 'data', 'event')
+
+    def __init__(self, symbol, bid, ask, last, size, ts):
+        self.symbol = symbol
+        self.data = json.dumps({'symbol': symbol, 'bid': bid, 'ask': ask, 'last': last, 'size': size, 'ts': ts},
+                               separators=(',', ':'))
+        self.event = f'event: quote\ndata: {self.data}\n\n'.encode()
+
+
+class Subscriber:
+    """One client's subscriptions and its pending quotes, latest per symbol"""
+
+    __slots__ = ('symbols', 'pending', 'waiter', 'delivered', 'coalesced')
+
+    def __init__(self):
+        self.symbols = set()
+        self.pending = {}
+        self.waiter = None
+        self.delivered = 0
+        self.coalesced = 0  # Quotes replaced before the client read them
+
+    def offer(self, quote):
+        if quote.symbol in self.pending:
+            self.coalesced += 1
+        self.pending[quote.symbol] = quote
+        if self.waiter is not None:
+            _wake(self.waiter)
+
+    async def get(self, timeout=None):
+        """Quotes published since the last call, latest per symbol; [] after `timeout` seconds without any"""
+        if not self.pending:
+            loop = asyncio.get_running_loop()
+            self.waiter = loop.create_future()
+            # Cheaper than asyncio.wait_for, which wraps the wait in more futures and callbacks
+            timer = loop.call_later(timeout, _wake, self.waiter) if timeout is not None else None
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+                if timer is not None:
+                    timer.cancel()
+        quotes = list(self.pending.values())
+        self.pending.clear()
+        self.delivered += len(quotes)
+        return quotes
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _start_price(symbol):
+    """Last stored close, so synthetic quotes continue the chart"""
+    try:
+        series = marketdata.get_store().series(symbol)
+    except marketdata.MarketDataError:
+        return 100.0
+    return float(series.columns['close'][series.rows - 1]) if series.rows else 100.0
+
+
+async def synthetic_ticks(hub, interval, seed=None):
+    """Every `interval` seconds, one random-walk tick per subscribed symbol, until none are"""
+    rng = random.Random(seed)
+    prices = {}
+    volatility = 0.0005 * math.sqrt(interval)  # Per tick, about 30% a year
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    while hub.channels:
+        next_tick = max(next_tick + interval, loop.time())  # A fixed cadence, whatever fan-out costs
+        await asyncio.sleep(next_tick - loop.time())
+        ts = round(time.time(), 3)
+        for symbol in list(hub.channels):
+            price = prices.get(symbol)
+            if price is None:
+                price = _start_price(symbol)
+            price = prices[symbol] = price * math.exp(rng.gauss(0.0, volatility))
+            half_spread = max(0.005, price * 0.0001)
+            yield Quote(symbol, round(price - half_spread, 2), round(price + half_spread, 2), round(price, 2),
+                        rng.randint(1, 50) * 100, ts)
+
+
+class QuoteHub:
+    def __init__(self, interval=0.25, max_symbols=50, source=synthetic_ticks):
+        self.loop = asyncio.get_running_loop()
+        self.interval = interval
+        self.max_symbols = max_symbols
+        self.source = source
+        self.channels = {}
+        self.latest = {}
+        self.published = 0
+        self._feed = None
+
+    def subscribe(self, subscriber, symbols):
+        """Add symbols to a subscriber; it gets each one's latest quote straight away"""
+        if len(subscriber.symbols | set(symbols)) > self.max_symbols:
+            raise QuoteError(f'At most {self.max_symbols} symbols per connection')
+        for symbol in symbols:
+            if symbol in subscriber.symbols:
+                continue
+            subscriber.symbols.add(symbol)
+            self.channels.setdefault(symbol, set()).add(subscriber)
+            if symbol in self.latest:
+                subscriber.offer(self.latest[symbol])
+        if self.channels and (self._feed is None or self._feed.done()):
+            self._feed = self.loop.create_task(self._consume())
+
+    def unsubscribe(self, subscriber, symbols=None):
+        """Remove symbols (all of them by default) from a subscriber"""
+        for symbol in list(subscriber.symbols if symbols is None else symbols):
+            subscriber.symbols.discard(symbol)
+            subscriber.pending.pop(symbol, None)
+            channel = self.channels.get(symbol)
+            if channel is not None:
+                channel.discard(subscriber)
+                if not channel:
+                    del self.channels[symbol]
+                    self.latest.pop(symbol, None)  # Not ticked any more, so it would go stale
+
+    def publish(self, quote):
+        self.latest[quote.symbol] = quote
+        self.published += 1
+        for subscriber in self.channels.get(quote.symbol, ()):
+            subscriber.offer(quote)
+
+    async def _consume(self):
+        """The feed consumer; sources return once nobody is subscribed"""
+        try:
+            async for quote in self.source(self, self.interval):
+                self.publish(quote)
+        except Exception:
+            logger.exception('Quote feed failed')
+
+
+_hub = None
+
+
+def get_hub():
+    """The hub of the running event loop"""
+    global _hub
+    loop = asyncio.get_running_loop()
+    if _hub is None or _hub.loop is not loop:  # Only tests run more than one loop per process
+        _hub = QuoteHub(
+            interval=getattr(settings, 'QUOTES_TICK_INTERVAL', 0.25),
+            max_symbols=getattr(settings, 'QUOTES_MAX_SYMBOLS', 50),
+        )
+    return _hub
+
+
+def parse_symbols(value):
+    """Normalized unique symbols from a comma-separated string or a list"""
+    if isinstance(value, str):
+        value = [symbol for symbol in value.split(',') if symbol.strip()]
+    if not isinstance(value, list) or not all(isinstance(symbol, str) for symbol in value):
+        raise QuoteError('Symbols must be a list of symbols')
+    try:
+        return list(dict.fromkeys(marketdata.normalize_symbol(symbol) for symbol in value))
+    except marketdata.MarketDataError as e:
+        raise QuoteError(str(e))
+
+
+def _query_symbols(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    return parse_symbols(','.join(query.get('symbols', [])))
+
+
+async def _close_with(writer):
+    writer.cancel()
+    await asyncio.gather(writer, return_exceptions=True)
+
+
+async def sse_app(scope, receive, send):
+    """ASGI endpoint for GET /api/quotes/stream/?symbols=: server-sent events, one `quote` event per quote"""
+    hub = get_hub()
+    try:
+        if scope['method'] != 'GET':
+            raise QuoteError('Invalid request method')
+        symbols = _query_symbols(scope)
+        if not symbols:
+            raise QuoteError('Pass ?symbols= as a comma-separated list')
+        subscriber = Subscriber()
+        hub.subscribe(subscriber, symbols)
+    except QuoteError as e:
+        await send({'type': 'http.response.start', 'status': 400,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps({'status': 'error', 'message': str(e)}).encode()})
+        return
+
+    headers = [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+               (b'x-accel-buffering', b'no')]  # Stop nginx from buffering events
+    if getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+        headers.append((b'access-control-allow-origin', b'*'))
+    heartbeat = getattr(settings, 'QUOTES_HEARTBEAT', 15)
+
+    async def write():
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+        while True:
+            quotes = await subscriber.get(heartbeat)
+            # Comment lines keep proxies from closing an idle stream
+            body = b''.join(quote.event for quote in quotes) if quotes else b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+    writer = asyncio.create_task(write())
+    try:
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+    finally:
+        hub.unsubscribe(subscriber)
+        await _close_with(writer)
+
+
+async def websocket_app(scope, receive, send):
+    """ASGI endpoint for WebSocket /ws/quotes/?symbols=; every frame is a JSON array of quotes"""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    if scope['path'].rstrip('/') != '/ws/quotes':
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    hub = get_hub()
+    subscriber = Subscriber()
+    try:
+        hub.subscribe(subscriber, _query_symbols(scope))
+    except QuoteError:
+        await send({'type': 'websocket.close', 'code': 4400})
+        return
+    await send({'type': 'websocket.accept'})
+
+    lock = asyncio.Lock()  # Frames from the writer and replies from the reader must not interleave
+
+    async def write():
+        while True:
+            quotes = await subscriber.get()
+            async with lock:
+                await send({'type': 'websocket.send', 'text': f'[{",".join(quote.data for quote in quotes)}]'})
+
+    writer = asyncio.create_task(write())
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            try:
+                request = json.loads(message.get('text') or message.get('bytes') or '')
+                if not isinstance(request, dict) or not set(request) <= {'subscribe', 'unsubscribe'}:
+                    raise QuoteError('Send {"subscribe": [...]} or {"unsubscribe": [...]}')
+                if 'unsubscribe' in request:
+                    hub.unsubscribe(subscriber, parse_symbols(request['unsubscribe']))
+                if 'subscribe' in request:
+                    hub.subscribe(subscriber, parse_symbols(request['subscribe']))
+                reply = {'symbols': sorted(subscriber.symbols)}
+            except ValueError as e:  # QuoteError or invalid JSON
+                reply = {'error': str(e)}
+            async with lock:
+                await send({'type': 'websocket.send', 'text': json.dumps(reply)})
+    finally:
+        hub.unsubscribe(subscriber)
+        await _close_with(writer)
+
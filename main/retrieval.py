@@ -0,0 +1,286 @@
+"""
+TF-IDF retrieval over the marketing pages for ``ai_chat``.
+
+Text is extracted from the page templates (navigation, footers, scripts and
+SVG skipped), split into passages under their nearest heading, and weighted
+with TF-IDF. The weights are stored term-major (one row per vocabulary
+term, one column per passage) in a ``.npy`` file that is opened
+memory-mapped, so a query reads only the rows of its own terms and scores
+every passage with one small matrix-vector product.
+
+The index lives in RETRIEVAL_INDEX_DIR next to a JSON manifest recording
+each template's mtime and passages. When a template changes, only that file
+is parsed again; IDF and the weight matrix are recomputed from the cached
+passages of the rest. ``python manage.py build_retrieval_index`` builds it
+ahead of time; otherwise the first question builds it.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from html.parser import HTMLParser
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+PASSAGE_WORDS = 80
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a about all also an and any are as at be but by can do does for from get has have how i if in into is it '
+    'its me my no not of on or our so than that the their them then there these they this to up us was we '
+    'what when where which who why will with you your'.split()
+)
+SKIP_TAGS = {'script', 'style', 'svg', 'nav', 'footer', 'head', 'noscript'}
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords; a trailing plural 's' is dropped"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class PageTextParser(HTMLParser):
+    """Collect (heading, [text fragments]) sections from a page"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.in_heading = False
+        self.heading = []
+        self.sections = [['', []]]
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        if self.skip_depth or tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in HEADING_TAGS:
+            self.in_heading = True
+            self.heading = []
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in HEADING_TAGS and self.in_heading:
+            self.in_heading = False
+            self.sections.append([' '.join(self.heading), []])
+
+    def handle_data(self, data):
+        text = ' '.join(data.split())
+        if not text or self.skip_depth:
+            return
+        if self.in_heading:
+            self.heading.append(text)
+        else:
+            self.sections[-1][1].append(text)
+
+
+def extract_passages(html, page):
+    """Split a page into passages of at most PASSAGE_WORDS words, each under its heading"""
+    parser = PageTextParser()
+    parser.feed(html)
+    parser.close()
+
+    passages = []
+    for heading, fragments in parser.sections:
+        sentences = [f if f[-1] in '.!?:' else f + '.' for f in fragments]
+        if not sentences:
+            continue
+        chunk, words = [], 0
+        for sentence in sentences:
+            count = len(sentence.split())
+            if chunk and words + count > PASSAGE_WORDS:
+                passages.append({'page': page, 'title': heading, 'text': ' '.join(chunk)})
+                chunk, words = [], 0
+            chunk.append(sentence)
+            words += count
+        passages.append({'page': page, 'title': heading, 'text': ' '.join(chunk)})
+    return passages
+
+
+def build_matrix(passages):
+    """Return (vocabulary, idf, term-major float32 weight matrix with unit-length passage columns)"""
+    counts = [Counter(tokenize(f"{p['title']} {p['title']} {p['text']}")) for p in passages]
+    document_frequency = Counter(term for c in counts for term in c)
+    vocabulary = sorted(document_frequency)
+    term_ids = {term: i for i, term in enumerate(vocabulary)}
+    n = len(passages)
+    idf = np.array([math.log((1 + n) / (1 + document_frequency[t])) + 1 for t in vocabulary], dtype=np.float32)
+
+    matrix = np.zeros((len(vocabulary), n), dtype=np.float32)
+    for column, passage_counts in enumerate(counts):
+        for term, count in passage_counts.items():
+            matrix[term_ids[term], column] = 1 + math.log(count)
+    matrix *= idf[:, None]
+    norms = np.linalg.norm(matrix, axis=0)
+    matrix /= np.where(norms > 0, norms, 1)
+    return vocabulary, idf, matrix
+
+
+class RetrievalIndex:
+    """Loaded index: vocabulary lookup plus the (memory-mapped) weight matrix"""
+
+    def __init__(self, vocabulary, idf, matrix, passages):
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self.idf = idf
+        self.matrix = matrix
+        self.passages = passages
+
+    def search(self, query, k=3):
+        """Return up to k (score, passage) pairs, best first"""
+        counts = Counter(t for t in tokenize(query) if t in self.term_ids)
+        if not counts or not self.passages:
+            return []
+        rows = np.fromiter((self.term_ids[t] for t in counts), dtype=np.intp, count=len(counts))
+        weights = np.fromiter(((1 + math.log(c)) for c in counts.values()), dtype=np.float32, count=len(counts))
+        weights *= self.idf[rows]
+        weights /= np.linalg.norm(weights)
+
+        scores = weights @ self.matrix[rows]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.passages[i]) for i in top if scores[i] > 0]
+
+
+def get_sources():
+    base = settings.BASE_DIR
+    return {name: os.path.join(base, name) for name in getattr(
+        settings, 'RETRIEVAL_TEMPLATES', ['index.html', 'features.html', 'pricing.html', 'about.html']
+    )}
+
+
+def _atomic_write(directory, name, write):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+class IndexStore:
+    """Builds, persists and reloads the index when source templates change"""
+
+    def __init__(self, index_dir=None, check_interval=5):
+        self.index_dir = str(index_dir) if index_dir else None
+        self.check_interval = check_interval
+        self.index = None
+        self.manifest = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _mtimes(self):
+        mtimes = {}
+        for name, path in get_sources().items():
+            try:
+                mtimes[name] = os.stat(path).st_mtime_ns
+            except OSError:
+                logger.warning(f"Retrieval source {path} is missing")
+        return mtimes
+
+    def _load_manifest(self):
+        if self.manifest is None and self.index_dir:
+            try:
+                with open(os.path.join(self.index_dir, MANIFEST)) as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError):
+                self.manifest = None
+        return self.manifest
+
+    def _open(self, manifest):
+        if self.index_dir:
+            matrix = np.load(os.path.join(self.index_dir, manifest['matrix']), mmap_mode='r')
+        else:
+            matrix = manifest['_matrix']
+        passages = [p for name in sorted(manifest['sources']) for p in manifest['sources'][name]['passages']]
+        return RetrievalIndex(manifest['vocabulary'], np.array(manifest['idf'], dtype=np.float32), matrix, passages)
+
+    def build(self, force=False):
+        """Re-parse changed templates and rewrite the index; returns the names re-parsed"""
+        previous = None if force else self._load_manifest()
+        old_sources = previous['sources'] if previous else {}
+        sources = {}
+        parsed = []
+        for name, mtime in self._mtimes().items():
+            cached = old_sources.get(name)
+            if cached and cached['mtime'] == mtime:
+                sources[name] = cached
+                continue
+            with open(get_sources()[name], encoding='utf-8') as f:
+                page = os.path.splitext(name)[0]
+                sources[name] = {'mtime': mtime, 'passages': extract_passages(f.read(), page)}
+            parsed.append(name)
+
+        passages = [p for name in sorted(sources) for p in sources[name]['passages']]
+        vocabulary, idf, matrix = build_matrix(passages)
+        manifest = {'sources': sources, 'vocabulary': vocabulary, 'idf': idf.tolist()}
+
+        if self.index_dir:
+            os.makedirs(self.index_dir, exist_ok=True)
+            # A new matrix file per build so open memory maps of the old one stay valid
+            digest = hashlib.sha1(json.dumps(sorted((n, s['mtime']) for n, s in sources.items())).encode())
+            manifest['matrix'] = f'weights-{digest.hexdigest()[:12]}.npy'
+            _atomic_write(self.index_dir, manifest['matrix'], lambda f: np.save(f, matrix))
+            _atomic_write(self.index_dir, MANIFEST, lambda f: f.write(json.dumps(manifest).encode()))
+            for name in os.listdir(self.index_dir):
+                if name.startswith('weights-') and name != manifest['matrix']:
+                    os.remove(os.path.join(self.index_dir, name))
+        else:
+            manifest['_matrix'] = matrix
+
+        self.manifest = manifest
+        self.index = self._open(manifest)
+        logger.info(f"Built retrieval index: {len(passages)} passages, {len(vocabulary)} terms; "
+                    f"re-parsed {', '.join(parsed) or 'nothing'}")
+        return parsed
+
+    def get(self):
+        now = time.monotonic()
+        if self.index is not None and now - self._checked_at < self.check_interval:
+            return self.index
+        with self._lock:
+            self._checked_at = now
+            manifest = self._load_manifest()
+            current = {name: s['mtime'] for name, s in manifest['sources'].items()} if manifest else None
+            if current != self._mtimes():
+                self.build()
+            elif self.index is None:
+                self.index = self._open(manifest)
+        return self.index
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        index_dir = getattr(settings, 'RETRIEVAL_INDEX_DIR', None)
+        if _store is None or _store.index_dir != (str(index_dir) if index_dir else None):
+            _store = IndexStore(index_dir, getattr(settings, 'RETRIEVAL_CHECK_SECONDS', 5))
+        return _store
+
+
+def answer(question, k=3):
+    """Best passages for a question, or an empty list if nothing relevant matched"""
+    min_score = getattr(settings, 'RETRIEVAL_MIN_SCORE', 0.15)
+    return [(score, p) for score, p in get_store().get().search(question, k) if score >= min_score]
@@ -0,0 +1,288 @@
+"""
+Monte Carlo value at risk for positions in stored symbols.
+
+Per-bar log returns of the assets are drawn as mean + L z, with L the
+Cholesky factor of the cached shrunk covariance (``portfolio.covariance``)
+and z standard normal, and compounded over the horizon. Each path's P&L is
+sum(position * (exp(cumulative log return) - 1)) at every bar, so the
+simulation keeps the non-linearity of compounding and gives both the
+terminal P&L (for VaR and CVaR) and the largest peak-to-trough fall of P&L
+along the path (for the drawdown distribution), in the units of the
+positions.
+
+Paths are simulated in blocks of BLOCK_PATHS. Block i always draws from
+child i of ``SeedSequence(seed)``, so a seed reproduces the same paths
+whatever the number of workers. With RISK_WORKERS > 0 the blocks run in a
+process pool (spawned, not forked, because the web process has threads);
+workers write their columns straight into a shared memory buffer, so only
+the inputs are pickled and the parent summarizes millions of paths without
+copying them back.
+
+Simulations run as RiskJob rows: the view stores the job and hands its id
+to a small thread pool, and clients poll the job for progress and results,
+so a web worker is never tied up for the length of a simulation. Jobs live
+in the memory of the process that accepted them, which refreshes the
+heartbeat of its queued and running rows with each progress write; rows
+whose heartbeat is older than RISK_STALE_SECONDS belonged to a process that
+exited or restarted, and ``reap_stale`` marks them failed.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from . import marketdata, portfolio
+
+BLOCK_PATHS = 65_536  # Paths per seeded block (the unit of work of a pool task)
+CHUNK_VALUES = 4_000_000  # Normals drawn at once inside a block, bounding worker memory to ~32 MB
+RESULT_COLUMNS = ('pnl', 'drawdown')
+DRAWDOWN_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+PNL_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+PROGRESS_INTERVAL = 1.0  # Seconds between progress writes
+ACTIVE = ('queued', 'running')
+RUNNER = uuid.uuid4().hex  # This process, in the rows of the jobs it accepted
+LOST_ERROR = 'The server restarted before the simulation finished; resubmit it with the same seed'
+
+logger = logging.getLogger(__name__)
+
+
+class RiskError(ValueError):
+    pass
+
+
+def simulate_block(out, start, count, seed, block, mean, chol, positions, horizon):
+    """Fill out[:, start:start + count] with (terminal P&L, max drawdown) of block `block`'s paths"""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))  # = SeedSequence(seed).spawn()
+    n = len(positions)
+    chunk = max(1, CHUNK_VALUES // (horizon * n))
+    for lo in range(0, count, chunk):
+        rows = min(chunk, count - lo)
+        log_returns = (rng.standard_normal((rows * horizon, n)) @ chol.T).reshape(rows, horizon, n)
+        log_returns += mean
+        np.cumsum(log_returns, axis=1, out=log_returns)
+        np.exp(log_returns, out=log_returns)
+        pnl = log_returns @ positions - positions.sum()  # (rows, horizon)
+        peak = np.maximum.accumulate(np.maximum(pnl, 0.0), axis=1)  # P&L starts at a peak of 0
+        out[0, start + lo:start + lo + rows] = pnl[:, -1]
+        out[1, start + lo:start + lo + rows] = (peak - pnl).max(axis=1)
+
+
+def _simulate_shared(name, paths, start, count, seed, block, mean, chol, positions, horizon):
+    """Pool task: simulate one block into the parent's shared memory buffer"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        out = np.ndarray((len(RESULT_COLUMNS), paths), dtype=np.float64, buffer=shm.buf)
+        simulate_block(out, start, count, seed, block, mean, chol, positions, horizon)
+        del out
+    finally:
+        shm.close()
+    return count
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def simulate(mean, chol, positions, horizon, paths, seed, workers=0, progress=None):
+    """
+    (terminal P&L, max drawdown) arrays over `paths` paths.
+
+    workers=0 simulates in the calling thread; otherwise blocks go to the
+    process pool. progress, if given, is called with the fraction done.
+    """
+    blocks = [(start, min(BLOCK_PATHS, paths - start)) for start in range(0, paths, BLOCK_PATHS)]
+    inputs = (mean, chol, positions, horizon)
+    if not workers:
+        out = np.empty((len(RESULT_COLUMNS), paths))
+        for block, (start, count) in enumerate(blocks):
+            simulate_block(out, start, count, seed, block, *inputs)
+            if progress:
+                progress((start + count) / paths)
+        return out[0], out[1]
+
+    shm = shared_memory.SharedMemory(create=True, size=len(RESULT_COLUMNS) * paths * 8)
+    try:
+        pool = get_pool(workers)
+        futures = [pool.submit(_simulate_shared, shm.name, paths, start, count, seed, block, *inputs)
+                   for block, (start, count) in enumerate(blocks)]
+        done = 0
+        for future in as_completed(futures):
+            done += future.result()
+            if progress:
+                progress(done / paths)
+        out = np.ndarray((len(RESULT_COLUMNS), paths), dtype=np.float64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return out[0], out[1]
+
+
+def summarize(pnl, drawdown, confidence):
+    """VaR and CVaR (as positive losses) at each confidence level, and P&L and drawdown quantiles"""
+    order = np.sort(pnl)
+    var, cvar = {}, {}
+    for level in confidence:
+        tail = max(int(np.ceil((1 - level) * len(order))), 1)
+        var[str(level)] = float(-order[tail - 1])
+        cvar[str(level)] = float(-order[:tail].mean())
+    return {
+        'var': var,
+        'cvar': cvar,
+        'pnl': {
+            'mean': float(pnl.mean()),
+            'std': float(pnl.std()),
+            'quantiles': {str(q): float(v) for q, v in zip(PNL_QUANTILES, np.quantile(order, PNL_QUANTILES))},
+        },
+        'drawdown': {
+            'mean': float(drawdown.mean()),
+            'quantiles': {str(q): float(v) for q, v in
+                          zip(DRAWDOWN_QUANTILES, np.quantile(drawdown, DRAWDOWN_QUANTILES))},
+        },
+    }
+
+
+def run(positions, window=252, horizon=10, paths=100_000, confidence=(0.95, 0.99), seed=0, workers=0,
+        progress=None, cache_size=8):
+    """Simulate a portfolio of {symbol: position value} and summarize its risk"""
+    symbols = list(positions)
+    estimate, cached = portfolio.covariance(symbols, window, cache_size)
+    chol = np.linalg.cholesky(estimate.covariance)
+    values = np.array([positions[symbol] for symbol in symbols], dtype=np.float64)
+
+    start = time.perf_counter()
+    pnl, drawdown = simulate(estimate.mean, chol, values, horizon, paths, seed, workers, progress)
+    summary = summarize(pnl, drawdown, confidence)
+    summary.update({
+        'paths': paths,
+        'horizon': horizon,
+        'seed': seed,
+        'observations': estimate.observations,
+        'end': int(estimate.ts[-1]),
+        'gross_exposure': float(np.abs(values).sum()),
+        'covariance_cached': cached,
+        'simulation_ms': round((time.perf_counter() - start) * 1000, 1),
+    })
+    return summary
+
+
+def parse_request(data, max_paths, max_horizon, max_draws, max_assets):
+    """Validate a JSON simulation request into run keyword arguments"""
+    if not isinstance(data, dict):
+        raise RiskError('Expected a JSON object')
+    positions = data.get('positions')
+    if not isinstance(positions, dict) or not positions:
+        raise RiskError('Positions must be an object of {symbol: position value}')
+    if len(positions) > max_assets:
+        raise RiskError(f'At most {max_assets} positions per simulation')
+    try:
+        normalized = {marketdata.normalize_symbol(symbol): value for symbol, value in positions.items()}
+    except marketdata.MarketDataError as e:
+        raise RiskError(str(e))
+    if len(normalized) != len(positions):
+        raise RiskError('Symbols must be unique')
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) and np.isfinite(v)
+               for v in normalized.values()):
+        raise RiskError('Position values must be finite numbers')
+
+    params = {'positions': normalized}
+    for name, default, low, high in [('window', 252, portfolio.MIN_OBSERVATIONS, 5000),
+                                     ('horizon', 10, 1, max_horizon), ('paths', 100_000, 1000, max_paths)]:
+        value = data.get(name, default)
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            raise RiskError(f'{name} must be an integer between {low} and {high}')
+        params[name] = value
+    if params['paths'] * params['horizon'] * len(normalized) > max_draws:
+        raise RiskError(f'paths x horizon x positions must be at most {max_draws}')
+
+    confidence = data.get('confidence', [0.95, 0.99])
+    if not isinstance(confidence, list) or not confidence or \
+            not all(isinstance(c, float) and 0.5 <= c < 1 for c in confidence):
+        raise RiskError('Confidence must be a list of levels between 0.5 and 1')
+    params['confidence'] = confidence
+
+    seed = data.get('seed')
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**63)  # Fresh, but recorded so the job can be rerun
+    if not isinstance(seed, int) or isinstance(seed, bool) or seed < 0:
+        raise RiskError('Seed must be a non-negative integer')
+    params['seed'] = seed
+    return params
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def submit(job_id):
+    """Run a queued RiskJob on the job thread pool; returns the Future"""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = ThreadPoolExecutor(getattr(settings, 'RISK_MAX_RUNNING_JOBS', 2),
+                                       thread_name_prefix='risk-job')
+        return _jobs.submit(run_job, job_id)
+
+
+def reap_stale():
+    """Mark failed the queued and running jobs whose process stopped refreshing them; returns how many"""
+    from .models import RiskJob
+
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'RISK_STALE_SECONDS', 600))
+    return RiskJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, created_at__lt=cutoff), status__in=ACTIVE,
+    ).update(status='failed', error=LOST_ERROR, finished_at=now)
+
+
+def run_job(job_id):
+    """Simulate a RiskJob and store its result or error"""
+    from .models import RiskJob
+
+    try:
+        job = RiskJob.objects.get(pk=job_id)
+        RiskJob.objects.filter(pk=job_id).update(status='running', started_at=timezone.now(),
+                                                 heartbeat_at=timezone.now())
+        last_write = [time.monotonic()]
+
+        def progress(fraction):
+            now = time.monotonic()
+            if now - last_write[0] >= PROGRESS_INTERVAL:
+                RiskJob.objects.filter(pk=job_id).update(progress=fraction)
+                # Also keeps the jobs queued behind this one from looking abandoned
+                RiskJob.objects.filter(runner=RUNNER, status__in=ACTIVE).update(heartbeat_at=timezone.now())
+                last_write[0] = now
+
+        try:
+            result = run(**job.params, workers=getattr(settings, 'RISK_WORKERS', 0), progress=progress,
+                         cache_size=getattr(settings, 'PORTFOLIO_CACHE_SIZE', 8))
+        except (marketdata.MarketDataError, portfolio.PortfolioError, np.linalg.LinAlgError) as e:
+            RiskJob.objects.filter(pk=job_id).update(status='failed', error=str(e), finished_at=timezone.now())
+            return
+        except Exception:
+            logger.exception('Risk job %s failed', job_id)
+            RiskJob.objects.filter(pk=job_id).update(status='failed', error='Simulation failed',
+                                                     finished_at=timezone.now())
+            return
+        RiskJob.objects.filter(pk=job_id).update(status='done', progress=1.0, result=result,
+                                                 finished_at=timezone.now())
+    finally:
+        connection.close()  # Job threads outlive requests, so nothing else closes their connection
@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import dashboard, lockout
+from .bloom import registered_emails
+from .marketdata import bars_appended
+from .models import UserProfile
+from .trading import fills_stored
+
+
+@receiver(post_save, sender=User)
+def track_registered_email(sender, instance, **kwargs):
+    """Keep the email Bloom filter current for signups, email changes and admin edits"""
+    registered_emails.add(instance.email)
+
+
+@receiver(post_save, sender=UserProfile)
+def mirror_lockout_state(sender, instance, **kwargs):
+    """Copy lockout fields to the cache whenever the profile is saved"""
+    lockout.remember(instance.user_id, instance.failed_login_attempts, instance.account_locked_until)
+
+
+@receiver(fills_stored)
+def patch_dashboard_positions(sender, fills, **kwargs):
+    """Fold stored paper fills into cached dashboard positions"""
+    dashboard.apply_fills(fills)
+
+
+@receiver(bars_appended)
+def invalidate_dashboards(sender, symbol, **kwargs):
+    """New bars re-mark every holder's dashboard"""
+    dashboard.invalidate_symbol(symbol)
@@ -0,0 +1,64 @@
+"""
+Query and wall-time budgets for every route in main.urls.
+
+Keys are "<url name>" or "<url name>:<scenario>". ``queries`` is the maximum
+number of SQL statements (including session reads/writes and the savepoints
+TestCase wraps around atomic blocks); ``ms`` is a generous wall-time ceiling
+measured with the fast MD5 test hasher. When a change legitimately alters an
+endpoint's cost, update its row here in the same commit so the difference is
+visible in review.
+"""
+
+BUDGETS = {
+    # Page views (anonymous visitors never touch the session table)
+    'index': {'queries': 0, 'ms': 250},
+    'about': {'queries': 0, 'ms': 250},
+    'features': {'queries': 0, 'ms': 250},
+    'pricing': {'queries': 0, 'ms': 250},
+    'contact': {'queries': 0, 'ms': 250},
+    'login': {'queries': 0, 'ms': 250},
+    'dashboard': {'queries': 0, 'ms': 250},
+    'signup': {'queries': 0, 'ms': 250},
+    'ai_interface': {'queries': 0, 'ms': 250},
+
+    # Authentication
+    'user_login:success': {'queries': 15, 'ms': 250},
+    'user_login:wrong_password': {'queries': 5, 'ms': 250},
+    'user_login:unknown_user': {'queries': 2, 'ms': 250},
+    'user_login:locked_cold_cache': {'queries': 3, 'ms': 250},
+    'user_login:locked': {'queries': 0, 'ms': 250},
+    'user_signup:success': {'queries': 16, 'ms': 250},
+    'user_signup:existing_email': {'queries': 2, 'ms': 250},
+    'user_logout': {'queries': 4, 'ms': 250},
+    'get_csrf_token': {'queries': 0, 'ms': 250},
+    'check_auth_status:anonymous': {'queries': 0, 'ms': 250},
+    'check_auth_status:authenticated': {'queries': 6, 'ms': 250},
+    'update_user_profile': {'queries': 10, 'ms': 250},
+    'validate_email:available': {'queries': 0, 'ms': 250},
+    'validate_email:registered': {'queries': 1, 'ms': 250},
+    'request_password_reset': {'queries': 2, 'ms': 250},
+    'confirm_password_reset': {'queries': 5, 'ms': 250},
+    'request_email_verification': {'queries': 7, 'ms': 250},
+    'verify_email': {'queries': 6, 'ms': 250},
+
+    # Other APIs
+    'export_data': {'queries': 6, 'ms': 250},
+    'batch_api': {'queries': 6, 'ms': 250},
+    'market_data': {'queries': 0, 'ms': 250},
+    'market_indicators': {'queries': 0, 'ms': 250},
+    'price_options': {'queries': 0, 'ms': 250},
+    'optimize_portfolio': {'queries': 0, 'ms': 250},
+    'run_backtest': {'queries': 5, 'ms': 250},
+    'submit_risk_simulation': {'queries': 8, 'ms': 250},
+    'risk_simulation_status': {'queries': 7, 'ms': 250},
+    'place_paper_order': {'queries': 5, 'ms': 250},
+    'cancel_paper_order': {'queries': 5, 'ms': 250},
+    'paper_order_book': {'queries': 0, 'ms': 250},
+    'paper_fills': {'queries': 6, 'ms': 250},
+    'dashboard_snapshot:cold': {'queries': 6, 'ms': 250},
+    'dashboard_snapshot:not_modified': {'queries': 5, 'ms': 250},
+    'contact_form': {'queries': 1, 'ms': 250},
+    'contact_form:idempotent_retry': {'queries': 0, 'ms': 250},
+    'ai_chat': {'queries': 0, 'ms': 250},
+    'metrics': {'queries': 0, 'ms': 250},
+}
@@ -0,0 +1,143 @@
+import json
+import shutil
+import tempfile
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main import backtest, marketdata
+
+
+def loop_backtest(closes, fast, slow, cost_bps):
+    """Bar-by-bar reference: decide at each close from trailing averages, then hold to the next close"""
+    symbols, bars = closes.shape
+    weights = [0.0] * symbols
+    equity, curve, opening = 1.0, [], 0.0
+    for t in range(bars):
+        period = sum(weights[i] * (closes[i][t] / closes[i][t - 1] - 1) for i in range(symbols)) if t else 0.0
+        traded = 0.0
+        for i in range(symbols):
+            target = 0.0
+            if t + 1 >= slow:
+                fast_mean = sum(closes[i][t + 1 - fast:t + 1]) / fast
+                slow_mean = sum(closes[i][t + 1 - slow:t + 1]) / slow
+                target = float(np.sign(fast_mean - slow_mean)) / symbols
+            traded += abs(target - weights[i])
+            weights[i] = target
+        if t == 0:
+            opening = traded  # Paid with the first period's trades
+            continue
+        equity *= 1 + period - (traded + opening * (t == 1)) * cost_bps / 1e4
+        curve.append(equity)
+    return np.array(curve)
+
+
+class BacktestTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(8)
+        self.closes = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.01, (6, 400)), axis=1))
+
+    def test_matches_event_loop(self):
+        panel = backtest.Panel(self.closes)
+        position = backtest.positions(panel, 'sma_cross', {'fast': 5, 'slow': 30})
+        metrics, curve = backtest.evaluate(panel, position, commission_bps=1.0, slippage_bps=2.0, equity=True)
+        expected = loop_backtest(self.closes, 5, 30, 3.0)
+        np.testing.assert_allclose(curve[1:], expected, rtol=1e-9)
+        self.assertAlmostEqual(metrics['total_return'], expected[-1] - 1, places=9)
+        drawdown = 1 - expected / np.maximum.accumulate(np.maximum(expected, 1))
+        self.assertAlmostEqual(metrics['max_drawdown'], drawdown.max(), places=9)
+
+    def test_positions_do_not_look_ahead(self):
+        changed = self.closes.copy()
+        changed[:, 250:] *= 1.5
+        for strategy, params in [('sma_cross', {'fast': 5, 'slow': 30}), ('momentum', {'lookback': 20}),
+                                 ('mean_reversion', {'window': 20, 'entry': 1.0})]:
+            with self.subTest(strategy=strategy):
+                before = backtest.positions(backtest.Panel(self.closes), strategy, params)
+                after = backtest.positions(backtest.Panel(changed), strategy, params)
+                np.testing.assert_array_equal(before[:, :250], after[:, :250])
+                self.assertFalse((before[:, :params.get('slow', params.get('lookback', 20)) - 1] != 0).any())
+
+    def test_costs_and_long_only(self):
+        panel = backtest.Panel(self.closes)
+        position = backtest.positions(panel, 'momentum', {'lookback': 20})
+        free = backtest.evaluate(panel, position, 0, 0)
+        costly = backtest.evaluate(panel, position, 5, 5)
+        self.assertLess(costly['total_return'], free['total_return'])
+        self.assertEqual(costly['turnover'], free['turnover'])
+        long_only = backtest.positions(panel, 'momentum', {'lookback': 20}, long_only=True)
+        self.assertTrue((long_only >= 0).all())
+        self.assertTrue(((long_only == 0) | (long_only == position)).all())
+
+    def test_grid_and_pooled_sweep(self):
+        combos = backtest.grid('sma_cross', {'fast': [5, 10, 40], 'slow': [20, 40]})
+        self.assertEqual(combos, [{'fast': 5, 'slow': 20}, {'fast': 5, 'slow': 40}, {'fast': 10, 'slow': 20},
+                                  {'fast': 10, 'slow': 40}])
+        inline = backtest.sweep(self.closes, 'sma_cross', combos)
+        pooled = backtest.sweep(self.closes, 'sma_cross', combos, workers=2)
+        self.assertEqual(inline, pooled)
+
+
+@override_settings(METRICS_DIR=None)
+class BacktestApiTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('alice', 'alice@example.com', 'x'))
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        overrides = override_settings(MARKET_DATA_DIR=root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.symbols = ['AAA', 'BBB', 'CCC']
+        for seed, symbol in enumerate(self.symbols):
+            bars = marketdata.synthetic_bars(600, step=86400, seed=seed)
+            marketdata.get_store().append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+        self.ts = bars['ts']
+
+    def post(self, data):
+        return self.client.post('/api/backtest/', json.dumps(data), content_type='application/json')
+
+    def test_sweep_sorted_by_sharpe(self):
+        body = self.post({'symbols': self.symbols, 'strategy': 'momentum', 'params': {'lookback': [10, 20, 60]},
+                          'start': int(self.ts[100])}).json()
+        self.assertEqual(body['status'], 'success')
+        self.assertEqual(body['bars'], 500)
+        sharpes = [result['sharpe'] for result in body['results']]
+        self.assertEqual(sharpes, sorted(sharpes, reverse=True))
+        self.assertEqual(body['best']['params'], body['results'][0]['params'])
+        self.assertEqual(len(body['best']['equity']), len(body['best']['ts']))
+        self.assertEqual(body['best']['equity'][0], 1.0)
+
+    @override_settings(BACKTEST_MAX_COMBINATIONS=4, BACKTEST_MAX_CELLS=3000)
+    def test_errors(self):
+        for data in [
+            {'symbols': self.symbols, 'strategy': 'martingale'},
+            {'symbols': self.symbols, 'strategy': 'momentum', 'params': {'fast': 5}},
+            {'symbols': self.symbols, 'strategy': 'momentum', 'params': {'lookback': [0]}},
+            {'symbols': self.symbols, 'strategy': 'sma_cross', 'params': {'fast': 50, 'slow': 20}},
+            {'symbols': self.symbols, 'strategy': 'sma_cross', 'params': {'fast': [1, 2, 3], 'slow': [10, 20]}},
+            {'symbols': self.symbols, 'strategy': 'momentum', 'params': {'lookback': [5, 10]}},
+            {'symbols': ['AAA'], 'strategy': 'momentum', 'start': 'yesterday'},
+        ]:
+            with self.subTest(data=data):
+                response = self.post(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(self.post({'symbols': ['NOPE'], 'strategy': 'momentum'}).status_code, 404)
+
+    def test_memory_limit(self):
+        # 3 symbols x 600 bars x 8 bytes is 14,400 bytes per panel array
+        self.assertEqual(backtest.panel_bytes(3, 600, 'sma_cross', backtest.grid('sma_cross', {
+            'fast': [10, 20], 'slow': [20, 50]})), 14_400 * (backtest.PANEL_ARRAYS + 3))
+        data = {'symbols': self.symbols, 'strategy': 'momentum', 'params': {'lookback': [10, 20]}}
+        with self.settings(BACKTEST_MAX_PANEL_BYTES=14_400 * (backtest.PANEL_ARRAYS + 2)):
+            self.assertEqual(self.post(data).status_code, 200)
+        with self.settings(BACKTEST_MAX_PANEL_BYTES=14_400 * (backtest.PANEL_ARRAYS + 1)):
+            response = self.post(data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('MB', response.json()['message'])
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.post({'symbols': self.symbols, 'strategy': 'momentum'})
+        self.assertEqual(response.status_code, 401)
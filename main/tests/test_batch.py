@@ -0,0 +1,91 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, override_settings
+
+from main.models import ContactMessage, UserProfile
+
+
+@override_settings(METRICS_DIR=None)
+class BatchAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='jane', email='jane@example.com', password='x', first_name='Jane')
+        UserProfile.objects.create(user=cls.user)
+
+    def batch(self, requests):
+        return self.client.post('/api/batch/', json.dumps({'requests': requests}), content_type='application/json')
+
+    def test_page_load_batch(self):
+        self.client.force_login(self.user)
+        response = self.batch([
+            {'id': 'csrf', 'path': '/api/csrf-token/'},
+            {'id': 'auth', 'path': '/api/auth-status/'},
+            {'id': 'email', 'method': 'POST', 'path': '/api/validate-email/', 'body': {'email': 'jane@example.com'}},
+        ])
+        results = {r['id']: r for r in response.json()['responses']}
+        self.assertTrue(results['csrf']['body']['csrf_token'])
+        self.assertEqual(results['auth']['body']['user']['email'], 'jane@example.com')
+        self.assertTrue(results['email']['body']['exists'])
+        # The token handed out by the sub-request is set as a cookie on the batch response
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_matches_direct_calls(self):
+        self.client.force_login(self.user)
+        direct = self.client.get('/api/auth-status/').json()
+        batched = self.batch([{'path': '/api/auth-status/'}]).json()['responses'][0]
+        self.assertEqual(batched, {'id': None, 'status': 200, 'body': direct})
+
+    def test_later_sub_requests_see_earlier_changes(self):
+        self.client.force_login(self.user)
+        response = self.batch([
+            {'path': '/api/auth-status/'},
+            {'method': 'POST', 'path': '/api/logout/'},
+            {'path': '/api/auth-status/'},
+        ])
+        before, logout, after = response.json()['responses']
+        self.assertTrue(before['body']['authenticated'])
+        self.assertEqual(logout['body']['status'], 'success')
+        self.assertFalse(after['body']['authenticated'])
+        self.assertFalse(self.client.get('/api/auth-status/').json()['authenticated'])
+
+    def test_rejected_sub_requests(self):
+        response = self.batch([
+            {'path': '/about/'},
+            {'path': '/api/batch/'},
+            {'method': 'POST', 'path': '/api/login/', 'body': {'username': 'jane@example.com', 'password': 'x'}},
+            {'path': '/api/nope/'},
+            {'method': 'DELETE', 'path': '/api/auth-status/'},
+            'not an object',
+        ])
+        self.assertEqual([r['status'] for r in response.json()['responses']], [400, 400, 403, 404, 400, 400])
+
+    def test_invalid_payloads(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'path': '/api/csrf-token/'}] * 21).status_code, 400)
+        response = self.client.post('/api/batch/', 'nope', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_unsafe_sub_requests_need_the_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        order = {'method': 'POST', 'path': '/api/risk/simulations/', 'body': {}}
+        page_load = [{'id': 'csrf', 'path': '/api/csrf-token/'}, order]
+
+        # What a cross-site form can send: no token header
+        response = client.post('/api/batch/', json.dumps({'requests': page_load}), content_type='text/plain')
+        csrf, rejected = response.json()['responses']
+        self.assertEqual(rejected['status'], 403)
+
+        response = client.post('/api/batch/', json.dumps({'requests': [order]}), content_type='application/json',
+                               HTTP_X_CSRFTOKEN=csrf['body']['csrf_token'])
+        self.assertEqual(response.json()['responses'][0]['status'], 400)  # Past CSRF, into the view
+
+    def test_idempotency_key_is_not_shared_by_sub_requests(self):
+        contact = {'method': 'POST', 'path': '/api/contact/'}
+        response = self.client.post('/api/batch/', json.dumps({'requests': [
+            {**contact, 'body': {'name': 'Ann Lee', 'email': 'ann@example.com', 'message': 'First message here'}},
+            {**contact, 'body': {'name': 'Bob Lee', 'email': 'bob@example.com', 'message': 'Second message here'}},
+        ]}), content_type='application/json', HTTP_IDEMPOTENCY_KEY='same-key')
+        self.assertEqual([r['status'] for r in response.json()['responses']], [200, 200])
+        self.assertEqual(ContactMessage.objects.count(), 2)
@@ -0,0 +1,128 @@
+import fcntl
+import json
+import os
+import tempfile
+from multiprocessing import shared_memory
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from main import bloom
+from main.bloom import BloomFilter, registered_emails
+from main.models import UserProfile
+
+
+class BloomFilterTests(TestCase):
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(capacity=5000, error_rate=0.01)
+        members = [f'member{i}@example.com' for i in range(5000)]
+        for email in members:
+            bloom.add(email)
+
+        self.assertTrue(all(email in bloom for email in members))
+        false_positives = sum(f'stranger{i}@example.com' in bloom for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+
+    def test_add_reports_new_keys(self):
+        bloom = BloomFilter(capacity=100)
+        self.assertTrue(bloom.add('a@example.com'))
+        self.assertFalse(bloom.add('a@example.com'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RegisteredEmailsTests(TestCase):
+    def setUp(self):
+        registered_emails.reset()
+        self.addCleanup(registered_emails.reset)
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com') for i in range(100)
+        ])
+
+    def check(self, email):
+        response = self.client.post(
+            '/api/validate-email/', json.dumps({'email': email}), content_type='application/json'
+        )
+        return response.json()
+
+    def test_unregistered_email_skips_database_once_built(self):
+        registered_emails.might_contain('warmup@example.com')
+        with self.assertNumQueries(0):
+            self.assertFalse(registered_emails.is_registered('nobody@example.com'))
+        with self.assertNumQueries(1):
+            self.assertTrue(registered_emails.is_registered('USER42@example.com '))
+
+    def test_signup_and_email_change_update_filter(self):
+        self.assertFalse(self.check('fresh@example.com')['exists'])
+
+        response = self.client.post('/api/signup/', json.dumps({
+            'fullName': 'Fresh User', 'email': 'fresh@example.com', 'password': 'Str0ngPassw0rd'
+        }), content_type='application/json')
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertTrue(self.check('fresh@example.com')['exists'])
+
+        self.client.post('/api/profile/update/', json.dumps({'email': 'renamed@example.com'}),
+                         content_type='application/json')
+        self.assertTrue(self.check('renamed@example.com')['exists'])
+        # The old address stays in the filter but the database confirms it is free
+        self.assertFalse(self.check('fresh@example.com')['exists'])
+
+    @override_settings(EMAIL_BLOOM_REFRESH_SECONDS=0)
+    def test_refresh_picks_up_bulk_created_users(self):
+        registered_emails.might_contain('warmup@example.com')
+        User.objects.bulk_create([User(username='bulk', email='bulk@example.com')])
+        self.assertTrue(registered_emails.is_registered('bulk@example.com'))
+
+    @override_settings(EMAIL_BLOOM_REFRESH_SECONDS=0)
+    def test_refresh_counts_only_new_emails(self):
+        registered_emails.might_contain('warmup@example.com')
+        self.assertEqual(registered_emails._count, 100)
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in User.objects.all()])
+        for _ in range(3):  # Every refresh sees the saved profiles again
+            registered_emails.might_contain('warmup@example.com')
+        User.objects.create_user('new', 'new@example.com', 'x')
+        registered_emails.add('NEW@example.com')
+        self.assertEqual(registered_emails._count, 101)
+
+    @override_settings(EMAIL_BLOOM_REFRESH_SECONDS=0)
+    def test_shared_filter_counts_in_its_header(self):
+        name = f'derivity-test-bloom-{os.getpid()}'
+        with self.settings(EMAIL_BLOOM_SHARED_NAME=name):
+            registered_emails.might_contain('warmup@example.com')
+            segment = registered_emails._shm.name
+            self.addCleanup(os.remove, os.path.join(tempfile.gettempdir(), f'{segment}.lock'))
+            self.addCleanup(lambda: shared_memory.SharedMemory(name=segment).unlink())
+            self.addCleanup(registered_emails.reset)
+
+            User.objects.create_user('new', 'new@example.com', 'x')
+            registered_emails.might_contain('warmup@example.com')  # Refresh sees the user again
+            self.assertTrue(registered_emails.is_registered('new@example.com'))
+            self.assertEqual(bloom.HEADER.unpack_from(registered_emails._shm.buf), (1, 101, registered_emails._max_pk))
+
+    def test_shared_build_holds_the_lock_and_unlinks_outgrown_segments(self):
+        name = f'derivity-test-bloom-grow-{os.getpid()}'
+        populate = registered_emails._populate
+
+        def locked_populate(bloom_filter, since_pk):
+            with open(os.path.join(tempfile.gettempdir(), f'{registered_emails._shm.name}.lock'), 'a') as f:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return populate(bloom_filter, since_pk)
+
+        with self.settings(EMAIL_BLOOM_SHARED_NAME=name), mock.patch.object(bloom, 'MIN_CAPACITY', 128), \
+                mock.patch.object(registered_emails, '_populate', locked_populate):
+            registered_emails.might_contain('warmup@example.com')
+            small = registered_emails._shm.name
+            self.assertEqual(small, f'{name}-256')
+            User.objects.bulk_create([User(username=f'more{i}', email=f'more{i}@example.com') for i in range(100)])
+            registered_emails._filter = None  # As a refresh does once the count passes capacity
+            registered_emails.might_contain('warmup@example.com')
+            large = registered_emails._shm.name
+            for segment in (small, large):
+                self.addCleanup(os.remove, os.path.join(tempfile.gettempdir(), f'{segment}.lock'))
+            self.addCleanup(lambda: shared_memory.SharedMemory(name=large).unlink())
+            self.addCleanup(registered_emails.reset)
+
+        self.assertEqual(large, f'{name}-512')
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=small)
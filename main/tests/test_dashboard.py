@@ -0,0 +1,133 @@
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from main import dashboard, marketdata, trading
+from main.models import PaperFill
+
+
+@override_settings(METRICS_DIR=None)
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(MARKET_DATA_DIR=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.store = marketdata.get_store()
+        for seed, symbol in enumerate(['AAA', 'BBB']):
+            bars = marketdata.synthetic_bars(300, step=86400, seed=seed)
+            self.store.append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'x')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'x')
+
+    def store_fills(self, *fills):
+        """Store fills the way the matching engine's writer does"""
+        stored = PaperFill.objects.bulk_create([PaperFill(
+            symbol=symbol, price=Decimal(price), quantity=quantity, buy_order_id=1, sell_order_id=2,
+            buyer=buyer, seller=seller, aggressor='buy', executed_at=timezone.now(),
+        ) for symbol, price, quantity, buyer, seller in fills])
+        trading.fills_stored.send(sender=PaperFill, fills=stored)
+
+    def close(self, symbol):
+        series = self.store.series(symbol)
+        return float(series.columns['close'][series.rows - 1])
+
+    def test_snapshot(self):
+        self.store_fills(('AAA', '10', 100, self.alice, self.bob), ('AAA', '12', 40, self.bob, self.alice),
+                         ('BBB', '50', 10, self.alice, self.bob), ('CCC', '5', 3, self.alice, self.bob))
+        self.client.force_login(self.alice)
+        response = self.client.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        data = response.json()
+        positions = {item['symbol']: item for item in data['positions']}
+        self.assertEqual((positions['AAA']['quantity'], positions['AAA']['net_cost']), (60, 520.0))
+        self.assertAlmostEqual(positions['AAA']['pnl'], 60 * self.close('AAA') - 520.0, places=4)
+        self.assertEqual(set(positions['BBB']['indicators']), set(dashboard.INDICATORS))
+        self.assertIsNone(positions['CCC']['last'])  # No bars stored
+        self.assertEqual((data['totals']['open_positions'], data['totals']['unmarked']), (3, 1))
+        self.assertGreater(data['risk']['var']['0.99'], data['risk']['var']['0.95'])
+
+        bob = dashboard.load_positions(self.bob.pk)['positions']
+        self.assertEqual(bob['AAA'], [-60, -520.0])
+
+    def test_not_modified(self):
+        self.store_fills(('AAA', '10', 100, self.alice, self.bob))
+        self.client.force_login(self.alice)
+        first = self.client.get('/api/dashboard/')
+        with self.assertNumQueries(5):  # Session and user only
+            response = self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        cache.delete(dashboard._snapshot_key(self.alice.pk))
+        rebuilt = self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(rebuilt.status_code, 304)  # Same content, same ETag
+
+    def test_fills_patch_positions(self):
+        self.store_fills(('AAA', '10', 100, self.alice, self.bob))
+        etag, _ = dashboard.get_snapshot(self.alice.pk)
+        self.store_fills(('AAA', '11', 50, self.bob, self.alice), ('BBB', '20', 5, self.alice, self.alice))
+        self.assertIsNone(cache.get(dashboard._snapshot_key(self.alice.pk)))
+        with self.assertNumQueries(0):
+            state = dashboard.positions(self.alice.pk)
+        self.assertEqual(state['positions'], {'AAA': [50, 450.0], 'BBB': [0, 0.0]})  # Self-trades net out
+        self.assertEqual(state, dashboard.load_positions(self.alice.pk))
+        self.assertNotEqual(dashboard.get_snapshot(self.alice.pk)[0], etag)
+
+        # Fills the cached entry already includes are not counted twice
+        dashboard.apply_fills(PaperFill.objects.all())
+        self.assertEqual(dashboard.positions(self.alice.pk), state)
+
+    def test_appended_bars_drop_holders_snapshots(self):
+        self.store_fills(('AAA', '10', 100, self.alice, None), ('BBB', '10', 1, self.bob, None))
+        for user in (self.alice, self.bob):
+            dashboard.get_snapshot(user.pk)
+        last = self.store.info('BBB')['last_ts']
+        self.store.append('BBB', [last + 86400], [1.0], [1.0], [1.0], [1.0], [1.0])
+        self.assertIsNotNone(cache.get(dashboard._snapshot_key(self.alice.pk)))
+        self.assertIsNone(cache.get(dashboard._snapshot_key(self.bob.pk)))
+
+        self.client.force_login(self.bob)
+        position, = self.client.get('/api/dashboard/').json()['positions']
+        self.assertEqual((position['last'], position['ts']), (1.0, last + 86400))
+
+    def test_cached_positions_expire_with_snapshots(self):
+        self.store_fills(('AAA', '10', 100, self.alice, self.bob))
+        # Matched in another process: its fills_stored signal never reaches this cache
+        PaperFill.objects.create(symbol='AAA', price=Decimal('10'), quantity=1, buy_order_id=3, sell_order_id=4,
+                                 buyer=self.alice, aggressor='buy', executed_at=timezone.now())
+        with self.settings(DASHBOARD_SNAPSHOT_TIMEOUT=0):  # Every entry has expired
+            dashboard.get_snapshot(self.alice.pk)
+            self.assertEqual(dashboard.positions(self.alice.pk)['positions']['AAA'][0], 101)
+        dashboard.get_snapshot(self.alice.pk)
+        PaperFill.objects.create(symbol='AAA', price=Decimal('10'), quantity=1, buy_order_id=5, sell_order_id=6,
+                                 buyer=self.alice, aggressor='buy', executed_at=timezone.now())
+        self.assertEqual(dashboard.positions(self.alice.pk)['positions']['AAA'][0], 101)  # Until they expire
+
+    def test_build_racing_an_update_is_not_stored(self):
+        self.store_fills(('AAA', '10', 100, self.alice, self.bob))
+        compose = dashboard.compose
+
+        def racing_compose(state, risk_window):
+            self.store_fills(('AAA', '10', 1, self.alice, self.bob))
+            return compose(state, risk_window)
+
+        with mock.patch.object(dashboard, 'compose', racing_compose):
+            dashboard.get_snapshot(self.alice.pk)
+        self.assertIsNone(cache.get(dashboard._snapshot_key(self.alice.pk)))
+        self.assertEqual(dashboard.positions(self.alice.pk)['positions']['AAA'][0], 101)
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.post('/api/dashboard/').status_code, 405)
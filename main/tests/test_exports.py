@@ -0,0 +1,107 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from main import exports
+from main.models import ContactMessage, LoginAttempt
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='ops', email='ops@example.com', password='x', is_staff=True)
+        cls.member = User.objects.create_user(username='member', email='member@example.com', password='x')
+        attempts = LoginAttempt.objects.bulk_create([
+            LoginAttempt(email=f'user{i}@example.com', ip_address='10.0.0.1', success=bool(i % 2))
+            for i in range(25)
+        ])
+        # Several rows share a timestamp so pages must break ties on id
+        base = timezone.now() - timedelta(days=10)
+        for i, attempt in enumerate(attempts):
+            attempt.timestamp = base + timedelta(days=i // 5)
+        LoginAttempt.objects.bulk_update(attempts, ['timestamp'])
+        cls.base = base
+
+    def test_keyset_pages_return_every_row_once_in_order(self):
+        with self.assertNumQueries(4):  # 25 rows in pages of 7; the short last page ends the scan
+            rows = list(exports.iter_rows('login_attempts', chunk_size=7))
+        ids = [row[0] for row in rows]
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(set(ids)), 25)
+        self.assertEqual(ids, sorted(ids))
+
+    def test_date_range_filter(self):
+        start = (self.base + timedelta(days=1)).isoformat()
+        end = (self.base + timedelta(days=2)).isoformat()
+        rows = list(exports.iter_rows(
+            'login_attempts', exports.parse_bound(start), exports.parse_bound(end, end=True), chunk_size=3
+        ))
+        self.assertEqual(len(rows), 10)
+
+    def test_staff_csv_download(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/export/login_attempts/')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        body = b''.join(response.streaming_content).decode()
+        reader = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(reader[0][:3], ['id', 'timestamp', 'email'])
+        self.assertEqual(len(reader), 26)
+
+    def test_gzip_jsonl_download(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/export/users/', {'format': 'jsonl', 'gzip': '1'})
+        self.assertIn('.jsonl.gz', response['Content-Disposition'])
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        emails = [json.loads(line)['email'] for line in lines]
+        self.assertEqual(emails, ['ops@example.com', 'member@example.com'])
+        self.assertIn('newsletter_subscription', json.loads(lines[0]))
+
+    def test_csv_cells_cannot_be_formulas(self):
+        ContactMessage.objects.create(name='=HYPERLINK("http://example.com")', email='a@example.com',
+                                      message='-2+3')
+        ContactMessage.objects.create(name='Plain', email='b@example.com', message='a = b')
+        body = b''.join(exports.stream_export('contact_messages')).decode()
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual((rows[0]['name'], rows[0]['message']), ('\'=HYPERLINK("http://example.com")', "'-2+3"))
+        self.assertEqual((rows[1]['name'], rows[1]['message']), ('Plain', 'a = b'))
+        self.assertEqual(rows[0]['responded'], 'False')
+
+    @override_settings(ASYNC_VIEWS=True)
+    async def test_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get('/api/export/login_attempts/')
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(list(csv.reader(io.StringIO(body)))), 26)
+
+    def test_non_staff_and_bad_input_rejected(self):
+        self.assertEqual(self.client.get('/api/export/users/').status_code, 403)
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get('/api/export/users/').status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/api/export/secrets/').status_code, 404)
+        self.assertEqual(self.client.get('/api/export/users/', {'start': 'yesterday'}).status_code, 400)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('export_data', 'login_attempts', format='jsonl', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 25)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'attempts.csv.gz')
+            call_command('export_data', 'login_attempts', gzip=True, output=path, stderr=StringIO())
+            with gzip.open(path, 'rt') as f:
+                self.assertEqual(len(f.read().splitlines()), 26)
+
+        with self.assertRaisesMessage(CommandError, '--chunk-size must be positive'):
+            call_command('export_data', 'login_attempts', chunk_size=0, stdout=StringIO())
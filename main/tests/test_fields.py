@@ -0,0 +1,44 @@
+from django.db import connection
+from django.test import TestCase
+
+from main.fields import RAW, ZLIB, decode_text, encode_text
+from main.models import AIConversation
+
+
+class CompressedTextFieldTests(TestCase):
+    def stored_bytes(self, conversation, column):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {column} FROM main_aiconversation WHERE id = %s', [conversation.pk])
+            return bytes(cursor.fetchone()[0])
+
+    def test_round_trip_and_storage_format(self):
+        long_text = 'Derivatives pricing explained, step by step — Δ, Γ and ν. ' * 100
+        conversation = AIConversation.objects.create(session_id='s1', message='Hi', response=long_text)
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message, 'Hi')
+        self.assertEqual(conversation.response, long_text)
+
+        self.assertEqual(self.stored_bytes(conversation, 'message'), bytes([RAW]) + b'Hi')
+        stored = self.stored_bytes(conversation, 'response')
+        self.assertEqual(stored[0], ZLIB)
+        self.assertLess(len(stored), len(long_text.encode()) / 10)
+
+    def test_values_list_and_exact_lookup_decode(self):
+        AIConversation.objects.create(session_id='s1', message='What is a call option?', response='x' * 1000)
+        self.assertEqual(
+            list(AIConversation.objects.values_list('message', 'response')),
+            [('What is a call option?', 'x' * 1000)]
+        )
+        self.assertTrue(AIConversation.objects.filter(response='x' * 1000).exists())
+
+    def test_text_that_does_not_shrink_is_stored_raw(self):
+        self.assertEqual(encode_text('Hello there', threshold=1), bytes([RAW]) + b'Hello there')
+        unicode_text = 'Ωμέγα ' * 80
+        self.assertEqual(decode_text(encode_text(unicode_text)), unicode_text)
+
+    def test_threshold_and_unknown_codec(self):
+        self.assertEqual(encode_text('a' * 255)[0], RAW)
+        self.assertEqual(encode_text('a' * 256)[0], ZLIB)
+        self.assertEqual(decode_text(b''), '')
+        with self.assertRaises(ValueError):
+            decode_text(b'\x07payload')
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.http import JsonResponse
+
+from main import idempotency
+from main.models import ContactMessage, UserProfile
+
+CONTACT = {'name': 'Sam Visitor', 'email': 'sam@example.com', 'message': 'Please call me back about pricing.'}
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    METRICS_DIR=None,
+    IDEMPOTENCY_WAIT_SECONDS=1,
+)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def post(self, url, data, key=None):
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post(url, json.dumps(data), content_type='application/json', headers=headers)
+
+    def test_retry_replays_without_creating_duplicates(self):
+        first = self.post('/api/contact/', CONTACT, key='retry-1')
+        with self.assertNumQueries(0):
+            retry = self.post('/api/contact/', CONTACT, key='retry-1')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(ContactMessage.objects.count(), 1)
+
+        # Without a key, or with a new one, the request runs again
+        self.post('/api/contact/', CONTACT)
+        self.post('/api/contact/', CONTACT, key='retry-2')
+        self.assertEqual(ContactMessage.objects.count(), 3)
+
+    def test_key_reused_with_different_body(self):
+        self.post('/api/contact/', CONTACT, key='retry-1')
+        response = self.post('/api/contact/', dict(CONTACT, message='Something else entirely.'), key='retry-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ContactMessage.objects.count(), 1)
+
+    def test_signup_retry(self):
+        signup = {'fullName': 'New Person', 'email': 'new@example.com', 'password': 'Str0ngPassw0rd'}
+        first = self.post('/api/signup/', signup, key='signup-1')
+        self.assertEqual(first.json()['status'], 'success')
+        self.client.logout()  # The retry comes from a client that never saw the cookie
+        retry = self.post('/api/signup/', signup, key='signup-1')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(User.objects.filter(email='new@example.com').count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        jane = User.objects.create_user(username='jane', email='jane@example.com', password='x')
+        sam = User.objects.create_user(username='sam', email='sam@example.com', password='x')
+        UserProfile.objects.create(user=jane)
+        UserProfile.objects.create(user=sam)
+        for user in (jane, sam):
+            self.client.force_login(user)
+            response = self.post('/api/profile/update/', {'first_name': 'Alex'}, key='same-key')
+            self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(User.objects.filter(first_name='Alex').count(), 2)
+
+    def test_concurrent_duplicate_waits_for_first(self):
+        factory = RequestFactory()
+        calls = []
+        started = threading.Event()
+
+        @idempotency.idempotent
+        def slow_view(request):
+            calls.append(1)
+            started.set()
+            time.sleep(0.3)
+            return JsonResponse({'status': 'success', 'call': len(calls)})
+
+        def request():
+            req = factory.post('/slow/', '{}', content_type='application/json', headers={'Idempotency-Key': 'k'})
+            req.user = User()
+            return req
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(slow_view(request())))
+        first.start()
+        started.wait()
+        duplicate = slow_view(request())
+        first.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(json.loads(duplicate.content), json.loads(results[0].content))
+        self.assertEqual(duplicate['Idempotent-Replayed'], 'true')
+
+    def test_server_errors_are_not_stored(self):
+        factory = RequestFactory()
+        responses = iter([JsonResponse({'status': 'error'}, status=503), JsonResponse({'status': 'success'})])
+
+        @idempotency.idempotent
+        def flaky_view(request):
+            return next(responses)
+
+        def request():
+            req = factory.post('/flaky/', '{}', content_type='application/json', headers={'Idempotency-Key': 'k'})
+            req.user = User()
+            return req
+
+        self.assertEqual(flaky_view(request()).status_code, 503)
+        self.assertEqual(flaky_view(request()).status_code, 200)
+
+    def test_transient_view_failure_is_not_replayed(self):
+        with mock.patch.object(ContactMessage.objects, 'create', side_effect=RuntimeError('database is locked')):
+            failed = self.post('/api/contact/', CONTACT, key='transient')
+        self.assertEqual(failed.status_code, 500)
+        retry = self.post('/api/contact/', CONTACT, key='transient')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['status'], 'success')
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(ContactMessage.objects.count(), 1)
+
+    def test_abandoned_request_times_out(self):
+        factory = RequestFactory()
+
+        @idempotency.idempotent
+        def view(request):
+            return JsonResponse({'status': 'success'})
+
+        req = factory.post('/view/', '{}', content_type='application/json', headers={'Idempotency-Key': 'k'})
+        req.user = User()
+        # Another worker holds the in-flight marker and never finishes
+        cache.add(idempotency._cache_key(req, 'view', 'k') + ':lock', 'x')
+        self.assertEqual(view(req).status_code, 409)
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from main.bloom import registered_emails
+from main.models import UserProfile
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        registered_emails.reset()
+        self.addCleanup(registered_emails.reset)
+        User.objects.create_user(username='ann', email='ann@example.com', password='x')
+
+    def write(self, suffix, content):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def test_csv_import_validates_hashes_and_creates_profiles(self):
+        path = self.write('.csv', (
+            'full_name,email,password,newsletter\n'
+            'Bob Stone,Bob@Example.com,Str0ngPassw0rd,yes\n'
+            'Ann Clash,ann@example.com,Str0ngPassw0rd,no\n'
+            'B4d Name,bad@example.com,Str0ngPassw0rd,no\n'
+            'Weak Pass,weak@example.com,short,no\n'
+            'Bob Again,bob@example.com,Str0ngPassw0rd,no\n'
+            'Ann Other,ann@other.com,,no\n'
+        ))
+        rejects = path + '.rejects'
+        self.addCleanup(lambda: os.path.exists(rejects) and os.unlink(rejects))
+        out = StringIO()
+        call_command('import_users', path, workers=2, batch_size=2, rejects=rejects, stdout=out, stderr=StringIO())
+
+        self.assertIn('Imported 2 users', out.getvalue())
+        bob = User.objects.get(email='bob@example.com')
+        self.assertEqual((bob.username, bob.first_name, bob.last_name), ('bob', 'Bob', 'Stone'))
+        self.assertTrue(bob.check_password('Str0ngPassw0rd'))
+        self.assertTrue(bob.profile.newsletter_subscription)
+
+        # Username collides with the existing 'ann'; no password means an unusable one
+        other = User.objects.get(email='ann@other.com')
+        self.assertTrue(other.username.startswith('ann_'))
+        self.assertFalse(other.has_usable_password())
+        self.assertEqual(UserProfile.objects.count(), 2)
+
+        with open(rejects) as f:
+            reasons = [json.loads(line)['reason'] for line in f]
+        self.assertEqual(len(reasons), 4)
+        self.assertIn('An account with this email already exists', reasons)
+        self.assertIn('Duplicate email in file', reasons)
+
+        self.assertTrue(registered_emails.is_registered('bob@example.com'))
+
+    def test_jsonl_dry_run_inserts_nothing(self):
+        path = self.write('.jsonl', json.dumps({
+            'fullName': 'Cara Moss', 'email': 'cara@example.com', 'password': 'Str0ngPassw0rd'
+        }) + '\nnot json\n')
+        out = StringIO()
+        call_command('import_users', path, workers=1, dry_run=True, stdout=out, stderr=StringIO())
+        self.assertIn('Validated 1 users', out.getvalue())
+        self.assertFalse(User.objects.filter(email='cara@example.com').exists())
+
+    def test_non_string_password_is_rejected_per_row(self):
+        rows = [
+            {'fullName': 'Num Pass', 'email': 'num@example.com', 'password': 123456789012},
+            {'fullName': 'List Pass', 'email': 'list@example.com', 'password': ['Str0ngPassw0rd']},
+            {'fullName': 'Good Pass', 'email': 'good@example.com', 'password': 'Str0ngPassw0rd'},
+        ]
+        path = self.write('.jsonl', ''.join(json.dumps(row) + '\n' for row in rows))
+        rejects = path + '.rejects'
+        self.addCleanup(lambda: os.path.exists(rejects) and os.unlink(rejects))
+        out = StringIO()
+        call_command('import_users', path, workers=1, rejects=rejects, stdout=out, stderr=StringIO())
+        self.assertIn('Imported 1 users', out.getvalue())
+        with open(rejects) as f:
+            self.assertEqual([(reject['line'], reject['reason']) for reject in map(json.loads, f)],
+                             [(1, 'Password must be a string'), (2, 'Password must be a string')])
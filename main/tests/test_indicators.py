@@ -0,0 +1,111 @@
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from main import indicators, marketdata
+
+
+def reference_ema(x, span):
+    alpha = 2 / (span + 1)
+    out = np.empty_like(x)
+    out[..., 0] = x[..., 0]
+    for t in range(1, x.shape[-1]):
+        out[..., t] = alpha * x[..., t] + (1 - alpha) * out[..., t - 1]
+    return out
+
+
+class IndicatorTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        self.panel = 100 + np.cumsum(rng.normal(0, 1, (4, 700)), axis=1)
+
+    def test_blocked_ema_matches_recurrence(self):
+        for span in (3, 20, 500):
+            with self.subTest(span=span):
+                np.testing.assert_allclose(indicators.ema(self.panel, span), reference_ema(self.panel, span),
+                                           rtol=1e-12)
+        np.testing.assert_allclose(indicators.ema(self.panel[0, :5], 20), reference_ema(self.panel[0, :5], 20))
+
+    def test_rolling_windows_match_direct_computation(self):
+        x = self.panel[1]
+        window = np.lib.stride_tricks.sliding_window_view(x, 20)
+        mean, upper, lower = indicators.bollinger(x, 20, 2.0)
+        self.assertTrue(np.isnan(mean[:19]).all())
+        np.testing.assert_allclose(mean[19:], window.mean(axis=1))
+        np.testing.assert_allclose(upper[19:], window.mean(axis=1) + 2 * window.std(axis=1))
+        np.testing.assert_allclose(indicators.zscore(x, 20)[19:], (x[19:] - window.mean(axis=1)) / window.std(axis=1))
+
+        returns = np.lib.stride_tricks.sliding_window_view(np.diff(np.log(x)), 20)
+        vol = indicators.volatility(x, 20)
+        self.assertTrue(np.isnan(vol[:20]).all())
+        np.testing.assert_allclose(vol[20:], returns.std(axis=1, ddof=1))
+
+    def test_rsi_bounds_and_extremes(self):
+        values = indicators.rsi(self.panel, 14)
+        self.assertTrue(np.isnan(values[:, :14]).all())
+        self.assertTrue(((values[:, 14:] >= 0) & (values[:, 14:] <= 100)).all())
+        self.assertEqual(indicators.rsi(np.arange(1.0, 40.0), 14)[-1], 100.0)
+        self.assertEqual(indicators.rsi(np.full(40, 5.0), 14)[-1], 50.0)
+
+    def test_incremental_updates_match_full_computation(self):
+        full = indicators.compute(self.panel, **indicators.DEFAULTS)
+        state = indicators.IndicatorState(self.panel.shape[0], **indicators.DEFAULTS)
+        for t in range(self.panel.shape[1]):
+            values = state.update(self.panel[:, t])
+            if t in (0, 13, 14, 19, 20, 21, 699):
+                for name in indicators.NAMES:
+                    np.testing.assert_allclose(values[name], full[name][:, t], rtol=1e-9, atol=1e-9,
+                                               err_msg=f'{name} at bar {t}')
+
+    def test_state_from_history_continues_incrementally(self):
+        full = indicators.compute(self.panel, **indicators.DEFAULTS)
+        state = indicators.IndicatorState.from_history(self.panel[:, :650], **indicators.DEFAULTS)
+        for t in range(650, 700):
+            values = state.update(self.panel[:, t])
+        for name in indicators.NAMES:
+            np.testing.assert_allclose(values[name], full[name][:, -1], rtol=1e-9, atol=1e-9, err_msg=name)
+
+    def test_payload_replaces_nan(self):
+        self.assertEqual(indicators.to_payload(np.array([np.nan, 1.23456789])), [None, 1.234568])
+        self.assertIsNone(indicators.to_payload(np.float64('nan')))
+
+
+@override_settings(METRICS_DIR=None)
+class IndicatorApiTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        overrides = override_settings(MARKET_DATA_DIR=root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.bars = marketdata.synthetic_bars(5000, seed=2)
+        self.append(0, 4000)
+
+    def append(self, lo, hi):
+        marketdata.get_store().append('DRV', self.bars['ts'][lo:hi],
+                                      *(self.bars[name][lo:hi] for name in marketdata.COLUMNS))
+
+    def test_latest_values_follow_appended_bars(self):
+        body = self.client.get('/api/market/DRV/indicators/').json()
+        self.assertEqual(body['ts'], int(self.bars['ts'][3999]))
+        self.assertNotIn('series', body)
+
+        self.append(4000, 5000)
+        body = self.client.get('/api/market/DRV/indicators/').json()
+        full = indicators.compute(self.bars['close'], **indicators.DEFAULTS)
+        self.assertEqual(body['ts'], int(self.bars['ts'][-1]))
+        for name in indicators.NAMES:
+            self.assertAlmostEqual(body['indicators'][name], full[name][-1], places=5, msg=name)
+
+    def test_series(self):
+        body = self.client.get('/api/market/DRV/indicators/', {'bars': 30}).json()
+        series = body['series']
+        self.assertEqual(series['ts'], self.bars['ts'][3970:4000].tolist())
+        self.assertEqual(len(series['sma']), 30)
+        self.assertEqual(series['rsi'][-1], body['indicators']['rsi'])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/api/market/NOPE/indicators/').status_code, 404)
+        self.assertEqual(self.client.get('/api/market/DRV/indicators/', {'bars': -1}).status_code, 400)
@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main import ippolicy
+from main.ippolicy import IPPolicy, IntervalSet, PolicyLoader, parse_ip
+
+
+class IPPolicyTests(SimpleTestCase):
+    def test_interval_set_merges_overlapping_and_adjacent_ranges(self):
+        intervals = IntervalSet([(10, 20), (15, 30), (31, 40), (50, 60)])
+        self.assertEqual(list(intervals.starts), [10, 50])
+        self.assertEqual(list(intervals.ends), [40, 60])
+        self.assertIn(10, intervals)
+        self.assertIn(40, intervals)
+        self.assertNotIn(41, intervals)
+        self.assertNotIn(9, intervals)
+
+    def test_ipv4_and_ipv6_boundaries(self):
+        policy = IPPolicy(blocked=['203.0.113.0/24', '2001:db8::/32', '198.51.100.7'])
+        self.assertTrue(policy.is_blocked('203.0.113.0'))
+        self.assertTrue(policy.is_blocked('203.0.113.255'))
+        self.assertFalse(policy.is_blocked('203.0.114.0'))
+        self.assertTrue(policy.is_blocked('198.51.100.7'))
+        self.assertFalse(policy.is_blocked('198.51.100.8'))
+        self.assertTrue(policy.is_blocked('2001:db8:ffff::1'))
+        self.assertFalse(policy.is_blocked('2001:db9::1'))
+        self.assertTrue(policy.is_blocked('::ffff:203.0.113.9'))
+
+    def test_allowlist_overrides_blocklist_and_bad_input_is_allowed(self):
+        policy = IPPolicy(blocked=['10.0.0.0/8'], allowed=['10.1.0.0/16'])
+        self.assertTrue(policy.is_blocked('10.2.3.4'))
+        self.assertFalse(policy.is_blocked('10.1.3.4'))
+        self.assertFalse(policy.is_blocked('not-an-ip'))
+        self.assertEqual(parse_ip(None), (None, None))
+
+    def test_loader_reloads_changed_file_in_background(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('# office abuse\n192.0.2.0/24\nbogus-line\n')
+        self.addCleanup(os.unlink, f.name)
+
+        loader = PolicyLoader(f.name, check_interval=0)
+        self.assertTrue(loader.get().is_blocked('192.0.2.10'))
+
+        with open(f.name, 'w') as out:
+            out.write('198.51.100.0/24\n')
+        os.utime(f.name, ns=(time.time_ns(), time.time_ns() + 10**9))
+        loader.get()  # Triggers the background reload
+        deadline = time.monotonic() + 5
+        while loader.get().is_blocked('192.0.2.10') and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(loader.get().is_blocked('192.0.2.10'))
+        self.assertTrue(loader.get().is_blocked('198.51.100.1'))
+
+
+class IPPolicyMiddlewareTests(TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('203.0.113.0/24\n')
+        self.addCleanup(os.unlink, f.name)
+        self.blocklist = f.name
+
+    def test_blocks_auth_endpoints_only(self):
+        with override_settings(IP_BLOCKLIST_FILE=self.blocklist):
+            login = self.client.post('/api/login/', json.dumps({'username': 'a@example.com', 'password': 'x'}),
+                                     content_type='application/json', REMOTE_ADDR='203.0.113.5')
+            page = self.client.get('/', REMOTE_ADDR='203.0.113.5')
+            other = self.client.post('/api/login/', json.dumps({'username': 'a@example.com', 'password': 'x'}),
+                                     content_type='application/json', REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(login.status_code, 403)
+        self.assertEqual(page.status_code, 200)
+        self.assertEqual(other.status_code, 200)
+
+    def test_forwarded_for_is_only_trusted_from_proxies(self):
+        login = lambda **extra: self.client.post(
+            '/api/login/', json.dumps({'username': 'a@example.com', 'password': 'x'}),
+            content_type='application/json', **extra
+        ).status_code
+        with override_settings(IP_BLOCKLIST_FILE=self.blocklist):
+            self.assertEqual(login(REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='8.8.8.8'), 403)
+            self.assertEqual(login(REMOTE_ADDR='8.8.8.8', HTTP_X_FORWARDED_FOR='203.0.113.9'), 200)
+            with override_settings(TRUSTED_PROXIES=['10.0.0.0/8']):
+                # The proxy appends the real peer; entries left of it are the client's own
+                self.assertEqual(login(REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='8.8.8.8, 203.0.113.5'), 403)
+                self.assertEqual(login(REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='203.0.113.9, 8.8.8.8'), 200)
+
+
+class ClientIPTests(SimpleTestCase):
+    def test_walks_forwarded_for_past_trusted_proxies(self):
+        meta = {'REMOTE_ADDR': '10.0.0.2', 'HTTP_X_FORWARDED_FOR': '1.1.1.1, 8.8.8.8, 10.0.0.9'}
+        self.assertEqual(ippolicy.client_ip(meta), '10.0.0.2')
+        with override_settings(TRUSTED_PROXIES=['10.0.0.0/8']):
+            self.assertEqual(ippolicy.client_ip(meta), '8.8.8.8')
+            self.assertEqual(ippolicy.client_ip({'REMOTE_ADDR': '10.0.0.2'}), '10.0.0.2')
+            self.assertEqual(ippolicy.client_ip({'REMOTE_ADDR': '10.0.0.2', 'HTTP_X_FORWARDED_FOR': 'junk'}),
+                             '10.0.0.2')
+            self.assertEqual(ippolicy.client_ip({'REMOTE_ADDR': '192.0.2.1', 'HTTP_X_FORWARDED_FOR': '8.8.8.8'}),
+                             '192.0.2.1')
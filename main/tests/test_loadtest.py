@@ -0,0 +1,57 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from benchmarks import loadtest
+
+
+class LoadTestStatsTests(SimpleTestCase):
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 95), 95)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile([], 50), 0.0)
+
+    def test_summarize_counts_errors_and_throughput(self):
+        samples = [(0.010, True), (0.020, True), (0.030, False), (0.040, True)]
+        summary = loadtest.summarize(samples, elapsed=2.0)
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['error_rate'], 0.25)
+        self.assertEqual(summary['rps'], 2.0)
+        self.assertEqual(summary['p50_ms'], 20.0)
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = {'login': {'p95_ms': 100.0, 'rps': 50.0, 'error_rate': 0.0}}
+        within = {'login': {'p95_ms': 105.0, 'rps': 48.0, 'error_rate': 0.0}}
+        slower = {'login': {'p95_ms': 130.0, 'rps': 30.0, 'error_rate': 0.05}}
+
+        self.assertEqual(loadtest.compare(within, baseline)[1], [])
+        self.assertEqual(
+            loadtest.compare(slower, baseline)[1],
+            ['login.p95_ms', 'login.rps', 'login.error_rate']
+        )
+
+
+@override_settings(METRICS_DIR=None, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestCommandTests(TransactionTestCase):
+    def run_command(self, **options):
+        out = StringIO()
+        call_command('loadtest', scenarios='login', users=3, requests=6, concurrency=1, stdout=out,
+                     stderr=StringIO(), **options)
+        return json.loads(out.getvalue())
+
+    def bench_users(self):
+        return User.objects.filter(email__endswith=f'@{loadtest.BENCH_EMAIL_DOMAIN}').count()
+
+    def test_benchmark_rows_are_deleted_unless_kept(self):
+        report = self.run_command()
+        self.assertEqual(report['results']['login']['requests'], 6)
+        self.assertEqual(self.bench_users(), 0)
+
+        self.run_command(keep=True)
+        self.assertEqual(self.bench_users(), 3)
@@ -0,0 +1,93 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from main import lockout
+from main.models import LoginAttempt, UserProfile
+
+PASSWORD = 'Str0ngPassw0rd'
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LockoutCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='jane', email='jane@example.com', password=PASSWORD)
+        self.profile = UserProfile.objects.create(user=self.user)
+
+    def login(self, password):
+        response = self.client.post('/api/login/', json.dumps({
+            'username': 'Jane@Example.com', 'password': password
+        }), content_type='application/json')
+        return response.json()
+
+    def test_locked_account_rejected_without_queries(self):
+        for _ in range(5):
+            self.assertEqual(self.login('Wr0ngPassword')['status'], 'error')
+        self.assertTrue(lockout.is_locked('jane@example.com'))
+
+        with self.assertNumQueries(0):
+            result = self.login(PASSWORD)
+        self.assertIn('locked', result['message'])
+        # Only the five password failures reached the audit table
+        self.assertEqual(LoginAttempt.objects.filter(email='jane@example.com').count(), 5)
+
+    def test_cold_cache_falls_back_to_database_and_warms(self):
+        self.profile.failed_login_attempts = 5
+        self.profile.account_locked_until = timezone.now() + timedelta(minutes=30)
+        self.profile.save()
+        cache.clear()
+
+        self.assertIn('locked', self.login(PASSWORD)['message'])
+        self.assertTrue(lockout.is_locked('jane@example.com'))
+        self.assertEqual(LoginAttempt.objects.filter(failure_reason='Account locked').count(), 1)
+
+    def test_expired_lock_allows_login_and_resets_state(self):
+        for _ in range(5):
+            self.login('Wr0ngPassword')
+        # Lock ran out in the database; the mirror compares against the same timestamp
+        profile = UserProfile.objects.select_related('user').get(pk=self.profile.pk)
+        profile.account_locked_until = timezone.now() - timedelta(seconds=1)
+        profile.save()
+        self.assertFalse(lockout.is_locked('jane@example.com'))
+
+        self.assertEqual(self.login(PASSWORD)['status'], 'success')
+        self.assertIsNone(lockout.get_state('jane@example.com'))
+        profile.refresh_from_db()
+        self.assertEqual(profile.failed_login_attempts, 0)
+        self.assertIsNone(profile.account_locked_until)
+
+    def test_success_resets_failure_count(self):
+        for _ in range(3):
+            self.login('Wr0ngPassword')
+        self.assertEqual(lockout.get_state('jane@example.com')['failed_attempts'], 3)
+
+        self.assertEqual(self.login(PASSWORD)['status'], 'success')
+        self.assertIsNone(lockout.get_state('jane@example.com'))
+
+    def test_admin_style_unlock_clears_mirror(self):
+        for _ in range(5):
+            self.login('Wr0ngPassword')
+        profile = UserProfile.objects.select_related('user').get(pk=self.profile.pk)
+        profile.reset_failed_attempts()
+        self.assertFalse(lockout.is_locked('jane@example.com'))
+        self.assertEqual(self.login(PASSWORD)['status'], 'success')
+
+    def test_save_without_loaded_user_updates_mirror(self):
+        for _ in range(5):
+            self.login('Wr0ngPassword')
+        profile = UserProfile.objects.get(pk=self.profile.pk)
+        with self.assertNumQueries(1):  # The save only; the user is never loaded
+            profile.reset_failed_attempts()
+        self.assertFalse(lockout.is_locked('jane@example.com'))
+
+    def test_bulk_update_clears_mirror(self):
+        for _ in range(5):
+            self.login('Wr0ngPassword')
+        UserProfile.objects.filter(user=self.user).update(failed_login_attempts=0, account_locked_until=None)
+        self.assertIsNone(lockout.get_state('jane@example.com'))
+        self.assertEqual(self.login(PASSWORD)['status'], 'success')
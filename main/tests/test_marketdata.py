@@ -0,0 +1,236 @@
+import io
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from main import marketdata
+
+
+def append(store, symbol, bars):
+    return store.append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+
+
+class MarketDataStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = marketdata.MarketDataStore(self.root)
+
+    def test_range_reads_match_a_linear_scan(self):
+        bars = marketdata.synthetic_bars(3 * marketdata.INDEX_STRIDE + 17)
+        append(self.store, 'DRV', bars)
+        ts = bars['ts']
+        for start, end in [(None, None), (ts[5], ts[5]), (ts[100] - 30, ts[9000] + 30),
+                           (ts[4095], ts[4096]), (ts[-1] + 60, None), (None, ts[0] - 60)]:
+            with self.subTest(start=start, end=end):
+                data = self.store.read('DRV', start, end)
+                mask = np.ones(len(ts), dtype=bool)
+                if start is not None:
+                    mask &= ts >= start
+                if end is not None:
+                    mask &= ts <= end
+                np.testing.assert_array_equal(data['ts'], ts[mask])
+                np.testing.assert_array_equal(data['close'], bars['close'][mask])
+
+    def test_reads_are_memory_mapped(self):
+        append(self.store, 'DRV', marketdata.synthetic_bars(100))
+        data = self.store.read('DRV')
+        self.assertIsInstance(data['close'], np.memmap)
+
+    def test_appends_extend_series_and_skip_old_bars(self):
+        bars = marketdata.synthetic_bars(10_000)
+        first = {name: values[:6000] for name, values in bars.items()}
+        overlap = {name: values[5000:] for name, values in bars.items()}
+        self.assertEqual(append(self.store, 'drv', first), 6000)
+        self.assertEqual(len(self.store.read('DRV')['ts']), 6000)
+
+        self.assertEqual(append(self.store, 'DRV', overlap), 4000)
+        data = self.store.read('DRV')
+        np.testing.assert_array_equal(data['ts'], bars['ts'])
+        np.testing.assert_array_equal(self.store.series('DRV').sparse, bars['ts'][::marketdata.INDEX_STRIDE])
+        self.assertEqual(self.store.info('DRV')['first_ts'], int(bars['ts'][0]))
+        self.assertEqual(self.store.symbols(), ['DRV'])
+
+    def test_uncommitted_bytes_are_ignored_and_truncated(self):
+        bars = marketdata.synthetic_bars(50)
+        append(self.store, 'DRV', {name: values[:40] for name, values in bars.items()})
+        # A writer that died after writing columns but before meta.json
+        with open(os.path.join(self.root, 'DRV', 'close.f8'), 'ab') as f:
+            f.write(b'\0' * 80)
+        self.assertEqual(len(self.store.read('DRV')['close']), 40)
+
+        append(self.store, 'DRV', {name: values[40:] for name, values in bars.items()})
+        np.testing.assert_array_equal(self.store.read('DRV')['close'], bars['close'])
+
+    def test_unsorted_input_is_ordered_and_deduplicated(self):
+        self.store.append('DRV', [180, 60, 120, 60], [3, 1, 2, 9], [3, 1, 2, 9], [3, 1, 2, 9], [3, 1, 2, 9], [1] * 4)
+        data = self.store.read('DRV')
+        self.assertEqual(data['ts'].tolist(), [60, 120, 180])
+        self.assertEqual(data['close'].tolist(), [1, 2, 3])
+
+    def test_rollups_are_maintained_across_partial_blocks(self):
+        bars = marketdata.synthetic_bars(5 * marketdata.ROLLUP_ROWS + 300, seed=5)
+        for lo, hi in [(0, 700), (700, 2500), (2500, len(bars['ts']))]:
+            append(self.store, 'DRV', {name: values[lo:hi] for name, values in bars.items()})
+        rollups = self.store.series('DRV').rollups
+        blocks = np.arange(0, len(bars['ts']), marketdata.ROLLUP_ROWS)
+        np.testing.assert_array_equal(rollups['high.max'], np.maximum.reduceat(bars['high'], blocks))
+        np.testing.assert_array_equal(rollups['volume.sum'], np.add.reduceat(bars['volume'], blocks))
+        np.testing.assert_array_equal(rollups['close.min'], np.minimum.reduceat(bars['close'], blocks))
+        np.testing.assert_array_equal(bars['close'][rollups['close.argmax']], rollups['close.max'])
+
+    def test_long_ranges_downsample_from_rollups(self):
+        bars = marketdata.synthetic_bars(60 * marketdata.ROLLUP_ROWS + 123, seed=6)
+        append(self.store, 'DRV', bars)
+        first, last = 517, len(bars['ts']) - 211
+        window = {name: values[first:last] for name, values in bars.items()}
+        series = self.store.series('DRV')
+
+        candles = series.downsample(first, last, 10, 'ohlc')
+        self.assertEqual(len(candles['ts']), 10)
+        self.assertEqual((candles['ts'][0], candles['open'][0]), (window['ts'][0], window['open'][0]))
+        self.assertEqual(candles['close'][-1], window['close'][-1])
+        self.assertEqual(candles['high'].max(), window['high'].max())
+        self.assertEqual(candles['low'].min(), window['low'].min())
+        self.assertAlmostEqual(candles['volume'].sum(), window['volume'].sum(), places=3)
+
+        for mode in ('minmax', 'lttb'):
+            with self.subTest(mode=mode):
+                line = series.downsample(first, last, 20, mode)
+                self.assertLessEqual(len(line['ts']), 20)
+                self.assertTrue(np.all(np.diff(line['ts']) > 0))
+                self.assertGreaterEqual(line['ts'][0], window['ts'][0])
+                self.assertLessEqual(line['ts'][-1], window['ts'][-1])
+                if mode == 'minmax':
+                    self.assertIn(window['close'].max(), line['close'])
+                    self.assertIn(window['close'].min(), line['close'])
+                else:
+                    self.assertEqual((line['ts'][0], line['ts'][-1]), (window['ts'][0], window['ts'][-1]))
+
+    def test_invalid_and_unknown_symbols(self):
+        with self.assertRaises(marketdata.MarketDataError):
+            self.store.read('../etc')
+        with self.assertRaises(marketdata.MarketDataError):
+            self.store.read('NOPE')
+
+
+class DownsampleTests(SimpleTestCase):
+    def setUp(self):
+        self.bars = marketdata.synthetic_bars(10_007, seed=3)
+
+    def test_ohlc_buckets_preserve_range_and_volume(self):
+        sampled = marketdata.downsample(self.bars, 100, 'ohlc')
+        self.assertEqual(len(sampled['ts']), 100)
+        self.assertEqual(sampled['open'][0], self.bars['open'][0])
+        self.assertEqual(sampled['close'][-1], self.bars['close'][-1])
+        self.assertEqual(sampled['high'].max(), self.bars['high'].max())
+        self.assertEqual(sampled['low'].min(), self.bars['low'].min())
+        self.assertAlmostEqual(sampled['volume'].sum(), self.bars['volume'].sum())
+
+    def test_minmax_keeps_extremes_in_time_order(self):
+        ts, close = marketdata.downsample_minmax(self.bars['ts'], self.bars['close'], 200)
+        self.assertLessEqual(len(ts), 200)
+        self.assertTrue(np.all(np.diff(ts) > 0))
+        self.assertIn(self.bars['close'].max(), close)
+        self.assertIn(self.bars['close'].min(), close)
+
+    def test_lttb_keeps_endpoints_and_picks_spikes(self):
+        close = self.bars['close'].copy()
+        close[5000] = close.max() * 2
+        ts, sampled = marketdata.downsample_lttb(self.bars['ts'], close, 300)
+        self.assertEqual(len(ts), 300)
+        self.assertEqual((ts[0], ts[-1]), (self.bars['ts'][0], self.bars['ts'][-1]))
+        self.assertTrue(np.all(np.diff(ts) > 0))
+        self.assertIn(close[5000], sampled)
+
+    def test_lttb_below_three_points_keeps_endpoints(self):
+        ts, close = marketdata.downsample_lttb(self.bars['ts'], self.bars['close'], 2)
+        self.assertEqual(list(ts), [self.bars['ts'][0], self.bars['ts'][-1]])
+        self.assertEqual(list(close), [self.bars['close'][0], self.bars['close'][-1]])
+        self.assertEqual(len(marketdata.downsample_lttb(self.bars['ts'], self.bars['close'], 1)[0]), 1)
+
+    def test_short_ranges_are_returned_whole(self):
+        short = {name: values[:50] for name, values in self.bars.items()}
+        for mode in marketdata.DOWNSAMPLE_MODES:
+            with self.subTest(mode=mode):
+                self.assertEqual(len(marketdata.downsample(short, 100, mode)['ts']), 50)
+
+
+class ReadCsvTests(SimpleTestCase):
+    def test_iso_and_epoch_timestamps(self):
+        iso = 'Date,Open,High,Low,Close,Volume\n2024-01-02 09:30:00,1,2,0.5,1.5,100\n2024-01-02T09:31:00Z,1.5,2,1,1.8,\n'
+        epoch_ms = 'timestamp,open,high,low,close\n1704187800000,1,2,0.5,1.5\n'
+        chunk = next(marketdata.read_csv(io.StringIO(iso)))
+        self.assertEqual(chunk['ts'].tolist(), [1704187800, 1704187860])
+        self.assertEqual(chunk['volume'].tolist(), [100, 0])
+        chunk = next(marketdata.read_csv(io.StringIO(epoch_ms)))
+        self.assertEqual(chunk['ts'].tolist(), [1704187800])
+        self.assertEqual(chunk['volume'].tolist(), [0])
+
+    def test_chunks(self):
+        rows = ''.join(f'{60 * i},1,1,1,1,1\n' for i in range(25))
+        chunks = list(marketdata.read_csv(io.StringIO('ts,open,high,low,close,volume\n' + rows), chunk_rows=10))
+        self.assertEqual([len(c['ts']) for c in chunks], [10, 10, 5])
+
+    def test_missing_columns(self):
+        with self.assertRaises(marketdata.MarketDataError):
+            next(marketdata.read_csv(io.StringIO('ts,price\n1,2\n')))
+
+
+class MarketDataApiTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        overrides = override_settings(MARKET_DATA_DIR=self.root, METRICS_DIR=None)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.bars = marketdata.synthetic_bars(20_000, start_ts=1_704_067_200)
+        append(marketdata.get_store(), 'DRV', self.bars)
+
+    def test_downsampled_range(self):
+        response = self.client.get('/api/market/drv/', {
+            'start': '2024-01-02', 'end': '2024-01-05', 'points': 120, 'mode': 'ohlc'
+        })
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['symbol'], body['points']), ('DRV', 120))
+        self.assertEqual(body['rows'], 4 * 1440)
+        self.assertEqual(body['data']['ts'][0], 1_704_153_600)
+        self.assertEqual(set(body['data']), {'ts', 'open', 'high', 'low', 'close', 'volume'})
+
+    def test_line_modes_return_close_only(self):
+        for mode in ('minmax', 'lttb'):
+            with self.subTest(mode=mode):
+                body = self.client.get('/api/market/DRV/', {'points': 100, 'mode': mode}).json()
+                self.assertEqual(set(body['data']), {'ts', 'close'})
+                self.assertLessEqual(body['points'], 100)
+        body = self.client.get('/api/market/DRV/', {'points': 2, 'mode': 'lttb'}).json()
+        self.assertEqual(body['points'], 2)
+
+    def test_errors(self):
+        for url, params, status in [
+            ('/api/market/NOPE/', {}, 404),
+            ('/api/market/DRV/', {'points': 1}, 400),
+            ('/api/market/DRV/', {'points': 'many'}, 400),
+            ('/api/market/DRV/', {'mode': 'bars'}, 400),
+            ('/api/market/DRV/', {'start': 'yesterday'}, 400),
+        ]:
+            with self.subTest(url=url, params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.json()['status'], 'error')
+
+    def test_import_command(self):
+        path = os.path.join(self.root, 'bars.csv')
+        with open(path, 'w') as f:
+            f.write('time,open,high,low,close,volume\n2030-01-01T00:00:00,1,2,0.5,1.5,10\n')
+        out = io.StringIO()
+        call_command('import_market_data', 'DRV', csv=path, stdout=out)
+        self.assertIn('appended 1 bars, 20001 stored', out.getvalue())
+
+        call_command('import_market_data', 'AAA', 'BBB', synthetic=True, years=0.01, stdout=out)
+        self.assertEqual(marketdata.get_store().symbols(), ['AAA', 'BBB', 'DRV'])
@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main import metrics
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_record_and_snapshot(self):
+        metrics.record_request('index', 'GET', 200, 0.003, 2, 0.001, 300)
+        metrics.record_request('index', 'GET', 200, 0.2, 0, 0.0, None)
+        metrics.record_request('index', 'POST', 405, 20.0, 1, 0.002, 10)
+        counters, histograms = metrics.snapshot()
+        self.assertEqual(counters[('derivity_http_requests_total',
+                                   (('view', 'index'), ('method', 'GET'), ('status', '200')))], 2)
+        self.assertEqual(counters[('derivity_db_queries_total', (('view', 'index'),))], 3)
+        latency = histograms[('derivity_http_request_duration_seconds', (('view', 'index'),))]
+        self.assertEqual((latency[0], latency[5], latency[len(metrics.LATENCY_BUCKETS)]), (1, 1, 1))  # 20 s is +Inf
+        self.assertEqual(latency[-1], 3)
+        self.assertEqual(histograms[('derivity_http_response_size_bytes', (('view', 'index'),))][-1], 2)
+
+    def test_render_prometheus(self):
+        metrics.record_request('say "hi"', 'GET', 200, 0.02, 1, 0.5, 100)
+        text = metrics.render_prometheus(*metrics.snapshot())
+        self.assertIn('# TYPE derivity_http_request_duration_seconds histogram\n', text)
+        self.assertIn('derivity_http_requests_total{view="say \\"hi\\"",method="GET",status="200"} 1\n', text)
+        self.assertIn('derivity_http_request_duration_seconds_bucket{view="say \\"hi\\"",le="0.01"} 0\n', text)
+        self.assertIn('derivity_http_request_duration_seconds_bucket{view="say \\"hi\\"",le="0.025"} 1\n', text)
+        self.assertIn('derivity_http_request_duration_seconds_bucket{view="say \\"hi\\"",le="+Inf"} 1\n', text)
+        self.assertIn('derivity_http_request_duration_seconds_count{view="say \\"hi\\""} 1\n', text)
+        self.assertIn('derivity_db_query_duration_seconds_total{view="say \\"hi\\""} 0.5\n', text)
+
+    def test_flush_per_process_and_collect_across_processes(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        with override_settings(METRICS_DIR=metrics_dir, METRICS_FLUSH_INTERVAL=3600):
+            metrics.record_request('index', 'GET', 200, 0.003, 1, 0.001, 300)
+            metrics.flush(force=True)
+            path = os.path.join(metrics_dir, f'{os.getpid()}.json')
+            with open(path) as f:
+                self.assertEqual(len(json.load(f)['counters']), 3)
+
+            metrics.record_request('index', 'GET', 200, 0.003, 1, 0.001, 300)
+            metrics.flush()  # Within the interval: the file is not rewritten
+            with open(path) as f:
+                counters = {name: value for name, labels, value in json.load(f)['counters']}
+            self.assertEqual(counters['derivity_http_requests_total'], 1)
+
+            # Another worker's totals
+            with open(os.path.join(metrics_dir, '99999.json'), 'w') as f:
+                json.dump({'counters': [['derivity_http_requests_total',
+                                         [['view', 'index'], ['method', 'GET'], ['status', '200']], 5]],
+                           'histograms': []}, f)
+            with open(os.path.join(metrics_dir, 'partial.json.tmp'), 'w') as f:
+                f.write('{')
+            counters, histograms = metrics.collect()
+        self.assertEqual(counters[('derivity_http_requests_total',
+                                   (('view', 'index'), ('method', 'GET'), ('status', '200')))], 7)
+        self.assertEqual(histograms[('derivity_http_request_duration_seconds', (('view', 'index'),))][-1], 2)
+        # The exited worker's totals moved to retired.json and still count
+        self.assertEqual(sorted(name for name in os.listdir(metrics_dir) if name.endswith('.json')),
+                         [f'{os.getpid()}.json', 'retired.json'])
+
+    def test_finished_threads_are_folded_into_the_process_total(self):
+        threads = [threading.Thread(target=metrics.record_request, args=('index', 'GET', 200, 0.003, 1, 0.001))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        counters, _ = metrics.snapshot()
+        self.assertEqual(counters[('derivity_http_requests_total',
+                                   (('view', 'index'), ('method', 'GET'), ('status', '200')))], 3)
+        self.assertFalse(any(shard.thread in threads for shard in metrics._shards))
+
+
+@override_settings(METRICS_DIR=None)
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_middleware_records_requests(self):
+        self.client.get('/api/csrf-token/')
+        self.client.get('/no-such-page/')
+        counters, histograms = metrics.snapshot()
+        self.assertEqual(counters[('derivity_http_requests_total',
+                                   (('view', 'get_csrf_token'), ('method', 'GET'), ('status', '200')))], 1)
+        self.assertEqual(counters[('derivity_http_requests_total',
+                                   (('view', 'unresolved'), ('method', 'GET'), ('status', '404')))], 1)
+        self.assertIn(('derivity_http_response_size_bytes', (('view', 'get_csrf_token'),)), histograms)
+
+    def test_access_is_by_client_address(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE derivity_http_requests_total counter', response.content)
+        spoofed = self.client.get('/metrics', REMOTE_ADDR='192.0.2.1', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(spoofed.status_code, 403)
+        with override_settings(TRUSTED_PROXIES=['10.0.0.0/8']):
+            proxied = self.client.get('/metrics', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(proxied.status_code, 200)
@@ -0,0 +1,140 @@
+import socketserver
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from main import newsletter
+from main.models import NewsletterCampaign, UserProfile
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Minimal local SMTP server that records connections and messages"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        self.connections = 0
+        self.messages = []
+        self.refused = set()
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 stand-in ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command == 'EHLO':
+                self.reply('250 stand-in')
+            elif command == 'RCPT':
+                recipient = line.split(':', 1)[1].strip(' <>')
+                if recipient in self.server.refused:
+                    self.reply('550 no such mailbox')
+                    continue
+                recipients.append(recipient)
+                self.reply('250 ok')
+            elif command == 'DATA':
+                self.reply('354 end with .')
+                body = []
+                for data in iter(self.rfile.readline, b'.\r\n'):
+                    body.append(data.decode())
+                self.server.messages.append((recipients, ''.join(body)))
+                recipients = []
+                self.reply('250 queued')
+            else:  # HELO, MAIL, RSET, NOOP
+                self.reply('250 ok')
+
+
+class NewsletterTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        self.settings_override = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.smtp.server_address[1], EMAIL_USE_TLS=False,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        users = User.objects.bulk_create([
+            User(username=f'u{i}', email=f'u{i}@example.com', first_name=f'Name{i}') for i in range(25)
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=u, newsletter_subscription=(i % 5 != 0)) for i, u in enumerate(users)
+        ])
+        self.campaign = NewsletterCampaign.objects.create(
+            subject='Market update', body='Hello $first_name, here is your update for $email.'
+        )
+
+    def test_sends_each_batch_over_one_connection_with_substitution(self):
+        out = StringIO()
+        call_command('send_newsletter', self.campaign.pk, batch_size=8, stdout=out)
+
+        self.assertEqual(len(self.smtp.messages), 20)
+        self.assertEqual(self.smtp.connections, 3)  # 8 + 8 + 4
+        recipients, body = self.smtp.messages[0]
+        self.assertEqual(recipients, ['u1@example.com'])
+        self.assertIn('Hello Name1, here is your update for u1@example.com.', body)
+        self.assertIn('msg/s', out.getvalue())
+
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'sent')
+        self.assertEqual(self.campaign.sent_count, 20)
+
+    def test_resumes_from_watermark_after_crash(self):
+        real_send = newsletter.get_connection
+        batches = []
+
+        def failing_connection(*args, **kwargs):
+            batches.append(1)
+            if len(batches) == 2:
+                raise ConnectionError('SMTP went away')
+            return real_send(*args, **kwargs)
+
+        with mock.patch.object(newsletter, 'get_connection', failing_connection):
+            with self.assertRaises(ConnectionError):
+                newsletter.send_campaign(self.campaign, batch_size=8)
+
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.sent_count, 8)
+        self.assertEqual(self.campaign.status, 'sending')
+
+        call_command('send_newsletter', self.campaign.pk, batch_size=8, stdout=StringIO())
+        sent_to = [recipients[0] for recipients, _ in self.smtp.messages]
+        self.assertEqual(len(sent_to), 20)
+        self.assertEqual(len(set(sent_to)), 20)  # Nobody mailed twice
+
+    def test_refused_recipients_are_skipped(self):
+        self.smtp.refused = {'u2@example.com', 'u9@example.com'}
+        with self.assertLogs('main.newsletter', 'WARNING') as logs:
+            call_command('send_newsletter', self.campaign.pk, batch_size=8, stdout=StringIO())
+        self.assertEqual(len(logs.records), 2)
+
+        sent_to = [recipients[0] for recipients, _ in self.smtp.messages]
+        self.assertEqual(len(sent_to), 18)
+        self.assertIn('u3@example.com', sent_to)  # Sent on after the refusal, over the same connection
+        self.assertEqual(self.smtp.connections, 3)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.sent_count, self.campaign.failed_count),
+                         ('sent', 18, 2))
+
+    def test_subscriber_batches_use_keyset_order(self):
+        batches = list(newsletter.subscriber_batches(0, 6))
+        ids = [row[0] for batch in batches for row in batch]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual([len(b) for b in batches], [6, 6, 6, 2])
@@ -0,0 +1,115 @@
+import itertools
+import random
+
+from django.test import SimpleTestCase
+
+from main.orderbook import BUY, SELL, Order, OrderBook
+
+
+class OrderBookTests(SimpleTestCase):
+    def setUp(self):
+        self.book = OrderBook('AAA')
+        self.ids = itertools.count(1)
+
+    def submit(self, side, price, quantity, user_id=1):
+        order = Order(next(self.ids), user_id, side, price, quantity)
+        return order, self.book.submit(order)
+
+    def test_price_then_time_priority(self):
+        first, _ = self.submit(SELL, 101, 5)
+        second, _ = self.submit(SELL, 101, 5)
+        cheaper, _ = self.submit(SELL, 100, 5)
+        taker, fills = self.submit(BUY, 101, 12)
+        self.assertEqual([(f.maker.id, f.price, f.quantity) for f in fills],
+                         [(cheaper.id, 100, 5), (first.id, 101, 5), (second.id, 101, 2)])
+        self.assertEqual((taker.status, first.status, second.status), ('filled', 'filled', 'partial'))
+        self.assertEqual(self.book.snapshot(), {'bids': [], 'asks': [(101, 3)], 'last': 101})
+
+    def test_limit_remainder_rests(self):
+        self.submit(SELL, 100, 4)
+        order, fills = self.submit(BUY, 102, 10)
+        self.assertEqual(sum(f.quantity for f in fills), 4)
+        self.assertEqual((order.status, order.remaining), ('partial', 6))
+        self.assertEqual(self.book.best_bid(), 102)
+        self.assertIsNone(self.book.best_ask())
+        _, fills = self.submit(SELL, 103, 1)
+        self.assertEqual(fills, [])  # Does not cross
+
+    def test_market_orders_never_rest(self):
+        self.submit(BUY, 99, 3)
+        self.submit(BUY, 98, 3)
+        order, fills = self.submit(SELL, None, 10)
+        self.assertEqual([(f.price, f.quantity) for f in fills], [(99, 3), (98, 3)])
+        self.assertEqual((order.status, order.remaining), ('cancelled', 4))
+        self.assertNotIn(order.id, self.book.orders)
+        self.assertEqual(self.book.snapshot()['bids'], [])
+
+    def test_cancel_skips_order_and_empties_level(self):
+        first, _ = self.submit(SELL, 100, 5)
+        second, _ = self.submit(SELL, 100, 5)
+        self.assertIs(self.book.cancel(first.id), first)
+        self.assertIsNone(self.book.cancel(first.id))
+        self.assertEqual(self.book.snapshot()['asks'], [(100, 5)])
+        _, fills = self.submit(BUY, 100, 5)
+        self.assertEqual([f.maker.id for f in fills], [second.id])
+
+        only, _ = self.submit(SELL, 100, 5)
+        self.book.cancel(only.id)
+        self.assertIsNone(self.book.best_ask())  # Stale heap entry is skipped
+        self.submit(SELL, 100, 2)
+        self.assertEqual(self.book.snapshot()['asks'], [(100, 2)])
+
+    def test_matches_naive_book(self):
+        """Random flow against a list-scanning reference book"""
+        rng = random.Random(5)
+        resting = []  # [id, side, price, remaining, sequence]
+        for sequence in range(3000):
+            if resting and rng.random() < 0.2:
+                victim = rng.choice(resting)
+                resting.remove(victim)
+                self.assertIsNotNone(self.book.cancel(victim[0]))
+                continue
+            side = rng.choice([BUY, SELL])
+            price = None if rng.random() < 0.05 else rng.randint(95, 105)
+            order, fills = self.submit(side, price, rng.randint(1, 20))
+
+            expected, remaining = [], order.quantity
+            opposite = sorted((r for r in resting if r[1] != side),
+                              key=lambda r: (r[2] if side == BUY else -r[2], r[4]))
+            for maker in opposite:
+                if not remaining or (price is not None and (maker[2] > price if side == BUY else maker[2] < price)):
+                    break
+                quantity = min(remaining, maker[3])
+                expected.append((maker[0], maker[2], quantity))
+                maker[3] -= quantity
+                remaining -= quantity
+            resting = [r for r in resting if r[3]]
+            if remaining and price is not None:
+                resting.append([order.id, side, price, remaining, sequence])
+            self.assertEqual([(f.maker.id, f.price, f.quantity) for f in fills], expected)
+
+        for side, key in [(BUY, 'bids'), (SELL, 'asks')]:
+            levels = {}
+            for r in resting:
+                if r[1] == side:
+                    levels[r[2]] = levels.get(r[2], 0) + r[3]
+            expected = sorted(levels.items(), reverse=side == BUY)
+            self.assertEqual(self.book.snapshot(levels=100)[key], expected)
+
+    def test_level_with_only_cancelled_orders_left_is_removed(self):
+        first, _ = self.submit(SELL, 100, 5)
+        second, _ = self.submit(SELL, 100, 5)
+        self.book.cancel(second.id)
+        self.submit(BUY, 100, 5)
+        self.assertEqual(self.book.snapshot()['asks'], [])
+        self.assertIsNone(self.book.best_ask())
+        self.assertEqual(first.status, 'filled')
+
+    def test_heap_stays_bounded_under_place_and_cancel(self):
+        self.submit(SELL, 100, 5)
+        for i in range(10_000):
+            order, _ = self.submit(SELL, 200 + i % 7 if i % 2 else 300 + i, 1)
+            self.book.cancel(order.id)
+        side = self.book.sides[SELL]
+        self.assertLessEqual(len(side.heap), 2 * len(side.levels) + 64)
+        self.assertEqual(self.book.best_ask(), 100)
@@ -0,0 +1,144 @@
+import json
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from main import marketdata, portfolio
+
+
+def factor_returns(observations, assets, seed=0):
+    rng = np.random.default_rng(seed)
+    beta = rng.normal(1, 0.3, assets)
+    market = rng.normal(0.0004, 0.01, observations)
+    return np.outer(market, beta) + rng.normal(0, 0.02, (observations, assets)) * rng.uniform(0.5, 2, assets)
+
+
+class EstimatorTests(SimpleTestCase):
+    def test_ledoit_wolf_matches_direct_formula(self):
+        returns = factor_returns(60, 40)
+        covariance, shrinkage = portfolio.ledoit_wolf(returns)
+
+        x = returns - returns.mean(axis=0)
+        sample = x.T @ x / len(x)
+        target = np.trace(sample) / 40 * np.eye(40)
+        noise = sum(((np.outer(row, row) - sample) ** 2).sum() for row in x) / len(x) ** 2
+        expected = min(noise / ((sample - target) ** 2).sum(), 1.0)
+        self.assertAlmostEqual(shrinkage, expected, places=12)
+        np.testing.assert_allclose(covariance, expected * target + (1 - expected) * sample, atol=1e-15)
+        self.assertGreater(np.linalg.eigvalsh(portfolio.ledoit_wolf(factor_returns(30, 200))[0]).min(), 0)
+
+    def test_projection(self):
+        rng = np.random.default_rng(3)
+        for lo, hi in [(0.0, 1.0), (0.0, 0.05), (-0.2, 0.3)]:
+            with self.subTest(lo=lo, hi=hi):
+                v = rng.normal(0, 0.2, 50)
+                w = portfolio.project(v, lo, hi)
+                self.assertAlmostEqual(w.sum(), 1.0, places=12)
+                self.assertTrue(((w >= lo) & (w <= hi)).all())
+                # Optimality: w = clip(v - tau) for a single shift tau
+                free = (w > lo) & (w < hi)
+                np.testing.assert_allclose(v[free] - w[free], (v - w)[free][0], atol=1e-12)
+
+
+class AllocationTests(SimpleTestCase):
+    def setUp(self):
+        self.q, _ = portfolio.ledoit_wolf(factor_returns(252, 120))
+        self.q *= 252
+        self.lipschitz = np.linalg.eigvalsh(self.q).max()
+
+    def assertKkt(self, q, c, w, lo, hi):
+        """Gradient is equal on free weights, larger at the lower bound and smaller at the upper one"""
+        gradient = q @ w - c
+        free = (w > lo + 1e-9) & (w < hi - 1e-9)
+        self.assertTrue(free.any())
+        level = np.median(gradient[free])
+        np.testing.assert_allclose(gradient[free], level, atol=1e-6)
+        self.assertTrue((gradient[w <= lo + 1e-9] >= level - 1e-6).all())
+        self.assertTrue((gradient[w >= hi - 1e-9] <= level + 1e-6).all())
+
+    def test_unconstrained_min_variance_matches_closed_form(self):
+        w, _ = portfolio.solve_qp(self.q, np.zeros(120), -1.0, 1.0, self.lipschitz)
+        expected = np.linalg.solve(self.q, np.ones(120))
+        np.testing.assert_allclose(w, expected / expected.sum(), atol=1e-7)
+
+    def test_constrained_allocations_are_optimal(self):
+        mean = np.random.default_rng(1).normal(0.08, 0.05, 120)
+        for c, scale, lo, hi in [(np.zeros(120), 1.0, 0.0, 1.0), (np.zeros(120), 1.0, 0.0, 0.02),
+                                 (mean, 5.0, 0.0, 0.1), (mean, 5.0, -0.05, 0.1)]:
+            with self.subTest(lo=lo, hi=hi, mean_variance=scale != 1.0):
+                w, iterations = portfolio.solve_qp(scale * self.q, c, lo, hi, scale * self.lipschitz)
+                self.assertLess(iterations, portfolio.FISTA_MAX_ITERATIONS)
+                self.assertAlmostEqual(w.sum(), 1.0, places=10)
+                self.assertTrue(((w >= lo - 1e-12) & (w <= hi + 1e-12)).all())
+                self.assertKkt(scale * self.q, c, w, lo, hi)
+
+    def test_risk_parity_equalizes_contributions(self):
+        w, _ = portfolio.risk_parity(self.q)
+        contributions = w * (self.q @ w)
+        self.assertTrue((w > 0).all())
+        self.assertAlmostEqual(w.sum(), 1.0, places=12)
+        np.testing.assert_allclose(contributions / contributions.sum(), 1 / 120, rtol=1e-8)
+
+
+@override_settings(METRICS_DIR=None)
+class PortfolioApiTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        overrides = override_settings(MARKET_DATA_DIR=root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.symbols = [f'A{i}' for i in range(30)]
+        for seed, symbol in enumerate(self.symbols):
+            self.append(symbol, marketdata.synthetic_bars(300, step=86400, seed=seed))
+
+    def append(self, symbol, bars):
+        marketdata.get_store().append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+
+    def post(self, data):
+        return self.client.post('/api/portfolio/optimize/', json.dumps(data), content_type='application/json')
+
+    def test_min_variance_with_bounds(self):
+        body = self.post({'symbols': self.symbols, 'window': 100, 'max_weight': 0.1}).json()
+        self.assertEqual(body['status'], 'success')
+        self.assertEqual(list(body['weights']), self.symbols)
+        self.assertAlmostEqual(sum(body['weights'].values()), 1.0, places=6)
+        self.assertLessEqual(max(body['weights'].values()), 0.1 + 1e-8)
+        self.assertEqual(body['observations'], 100)
+        self.assertTrue(0 <= body['shrinkage'] <= 1)
+
+    def test_covariance_is_cached_until_bars_are_appended(self):
+        request = {'symbols': self.symbols, 'method': 'risk_parity'}
+        first = self.post(request).json()
+        self.assertFalse(first['cached'])
+        second = self.post(request).json()
+        self.assertTrue(second['cached'])
+        self.assertEqual(first['weights'], second['weights'])
+        self.assertTrue(self.post({**request, 'method': 'mean_variance'}).json()['cached'])
+
+        more = marketdata.synthetic_bars(301, step=86400, seed=0)
+        self.append('A0', {name: values[300:] for name, values in more.items()})
+        third = self.post(request).json()
+        self.assertFalse(third['cached'])
+        self.assertEqual(third['end'], first['end'])  # The other symbols have no bar at the new timestamp
+
+    def test_risk_parity_contributions_are_equal(self):
+        body = self.post({'symbols': self.symbols, 'method': 'risk_parity'}).json()
+        contributions = list(body['risk_contributions'].values())
+        np.testing.assert_allclose(contributions, 1 / 30, rtol=1e-5)
+
+    def test_errors(self):
+        for data in [
+            {'symbols': []}, {'symbols': ['A0', 'A0']}, {'symbols': self.symbols, 'method': 'kelly'},
+            {'symbols': self.symbols, 'window': 5}, {'symbols': self.symbols, 'max_weight': 0.01},
+            {'symbols': self.symbols, 'method': 'risk_parity', 'max_weight': 0.5},
+            {'symbols': self.symbols, 'method': 'mean_variance', 'expected_returns': [0.1]},
+            {'symbols': self.symbols, 'risk_aversion': 2},
+        ]:
+            with self.subTest(data=data):
+                response = self.post(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(self.post({'symbols': ['A0', 'NOPE']}).status_code, 404)
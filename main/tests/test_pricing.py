@@ -0,0 +1,167 @@
+import json
+import math
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from main import pricing
+
+
+class BlackScholesTests(SimpleTestCase):
+    def test_normal_cdf_matches_erfc(self):
+        x = np.linspace(-12, 12, 4801)
+        expected = np.array([0.5 * math.erfc(-v / math.sqrt(2)) for v in x])
+        np.testing.assert_allclose(pricing.norm_cdf(x), expected, rtol=1e-13, atol=1e-16)
+        self.assertEqual(pricing.norm_cdf(np.array([-np.inf, np.inf])).tolist(), [0.0, 1.0])
+
+    def test_reference_prices_and_parity(self):
+        price = pricing.black_scholes(100, 100, 1, 0.05, 0.2, [True, False])
+        np.testing.assert_allclose(price, [10.450583572185565, 5.573526022256971], rtol=1e-12)
+
+        rng = np.random.default_rng(0)
+        spot, strike, expiry = rng.uniform(50, 150, 200), rng.uniform(50, 150, 200), rng.uniform(0.05, 3, 200)
+        call = pricing.black_scholes(spot, strike, expiry, 0.03, 0.3, True, dividend=0.02)
+        put = pricing.black_scholes(spot, strike, expiry, 0.03, 0.3, False, dividend=0.02)
+        np.testing.assert_allclose(call - put, spot * np.exp(-0.02 * expiry) - strike * np.exp(-0.03 * expiry),
+                                   atol=1e-10)
+
+    def test_greeks_match_finite_differences(self):
+        args = dict(spot=105.0, strike=100.0, expiry=0.75, rate=0.04, volatility=0.25, is_call=[True, False],
+                    dividend=0.01)
+        _, greeks = pricing.black_scholes(**args, greeks=True)
+        h = 1e-4
+
+        def bump(name, delta):
+            return pricing.black_scholes(**{**args, name: args[name] + delta})
+
+        for greek, name in [('delta', 'spot'), ('vega', 'volatility'), ('rho', 'rate')]:
+            with self.subTest(greek=greek):
+                np.testing.assert_allclose(greeks[greek], (bump(name, h) - bump(name, -h)) / (2 * h), rtol=1e-6)
+        np.testing.assert_allclose(greeks['theta'], -(bump('expiry', h) - bump('expiry', -h)) / (2 * h), rtol=1e-6)
+        gamma = (bump('spot', 1e-2) - 2 * pricing.black_scholes(**args) + bump('spot', -1e-2)) / 1e-4
+        np.testing.assert_allclose(greeks['gamma'], gamma, rtol=1e-4)
+
+    def test_expired_and_zero_volatility_contracts(self):
+        price, greeks = pricing.black_scholes([110, 90, 110], 100, [0, 0, 1], 0.0, [0.2, 0.2, 0], True, greeks=True)
+        np.testing.assert_allclose(price, [10, 0, 10])
+        np.testing.assert_allclose(greeks['delta'], [1, 0, 1])
+        np.testing.assert_allclose(greeks['gamma'], [0, 0, 0])
+
+    def test_implied_volatility_round_trip(self):
+        rng = np.random.default_rng(1)
+        n = 5000
+        spot, strike = rng.uniform(50, 150, n), rng.uniform(50, 150, n)
+        expiry, sigma, call = rng.uniform(0.02, 3, n), rng.uniform(0.05, 1.5, n), rng.random(n) < 0.5
+        price = pricing.black_scholes(spot, strike, expiry, 0.03, sigma, call, 0.01)
+        solved = pricing.implied_volatility(price, spot, strike, expiry, 0.03, call, 0.01)
+
+        # Every price with time value above rounding is reproduced; volatility is only
+        # pinned down as tightly as vega allows
+        time_value = price - pricing.black_scholes(spot, strike, expiry, 0.03, 0.0, call, 0.01)
+        solvable = time_value > 1e-12
+        self.assertFalse(np.isnan(solved[solvable]).any())
+        repriced = pricing.black_scholes(spot, strike, expiry, 0.03, solved, call, 0.01)
+        np.testing.assert_allclose(repriced[solvable], price[solvable], rtol=1e-9, atol=1e-9)
+        _, greeks = pricing.black_scholes(spot, strike, expiry, 0.03, sigma, call, 0.01, greeks=True)
+        sensitive = solvable & (greeks['vega'] > 1e-6)
+        error = np.abs(solved - sigma)[sensitive] * greeks['vega'][sensitive]
+        self.assertTrue((error <= 2 * pricing.IV_PRICE_TOLERANCE * np.maximum(price[sensitive], 1)).all())
+
+    def test_implied_volatility_outside_bounds_is_nan(self):
+        # Below intrinsic, above the spot, and above the price at the volatility cap
+        solved = pricing.implied_volatility([5.0, 150.0, 99.99999], 100, [90, 100, 100], 1, 0.0, True)
+        self.assertTrue(np.isnan(solved).all())
+
+
+class TreeTests(SimpleTestCase):
+    def test_european_trees_converge_to_black_scholes(self):
+        expected = pricing.black_scholes(100, [90, 100, 110], 1, 0.05, 0.2, [True, False, True], 0.02)
+        for method in ('binomial', 'trinomial'):
+            with self.subTest(method=method):
+                price = pricing.tree_price(100, [90, 100, 110], 1, 0.05, 0.2, [True, False, True], 0.02,
+                                           steps=400, method=method, american=False)
+                np.testing.assert_allclose(price, expected, atol=0.01)
+
+    def test_american_put_reference_value(self):
+        for method in ('binomial', 'trinomial'):
+            with self.subTest(method=method):
+                price = pricing.tree_price(100, 100, 1, 0.05, 0.2, False, steps=1000, method=method)
+                self.assertAlmostEqual(price[0], 6.0904, places=2)
+
+    def test_american_call_without_dividends_is_european(self):
+        american = pricing.tree_price(100, 95, 0.5, 0.05, 0.3, True, steps=300)
+        european = pricing.tree_price(100, 95, 0.5, 0.05, 0.3, True, steps=300, american=False)
+        np.testing.assert_allclose(american, european, rtol=1e-12)
+
+    def test_chunks_match_single_pass(self):
+        strikes = np.linspace(80, 120, 37)
+        whole = pricing.tree_price(100, strikes, 1, 0.05, 0.2, False, steps=50)
+        original = pricing.TREE_CHUNK
+        pricing.TREE_CHUNK = 8
+        try:
+            chunked = pricing.tree_price(100, strikes, 1, 0.05, 0.2, False, steps=50)
+        finally:
+            pricing.TREE_CHUNK = original
+        np.testing.assert_array_equal(whole, chunked)
+
+    def test_too_few_steps_for_the_drift_is_rejected(self):
+        # sigma * sqrt(dt) < r * dt: the up probability would exceed 1
+        for method, needed in (('binomial', 100), ('trinomial', 300)):
+            with self.subTest(method=method):
+                with self.assertRaisesRegex(pricing.PricingError, f'at least {needed} steps'):
+                    pricing.tree_price(100, 100, 1, 0.10, 0.01, [True, False], steps=10, method=method)
+
+    def test_minimum_steps_keep_probabilities_valid(self):
+        for method in ('binomial', 'trinomial'):
+            with self.subTest(method=method):
+                steps = int(pricing._min_tree_steps(method, 1.0, 0.10, 0.0, 0.01))
+                _, weights = pricing._tree_parameters(method, np.array([1.0]), 0.10, 0.0,
+                                                      np.array([0.01]), steps)
+                self.assertTrue(all((w >= -1e-12).all() for w in weights))
+                price = pricing.tree_price(100, 100, 1, 0.10, 0.01, [True, False], steps=steps,
+                                           method=method, american=False)
+                # Near-deterministic growth: the call is worth about S - K e^(-rT), the put nothing
+                np.testing.assert_allclose(price, [100 - 100 * np.exp(-0.1), 0], atol=0.05)
+
+
+@override_settings(METRICS_DIR=None)
+class PricingApiTests(SimpleTestCase):
+    def post(self, data):
+        return self.client.post('/api/pricing/options/', json.dumps(data), content_type='application/json')
+
+    def test_european_batch_with_greeks(self):
+        response = self.post({'spot': 100, 'strike': [90, 100, 110], 'expiry': 1, 'rate': 0.05,
+                              'volatility': 0.2, 'type': ['call', 'put', 'call']})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 3)
+        self.assertEqual(set(body['results']), {'price', 'delta', 'gamma', 'vega', 'theta', 'rho'})
+        self.assertAlmostEqual(body['results']['price'][1], 5.57352602, places=7)
+
+    def test_implied_volatility_from_prices(self):
+        body = self.post({'spot': 100, 'strike': [100, 100], 'expiry': 1, 'rate': 0.05,
+                          'price': [10.450583572185565, 200], 'type': 'call', 'greeks': False}).json()
+        self.assertAlmostEqual(body['results']['implied_volatility'][0], 0.2, places=7)
+        self.assertIsNone(body['results']['implied_volatility'][1])
+        self.assertIsNone(body['results']['price'][1])
+
+    def test_american_options(self):
+        body = self.post({'spot': 100, 'strike': 100, 'expiry': 1, 'rate': 0.05, 'volatility': 0.2,
+                          'type': 'put', 'style': 'american', 'method': 'trinomial', 'steps': 500}).json()
+        self.assertAlmostEqual(body['results']['price'][0], 6.09, places=1)
+        self.assertGreater(body['results']['early_exercise_premium'][0], 0.4)
+
+    @override_settings(PRICING_MAX_CONTRACTS=10, PRICING_MAX_TREE_NODES=10_000)
+    def test_validation(self):
+        base = {'spot': 100, 'strike': 100, 'expiry': 1, 'volatility': 0.2, 'type': 'call'}
+        for changes in [
+            {'type': 'straddle'}, {'strike': [90, 100], 'spot': [1, 2, 3]}, {'spot': -1},
+            {'price': 5}, {'strike': list(range(1, 12))}, {'volatility': 'high'},
+            {'style': 'american', 'steps': 200}, {'style': 'american', 'price': 5, 'volatility': None},
+            {'style': 'american', 'steps': 10, 'rate': 0.10, 'volatility': 0.01},
+        ]:
+            with self.subTest(changes=changes):
+                data = {key: value for key, value in {**base, **changes}.items() if value is not None}
+                response = self.post(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['status'], 'error')
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from main import middleware
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        self.staff = User.objects.create_user(username='ops', email='ops@example.com', password='x', is_staff=True)
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='x')
+
+    def profiles(self):
+        return [name for _, _, names in os.walk(self.profile_dir) for name in names]
+
+    def test_disabled_by_default(self):
+        with override_settings(PROFILING_DIR=self.profile_dir):
+            self.client.force_login(self.staff)
+            self.client.get('/api/auth-status/', HTTP_X_PROFILE='1')
+        self.assertEqual(self.profiles(), [])
+
+    def test_staff_header_profiles_request_and_report_merges(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profile_dir):
+            self.client.force_login(self.staff)
+            response = self.client.get('/api/auth-status/', HTTP_X_PROFILE='1')
+            self.client.get('/api/auth-status/', HTTP_X_PROFILE='1')
+
+        self.assertTrue(response.json()['authenticated'])
+        self.assertEqual(os.listdir(self.profile_dir), ['check_auth_status'])
+        self.assertEqual(len(self.profiles()), 2)
+
+        out = StringIO()
+        call_command('profile_report', dir=self.profile_dir, top=5, stdout=out)
+        self.assertIn('check_auth_status (2 samples)', out.getvalue())
+        self.assertIn('check_auth_status', out.getvalue())
+
+    def test_header_ignored_for_non_staff(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profile_dir):
+            self.client.force_login(self.member)
+            self.client.get('/api/auth-status/', HTTP_X_PROFILE='1')
+        self.assertEqual(self.profiles(), [])
+
+    def test_rotation_keeps_newest_files(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0,
+                               PROFILING_MAX_FILES=3, PROFILING_DIR=self.profile_dir):
+            for _ in range(5):
+                self.client.get('/api/csrf-token/')
+        self.assertEqual(len(self.profiles()), 3)
+
+    def test_one_request_profiled_at_a_time(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_DIR=self.profile_dir):
+            with middleware._profiling:  # Another request is being profiled
+                response = self.client.get('/api/csrf-token/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.profiles(), [])
+            self.client.get('/api/csrf-token/')
+        self.assertEqual(len(self.profiles()), 1)
+
+    async def test_one_request_profiled_at_a_time_under_asgi(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_DIR=self.profile_dir):
+            with middleware._profiling:
+                response = await self.async_client.get('/api/csrf-token/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.profiles(), [])
+            await self.async_client.get('/api/csrf-token/')
+        self.assertEqual(len(self.profiles()), 1)
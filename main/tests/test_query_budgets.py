@@ -0,0 +1,359 @@
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from django.utils import timezone
+
+from main import urls as main_urls
+from main.bloom import registered_emails
+from main import marketdata, retrieval, tokens
+from main.models import UserProfile, ContactMessage, AIConversation, LoginAttempt, PaperFill
+from .budgets import BUDGETS
+
+PASSWORD = 'Str0ngPassw0rd'
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    METRICS_DIR=None,
+    RETRIEVAL_INDEX_DIR=None,
+)
+class QueryBudgetTests(TestCase):
+    """Every route in main.urls must stay within its recorded query and time budget"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='jane', email='jane@example.com', password=PASSWORD,
+            first_name='Jane', last_name='Doe'
+        )
+        UserProfile.objects.create(user=cls.user, newsletter_subscription=True, email_verified=True)
+
+        cls.locked_user = User.objects.create_user(
+            username='locked', email='locked@example.com', password=PASSWORD
+        )
+        UserProfile.objects.create(
+            user=cls.locked_user,
+            failed_login_attempts=5,
+            account_locked_until=timezone.now() + timedelta(minutes=30)
+        )
+
+        # Background rows so lookups run against populated tables
+        users = User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com', password='!')
+            for i in range(50)
+        ])
+        UserProfile.objects.bulk_create([UserProfile(user=u) for u in users])
+        LoginAttempt.objects.bulk_create([
+            LoginAttempt(user=u, email=u.email, ip_address='10.0.0.1', success=True)
+            for u in users
+        ])
+        ContactMessage.objects.bulk_create([
+            ContactMessage(name='Visitor', email=f'visitor{i}@example.com', message='Hello there, team!')
+            for i in range(20)
+        ])
+        AIConversation.objects.bulk_create([
+            AIConversation(user=users[i], session_id=f'session-{i}', message='Hi', response='Hello')
+            for i in range(20)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def post_json(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+    def assertWithinBudget(self, scenario, request):
+        """Run request() and compare its query count and wall time against BUDGETS"""
+        budget = BUDGETS[scenario]
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.assertLess(response.status_code, 500, f'{scenario} returned {response.status_code}')
+        query_count = len(captured.captured_queries)
+        if query_count > budget['queries']:
+            queries = '\n'.join(
+                f"  {i}. {q['sql']}" for i, q in enumerate(captured.captured_queries, 1)
+            )
+            self.fail(
+                f"Query budget exceeded for {scenario!r} (main/tests/budgets.py):\n"
+                f"- {scenario}: queries={budget['queries']}\n"
+                f"+ {scenario}: queries={query_count}  (+{query_count - budget['queries']})\n"
+                f"Queries executed:\n{queries}"
+            )
+        if elapsed_ms > budget['ms']:
+            self.fail(
+                f"Time budget exceeded for {scenario!r} (main/tests/budgets.py):\n"
+                f"- {scenario}: ms={budget['ms']}\n"
+                f"+ {scenario}: ms={elapsed_ms:.1f}"
+            )
+        return response
+
+    def test_every_route_has_a_budget(self):
+        route_names = {p.name for p in main_urls.urlpatterns if isinstance(p, URLPattern)}
+        budgeted = {scenario.split(':')[0] for scenario in BUDGETS}
+        self.assertEqual(sorted(route_names - budgeted), [], 'Routes missing from main/tests/budgets.py')
+        self.assertEqual(sorted(budgeted - route_names), [], 'Budgets for routes that no longer exist')
+
+    def test_page_views(self):
+        for name, url in [
+            ('index', '/'), ('about', '/about/'), ('features', '/features/'),
+            ('pricing', '/pricing/'), ('contact', '/contact/'), ('login', '/login/'),
+            ('dashboard', '/dashboard/'), ('signup', '/signup/'), ('ai_interface', '/ai-interface/'),
+        ]:
+            with self.subTest(page=name):
+                self.assertWithinBudget(name, lambda: self.client.get(url))
+
+    def test_login_success(self):
+        response = self.assertWithinBudget('user_login:success', lambda: self.post_json(
+            '/api/login/', {'username': 'jane@example.com', 'password': PASSWORD}
+        ))
+        self.assertEqual(response.json()['status'], 'success')
+
+    def test_login_wrong_password(self):
+        response = self.assertWithinBudget('user_login:wrong_password', lambda: self.post_json(
+            '/api/login/', {'username': 'jane@example.com', 'password': 'Wr0ngPassword'}
+        ))
+        self.assertEqual(response.json()['status'], 'error')
+
+    def test_login_unknown_user(self):
+        response = self.assertWithinBudget('user_login:unknown_user', lambda: self.post_json(
+            '/api/login/', {'username': 'nobody@example.com', 'password': PASSWORD}
+        ))
+        self.assertEqual(response.json()['status'], 'error')
+
+    def test_login_locked_account(self):
+        attempt = lambda: self.post_json('/api/login/', {'username': 'locked@example.com', 'password': PASSWORD})
+        response = self.assertWithinBudget('user_login:locked_cold_cache', attempt)
+        self.assertIn('locked', response.json()['message'])
+        response = self.assertWithinBudget('user_login:locked', attempt)
+        self.assertIn('locked', response.json()['message'])
+
+    def test_signup_success(self):
+        response = self.assertWithinBudget('user_signup:success', lambda: self.post_json(
+            '/api/signup/', {'fullName': 'New Person', 'email': 'new@example.com',
+                             'password': PASSWORD, 'newsletter': True}
+        ))
+        self.assertEqual(response.json()['status'], 'success')
+
+    def test_signup_existing_email(self):
+        response = self.assertWithinBudget('user_signup:existing_email', lambda: self.post_json(
+            '/api/signup/', {'fullName': 'Jane Doe', 'email': 'jane@example.com', 'password': PASSWORD}
+        ))
+        self.assertEqual(response.json()['status'], 'error')
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+        self.assertWithinBudget('user_logout', lambda: self.client.post('/api/logout/'))
+
+    def test_ai_chat(self):
+        retrieval.get_store().get()  # Budgets are for the steady state, after the index is built
+        response = self.assertWithinBudget('ai_chat', lambda: self.post_json(
+            '/api/ai-chat/', {'message': 'Is my data secure?'}
+        ))
+        self.assertTrue(response.json()['sources'])
+
+    def test_csrf_token(self):
+        self.assertWithinBudget('get_csrf_token', lambda: self.client.get('/api/csrf-token/'))
+
+    def test_auth_status_anonymous(self):
+        response = self.assertWithinBudget('check_auth_status:anonymous', lambda: self.client.get('/api/auth-status/'))
+        self.assertFalse(response.json()['authenticated'])
+
+    def test_auth_status_authenticated(self):
+        self.client.force_login(self.user)
+        response = self.assertWithinBudget('check_auth_status:authenticated', lambda: self.client.get('/api/auth-status/'))
+        self.assertTrue(response.json()['authenticated'])
+
+    def test_profile_update(self):
+        self.client.force_login(self.user)
+        response = self.assertWithinBudget('update_user_profile', lambda: self.post_json(
+            '/api/profile/update/', {'first_name': 'Janet', 'newsletter_subscription': False,
+                                     'phone_number': '+14155550100'}
+        ))
+        self.assertEqual(response.json()['status'], 'success')
+
+    def test_validate_email(self):
+        # Budgets are for the steady state, after the Bloom filter is built
+        registered_emails.reset()
+        registered_emails.might_contain('warmup@example.com')
+        for scenario, email in [('validate_email:available', 'free@example.com'),
+                                ('validate_email:registered', 'jane@example.com')]:
+            with self.subTest(scenario=scenario):
+                self.assertWithinBudget(scenario, lambda: self.post_json('/api/validate-email/', {'email': email}))
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_password_reset(self):
+        self.assertWithinBudget('request_password_reset', lambda: self.post_json(
+            '/api/password-reset/', {'email': 'jane@example.com'}
+        ))
+        token = tokens.issue_password_reset(UserProfile.objects.get(user=self.user))
+        response = self.assertWithinBudget('confirm_password_reset', lambda: self.post_json(
+            '/api/password-reset/confirm/', {'token': token, 'password': 'N3wPassword!'}
+        ))
+        self.assertEqual(response.json()['status'], 'success')
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_email_verification(self):
+        profile = UserProfile.objects.get(user=self.user)
+        profile.email_verified = False
+        profile.save()
+        self.client.force_login(self.user)
+        self.assertWithinBudget('request_email_verification', lambda: self.client.post('/api/verify-email/request/'))
+        token = tokens.issue_email_verification(profile)
+        response = self.assertWithinBudget('verify_email', lambda: self.post_json('/api/verify-email/', {'token': token}))
+        self.assertEqual(response.json()['status'], 'success')
+
+    def test_contact_form(self):
+        response = self.assertWithinBudget('contact_form', lambda: self.post_json(
+            '/api/contact/', {'name': 'Sam Visitor', 'email': 'sam@example.com',
+                              'message': 'I would like to hear more about pricing.'}
+        ))
+        self.assertEqual(response.json()['status'], 'success')
+
+    def test_contact_form_retry(self):
+        send = lambda: self.client.post('/api/contact/', json.dumps({
+            'name': 'Sam Visitor', 'email': 'sam@example.com', 'message': 'I would like to hear more about pricing.'
+        }), content_type='application/json', headers={'Idempotency-Key': 'contact-retry'})
+        send()
+        response = self.assertWithinBudget('contact_form:idempotent_retry', send)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_export(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        def download():
+            # Rows are fetched while the body streams, so consume it inside the budget
+            response = self.client.get('/api/export/login_attempts/')
+            response.body = b''.join(response.streaming_content)
+            return response
+
+        response = self.assertWithinBudget('export_data', download)
+        self.assertEqual(response.body.count(b'\n'), 51)
+
+    def test_batch_page_load(self):
+        # Session and user are loaded once for the whole batch
+        registered_emails.reset()
+        registered_emails.might_contain('warmup@example.com')
+        self.client.force_login(self.user)
+        response = self.assertWithinBudget('batch_api', lambda: self.post_json('/api/batch/', {'requests': [
+            {'path': '/api/csrf-token/'}, {'path': '/api/auth-status/'},
+            {'method': 'POST', 'path': '/api/validate-email/', 'body': {'email': 'free@example.com'}},
+        ]}))
+        self.assertEqual([r['status'] for r in response.json()['responses']], [200, 200, 200])
+
+    def test_market_data(self):
+        market_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, market_dir)
+        bars = marketdata.synthetic_bars(200_000)
+        with self.settings(MARKET_DATA_DIR=market_dir):
+            marketdata.get_store().append('DRV', bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+            response = self.assertWithinBudget(
+                'market_data', lambda: self.client.get('/api/market/DRV/', {'points': 500})
+            )
+        self.assertEqual(response.json()['points'], 500)
+
+    def test_market_indicators(self):
+        market_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, market_dir)
+        bars = marketdata.synthetic_bars(200_000)
+        with self.settings(MARKET_DATA_DIR=market_dir):
+            marketdata.get_store().append('DRV', bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+            response = self.assertWithinBudget(
+                'market_indicators', lambda: self.client.get('/api/market/DRV/indicators/', {'bars': 500})
+            )
+        self.assertEqual(len(response.json()['series']['rsi']), 500)
+
+    def test_price_options(self):
+        strikes = [80 + i * 0.01 for i in range(5000)]
+        response = self.assertWithinBudget('price_options', lambda: self.post_json('/api/pricing/options/', {
+            'spot': 100, 'strike': strikes, 'expiry': 0.5, 'rate': 0.03, 'volatility': 0.25, 'type': 'call'
+        }))
+        self.assertEqual(response.json()['count'], 5000)
+
+    def test_optimize_portfolio(self):
+        market_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, market_dir)
+        symbols = [f'S{i}' for i in range(100)]
+        with self.settings(MARKET_DATA_DIR=market_dir):
+            for seed, symbol in enumerate(symbols):
+                bars = marketdata.synthetic_bars(300, step=86400, seed=seed)
+                marketdata.get_store().append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+            response = self.assertWithinBudget('optimize_portfolio', lambda: self.post_json(
+                '/api/portfolio/optimize/', {'symbols': symbols, 'method': 'min_variance', 'max_weight': 0.05}
+            ))
+        self.assertEqual(len(response.json()['weights']), 100)
+
+    def test_run_backtest(self):
+        self.client.force_login(self.user)
+        market_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, market_dir)
+        symbols = [f'S{i}' for i in range(20)]
+        with self.settings(MARKET_DATA_DIR=market_dir):
+            for seed, symbol in enumerate(symbols):
+                bars = marketdata.synthetic_bars(2520, step=86400, seed=seed)
+                marketdata.get_store().append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+            response = self.assertWithinBudget('run_backtest', lambda: self.post_json('/api/backtest/', {
+                'symbols': symbols, 'strategy': 'sma_cross', 'params': {'fast': [10, 20, 50], 'slow': [100, 200]}
+            }))
+        self.assertEqual(len(response.json()['results']), 6)
+
+    def test_risk_simulation(self):
+        self.client.force_login(self.user)
+        response = self.assertWithinBudget('submit_risk_simulation', lambda: self.post_json(
+            '/api/risk/simulations/', {'positions': {'AAA': 1000, 'BBB': -500}, 'paths': 10_000, 'seed': 1}
+        ))
+        self.assertEqual(response.status_code, 202)
+        poll = response.json()['poll']
+        response = self.assertWithinBudget('risk_simulation_status', lambda: self.client.get(poll))
+        self.assertEqual(response.json()['state'], 'queued')  # Jobs start on commit, which TestCase never does
+
+    @override_settings(TRADING_SYMBOLS=['BUDGET'])
+    def test_paper_trading(self):
+        self.client.force_login(self.user)
+        # A resting order: nothing fills, so nothing is written
+        response = self.assertWithinBudget('place_paper_order', lambda: self.post_json(
+            '/api/trading/orders/', {'symbol': 'BUDGET', 'side': 'buy', 'price': 1.5, 'quantity': 10}
+        ))
+        order_id = response.json()['order']['id']
+        self.assertWithinBudget('paper_fills', lambda: self.client.get('/api/trading/fills/'))
+        response = self.assertWithinBudget('cancel_paper_order', lambda: self.post_json(
+            f'/api/trading/orders/{order_id}/cancel/', {'symbol': 'BUDGET'}
+        ))
+        self.assertEqual(response.json()['order']['status'], 'cancelled')
+        self.client.logout()
+        response = self.assertWithinBudget('paper_order_book', lambda: self.client.get('/api/trading/book/BUDGET/'))
+        self.assertEqual(response.json()['bids'], [])
+
+    def test_dashboard_snapshot(self):
+        market_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, market_dir)
+        with self.settings(MARKET_DATA_DIR=market_dir):
+            for seed, symbol in enumerate(['AAA', 'BBB']):
+                bars = marketdata.synthetic_bars(300, step=86400, seed=seed)
+                marketdata.get_store().append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+                PaperFill.objects.create(symbol=symbol, price='100.5', quantity=10, buy_order_id=1, sell_order_id=2,
+                                         buyer=self.user, aggressor='buy', executed_at=timezone.now())
+            self.client.force_login(self.user)
+            # Session and user lookups plus one grouped query over the user's fills
+            response = self.assertWithinBudget('dashboard_snapshot:cold', lambda: self.client.get('/api/dashboard/'))
+            etag = response['ETag']
+            response = self.assertWithinBudget('dashboard_snapshot:not_modified', lambda: self.client.get(
+                '/api/dashboard/', HTTP_IF_NONE_MATCH=etag
+            ))
+        self.assertEqual(response.status_code, 304)
+
+    def test_metrics(self):
+        self.assertWithinBudget('metrics', lambda: self.client.get('/metrics'))
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+from django.test import SimpleTestCase, override_settings
+
+from main import quotes
+
+
+async def idle_source(hub, interval):
+    """A feed that publishes nothing, so tests publish by hand"""
+    while hub.channels:
+        await asyncio.sleep(interval)
+    return
+    yield
+
+
+def quote(symbol, last):
+    return quotes.Quote(symbol, last - 0.01, last + 0.01, last, 100, 0.0)
+
+
+class QuoteHubTests(SimpleTestCase):
+    async def test_subscribers_get_only_their_symbols(self):
+        hub = quotes.QuoteHub(interval=0.01, source=idle_source)
+        first, second = quotes.Subscriber(), quotes.Subscriber()
+        hub.subscribe(first, ['AAA', 'BBB'])
+        hub.subscribe(second, ['BBB'])
+        hub.publish(quote('AAA', 10.0))
+        hub.publish(quote('BBB', 20.0))
+        hub.publish(quote('CCC', 30.0))
+        self.assertEqual([q.symbol for q in await first.get()], ['AAA', 'BBB'])
+        self.assertEqual([q.symbol for q in await second.get()], ['BBB'])
+        self.assertEqual(await second.get(timeout=0.01), [])
+
+        late = quotes.Subscriber()
+        hub.subscribe(late, ['AAA'])
+        self.assertEqual(json.loads((await late.get())[0].data)['last'], 10.0)  # Latest quote straight away
+
+    async def test_slow_subscriber_gets_latest_quote(self):
+        hub = quotes.QuoteHub(interval=0.01, source=idle_source)
+        subscriber = quotes.Subscriber()
+        hub.subscribe(subscriber, ['AAA', 'BBB'])
+        for i in range(5):
+            hub.publish(quote('AAA', 10.0 + i))
+        hub.publish(quote('BBB', 20.0))
+        received = await subscriber.get()
+        self.assertEqual([json.loads(q.data)['last'] for q in received], [14.0, 20.0])
+        self.assertEqual((subscriber.coalesced, subscriber.delivered), (4, 2))
+
+    async def test_unsubscribe_and_limits(self):
+        hub = quotes.QuoteHub(interval=0.01, max_symbols=2, source=idle_source)
+        subscriber = quotes.Subscriber()
+        hub.subscribe(subscriber, ['AAA', 'BBB'])
+        with self.assertRaises(quotes.QuoteError):
+            hub.subscribe(subscriber, ['CCC'])
+        hub.publish(quote('AAA', 10.0))
+        hub.unsubscribe(subscriber, ['AAA'])
+        self.assertEqual(await subscriber.get(timeout=0.01), [])
+        self.assertEqual(list(hub.channels), ['BBB'])
+        self.assertNotIn('AAA', hub.latest)
+        hub.unsubscribe(subscriber)
+        await asyncio.sleep(0.05)
+        self.assertTrue(hub._feed.done())  # The feed stops with the last subscription
+
+    async def test_synthetic_feed(self):
+        hub = quotes.QuoteHub(interval=0.01)
+        subscriber = quotes.Subscriber()
+        hub.subscribe(subscriber, ['AAA'])
+        received = []
+        while len(received) < 3:
+            received += [json.loads(q.data) for q in await subscriber.get(timeout=1)]
+        self.assertTrue(all(q['symbol'] == 'AAA' and q['bid'] < q['ask'] for q in received))
+        hub.unsubscribe(subscriber)
+
+    def test_parse_symbols(self):
+        self.assertEqual(quotes.parse_symbols('aaa, bbb,AAA,'), ['AAA', 'BBB'])
+        self.assertEqual(quotes.parse_symbols(['ccc']), ['CCC'])
+        for value in ['$$$', [1], {'AAA': 1}]:
+            with self.subTest(value=value):
+                with self.assertRaises(quotes.QuoteError):
+                    quotes.parse_symbols(value)
+
+
+@override_settings(QUOTES_TICK_INTERVAL=0.01)
+class QuoteStreamTests(SimpleTestCase):
+    async def open(self, query, method='GET'):
+        incoming, sent = asyncio.Queue(), asyncio.Queue()
+        incoming.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+        scope = {'type': 'http', 'method': method, 'path': '/api/quotes/stream/', 'query_string': query}
+        task = asyncio.create_task(quotes.sse_app(scope, incoming.get, sent.put))
+        return task, incoming, sent
+
+    async def test_server_sent_events(self):
+        task, incoming, sent = await self.open(b'symbols=aaa,bbb')
+        start = await sent.get()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual((await sent.get())['body'], b'retry: 3000\n\n')
+        events = []
+        while len(events) < 4:
+            body = (await asyncio.wait_for(sent.get(), 1))['body'].decode()
+            events += [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+        self.assertEqual({event['symbol'] for event in events}, {'AAA', 'BBB'})
+
+        incoming.put_nowait({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(quotes.get_hub().channels, {})
+
+    async def test_errors(self):
+        too_many = 'symbols=' + ','.join(f'S{i}' for i in range(51))
+        for query, method in [('symbols=', 'GET'), (too_many, 'GET'), ('symbols=$$$', 'GET'), ('symbols=AAA', 'POST')]:
+            with self.subTest(query=query[:20], method=method):
+                task, _, sent = await self.open(query.encode(), method)
+                await asyncio.wait_for(task, 1)
+                self.assertEqual((await sent.get())['status'], 400)
+                self.assertEqual(json.loads((await sent.get())['body'])['status'], 'error')
+        self.assertEqual(quotes.get_hub().channels, {})
+
+
+@override_settings(QUOTES_TICK_INTERVAL=0.01)
+class QuoteWebSocketTests(SimpleTestCase):
+    async def connect(self, path, query=b''):
+        incoming, sent = asyncio.Queue(), asyncio.Queue()
+        incoming.put_nowait({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': path, 'query_string': query}
+        task = asyncio.create_task(quotes.websocket_app(scope, incoming.get, sent.put))
+        return task, incoming, sent
+
+    async def frames(self, sent, predicate, count):
+        found = []
+        while len(found) < count:
+            message = await asyncio.wait_for(sent.get(), 1)
+            data = json.loads(message['text'])
+            if predicate(data):
+                found.append(data)
+        return found
+
+    async def test_subscribe_and_unsubscribe(self):
+        task, incoming, sent = await self.connect('/ws/quotes/', b'symbols=aaa')
+        self.assertEqual(await sent.get(), {'type': 'websocket.accept'})
+        batch, = await self.frames(sent, lambda data: isinstance(data, list), 1)
+        self.assertEqual({q['symbol'] for q in batch}, {'AAA'})
+
+        incoming.put_nowait({'type': 'websocket.receive', 'text': '{"subscribe": ["bbb"], "unsubscribe": ["aaa"]}'})
+        reply, = await self.frames(sent, lambda data: isinstance(data, dict), 1)
+        self.assertEqual(reply, {'symbols': ['BBB']})
+        batches = await self.frames(sent, lambda data: isinstance(data, list) and data[0]['symbol'] == 'BBB', 2)
+        self.assertTrue(all(q['symbol'] == 'BBB' for batch in batches for q in batch))
+
+        incoming.put_nowait({'type': 'websocket.receive', 'text': 'nonsense'})
+        reply, = await self.frames(sent, lambda data: isinstance(data, dict), 1)
+        self.assertIn('error', reply)
+
+        incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(quotes.get_hub().channels, {})
+
+    async def test_rejected_connections(self):
+        for path, query, code in [('/ws/other/', b'', 4404), ('/ws/quotes/', b'symbols=$$$', 4400)]:
+            with self.subTest(path=path):
+                task, _, sent = await self.connect(path, query)
+                await asyncio.wait_for(task, 1)
+                self.assertEqual(await sent.get(), {'type': 'websocket.close', 'code': code})
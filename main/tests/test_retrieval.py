@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from main import retrieval
+
+FAQ = """
+<html><head><title>FAQ</title><script>var ignored = 'pricing';</script></head>
+<body>
+  <nav><a href="/">Home pricing plans</a></nav>
+  <h2>How much does Pro cost?</h2>
+  <p>The Pro plan costs $29 per month and includes unlimited conversations.</p>
+  <h2>Is my data secure?</h2>
+  <p>All data is encrypted at rest and in transit.</p>
+  <footer>Pricing footer</footer>
+</body></html>
+"""
+
+ABOUT = """
+<html><body>
+  <h1>About us</h1>
+  <p>Derivity was founded to make AI simple.</p>
+</body></html>
+"""
+
+
+class RetrievalIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.site = tempfile.mkdtemp()
+        self.index_dir = os.path.join(self.site, 'index')
+        self.addCleanup(shutil.rmtree, self.site)
+        self.write('faq.html', FAQ)
+        self.write('about.html', ABOUT)
+        overrides = override_settings(
+            BASE_DIR=self.site, RETRIEVAL_TEMPLATES=['faq.html', 'about.html'],
+            RETRIEVAL_INDEX_DIR=self.index_dir, RETRIEVAL_CHECK_SECONDS=0, METRICS_DIR=None,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def write(self, name, html, mtime=None):
+        path = os.path.join(self.site, name)
+        with open(path, 'w') as f:
+            f.write(html)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+    def test_extraction_skips_chrome_and_keeps_headings(self):
+        passages = retrieval.extract_passages(FAQ, 'faq')
+        self.assertEqual([p['title'] for p in passages], ['How much does Pro cost?', 'Is my data secure?'])
+        text = ' '.join(p['text'] for p in passages)
+        self.assertNotIn('footer', text.lower())
+        self.assertNotIn('ignored', text)
+
+    def test_long_sections_are_split(self):
+        html = '<h2>Long</h2>' + ''.join(f'<p>Sentence number {i} about plans.</p>' for i in range(60))
+        passages = retrieval.extract_passages(html, 'long')
+        self.assertGreater(len(passages), 1)
+        self.assertTrue(all(len(p['text'].split()) <= retrieval.PASSAGE_WORDS for p in passages))
+
+    def test_search_ranks_the_matching_passage_first(self):
+        results = retrieval.get_store().get().search('What does the pro plan cost?')
+        self.assertEqual(results[0][1]['title'], 'How much does Pro cost?')
+        self.assertEqual(retrieval.get_store().get().search('weather forecast'), [])
+
+    def test_index_is_memory_mapped_and_rebuilt_only_for_changed_templates(self):
+        store = retrieval.get_store()
+        self.assertEqual(store.build(), ['faq.html', 'about.html'])
+        self.assertIsInstance(store.get().matrix, np.memmap)
+
+        # A fresh process reuses the files without parsing
+        fresh = retrieval.IndexStore(self.index_dir, check_interval=0)
+        self.assertEqual(fresh.get().search('encrypted data')[0][1]['title'], 'Is my data secure?')
+
+        self.write('about.html', ABOUT.replace('make AI simple', 'build portfolio analytics'), mtime=2_000_000_000)
+        self.assertEqual(store.build(), ['about.html'])
+        self.assertEqual(store.get().search('portfolio analytics')[0][1]['page'], 'about')
+        with open(os.path.join(self.index_dir, retrieval.MANIFEST)) as f:
+            matrix_files = [n for n in os.listdir(self.index_dir) if n.startswith('weights-')]
+            self.assertEqual(matrix_files, [json.load(f)['matrix']])
+
+    def test_get_picks_up_template_changes(self):
+        store = retrieval.get_store()
+        store.get()
+        self.write('faq.html', FAQ.replace('$29', '$39'), mtime=2_000_000_000)
+        self.assertIn('$39', store.get().search('pro cost')[0][1]['text'])
+
+    def test_ai_chat_answers_from_passages(self):
+        response = self.client.post('/api/ai-chat/', json.dumps({'message': 'Is my data secure?'}),
+                                    content_type='application/json').json()
+        self.assertIn('encrypted', response['response'])
+        self.assertEqual(response['sources'][0]['page'], 'faq')
+
+        response = self.client.post('/api/ai-chat/', json.dumps({'message': 'Tell me a joke'}),
+                                    content_type='application/json').json()
+        self.assertIn('Thank you for your interest', response['response'])
+        self.assertEqual(response['sources'], [])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('build_retrieval_index', force=True, stdout=out)
+        self.assertIn('Indexed 3 passages', out.getvalue())
@@ -0,0 +1,149 @@
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from main import marketdata, risk
+from main.models import RiskJob
+
+Z_01 = -2.3263478740408408  # Standard normal 1% quantile
+
+
+class SimulationTests(SimpleTestCase):
+    def test_single_asset_var_matches_lognormal(self):
+        mean, sigma = np.array([0.0005]), np.array([[0.02]])
+        pnl, drawdown = risk.simulate(mean, sigma, np.array([1000.0]), 1, 200_000, seed=3)
+        summary = risk.summarize(pnl, drawdown, [0.99])
+        expected_var = -1000 * (np.exp(0.0005 + 0.02 * Z_01) - 1)
+        self.assertAlmostEqual(summary['var']['0.99'] / expected_var, 1, delta=0.02)
+        self.assertGreater(summary['cvar']['0.99'], summary['var']['0.99'])
+        np.testing.assert_allclose(drawdown, np.maximum(-pnl, 0))  # One bar: drawdown is the loss
+
+    def test_correlation_comes_from_the_cholesky_factor(self):
+        covariance = 1e-6 * np.array([[1.0, 0.9], [0.9, 1.0]])
+        chol = np.linalg.cholesky(covariance)
+        pnl, _ = risk.simulate(np.zeros(2), chol, np.array([1.0, -1.0]), 5, 100_000, seed=4)
+        # Small returns: P&L is close to linear, with variance w'Cw per bar
+        self.assertAlmostEqual(pnl.var() / (5 * 1e-6 * 0.2), 1, delta=0.03)
+
+    def test_drawdown_covers_terminal_loss(self):
+        chol = np.linalg.cholesky(np.array([[4e-4, 1e-4], [1e-4, 2e-4]]))
+        pnl, drawdown = risk.simulate(np.zeros(2), chol, np.array([600.0, 400.0]), 20, 5000, seed=5)
+        self.assertTrue((drawdown >= np.maximum(-pnl, 0) - 1e-9).all())
+        self.assertTrue((drawdown > np.maximum(-pnl, 0) + 1e-9).any())
+
+    def test_seeded_paths_do_not_depend_on_workers(self):
+        chol = np.linalg.cholesky(np.array([[4e-4, 1e-4], [1e-4, 2e-4]]))
+        args = (np.zeros(2), chol, np.array([1.0, 2.0]), 3, risk.BLOCK_PATHS + 1000)
+        inline = risk.simulate(*args, seed=9)
+        pooled = risk.simulate(*args, seed=9, workers=2)
+        np.testing.assert_array_equal(inline[0], pooled[0])
+        np.testing.assert_array_equal(inline[1], pooled[1])
+        self.assertFalse(np.array_equal(inline[0], risk.simulate(*args, seed=10)[0]))
+
+    def test_parse_request(self):
+        limits = (100_000, 50, 1_000_000, 10)
+        params = risk.parse_request({'positions': {'aaa': 10}, 'paths': 5000}, *limits)
+        self.assertEqual(params['positions'], {'AAA': 10})
+        self.assertIsInstance(params['seed'], int)
+        for data in [
+            {'positions': {}}, {'positions': {'AAA': 'ten'}}, {'positions': {'AAA': 1, 'aaa': 2}},
+            {'positions': {'AAA': 1}, 'paths': 10}, {'positions': {'AAA': 1}, 'horizon': 51},
+            {'positions': {'AAA': 1}, 'confidence': [1.0]}, {'positions': {'AAA': 1}, 'seed': -1},
+            {'positions': {f'S{i}': 1 for i in range(5)}, 'paths': 100_000, 'horizon': 10},
+        ]:
+            with self.subTest(data=data):
+                with self.assertRaises(risk.RiskError):
+                    risk.parse_request(data, *limits)
+
+
+@override_settings(METRICS_DIR=None, RISK_WORKERS=0)
+class RiskJobApiTests(TransactionTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        overrides = override_settings(MARKET_DATA_DIR=root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for seed, symbol in enumerate(['AAA', 'BBB', 'CCC']):
+            bars = marketdata.synthetic_bars(300, step=86400, seed=seed)
+            marketdata.get_store().append(symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'x')
+        self.client.force_login(self.user)
+
+    def submit(self, data):
+        return self.client.post('/api/risk/simulations/', json.dumps(data), content_type='application/json')
+
+    def wait(self, poll):
+        for _ in range(200):
+            body = self.client.get(poll).json()
+            if body['state'] in ('done', 'failed'):
+                return body
+            time.sleep(0.05)
+        self.fail(f'Job still {body["state"]}')
+
+    def test_submit_and_poll(self):
+        data = {'positions': {'AAA': 5000, 'BBB': 3000, 'CCC': -2000}, 'paths': 20_000, 'horizon': 5, 'seed': 7}
+        response = self.submit(data)
+        self.assertEqual(response.status_code, 202)
+        body = self.wait(response.json()['poll'])
+        self.assertEqual(body['state'], 'done')
+        self.assertEqual(body['progress'], 1.0)
+        result = body['result']
+        self.assertEqual((result['paths'], result['horizon'], result['seed']), (20_000, 5, 7))
+        self.assertGreater(result['cvar']['0.99'], result['var']['0.99'])
+        self.assertGreater(result['var']['0.99'], result['var']['0.95'])
+        self.assertGreaterEqual(result['drawdown']['quantiles']['0.99'], result['drawdown']['quantiles']['0.5'])
+
+        # Same seed, same answer
+        again = self.wait(self.submit(data).json()['poll'])['result']
+        self.assertEqual(again['var'], result['var'])
+        self.assertTrue(again['covariance_cached'])
+
+    def test_failures(self):
+        body = self.wait(self.submit({'positions': {'AAA': 1, 'NOPE': 1}, 'paths': 1000}).json()['poll'])
+        self.assertEqual(body['state'], 'failed')
+        self.assertIn('NOPE', body['error'])
+        self.assertEqual(RiskJob.objects.get(pk=body['job']).status, 'failed')
+
+        self.assertEqual(self.submit({'positions': []}).status_code, 400)
+        self.assertEqual(self.client.get('/api/risk/simulations/00000000-0000-0000-0000-000000000000/').status_code,
+                         404)
+
+    def test_jobs_belong_to_their_user(self):
+        poll = self.submit({'positions': {'AAA': 1}, 'paths': 1000}).json()['poll']
+        self.assertEqual(self.wait(poll)['state'], 'done')
+        self.client.force_login(User.objects.create_user('bob', 'bob@example.com', 'x'))
+        self.assertEqual(self.client.get(poll).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.submit({'positions': {'AAA': 1}}).status_code, 401)
+        self.assertEqual(self.client.get(poll).status_code, 401)
+
+    def test_active_jobs_are_limited(self):
+        RiskJob.objects.create(user=self.user, params={}, status='running', runner='other',
+                               heartbeat_at=timezone.now())
+        with self.settings(RISK_MAX_ACTIVE_JOBS_PER_USER=1):
+            self.assertEqual(self.submit({'positions': {'AAA': 1}}).status_code, 429)
+        RiskJob.objects.create(params={}, runner=risk.RUNNER, heartbeat_at=timezone.now())
+        with self.settings(RISK_MAX_QUEUED_JOBS=1):
+            self.assertEqual(self.submit({'positions': {'AAA': 1}}).status_code, 429)
+        self.assertEqual(RiskJob.objects.filter(user=self.user).count(), 1)
+
+    def test_abandoned_jobs_are_failed(self):
+        old = timezone.now() - timedelta(hours=1)
+        lost = RiskJob.objects.create(user=self.user, params={}, status='running', runner='gone', heartbeat_at=old)
+        live = RiskJob.objects.create(user=self.user, params={}, runner='other', heartbeat_at=timezone.now())
+        body = self.client.get(f'/api/risk/simulations/{lost.pk}/').json()
+        self.assertEqual((body['state'], body['error']), ('failed', risk.LOST_ERROR))
+        self.assertEqual(RiskJob.objects.get(pk=live.pk).status, 'queued')
+        # The limit counts live jobs only
+        with self.settings(RISK_MAX_ACTIVE_JOBS_PER_USER=2):
+            response = self.submit({'positions': {'AAA': 1}, 'paths': 1000})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.wait(response.json()['poll'])['state'], 'done')
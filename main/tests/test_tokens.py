@@ -0,0 +1,132 @@
+import json
+import re
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from main import mailer, tokens
+from main.models import UserProfile
+
+PASSWORD = 'Str0ngPassw0rd'
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class TokenFlowTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='jane', email='jane@example.com', password=PASSWORD)
+        self.profile = UserProfile.objects.create(user=self.user, email_verified=False)
+
+    def post_json(self, url, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, json.dumps(data), content_type='application/json').json()
+        mailer.wait()
+        return response
+
+    def emailed_token(self, param):
+        return re.search(rf'{param}=([\w-]+)', mail.outbox[-1].body).group(1)
+
+    def test_password_reset_stores_only_hash_and_is_single_use(self):
+        result = self.post_json('/api/password-reset/', {'email': 'jane@example.com'})
+        self.assertEqual(result['status'], 'success')
+        token = self.emailed_token('reset_token')
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.password_reset_token, tokens.hash_token(token))
+        self.assertNotIn(token, self.profile.password_reset_token)
+
+        result = self.post_json('/api/password-reset/confirm/', {'token': token, 'password': 'N3wPassword!'})
+        self.assertEqual(result['status'], 'success')
+        self.assertTrue(self.client.login(username='jane', password='N3wPassword!'))
+
+        again = self.post_json('/api/password-reset/confirm/', {'token': token, 'password': 'An0therPassword'})
+        self.assertEqual(again['status'], 'error')
+
+    def test_unknown_email_gets_same_response(self):
+        known = self.post_json('/api/password-reset/', {'email': 'jane@example.com'})
+        unknown = self.post_json('/api/password-reset/', {'email': 'ghost@example.com'})
+        self.assertEqual(known, unknown)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_unknown_email_runs_the_same_queries(self):
+        with CaptureQueriesContext(connection) as known:
+            self.post_json('/api/password-reset/', {'email': 'jane@example.com'})
+        with CaptureQueriesContext(connection) as unknown:
+            self.post_json('/api/password-reset/', {'email': 'ghost@example.com'})
+        kinds = lambda captured: [query['sql'].split()[0] for query in captured]
+        self.assertEqual(kinds(known), kinds(unknown))
+        self.assertEqual(kinds(known), ['SELECT', 'UPDATE'])
+
+    def test_reset_for_account_without_profile(self):
+        User.objects.create_user(username='admin', email='admin@example.com', password=PASSWORD)
+        self.post_json('/api/password-reset/', {'email': 'admin@example.com'})
+        token = self.emailed_token('reset_token')
+        self.assertEqual(tokens.find_password_reset_profile(token).user.username, 'admin')
+
+    def test_expired_reset_token_rejected_and_swept(self):
+        token = tokens.issue_password_reset(self.profile)
+        UserProfile.objects.filter(pk=self.profile.pk).update(
+            password_reset_expires=timezone.now() - timedelta(seconds=1)
+        )
+        result = self.post_json('/api/password-reset/confirm/', {'token': token, 'password': 'N3wPassword!'})
+        self.assertEqual(result['status'], 'error')
+
+        out = StringIO()
+        call_command('expire_tokens', stdout=out)
+        self.assertIn('Expired 1 password reset', out.getvalue())
+        self.profile.refresh_from_db()
+        self.assertIsNone(self.profile.password_reset_token)
+
+    def test_email_verification_flow(self):
+        self.client.force_login(self.user)
+        self.post_json('/api/verify-email/request/', {})
+        token = self.emailed_token('verify_token')
+
+        result = self.post_json('/api/verify-email/', {'token': token})
+        self.assertEqual(result['status'], 'success')
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.email_verified)
+        self.assertIsNone(self.profile.email_verification_token)
+
+    def test_email_change_invalidates_pending_verification(self):
+        self.client.force_login(self.user)
+        self.post_json('/api/verify-email/request/', {})
+        token = self.emailed_token('verify_token')
+        self.post_json('/api/profile/update/', {'email': 'jane.new@example.com'})
+
+        self.assertEqual(self.post_json('/api/verify-email/', {'token': token})['status'], 'error')
+
+
+class TokenLookupCostTests(TestCase):
+    def add_profiles(self, start, count):
+        users = User.objects.bulk_create([
+            User(username=f'u{i}', email=f'u{i}@example.com') for i in range(start, start + count)
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=u, password_reset_token=tokens.hash_token(f'token-{u.username}'),
+                        password_reset_expires=timezone.now() + timedelta(hours=1))
+            for u in users
+        ])
+
+    def test_lookup_is_one_indexed_query_regardless_of_user_count(self):
+        for start, count in [(0, 10), (10, 2000)]:
+            self.add_profiles(start, count)
+            with self.assertNumQueries(1):
+                profile = tokens.find_password_reset_profile('token-u5')
+            self.assertEqual(profile.user.username, 'u5')
+            with self.assertNumQueries(1):
+                self.assertIsNone(tokens.find_password_reset_profile('wrong-token'))
+
+        if connection.vendor == 'sqlite':
+            plan = UserProfile.objects.filter(password_reset_token=tokens.hash_token('x')).explain()
+            self.assertIn('password_reset_token', plan)
+            self.assertIn('INDEX', plan)
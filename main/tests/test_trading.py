@@ -0,0 +1,131 @@
+import json
+import shutil
+import tempfile
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import Client, SimpleTestCase, TransactionTestCase, override_settings
+
+from main import marketdata, trading
+from main.models import PaperFill
+
+
+class ParseOrderTests(SimpleTestCase):
+    def test_prices_become_ticks(self):
+        tick = Decimal('0.01')
+        self.assertEqual(trading.parse_order({'side': 'buy', 'price': 101.25, 'quantity': 3}, tick, 100),
+                         ('buy', 10125, 3))
+        self.assertEqual(trading.parse_order({'side': 'sell', 'price': '0.10', 'quantity': 1}, tick, 100),
+                         ('sell', 10, 1))
+        self.assertEqual(trading.parse_order({'side': 'sell', 'type': 'market', 'quantity': 5}, tick, 100),
+                         ('sell', None, 5))
+        for data in [
+            [], {'side': 'hold', 'price': 1, 'quantity': 1}, {'side': 'buy', 'quantity': 1},
+            {'side': 'buy', 'price': 1.005, 'quantity': 1}, {'side': 'buy', 'price': -1, 'quantity': 1},
+            {'side': 'buy', 'price': 'NaN', 'quantity': 1}, {'side': 'buy', 'price': 'cheap', 'quantity': 1},
+            {'side': 'buy', 'price': 1, 'quantity': 1.5}, {'side': 'buy', 'price': 1, 'quantity': 101},
+            {'side': 'buy', 'type': 'market', 'price': 1, 'quantity': 1}, {'side': 'buy', 'type': 'stop'},
+        ]:
+            with self.subTest(data=data):
+                with self.assertRaises(trading.TradingError):
+                    trading.parse_order(data, tick, 100)
+
+
+@override_settings(METRICS_DIR=None)
+class TradingApiTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'x')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'x')
+        self.symbol = self._testMethodName[5:].replace('_', '').upper()[:12]  # Books outlive tests; keep them apart
+        overrides = override_settings(TRADING_SYMBOLS=[self.symbol])
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def order(self, user, data):
+        self.client.force_login(user)
+        return self.client.post('/api/trading/orders/', json.dumps({'symbol': self.symbol, **data}),
+                                content_type='application/json')
+
+    def test_match_and_store_fills(self):
+        maker = self.order(self.alice, {'side': 'sell', 'price': 10.5, 'quantity': 100}).json()
+        self.assertEqual(maker['order']['status'], 'open')
+        taker = self.order(self.bob, {'side': 'buy', 'price': 10.6, 'quantity': 40}).json()
+        self.assertEqual(taker['order']['status'], 'filled')
+        self.assertEqual(taker['fills'], [{'price': 10.5, 'quantity': 40, 'maker_order': maker['order']['id']}])
+
+        book = self.client.get(f'/api/trading/book/{self.symbol.lower()}/?depth=5').json()
+        self.assertEqual((book['asks'], book['bids'], book['last']), ([[10.5, 60]], [], 10.5))
+
+        trading.get_engine().flush()
+        fill = PaperFill.objects.get(symbol=self.symbol)
+        self.assertEqual((fill.buyer, fill.seller, fill.price, fill.quantity, fill.aggressor),
+                         (self.bob, self.alice, Decimal('10.5'), 40, 'buy'))
+        self.assertEqual((fill.buy_order_id, fill.sell_order_id), (taker['order']['id'], maker['order']['id']))
+
+        fills = self.client.get('/api/trading/fills/').json()['fills']  # Logged in as bob
+        self.assertEqual([(f['side'], f['quantity'], f['order']) for f in fills], [('buy', 40, taker['order']['id'])])
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get('/api/trading/fills/').json()['fills'][0]['side'], 'sell')
+
+    def test_cancel_only_own_orders(self):
+        order_id = self.order(self.alice, {'side': 'buy', 'price': 9, 'quantity': 10}).json()['order']['id']
+        url = f'/api/trading/orders/{order_id}/cancel/'
+        body = json.dumps({'symbol': self.symbol})
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 404)
+        self.client.force_login(self.alice)
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.json()['order']['status'], 'cancelled')
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/trading/book/{self.symbol}/').json()['bids'], [])
+
+    def test_errors(self):
+        self.assertEqual(self.client.post('/api/trading/orders/', '{}', content_type='application/json').status_code,
+                         401)
+        self.assertEqual(self.client.get('/api/trading/fills/').status_code, 401)
+        for data in [{'side': 'buy', 'price': 1.001, 'quantity': 1}, {'symbol': '', 'side': 'buy', 'quantity': 1}]:
+            with self.subTest(data=data):
+                self.assertEqual(self.order(self.alice, data).status_code, 400)
+
+    def test_orders_only_for_traded_symbols(self):
+        engine = trading.get_engine()
+        response = self.order(self.alice, {'symbol': 'NOTLISTED', 'side': 'buy', 'price': 9, 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'NOTLISTED is not traded')
+        self.assertNotIn('NOTLISTED', engine.books)
+
+        market_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, market_dir)
+        with self.settings(TRADING_SYMBOLS=None, MARKET_DATA_DIR=market_dir):
+            self.assertEqual(self.order(self.alice, {'side': 'buy', 'price': 9, 'quantity': 1}).status_code, 400)
+            bars = marketdata.synthetic_bars(3, step=86400)
+            marketdata.get_store().append(self.symbol, bars['ts'], *(bars[name] for name in marketdata.COLUMNS))
+            self.assertEqual(self.order(self.alice, {'side': 'buy', 'price': 9, 'quantity': 1}).status_code, 200)
+
+    def test_orders_need_a_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.alice)
+        body = json.dumps({'symbol': self.symbol, 'side': 'buy', 'price': 9, 'quantity': 1})
+        self.assertEqual(client.post('/api/trading/orders/', body, content_type='application/json').status_code, 403)
+        token = client.get('/api/csrf-token/').json()['csrf_token']
+        response = client.post('/api/trading/orders/', body, content_type='application/json', HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 200)
+
+    def test_reading_a_book_does_not_create_it(self):
+        engine = trading.get_engine()
+        book = self.client.get(f'/api/trading/book/{self.symbol}/').json()
+        self.assertEqual((book['bids'], book['asks'], book['last']), ([], [], None))
+        self.assertIsNone(engine.cancel(self.alice.pk, self.symbol, 1))
+        self.assertNotIn(self.symbol, engine.books)
+
+    def test_busy_engine_is_a_503(self):
+        def busy(coroutine, timeout=None):
+            coroutine.close()
+            raise FuturesTimeoutError
+
+        with mock.patch.object(trading.get_engine(), 'call', busy):
+            response = self.order(self.alice, {'side': 'buy', 'price': 9, 'quantity': 1})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(self.client.get(f'/api/trading/book/{self.symbol}/').status_code, 503)
@@ -0,0 +1,110 @@
+"""
+Single-use tokens for password reset and email verification.
+
+Only the SHA-256 hash of a token is stored, in an indexed column, so a token
+is found with one index lookup and a leaked database row cannot be replayed.
+Because lookups compare hashes, response time does not depend on how much of
+a guessed token matches a real one.
+"""
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import UserProfile
+
+
+def generate_token():
+    """Return (token for the user, hash to store)"""
+    token = secrets.token_urlsafe(32)
+    return token, hash_token(token)
+
+
+def hash_token(token):
+    return hashlib.sha256((token or '').encode()).hexdigest()
+
+
+def issue_password_reset(profile):
+    token, token_hash = generate_token()
+    profile.password_reset_token = token_hash
+    profile.password_reset_expires = timezone.now() + timedelta(
+        seconds=getattr(settings, 'PASSWORD_RESET_TOKEN_TTL', 3600)
+    )
+    profile.save(update_fields=['password_reset_token', 'password_reset_expires', 'updated_at'])
+    return token
+
+
+def issue_password_reset_for(user):
+    """
+    Store a new reset token for user, which may be None; returns the token, or
+    None when nobody got one
+
+    Known and unknown emails take the same path: a token is always generated
+    and hashed, then written with one UPDATE on the unique user_id index. For
+    an unknown email the key is 0, which no row has, so the statement does the
+    same lookup and simply matches nothing.
+    """
+    token, token_hash = generate_token()
+    fields = {
+        'password_reset_token': token_hash,
+        'password_reset_expires': timezone.now() + timedelta(
+            seconds=getattr(settings, 'PASSWORD_RESET_TOKEN_TTL', 3600)
+        ),
+        'updated_at': timezone.now(),
+    }
+    if UserProfile.objects.filter(user_id=user.pk if user else 0).update(**fields):
+        return token
+    if user is None:
+        return None
+    # Accounts made outside signup (createsuperuser, the admin) may have no profile yet
+    UserProfile.objects.create(user=user, **fields)
+    return token
+
+
+def issue_email_verification(profile):
+    token, token_hash = generate_token()
+    profile.email_verification_token = token_hash
+    profile.email_verification_expires = timezone.now() + timedelta(
+        seconds=getattr(settings, 'EMAIL_VERIFICATION_TOKEN_TTL', 7 * 24 * 3600)
+    )
+    profile.save(update_fields=['email_verification_token', 'email_verification_expires', 'updated_at'])
+    return token
+
+
+def _find(**filters):
+    # get() rather than first(): first() adds ORDER BY id, which can steer
+    # the planner away from the token index
+    try:
+        return UserProfile.objects.select_related('user').get(**filters)
+    except UserProfile.DoesNotExist:
+        return None
+
+
+def find_password_reset_profile(token):
+    """Return the profile (with user) owning a live reset token, or None"""
+    return _find(
+        password_reset_token=hash_token(token),
+        password_reset_expires__gt=timezone.now()
+    )
+
+
+def find_email_verification_profile(token):
+    """Return the profile (with user) owning a live verification token, or None"""
+    return _find(
+        email_verification_token=hash_token(token),
+        email_verification_expires__gt=timezone.now()
+    )
+
+
+def expire_tokens(now=None):
+    """Clear every expired token in two bulk updates; returns (reset, verification) counts"""
+    now = now or timezone.now()
+    reset = UserProfile.objects.filter(password_reset_expires__lte=now).update(
+        password_reset_token=None, password_reset_expires=None
+    )
+    verification = UserProfile.objects.filter(email_verification_expires__lte=now).update(
+        email_verification_token=None, email_verification_expires=None
+    )
+    return reset, verification
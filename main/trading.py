@@ -0,0 +1,248 @@
+"""
+Paper-trading matching engine.
+
+Each process runs one asyncio event loop in a daemon thread. Every symbol
+has an ``OrderBook`` owned by a single consumer task that takes commands
+(place, cancel, snapshot) off that symbol's asyncio.Queue in arrival
+order, so a book is only ever touched by one coroutine and needs no locks,
+and symbols are matched independently. Views are synchronous: they hand a
+command to the loop with ``run_coroutine_threadsafe`` and wait for its
+result, which is ready as soon as the order is matched.
+
+Fills are not written by the matching tasks. They are appended to a
+pending list that a writer task flushes with one ``bulk_create`` per
+TRADING_FILL_BATCH fills or every TRADING_FLUSH_INTERVAL seconds, on a
+single database thread, so matching never waits on the database.
+
+Books live in memory: they are per process and empty after a restart (only
+fills are stored), so paper trading is served by a single worker process.
+Orders are only taken for the TRADING_SYMBOLS universe, or when that is not
+set, for symbols with stored market data, so clients cannot grow the set of
+books without bound.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.dispatch import Signal
+
+from . import marketdata
+from .orderbook import BUY, SELL, Order, OrderBook
+
+logger = logging.getLogger(__name__)
+
+COMMAND_TIMEOUT = 5.0
+
+
+# Sent from the writer thread with the PaperFill objects of each stored batch (bulk_create sends no post_save)
+fills_stored = Signal()
+
+
+class TradingError(ValueError):
+    pass
+
+
+def _write_fills(rows):
+    from .models import PaperFill
+
+    try:
+        fills = PaperFill.objects.bulk_create([PaperFill(**row) for row in rows], batch_size=1000)
+    except Exception:
+        logger.exception('Could not store %d paper fills', len(rows))
+    else:
+        fills_stored.send_robust(sender=PaperFill, fills=fills)
+    finally:
+        close_old_connections()  # The writer thread outlives requests; apply CONN_MAX_AGE here
+
+
+class MatchingEngine:
+    def __init__(self, tick=Decimal('0.01'), fill_batch=500, flush_interval=0.05):
+        self.tick = tick
+        self.fill_batch = fill_batch
+        self.flush_interval = flush_interval
+        self.books = {}
+        self._queues = {}
+        self._handlers = {'place': self._place, 'cancel': self._cancel, 'snapshot': self._snapshot}
+        self._pending = []
+        self._ids = itertools.count(int(time.time() * 1_000_000))  # Unique across restarts
+        self._db = ThreadPoolExecutor(1, thread_name_prefix='paper-fills')
+        self.loop = asyncio.new_event_loop()
+        self._wake = asyncio.Event()
+        self._flushed = None
+        self._thread = threading.Thread(target=self._run, name='matching-engine', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self._writer = self.loop.create_task(self._write_pending())
+        self.loop.run_forever()
+
+    # Loop side
+
+    async def execute(self, symbol, command, *args):
+        """Run a command on a symbol's book in order with every other command for that symbol"""
+        queue = self._queues.get(symbol)
+        if queue is None:
+            if command != 'place':  # Only orders create books; anyone may ask for the depth of any symbol
+                return self._handlers[command](OrderBook(symbol), *args)
+            queue = self._queues[symbol] = asyncio.Queue()
+            self.books[symbol] = OrderBook(symbol)
+            self.loop.create_task(self._consume(self.books[symbol], queue))
+        future = self.loop.create_future()
+        queue.put_nowait((command, args, future))
+        return await future
+
+    async def _consume(self, book, queue):
+        while True:
+            command, args, future = await queue.get()
+            try:
+                result = self._handlers[command](book, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():  # The caller may have timed out
+                future.set_result(result)
+
+    def _place(self, book, user_id, side, price, quantity):
+        order = Order(next(self._ids), user_id, side, price, quantity)
+        fills = book.submit(order)
+        if fills:
+            executed_at = datetime.now(dt_timezone.utc)
+            for fill in fills:
+                buy, sell = (fill.taker, fill.maker) if fill.taker.side == BUY else (fill.maker, fill.taker)
+                self._pending.append({
+                    'symbol': book.symbol, 'price': fill.price * self.tick, 'quantity': fill.quantity,
+                    'buy_order_id': buy.id, 'sell_order_id': sell.id, 'buyer_id': buy.user_id,
+                    'seller_id': sell.user_id, 'aggressor': fill.taker.side, 'executed_at': executed_at,
+                })
+            if len(self._pending) >= self.fill_batch:
+                self._wake.set()
+        return self._order_payload(order), [
+            {'price': float(fill.price * self.tick), 'quantity': fill.quantity, 'maker_order': fill.maker.id}
+            for fill in fills
+        ]
+
+    def _cancel(self, book, user_id, order_id):
+        order = book.orders.get(order_id)
+        if order is None or order.user_id != user_id:
+            return None
+        return self._order_payload(book.cancel(order_id))
+
+    def _snapshot(self, book, levels):
+        snapshot = book.snapshot(levels)
+        return {
+            'bids': [[float(price * self.tick), quantity] for price, quantity in snapshot['bids']],
+            'asks': [[float(price * self.tick), quantity] for price, quantity in snapshot['asks']],
+            'last': None if snapshot['last'] is None else float(snapshot['last'] * self.tick),
+        }
+
+    def _order_payload(self, order):
+        payload = order.as_dict()
+        payload['price'] = None if order.price is None else float(order.price * self.tick)
+        return payload
+
+    async def _write_pending(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._pending:
+                rows, self._pending = self._pending, []
+                await self.loop.run_in_executor(self._db, _write_fills, rows)
+            if self._flushed is not None and not self._pending:
+                self._flushed.set_result(None)
+                self._flushed = None
+
+    async def _flush(self):
+        if self._flushed is None:
+            self._flushed = self.loop.create_future()
+        self._wake.set()
+        await self._flushed
+
+    # Thread side, for views
+
+    def call(self, coroutine, timeout=COMMAND_TIMEOUT):
+        """The coroutine's result; raises concurrent.futures.TimeoutError if the loop is too busy"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def place(self, user_id, symbol, side, price, quantity):
+        """(order, fills) for a limit order at `price` ticks, or a market order when price is None"""
+        return self.call(self.execute(symbol, 'place', user_id, side, price, quantity))
+
+    def cancel(self, user_id, symbol, order_id):
+        """The cancelled order, or None if it is not resting or not the user's"""
+        return self.call(self.execute(symbol, 'cancel', user_id, order_id))
+
+    def snapshot(self, symbol, levels=10):
+        return self.call(self.execute(symbol, 'snapshot', levels))
+
+    def flush(self, timeout=COMMAND_TIMEOUT):
+        """Wait until every fill matched so far is stored"""
+        self.call(self._flush(), timeout)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = MatchingEngine(
+                tick=Decimal(getattr(settings, 'TRADING_TICK', '0.01')),
+                fill_batch=getattr(settings, 'TRADING_FILL_BATCH', 500),
+                flush_interval=getattr(settings, 'TRADING_FLUSH_INTERVAL', 0.05),
+            )
+        return _engine
+
+
+def check_symbol(symbol):
+    """Raise TradingError unless orders may be placed for the (normalized) symbol"""
+    universe = getattr(settings, 'TRADING_SYMBOLS', None)
+    if universe is not None:
+        tradable = symbol in {marketdata.normalize_symbol(name) for name in universe}
+    else:
+        tradable = marketdata.get_store().has(symbol)
+    if not tradable:
+        raise TradingError(f'{symbol} is not traded')
+
+
+def parse_order(data, tick, max_quantity):
+    """Validate a JSON order into (side, price in ticks or None, quantity)"""
+    if not isinstance(data, dict):
+        raise TradingError('Expected a JSON object')
+    side = data.get('side')
+    if side not in (BUY, SELL):
+        raise TradingError('Side must be buy or sell')
+    order_type = data.get('type', 'limit')
+    if order_type not in ('limit', 'market'):
+        raise TradingError('Type must be limit or market')
+    quantity = data.get('quantity')
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or not 1 <= quantity <= max_quantity:
+        raise TradingError(f'Quantity must be a whole number between 1 and {max_quantity}')
+    if order_type == 'market':
+        if data.get('price') is not None:
+            raise TradingError('Market orders do not take a price')
+        return side, None, quantity
+
+    price = data.get('price')
+    if not isinstance(price, (int, float, str)) or isinstance(price, bool):
+        raise TradingError('Limit orders need a price')
+    try:
+        ticks = Decimal(str(price)) / tick
+    except ArithmeticError:
+        raise TradingError('Price must be a number')
+    if not ticks.is_finite() or ticks <= 0 or ticks != ticks.to_integral_value():
+        raise TradingError(f'Price must be a positive multiple of {tick}')
+    return side, int(ticks), quantity
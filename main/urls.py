@@ -1,6 +1,18 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the read-only endpoints polled by every page run as native async
+# views instead of being pushed through the sync_to_async thread pool
+if settings.ASYNC_VIEWS:
+    csrf_token_view, auth_status_view, validate_email_view = (
+        views.aget_csrf_token, views.acheck_auth_status, views.avalidate_email_api
+    )
+else:
+    csrf_token_view, auth_status_view, validate_email_view = (
+        views.get_csrf_token, views.check_auth_status, views.validate_email_api
+    )
+
 urlpatterns = [
     # Page views
     path('', views.index, name='index'),
@@ -19,8 +31,29 @@ urlpatterns = [
     path('api/logout/', views.user_logout, name='user_logout'),
     path('api/signup/', views.user_signup, name='user_signup'),
     path('api/ai-chat/', views.ai_chat, name='ai_chat'),
-    path('api/csrf-token/', views.get_csrf_token, name='get_csrf_token'),
-    path('api/auth-status/', views.check_auth_status, name='check_auth_status'),
+    path('api/csrf-token/', csrf_token_view, name='get_csrf_token'),
+    path('api/auth-status/', auth_status_view, name='check_auth_status'),
     path('api/profile/update/', views.update_user_profile, name='update_user_profile'),
-    path('api/validate-email/', views.validate_email_api, name='validate_email'),
+    path('api/validate-email/', validate_email_view, name='validate_email'),
+    path('api/password-reset/', views.request_password_reset, name='request_password_reset'),
+    path('api/password-reset/confirm/', views.confirm_password_reset, name='confirm_password_reset'),
+    path('api/verify-email/request/', views.request_email_verification, name='request_email_verification'),
+    path('api/verify-email/', views.verify_email, name='verify_email'),
+    path('api/export/<str:export>/', views.export_data, name='export_data'),
+    path('api/batch/', views.batch_api, name='batch_api'),
+    path('api/market/<str:symbol>/', views.market_data, name='market_data'),
+    path('api/market/<str:symbol>/indicators/', views.market_indicators, name='market_indicators'),
+    path('api/pricing/options/', views.price_options, name='price_options'),
+    path('api/portfolio/optimize/', views.optimize_portfolio, name='optimize_portfolio'),
+    path('api/backtest/', views.run_backtest, name='run_backtest'),
+    path('api/risk/simulations/', views.submit_risk_simulation, name='submit_risk_simulation'),
+    path('api/risk/simulations/<uuid:job_id>/', views.risk_simulation_status, name='risk_simulation_status'),
+    path('api/trading/orders/', views.place_paper_order, name='place_paper_order'),
+    path('api/trading/orders/<int:order_id>/cancel/', views.cancel_paper_order, name='cancel_paper_order'),
+    path('api/trading/book/<str:symbol>/', views.paper_order_book, name='paper_order_book'),
+    path('api/trading/fills/', views.paper_fills, name='paper_fills'),
+    path('api/dashboard/', views.dashboard_snapshot, name='dashboard_snapshot'),
+    
+    # Monitoring
+    path('metrics', views.metrics_view, name='metrics'),
 ]
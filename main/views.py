@@ -1,35 +1,40 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.middleware.csrf import get_token
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.core.mail import send_mail
 from django.conf import settings
 from django.db import transaction
-from .models import UserProfile, ContactMessage, AIConversation, LoginAttempt
+from django.db.models import Count, Q
+from .models import UserProfile, ContactMessage, AIConversation, LoginAttempt, RiskJob, PaperFill
+from . import (backtest, batch, dashboard, exports, indicators, ippolicy, lockout, mailer, marketdata, metrics,
+               portfolio, retrieval, risk, tokens, trading)
+from . import pricing as option_pricing  # views.pricing is the pricing page
+from .idempotency import idempotent
+from .bloom import registered_emails
+from .fields import decode_text
 import json
 import re
 import uuid
 import hashlib
 import secrets
 from datetime import timedelta
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 import logging
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 def get_client_ip(request):
-    """Get the client's IP address"""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    """Get the client's IP address; X-Forwarded-For only counts when added by TRUSTED_PROXIES"""
+    return ippolicy.client_ip(request.META)
 
 def get_user_agent(request):
     """Get the client's user agent"""
@@ -214,13 +219,23 @@ def user_login(request):
                     'message': 'Please enter a valid email address'
                 })
             
+            # Reject locked accounts from the cache mirror without touching the database
+            if lockout.is_locked(email):
+                logger.warning(f"Rejected login for locked account {email} from IP {client_ip}")
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Account is temporarily locked due to multiple failed login attempts. Please try again in 30 minutes.'
+                })
+            
             # Try to find user by email
             try:
                 user_obj = User.objects.get(email=email)
+                lockout.link(email, user_obj.pk)
                 
                 # Check if account is locked
                 profile, created = UserProfile.objects.get_or_create(user=user_obj)
                 if profile.is_account_locked():
+                    lockout.remember(user_obj.pk, profile.failed_login_attempts, profile.account_locked_until)
                     LoginAttempt.objects.create(
                         user=user_obj,
                         email=email,
@@ -324,18 +339,31 @@ def user_login(request):
 
 @csrf_exempt
 def ai_chat(request):
-    """Handle AI chat requests - placeholder for future AI integration"""
+    """Answer visitor questions from the marketing pages (see main/retrieval.py)"""
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            message = data.get('message')
+            message = str(data.get('message') or '').strip()
+            
+            # Answer from the site's own pages when a passage matches well enough
+            try:
+                matches = retrieval.answer(message) if message else []
+            except Exception as e:
+                logger.error(f"Retrieval error: {str(e)}")
+                matches = []
             
-            # Placeholder response - in the future, integrate with actual AI service
-            response = "Thank you for your interest in Derivity AI! We're currently in development and will be launching soon. Stay tuned for updates!"
+            if matches:
+                response = matches[0][1]['text']
+            else:
+                response = "Thank you for your interest in Derivity AI! We're currently in development and will be launching soon. Stay tuned for updates!"
             
             return JsonResponse({
                 'status': 'success',
-                'response': response
+                'response': response,
+                'sources': [
+                    {'page': passage['page'], 'title': passage['title'], 'score': round(score, 3)}
+                    for score, passage in matches
+                ]
             })
         except Exception as e:
             return JsonResponse({
@@ -346,6 +374,7 @@ def ai_chat(request):
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
 @csrf_exempt
+@idempotent
 def user_signup(request):
     """Enhanced user signup with comprehensive validation and security"""
     if request.method == 'POST':
@@ -476,7 +505,7 @@ def user_signup(request):
             return JsonResponse({
                 'status': 'error',
                 'message': 'There was an error creating your account. Please try again later.'
-            })
+            }, status=500)
     
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
@@ -499,32 +528,55 @@ def get_csrf_token(request):
         'csrf_token': get_token(request)
     })
 
+@csrf_exempt
+async def aget_csrf_token(request):
+    """Async get_csrf_token for ASGI deployments"""
+    return JsonResponse({
+        'csrf_token': get_token(request)
+    })
+
+def auth_status_payload(user, profile):
+    """Response body for an authenticated auth-status check"""
+    return {
+        'authenticated': True,
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'full_name': f"{user.first_name} {user.last_name}".strip(),
+            'email_verified': profile.email_verified,
+            'newsletter_subscription': profile.newsletter_subscription,
+            'date_joined': user.date_joined.isoformat(),
+            'last_login': user.last_login.isoformat() if user.last_login else None
+        }
+    }
+
 @csrf_exempt
 def check_auth_status(request):
     """Enhanced auth status check with detailed user info"""
     if request.user.is_authenticated:
         profile, created = UserProfile.objects.get_or_create(user=request.user)
-        return JsonResponse({
-            'authenticated': True,
-            'user': {
-                'id': request.user.id,
-                'username': request.user.username,
-                'email': request.user.email,
-                'first_name': request.user.first_name,
-                'last_name': request.user.last_name,
-                'full_name': f"{request.user.first_name} {request.user.last_name}".strip(),
-                'email_verified': profile.email_verified,
-                'newsletter_subscription': profile.newsletter_subscription,
-                'date_joined': request.user.date_joined.isoformat(),
-                'last_login': request.user.last_login.isoformat() if request.user.last_login else None
-            }
-        })
+        return JsonResponse(auth_status_payload(request.user, profile))
     else:
         return JsonResponse({
             'authenticated': False,
             'user': None
         })
 
+@csrf_exempt
+async def acheck_auth_status(request):
+    """Async check_auth_status; every page polls it, so it avoids a thread hop under ASGI"""
+    user = await request.auser()
+    if user.is_authenticated:
+        profile, created = await UserProfile.objects.aget_or_create(user=user)
+        return JsonResponse(auth_status_payload(user, profile))
+    return JsonResponse({
+        'authenticated': False,
+        'user': None
+    })
+
 @csrf_exempt
 def user_logout(request):
     """Enhanced user logout with logging"""
@@ -543,6 +595,7 @@ def user_logout(request):
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
 @csrf_exempt
+@idempotent
 def contact_form(request):
     """Enhanced contact form with better validation and storage"""
     if request.method == 'POST':
@@ -603,12 +656,13 @@ def contact_form(request):
             return JsonResponse({
                 'status': 'error',
                 'message': 'There was an error sending your message. Please try again.'
-            })
+            }, status=500)
     
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
 @csrf_exempt
 @login_required
+@idempotent
 def update_user_profile(request):
     """Enhanced user profile update with validation"""
     if request.method == 'POST':
@@ -663,6 +717,7 @@ def update_user_profile(request):
                 
                 user.email = new_email
                 profile.email_verified = False  # Reset verification status
+                profile.email_verification_token = None  # Links sent to the old address stop working
                 updated_fields.append('email')
             
             # Update newsletter subscription
@@ -717,7 +772,7 @@ def update_user_profile(request):
             return JsonResponse({
                 'status': 'error',
                 'message': 'There was an error updating your profile'
-            })
+            }, status=500)
     
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
@@ -731,8 +786,40 @@ def validate_email_api(request):
             
             email_valid, email_message = validate_email(email)
             
-            # Check if email already exists
-            email_exists = User.objects.filter(email=email).exists() if email_valid else False
+            # Check if email already exists; the Bloom filter answers most
+            # "not registered" lookups without a query
+            email_exists = registered_emails.is_registered(email) if email_valid else False
+            
+            return JsonResponse({
+                'valid': email_valid,
+                'message': email_message,
+                'exists': email_exists
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'valid': False,
+                'message': 'Invalid data format'
+            })
+        except Exception as e:
+            logger.error(f"Email validation error: {str(e)}")
+            return JsonResponse({
+                'valid': False,
+                'message': 'Error validating email'
+            })
+    
+    return JsonResponse({'valid': False, 'message': 'Invalid request method'})
+
+@csrf_exempt
+async def avalidate_email_api(request):
+    """Async validate_email_api for ASGI deployments"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            email = data.get('email', '').strip().lower()
+            
+            email_valid, email_message = validate_email(email)
+            email_exists = await registered_emails.ais_registered(email) if email_valid else False
             
             return JsonResponse({
                 'valid': email_valid,
@@ -754,6 +841,602 @@ def validate_email_api(request):
     
     return JsonResponse({'valid': False, 'message': 'Invalid request method'})
 
+@csrf_exempt
+def request_password_reset(request):
+    """Email a password reset link without revealing whether the account exists"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            email = data.get('email', '').strip().lower()
+            
+            email_valid, email_message = validate_email(email)
+            if not email_valid:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': email_message
+                })
+            
+            # One SELECT and one UPDATE whether or not the account exists (see
+            # tokens.issue_password_reset_for), and mail goes to a background
+            # thread, so response times do not reveal which emails are registered
+            user = User.objects.filter(email=email, is_active=True).first()
+            token = tokens.issue_password_reset_for(user)
+            if token is not None:
+                reset_url = f"{request.build_absolute_uri('/login/')}?reset_token={token}"
+                mailer.send_later(
+                    'Reset your Derivity AI password',
+                    f"Use this link to choose a new password (valid for one hour):\n\n{reset_url}\n\n"
+                    "If you did not request a reset, you can ignore this email.",
+                    [user.email]
+                )
+                logger.info(f"Password reset requested for {email} from IP {get_client_ip(request)}")
+            
+            return JsonResponse({
+                'status': 'success',
+                'message': 'If an account exists for this email, a password reset link has been sent.'
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            })
+        except Exception as e:
+            logger.error(f"Password reset request error: {str(e)}")
+            return JsonResponse({
+                'status': 'error',
+                'message': 'There was an error processing your request. Please try again.'
+            })
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+@csrf_exempt
+def confirm_password_reset(request):
+    """Set a new password using a reset token"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            token = data.get('token', '')
+            password = data.get('password', '')
+            
+            password_valid, password_message = validate_password(password)
+            if not password_valid:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': password_message
+                })
+            
+            profile = tokens.find_password_reset_profile(token)
+            if profile is None:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'This reset link is invalid or has expired. Please request a new one.'
+                })
+            
+            user = profile.user
+            with transaction.atomic():
+                user.set_password(password)
+                user.save()
+                
+                # Tokens are single-use; a successful reset also lifts any lockout
+                profile.password_reset_token = None
+                profile.password_reset_expires = None
+                profile.failed_login_attempts = 0
+                profile.account_locked_until = None
+                profile.save()
+            
+            logger.info(f"Password reset completed for {user.email} from IP {get_client_ip(request)}")
+            
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Your password has been reset. You can now log in.'
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            })
+        except Exception as e:
+            logger.error(f"Password reset error: {str(e)}")
+            return JsonResponse({
+                'status': 'error',
+                'message': 'There was an error resetting your password. Please try again.'
+            })
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+@csrf_exempt
+@login_required
+def request_email_verification(request):
+    """Email a verification link to the logged-in user's address"""
+    if request.method == 'POST':
+        user = request.user
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        if profile.email_verified:
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Your email address is already verified.'
+            })
+        
+        token = tokens.issue_email_verification(profile)
+        verify_url = f"{request.build_absolute_uri('/dashboard/')}?verify_token={token}"
+        send_mail(
+            'Verify your Derivity AI email address',
+            f"Confirm your email address with this link:\n\n{verify_url}",
+            None,
+            [user.email],
+            fail_silently=True
+        )
+        logger.info(f"Email verification sent to {user.email}")
+        
+        return JsonResponse({
+            'status': 'success',
+            'message': f'A verification link has been sent to {user.email}.'
+        })
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+@csrf_exempt
+def verify_email(request):
+    """Mark an email address as verified using a verification token"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            profile = tokens.find_email_verification_profile(data.get('token', ''))
+            if profile is None:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'This verification link is invalid or has expired.'
+                })
+            
+            profile.email_verified = True
+            profile.email_verification_token = None
+            profile.email_verification_expires = None
+            profile.save()
+            
+            logger.info(f"Email verified for {profile.user.email}")
+            
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Your email address has been verified.'
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            })
+        except Exception as e:
+            logger.error(f"Email verification error: {str(e)}")
+            return JsonResponse({
+                'status': 'error',
+                'message': 'There was an error verifying your email. Please try again.'
+            })
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+@require_http_methods(["GET"])
+def export_data(request, export):
+    """Staff-only streaming CSV/JSONL export of users and audit tables"""
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Staff access required'}, status=403)
+    
+    if export not in exports.EXPORTS:
+        return JsonResponse({'status': 'error', 'message': f'Unknown export: {export}'}, status=404)
+    
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return JsonResponse({'status': 'error', 'message': 'Format must be csv or jsonl'}, status=400)
+    
+    try:
+        start = exports.parse_bound(request.GET.get('start'))
+        end = exports.parse_bound(request.GET.get('end'), end=True)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    gzip = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"{export}-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+    if gzip:
+        content_type = 'application/gzip'
+        filename += '.gz'
+    
+    logger.info(f"Export {export} ({fmt}) started by {request.user.email}")
+    chunks = exports.stream_export(export, fmt, start, end, gzip)
+    if settings.ASYNC_VIEWS:
+        chunks = exports.aiter_chunks(chunks)  # An ASGI server would otherwise buffer the whole export
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@csrf_exempt
+def batch_api(request):
+    """Run several API calls in one round trip, sharing the session and user load"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            items = data.get('requests') if isinstance(data, dict) else None
+            if not isinstance(items, list) or not items:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Provide a non-empty list of requests'
+                }, status=400)
+            
+            max_requests = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+            if len(items) > max_requests:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': f'At most {max_requests} requests per batch'
+                }, status=400)
+            
+            results, cookies = batch.run_batch(request, items)
+            response = JsonResponse({'status': 'success', 'responses': results})
+            response.cookies.update(cookies)
+            return response
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            }, status=400)
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+@require_http_methods(["GET"])
+def market_data(request, symbol):
+    """OHLCV range for a symbol, downsampled server-side to at most `points` chart points"""
+    try:
+        symbol = marketdata.normalize_symbol(symbol)
+        start = marketdata.parse_time(request.GET.get('start'))
+        end = marketdata.parse_time(request.GET.get('end'), end=True)
+        points = int(request.GET.get('points', 500))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    max_points = getattr(settings, 'MARKET_DATA_MAX_POINTS', 5000)
+    if not 2 <= points <= max_points:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Points must be between 2 and {max_points}'
+        }, status=400)
+    
+    mode = request.GET.get('mode', 'ohlc')
+    if mode not in marketdata.DOWNSAMPLE_MODES:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Mode must be one of {", ".join(marketdata.DOWNSAMPLE_MODES)}'
+        }, status=400)
+    
+    try:
+        rows, sampled = marketdata.get_store().query(symbol, start, end, points, mode)
+    except marketdata.MarketDataError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+    
+    return JsonResponse({
+        'status': 'success',
+        'symbol': symbol,
+        'mode': mode,
+        'rows': rows,
+        'points': len(sampled['ts']),
+        'data': marketdata.to_payload(sampled),
+    })
+
+@require_http_methods(["GET"])
+def market_indicators(request, symbol):
+    """Latest indicator values for a symbol, plus the last `bars` values of each with ?bars="""
+    try:
+        symbol = marketdata.normalize_symbol(symbol)
+        bars = int(request.GET.get('bars', 0))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    max_points = getattr(settings, 'MARKET_DATA_MAX_POINTS', 5000)
+    if not 0 <= bars <= max_points:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Bars must be between 0 and {max_points}'
+        }, status=400)
+    
+    try:
+        ts, close, values = indicators.latest(symbol)
+    except marketdata.MarketDataError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+    
+    payload = {
+        'status': 'success',
+        'symbol': symbol,
+        'ts': ts,
+        'close': close,
+        'indicators': {name: indicators.to_payload(value) for name, value in values.items()},
+    }
+    if bars:
+        series_ts, series = indicators.history(symbol, bars)
+        payload['series'] = {'ts': series_ts.tolist()}
+        payload['series'].update((name, indicators.to_payload(value)) for name, value in series.items())
+    return JsonResponse(payload)
+
+@csrf_exempt
+def price_options(request):
+    """Black-Scholes prices, Greeks and implied volatility, or tree prices for American options, for a batch"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            params = option_pricing.parse_request(
+                data,
+                getattr(settings, 'PRICING_MAX_CONTRACTS', 100_000),
+                getattr(settings, 'PRICING_MAX_TREE_STEPS', 2000),
+                getattr(settings, 'PRICING_MAX_TREE_NODES', 2_000_000_000),
+            )
+            results = option_pricing.price_batch(**params)
+            return JsonResponse({
+                'status': 'success',
+                'count': len(results['price']),
+                'results': option_pricing.to_payload(results),
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            }, status=400)
+        except option_pricing.PricingError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+@csrf_exempt
+def optimize_portfolio(request):
+    """Min-variance, mean-variance or risk-parity weights for a universe of stored symbols"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            params = portfolio.parse_request(
+                data,
+                getattr(settings, 'PORTFOLIO_MAX_ASSETS', 2000),
+                getattr(settings, 'PORTFOLIO_MAX_WINDOW', 5000),
+            )
+            result = portfolio.optimize(**params, cache_size=getattr(settings, 'PORTFOLIO_CACHE_SIZE', 8))
+            return JsonResponse({
+                'status': 'success',
+                'method': params['method'],
+                **portfolio.to_payload(params['symbols'], result),
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            }, status=400)
+        except portfolio.PortfolioError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        except marketdata.MarketDataError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+def run_backtest(request):
+    """Backtest a strategy, or sweep a grid of its parameters, over stored bars"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required'}, status=401)
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            params = backtest.parse_request(
+                data,
+                getattr(settings, 'BACKTEST_MAX_SYMBOLS', 1000),
+                getattr(settings, 'BACKTEST_MAX_COMBINATIONS', 200),
+                getattr(settings, 'BACKTEST_MAX_CELLS', 500_000_000),
+                getattr(settings, 'BACKTEST_MAX_PANEL_BYTES', 1024 ** 3),
+            )
+            result = backtest.run(**params, workers=getattr(settings, 'BACKTEST_WORKERS', 0))
+            return JsonResponse({'status': 'success', 'strategy': params['strategy'], **result})
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            }, status=400)
+        except backtest.BacktestError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        except marketdata.MarketDataError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+def submit_risk_simulation(request):
+    """Queue a Monte Carlo VaR/CVaR simulation; poll the returned URL for the result"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required'}, status=401)
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            params = risk.parse_request(
+                data,
+                getattr(settings, 'RISK_MAX_PATHS', 5_000_000),
+                getattr(settings, 'RISK_MAX_HORIZON', 252),
+                getattr(settings, 'RISK_MAX_DRAWS', 2_000_000_000),
+                getattr(settings, 'PORTFOLIO_MAX_ASSETS', 2000),
+            )
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            }, status=400)
+        except risk.RiskError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        
+        risk.reap_stale()
+        active = RiskJob.objects.filter(status__in=risk.ACTIVE).aggregate(
+            mine=Count('pk', filter=Q(user=request.user)),
+            queued=Count('pk', filter=Q(runner=risk.RUNNER, status='queued')),
+        )
+        if active['mine'] >= getattr(settings, 'RISK_MAX_ACTIVE_JOBS_PER_USER', 2):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'You already have simulations queued or running; wait for one to finish',
+            }, status=429)
+        if active['queued'] >= getattr(settings, 'RISK_MAX_QUEUED_JOBS', 20):
+            return JsonResponse({'status': 'error', 'message': 'Too many simulations are queued; try again later'},
+                                status=429)
+        
+        job = RiskJob.objects.create(user=request.user, params=params, runner=risk.RUNNER,
+                                     heartbeat_at=timezone.now())
+        # Start once the row is committed, so the job thread can read it
+        transaction.on_commit(lambda: risk.submit(job.pk))
+        return JsonResponse({
+            'status': 'success',
+            'job': str(job.pk),
+            'seed': params['seed'],
+            'poll': reverse('risk_simulation_status', args=[job.pk]),
+        }, status=202)
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+def risk_simulation_status(request, job_id):
+    """State, progress and, once done, the result of a risk simulation"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required'}, status=401)
+    risk.reap_stale()
+    job = RiskJob.objects.filter(pk=job_id, user=request.user).first()
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+    
+    payload = {
+        'status': 'success',
+        'job': str(job.pk),
+        'state': job.status,
+        'progress': round(job.progress, 4),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == 'done':
+        payload['result'] = job.result
+    elif job.status == 'failed':
+        payload['error'] = job.error
+    return JsonResponse(payload)
+
+def place_paper_order(request):
+    """Place a paper-trading limit or market order; it is matched before the response is sent"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required'}, status=401)
+    if request.method == 'POST':
+        engine = trading.get_engine()
+        try:
+            data = json.loads(request.body)
+            symbol = marketdata.normalize_symbol(str(data.get('symbol') or '') if isinstance(data, dict) else None)
+            trading.check_symbol(symbol)
+            side, price, quantity = trading.parse_order(
+                data, engine.tick, getattr(settings, 'TRADING_MAX_QUANTITY', 1_000_000)
+            )
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            }, status=400)
+        except (trading.TradingError, marketdata.MarketDataError) as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        
+        try:
+            order, fills = engine.place(request.user.pk, symbol, side, price, quantity)
+        except FuturesTimeoutError:
+            # Still queued: it is matched when the engine gets to it, so the client must not resubmit blindly
+            return JsonResponse({
+                'status': 'error',
+                'message': 'The matching engine is busy; check your fills before placing the order again',
+            }, status=503)
+        return JsonResponse({'status': 'success', 'symbol': symbol, 'order': order, 'fills': fills})
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+def cancel_paper_order(request, order_id):
+    """Cancel one of the user's resting paper orders"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required'}, status=401)
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            symbol = marketdata.normalize_symbol(str(data.get('symbol') or '') if isinstance(data, dict) else None)
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid data format'
+            }, status=400)
+        except marketdata.MarketDataError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        
+        try:
+            order = trading.get_engine().cancel(request.user.pk, symbol, order_id)
+        except FuturesTimeoutError:
+            return JsonResponse({'status': 'error', 'message': 'The matching engine is busy; try again'}, status=503)
+        if order is None:
+            return JsonResponse({'status': 'error', 'message': 'No such open order'}, status=404)
+        return JsonResponse({'status': 'success', 'symbol': symbol, 'order': order})
+    
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+
+def paper_order_book(request, symbol):
+    """Aggregated depth of a paper-trading order book"""
+    try:
+        symbol = marketdata.normalize_symbol(symbol)
+        depth = int(request.GET.get('depth', 10))
+    except (ValueError, marketdata.MarketDataError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    depth = min(max(depth, 1), getattr(settings, 'TRADING_MAX_DEPTH', 100))
+    try:
+        snapshot = trading.get_engine().snapshot(symbol, depth)
+    except FuturesTimeoutError:
+        return JsonResponse({'status': 'error', 'message': 'The matching engine is busy; try again'}, status=503)
+    return JsonResponse({'status': 'success', 'symbol': symbol, **snapshot})
+
+def paper_fills(request):
+    """The user's most recent paper-trading fills, newest first"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required'}, status=401)
+    try:
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 500)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Limit must be an integer'}, status=400)
+    
+    user_id = request.user.pk
+    rows = PaperFill.objects.filter(Q(buyer_id=user_id) | Q(seller_id=user_id))
+    fills = [{
+        'symbol': fill.symbol,
+        'side': 'buy' if fill.buyer_id == user_id else 'sell',
+        'price': float(fill.price),
+        'quantity': fill.quantity,
+        'order': fill.buy_order_id if fill.buyer_id == user_id else fill.sell_order_id,
+        'aggressor': fill.aggressor,
+        'executed_at': fill.executed_at.isoformat(),
+    } for fill in rows[:limit]]
+    return JsonResponse({'status': 'success', 'fills': fills})
+
+@require_http_methods(["GET"])
+def dashboard_snapshot(request):
+    """The user's positions, indicators and risk in one document; 304 when If-None-Match is current"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required'}, status=401)
+    
+    etag, blob = dashboard.get_snapshot(request.user.pk)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(decode_text(blob), content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)  # Browsers revalidate every load
+    return response
+
+def metrics_view(request):
+    """Prometheus scrape endpoint aggregating request metrics across workers"""
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', None)
+    if allowed_ips and get_client_ip(request) not in allowed_ips:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    
+    counters, histograms = metrics.collect()
+    return HttpResponse(
+        metrics.render_prometheus(counters, histograms),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
 # Remove the old validate_email function and replace with the enhanced ones above
 def validate_email_old(email):
     """Validate email format - DEPRECATED, use validate_email instead"""
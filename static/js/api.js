@@ -9,6 +9,12 @@ class DerivityAPI {
         this.isGitHubPages = window.location.hostname.includes('github.io');
     }
 
+    // Django's CSRF cookie, set once any response has handed out a token
+    static getCSRFCookie() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
     // Generic API request handler
     async makeRequest(endpoint, options = {}) {
         if (this.isGitHubPages) {
@@ -21,8 +27,18 @@ class DerivityAPI {
             },
             credentials: 'same-origin', // Include cookies for session management
         };
+        const method = (options.method || 'GET').toUpperCase();
+        const csrfToken = DerivityAPI.getCSRFCookie();
+        if (method !== 'GET' && csrfToken) {
+            // Checked on protected views, including the sub-requests of /api/batch/
+            defaultOptions.headers['X-CSRFToken'] = csrfToken;
+        }
 
-        const requestOptions = { ...defaultOptions, ...options };
+        const requestOptions = {
+            ...defaultOptions,
+            ...options,
+            headers: { ...defaultOptions.headers, ...(options.headers || {}) }
+        };
 
         try {
             const response = await fetch(endpoint, requestOptions);
@@ -34,6 +50,29 @@ class DerivityAPI {
         }
     }
 
+    // POST that is safe to retry: every attempt carries the same
+    // Idempotency-Key, so the server runs it at most once
+    async makeIdempotentRequest(endpoint, data, retries = 2) {
+        const key = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        const options = {
+            method: 'POST',
+            headers: { 'Idempotency-Key': key },
+            body: JSON.stringify(data)
+        };
+        for (let attempt = 0; ; attempt++) {
+            try {
+                return await this.makeRequest(endpoint, options);
+            } catch (error) {
+                if (attempt >= retries) {
+                    throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+            }
+        }
+    }
+
     // Authentication methods
     async login(email, password) {
         return this.makeRequest('/api/login/', {
@@ -46,10 +85,7 @@ class DerivityAPI {
     }
 
     async signup(userData) {
-        return this.makeRequest('/api/signup/', {
-            method: 'POST',
-            body: JSON.stringify(userData)
-        });
+        return this.makeIdempotentRequest('/api/signup/', userData);
     }
 
     async logout() {
@@ -68,18 +104,12 @@ class DerivityAPI {
     }
 
     async updateUserProfile(userData) {
-        return this.makeRequest('/api/profile/update/', {
-            method: 'POST',
-            body: JSON.stringify(userData)
-        });
+        return this.makeIdempotentRequest('/api/profile/update/', userData);
     }
 
     // Contact form
     async submitContactForm(formData) {
-        return this.makeRequest('/api/contact/', {
-            method: 'POST',
-            body: JSON.stringify(formData)
-        });
+        return this.makeIdempotentRequest('/api/contact/', formData);
     }
 
     // AI Chat (placeholder)
@@ -95,6 +125,40 @@ class DerivityAPI {
         return this.makeRequest('/api/csrf-token/');
     }
 
+    // Batch several API calls into one round trip. Each entry is
+    // { path, method = 'GET', body, id }; results come back in the same order
+    // as { id, status, body }.
+    async batch(requests) {
+        const data = await this.makeRequest('/api/batch/', {
+            method: 'POST',
+            body: JSON.stringify({
+                requests: requests.map((request, index) => ({
+                    id: request.id !== undefined ? request.id : index,
+                    method: request.method || 'GET',
+                    path: request.path,
+                    body: request.body
+                }))
+            })
+        });
+        if (data.status !== 'success') {
+            throw new Error(data.message || 'Batch request failed');
+        }
+        return data.responses;
+    }
+
+    // Everything a page needs on load, in one request
+    async loadPageData() {
+        const [csrf, auth] = await this.batch([
+            { id: 'csrf', path: '/api/csrf-token/' },
+            { id: 'auth', path: '/api/auth-status/' }
+        ]);
+        return {
+            csrfToken: csrf.body.csrf_token,
+            authenticated: auth.body.authenticated,
+            user: auth.body.user
+        };
+    }
+
     // Storage management
     static setUserData(userData) {
         localStorage.setItem('userData', JSON.stringify(userData));